@@ -49,3 +49,12 @@ SQL_FIELDS_HYBRID = [ 's_dec', 's_ra', 'obs_collection', 'is_public' ]
 
 # Work directory: the mount point in the container for file input and output.
 WORK_DIR = '/work'
+
+# Default database file for the persistent cache of FITS headers, inside the work directory.
+DEFAULT_HEADER_CACHE_FILEPATH = "{}/.imdtk-header-cache.sqlite".format(WORK_DIR)
+
+# Default maximum size, in megabytes, of the persistent cache of FITS headers.
+DEFAULT_HEADER_CACHE_MAX_MB = 256
+
+# Default database file for the manifest of files ingested by incremental pipelines, inside the work directory.
+DEFAULT_INGEST_MANIFEST_FILEPATH = "{}/.imdtk-ingest-manifest.sqlite".format(WORK_DIR)
@@ -5,3 +5,6 @@ Metadatum = collections.namedtuple('Metadatum', ['keyword', 'value'])
 
 # class to hold an offsets and length information for FITS headers
 FitsHeaderInfo = collections.namedtuple('FitsHeaderInfo', ['offset', 'length', 'hdr'])
+
+# class to hold the location, extent, and type of a single HDU within a FITS file
+HduIndexEntry = collections.namedtuple('HduIndexEntry', ['offset', 'hdr_length', 'data_length', 'hdu_type'])
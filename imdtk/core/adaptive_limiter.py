@@ -0,0 +1,242 @@
+#
+# Class to adapt the number of concurrent remote operations to the observed latency and errors.
+#   Written by: Tom Hicks. 1/31/21.
+#   Last Modified: Add a file wrapper which limits only the reads and seeks of the file.
+#
+import io
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Default minimum number of completed operations between decisions to change the limit.
+DEFAULT_WINDOW = 8
+
+# Default factor by which the average latency may exceed the baseline before the limit is cut.
+DEFAULT_TOLERANCE = 2.0
+
+# Default factor by which the limit is multiplied when it is cut.
+DEFAULT_BACKOFF = 0.5
+
+# Factor by which the baseline latency may rise in each window, so that it follows a server
+# which has become slower for reasons other than the load placed on it.
+BASELINE_DRIFT = 1.05
+
+
+class AdaptiveLimiter:
+    """
+    A thread-safe limiter of the number of concurrent operations on a remote server, which
+    adapts the limit to the server's response using additive increase, multiplicative decrease
+    (AIMD). Every window of completed operations, the limiter decides: if any operation failed,
+    or the average latency rose well above the baseline (the lowest recent average latency),
+    the server is overloaded and the limit is cut by the backoff factor; otherwise, if the limit
+    was reached, the limit is raised by one. Each change of the limit is logged to the log file,
+    if one is given, so that the limiter can be tuned.
+    """
+
+    def __init__ (self, name, max_limit, min_limit=1, initial_limit=None, window=DEFAULT_WINDOW,
+                  tolerance=DEFAULT_TOLERANCE, backoff=DEFAULT_BACKOFF, log_file=None):
+        """
+        Constructor of a limiter, named for logging, which allows between min_limit and
+        max_limit concurrent operations, starting from the given initial limit (default:
+        half the maximum).
+        """
+        if ((min_limit is None) or (min_limit < 1) or (max_limit is None) or (max_limit < min_limit)):
+            raise ValueError(
+                f"The limits must satisfy 1 <= minimum <= maximum, not '{min_limit}' and '{max_limit}'.")
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = min(max((initial_limit or (max_limit // 2)), min_limit), max_limit)
+        self.window = window
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.log_file = log_file
+        self.baseline = None                # lowest recent average latency, in seconds
+        self.decreases = 0
+        self.increases = 0
+        self._available = threading.Condition(threading.Lock())
+        self._in_flight = 0
+        self._start_window()
+
+
+    def acquire (self, timeout=None):
+        """
+        Wait at most timeout seconds (forever if None) for the number of operations in flight
+        to fall below the limit, then count the calling operation as in flight. Returns True
+        if the operation may proceed, or False if the timeout expired first.
+        """
+        deadline = None if (timeout is None) else (time.monotonic() + timeout)
+        with self._available:
+            while (self._in_flight >= self.limit):
+                remaining = None if (deadline is None) else (deadline - time.monotonic())
+                if ((remaining is not None) and (remaining <= 0)):
+                    return False
+                self._available.wait(remaining)
+            self._in_flight += 1
+            self._peak = max(self._peak, self._in_flight)
+            return True
+
+
+    def release (self, latency, failed=False):
+        """
+        Count an operation, which took the given number of seconds, as no longer in flight,
+        recording its latency or its failure, and decide whether to change the limit.
+        """
+        with self._available:
+            self._in_flight -= 1
+            self._completed += 1
+            if (failed):
+                self._failures += 1
+            else:
+                self._latency_total += latency
+            if (self._completed >= max(self.window, self.limit)):
+                self._decide()
+            self._available.notify_all()
+
+
+    @contextmanager
+    def slot (self, failure_types=()):
+        """
+        Context manager which holds a place among the operations in flight for the duration of
+        a block, timing it. A block which raises one of the given exception types is counted as
+        a failed operation; other exceptions are not taken to reflect on the server.
+        """
+        self.acquire()
+        start = time.monotonic()
+        failed = False
+        try:
+            yield self
+        except failure_types:
+            failed = True
+            raise
+        finally:
+            self.release(time.monotonic() - start, failed=failed)
+
+
+    def stats (self):
+        """ Return a dictionary of the current state of the limiter and the decisions made. """
+        with self._available:
+            return { 'name': self.name, 'limit': self.limit, 'in_flight': self._in_flight,
+                     'baseline': self.baseline, 'increases': self.increases,
+                     'decreases': self.decreases }
+
+
+    def _decide (self):
+        """
+        Change the limit, if the operations completed in the current window call for it, then
+        start a new window. Must be called while holding the lock.
+        """
+        succeeded = self._completed - self._failures
+        average = (self._latency_total / succeeded) if (succeeded > 0) else None
+        old_limit = self.limit
+        reason = None
+        if (self._failures > 0):
+            self.limit = max(self.min_limit, int(self.limit * self.backoff))
+            reason = f"{self._failures} of {self._completed} operations failed"
+        elif ((self.baseline is not None) and (average > (self.baseline * self.tolerance))):
+            self.limit = max(self.min_limit, int(self.limit * self.backoff))
+            reason = f"average latency {average:.3f}s is over {self.tolerance} x baseline {self.baseline:.3f}s"
+        elif (self._peak >= self.limit):
+            self.limit = min(self.max_limit, self.limit + 1)
+            reason = f"limit reached with average latency {average:.3f}s"
+
+        if (average is not None):
+            self.baseline = average if (self.baseline is None) else min(average, self.baseline * BASELINE_DRIFT)
+
+        if (self.limit != old_limit):
+            if (self.limit > old_limit):
+                self.increases += 1
+            else:
+                self.decreases += 1
+            if (self.log_file is not None):
+                print(f"(AdaptiveLimiter): {self.name}: limit {old_limit} -> {self.limit}: {reason}",
+                      file=self.log_file)
+        self._start_window()
+
+
+    def _start_window (self):
+        """ Reset the record of the operations completed in the current window. """
+        self._completed = 0
+        self._failures = 0
+        self._latency_total = 0.0
+        self._peak = self._in_flight
+
+
+
+class LimitedReader (object):
+    """
+    Read-only file wrapper which holds a slot of the given limiter around each read and seek
+    of the wrapped (remote) file, and only around those calls, so that the limiter measures
+    and limits the requests made of the server, not the time the reader spends between them.
+    """
+
+    def __init__ (self, fd, limiter, failure_types=()):
+        """
+        Constructor of a wrapper for the given open (binary) file, whose reads and seeks are
+        governed by the given limiter, counting the given exception types as failures.
+        """
+        self.fd = fd
+        self.mode = 'rb'
+        self.limiter = limiter
+        self.failure_types = failure_types
+
+
+    def __enter__ (self):
+        return self
+
+
+    def __exit__ (self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close (self):
+        """ Nothing to release: the wrapped file is left open for its owner to close. """
+        pass
+
+
+    def read (self, size=-1):
+        """ Read and return up to size bytes from the wrapped file, within a limiter slot. """
+        with self.limiter.slot(self.failure_types):
+            return self.fd.read(size)
+
+
+    def readable (self):
+        return True
+
+
+    def readinto (self, buffer):
+        """ Read bytes into the given writable buffer and return the number of bytes read. """
+        view = memoryview(buffer).cast('B')
+        data = self.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+
+    def seek (self, offset, whence=io.SEEK_SET):
+        """ Move the position of the wrapped file, within a limiter slot, and return the new position. """
+        with self.limiter.slot(self.failure_types):
+            return self.fd.seek(offset, whence)
+
+
+    def seekable (self):
+        return True
+
+
+    def tell (self):
+        """ Return the current position of the wrapped file. """
+        return self.fd.tell()
+
+
+
+def make_adaptive_limiter (args, name, max_limit):
+    """
+    Return an adaptive limiter, with the given name and maximum limit, if the given arguments
+    dictionary selects adaptive concurrency (the 'adaptive' argument), or None if not.
+    The limiter logs its decisions to standard error, if the 'verbose' argument is set.
+    """
+    if (not args.get('adaptive')):
+        return None
+    log_file = sys.stderr if (args.get('verbose')) else None
+    return AdaptiveLimiter(name, max_limit, log_file=log_file)
@@ -0,0 +1,122 @@
+#
+# Class providing asyncio coroutines to fetch the headers and HDUs of FITS files within iRods.
+#   Written by: Tom Hicks. 2/1/21.
+#   Last Modified: Rebind given files to the session of the executing thread. Do not block the loop on exit.
+#
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncFitsIRodsHelper:
+    """
+    Asynchronous front end to a FitsIRodsHelper, for pipelines driven by an asyncio event loop.
+    The blocking iRods client calls are run by a small, managed pool of executor threads, each
+    of which uses a session checked out of the helper's session pool for the duration of a
+    call. Many coroutines may await reads at once, at the cost of a queued request each: the
+    reads are pipelined across as many connections as there are executor threads (by default,
+    the maximum number of pooled sessions).
+    """
+
+    def __init__ (self, firh, max_connections=None):
+        """
+        Constructor of an asynchronous front end to the given FitsIRodsHelper, which runs
+        at most max_connections iRods calls at a time (default: the helper's maximum
+        number of pooled sessions).
+        """
+        self.firh = firh
+        self.max_connections = max_connections or firh.max_sessions
+        self._executor = ThreadPoolExecutor(max_workers=self.max_connections,
+                                            thread_name_prefix='irods-fetch')
+
+
+    async def __aenter__ (self):
+        return self
+
+
+    async def __aexit__ (self, exc_type, exc_value, traceback):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)  # do not block the loop
+
+
+    def close (self):
+        """ Wait for any calls in progress to finish, then stop the executor threads. """
+        self._executor.shutdown(wait=True)
+
+
+    async def get_fits_file (self, irff_path):
+        """
+        Return the iRods FITS file (data object) at the given absolute path (see
+        FitsIRodsHelper.get_fits_file).
+
+        :raises irods.exception.DataObjectDoesNotExist if file not found or not readable
+        """
+        return await self.run(self.firh.get_fits_file, irff_path)
+
+
+    async def get_hdu (self, irods_fits_file, which_hdu=0):
+        """
+        Return the specified HDU (default: 0 (the first HDU)) of the given iRods FITS file,
+        or of the FITS file at the given absolute path, or None if the specified HDU is out
+        of range (see FitsIRodsHelper.get_hdu).
+        """
+        return await self.run(self._get_hdu, irods_fits_file, which_hdu)
+
+
+    async def get_header (self, irods_fits_file, which_hdu=0):
+        """
+        Return a FITS header for the specified HDU (default: 0 (the first HDU)) of the given
+        iRods FITS file, or of the FITS file at the given absolute path, or None if the
+        specified HDU is out of range (see FitsIRodsHelper.get_header).
+        """
+        return await self.run(self._get_header, irods_fits_file, which_hdu)
+
+
+    async def get_headers (self, irods_fits_files, which_hdu=0, return_exceptions=False):
+        """
+        Return a list of the FITS headers for the specified HDU of each of the given iRods FITS
+        files (or absolute paths), in order, reading them concurrently. If return_exceptions is
+        True, the exception raised in reading a file takes the place of its header in the list;
+        otherwise, the first such exception is raised.
+        """
+        return await asyncio.gather(
+            *[ self.get_header(irff, which_hdu) for irff in irods_fits_files ],
+            return_exceptions=return_exceptions)
+
+
+    async def run (self, func, *args, **kwargs):
+        """
+        Call the given blocking function, usually a method of the helper, with the given
+        arguments, in an executor thread using a pooled iRods session, and return its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self._call_pooled, func, *args, **kwargs))
+
+
+    def _call_pooled (self, func, *args, **kwargs):
+        """ Call the given function, with the given arguments, using a pooled iRods session. """
+        with self.firh.pooled_session():
+            return func(*args, **kwargs)
+
+
+    def _bind_file (self, irods_fits_file):
+        """
+        Return the given iRods FITS file, or the file at the given path, bound to the pooled
+        session of the calling thread. A file fetched in another thread is bound to that thread's
+        session, which may since have been checked out by another call.
+        """
+        if (isinstance(irods_fits_file, str)):
+            return self.firh.get_fits_file(irods_fits_file)
+        if (irods_fits_file.manager.sess is self.firh.session()):
+            return irods_fits_file
+        return self.firh.get_fits_file(str(irods_fits_file.path))
+
+
+    def _get_hdu (self, irods_fits_file, which_hdu):
+        """ Return the specified HDU of the given iRods FITS file or of the file at the given path. """
+        return self.firh.get_hdu(self._bind_file(irods_fits_file), which_hdu)
+
+
+    def _get_header (self, irods_fits_file, which_hdu):
+        """ Return the specified header of the given iRods FITS file or of the file at the given path. """
+        return self.firh.get_header(self._bind_file(irods_fits_file), which_hdu)
@@ -0,0 +1,99 @@
+#
+# Module to collect per-column statistics from the data of a FITS catalog, chunk by chunk.
+#   Written by: Tom Hicks. 1/14/21.
+#   Last Modified: Initial creation.
+#
+import numpy as np
+
+
+# numpy kinds of the columns for which minimum and maximum values are collected
+NUMERIC_KINDS = [ 'i', 'u', 'f' ]
+
+
+def new_column_stats (columns):
+    """
+    Return a new, empty statistics structure for the given astropy.io.fits.ColDefs
+    (the columns attribute of a FITS_rec). The returned structure is a dictionary
+    containing an overall row count and a list of per-column statistics dictionaries,
+    each holding the column name, value count, null count, minimum, and maximum values.
+    """
+    stats = dict()
+    stats['row_count'] = 0
+    stats['columns'] = [ { 'name': col.name, 'count': 0, 'null_count': 0,
+                           'min': None, 'max': None } for col in columns ]
+    return stats
+
+
+def update_column_stats (stats, data):
+    """
+    Update the given statistics structure with the values from the given chunk of
+    astropy.io.fits.fitsrec.FITS_rec data, processing each column, as a whole, with numpy.
+
+    Statistics for vector columns are computed over all the elements of the column.
+    Nulls are counted for floating point columns (NaN values) and for unscaled integer
+    columns which declare a null value (TNULLn). Minimum and maximum values are only
+    collected for numeric columns.
+    """
+    stats['row_count'] += len(data)
+    for idx, col in enumerate(data.columns):
+        update_one_column(stats['columns'][idx], data.field(idx), tnull=null_value(col))
+    return stats
+
+
+def update_one_column (col_stats, col_data, tnull=None):
+    """
+    Update the given statistics dictionary, for a single column, with the values
+    in the given numpy array of column data.
+    """
+    if (col_data.dtype.kind not in NUMERIC_KINDS):  # only count non-numeric values
+        col_stats['count'] += len(col_data)
+        return
+
+    if (col_data.dtype.kind == 'f'):
+        nulls = np.isnan(col_data)
+    elif (tnull is not None):
+        nulls = (col_data == tnull)
+    else:
+        nulls = None
+
+    if (nulls is not None):
+        null_count = int(np.count_nonzero(nulls))
+        values = col_data[~nulls]
+    else:
+        null_count = 0
+        values = col_data
+
+    col_stats['null_count'] += null_count
+    col_stats['count'] += values.size
+    if (values.size > 0):
+        cmin = values.min().item()
+        cmax = values.max().item()
+        col_stats['min'] = cmin if (col_stats['min'] is None) else min(col_stats['min'], cmin)
+        col_stats['max'] = cmax if (col_stats['max'] is None) else max(col_stats['max'], cmax)
+
+
+def null_value (column):
+    """
+    Return the null value (TNULLn) for the given astropy.io.fits.Column, if the column has
+    a null value which can be compared against the column data, else return None.
+    Null values are not compared against scaled columns since TNULLn applies to
+    the raw (unscaled) values.
+    """
+    tnull = getattr(column, 'null', None)
+    if ((tnull is None) or (tnull == '')):
+        return None
+    if ((column.bzero not in (None, '', 0)) or (column.bscale not in (None, '', 1))):
+        return None
+    return tnull
+
+
+def stats_to_rows (stats, table_name):
+    """
+    Return a list of rows for the given statistics structure, suitable for insertion into
+    a statistics table. Each row is a list of: table name, column name, row count,
+    value count, null count, minimum value, and maximum value.
+    """
+    row_count = stats.get('row_count', 0)
+    return [ [ table_name, cs.get('name'), row_count, cs.get('count'),
+               cs.get('null_count'), cs.get('min'), cs.get('max') ]
+             for cs in stats.get('columns', []) ]
@@ -0,0 +1,236 @@
+#
+# Module to compute image footprints and pixel scales directly from the WCS keywords of
+# images with simple celestial projections (TAN or SIN, without distortion), using numpy,
+# avoiding the cost of building a full Astropy WCS structure for each image.
+#   Written by: Tom Hicks. 1/25/21.
+#   Last Modified: Initial creation.
+#
+import collections
+import re
+
+import numpy as np
+
+
+# the (zenithal) projections handled by the fast path
+FAST_PROJECTIONS = [ 'TAN', 'SIN' ]
+
+# modes of computing WCS information: use the fast path when possible (else Astropy),
+# always use Astropy, or use Astropy but compare the fast path results against it
+WCS_MODES = [ 'fast', 'astropy', 'validate' ]
+DEFAULT_WCS_MODE = 'fast'
+
+# default tolerance, in degrees, when validating fast path results against Astropy
+WCS_TOLERANCE = 1e-6
+
+# header keywords which signal a distortion, a projection variant, or a (DSS) plate solution
+# which Astropy would apply, none of which are handled by the fast path
+_DISTORTION_REGEX = re.compile(
+    r'^(A|B|AP|BP)_(ORDER|\d+_\d+)$|^PV\d+_\d+|^PS\d+_\d+|^(CPDIS|CQDIS|DP\d|DQ\d|D2IM|AMDX|AMDY|PLTRAH)')
+
+# legacy rotation keywords, which Astropy converts into a PC matrix
+_CROTA_KEYS = [ 'CROTA1', 'CROTA2' ]
+
+# class to hold the projection parameters of a simple celestial WCS, in axis order, mirroring
+# the names of the corresponding properties of the Astropy Wcsprm structure
+WcsParams = collections.namedtuple('WcsParams', ['ctype', 'crpix', 'crval', 'cd', 'lonpole'])
+
+
+class FastWCS (object):
+    """
+    Lightweight stand-in for an astropy.wcs.WCS structure, for a two dimensional image with
+    a simple celestial projection. It provides only those attributes and methods of the
+    Astropy structure which are used to calculate the ObsCore fields: the wcs.ctype
+    property, the pixel_scale_matrix property, and the calc_footprint method.
+    """
+
+    def __init__ (self, params, naxis):
+        """
+        Constructor of a fast WCS from the given projection parameters (WcsParams) and
+        image dimensions (a sequence of NAXIS1 and NAXIS2).
+        """
+        self.wcs = params
+        self.pixel_shape = tuple(naxis)
+
+
+    @property
+    def pixel_scale_matrix (self):
+        """ The matrix transforming pixel offsets to intermediate world coordinates. """
+        return self.wcs.cd
+
+
+    def calc_footprint (self):
+        """
+        Return the world coordinates of the four corners of the image, as a (4, 2) array,
+        ordered clockwise from the lower left corner, as does the Astropy method of the same name.
+        """
+        return footprints(*fast_wcs_arrays([self]))[0]
+
+
+def compare_wcs (fast, full, tolerance=WCS_TOLERANCE):
+    """
+    Compare the footprint and pixel scales calculated by the given fast WCS with those
+    calculated by the given Astropy WCS. Returns a list of messages describing any
+    differences greater than the given tolerance (in degrees), or an empty list if the
+    two agree.
+    """
+    from astropy.wcs.utils import proj_plane_pixel_scales
+
+    diffs = []
+    fast_corners = np.asarray(fast.calc_footprint())
+    full_corners = np.asarray(full.calc_footprint())
+    corner_diff = np.abs(fast_corners - full_corners)
+    corner_diff[:, 0] = np.minimum(corner_diff[:, 0], 360.0 - corner_diff[:, 0])  # RA wrap
+    if (not (np.nanmax(corner_diff) <= tolerance)):
+        diffs.append("Footprint differs by {:.3g} degrees: fast={}, astropy={}".format(
+            np.nanmax(corner_diff), fast_corners.tolist(), full_corners.tolist()))
+
+    fast_scales = np.sqrt((fast.pixel_scale_matrix ** 2).sum(axis=0))
+    full_scales = np.asarray(proj_plane_pixel_scales(full))
+    scale_diff = np.max(np.abs(fast_scales - full_scales))
+    if (not (scale_diff <= tolerance)):
+        diffs.append("Pixel scales differ by {:.3g} degrees: fast={}, astropy={}".format(
+            scale_diff, fast_scales.tolist(), full_scales.tolist()))
+    return diffs
+
+
+def fast_wcs_arrays (fast_wcss):
+    """
+    Return a tuple of numpy arrays holding the projection parameters of the given sequence
+    of fast WCS structures, one row per structure, for use by the vectorized functions:
+    reference pixels (N, 2), reference values (N, 2), CD matrices (N, 2, 2), SIN projection
+    flags (N), native longitudes of the pole (N), latitude-first flags (N), and image sizes (N, 2).
+    """
+    count = len(fast_wcss)
+    crpix = np.empty((count, 2))
+    crval = np.empty((count, 2))
+    cd = np.empty((count, 2, 2))
+    is_sin = np.empty(count, dtype=bool)
+    lonpole = np.empty(count)
+    lat_first = np.empty(count, dtype=bool)
+    naxis = np.empty((count, 2))
+    for idx, fwcs in enumerate(fast_wcss):
+        params = fwcs.wcs
+        crpix[idx] = params.crpix
+        crval[idx] = params.crval
+        cd[idx] = params.cd
+        is_sin[idx] = params.ctype[0].endswith('SIN')
+        lonpole[idx] = params.lonpole
+        lat_first[idx] = params.ctype[0].startswith('DEC')
+        naxis[idx] = fwcs.pixel_shape
+    return (crpix, crval, cd, is_sin, lonpole, lat_first, naxis)
+
+
+def footprints (crpix, crval, cd, is_sin, lonpole, lat_first, naxis):
+    """
+    Return the world coordinates of the four corners of each of N images, as an (N, 4, 2)
+    array, ordered clockwise from the lower left corner, given the projection parameters of
+    the images as arrays (see fast_wcs_arrays). As for Astropy footprints, the corners are the
+    centers of the corner pixels.
+    """
+    ones = np.ones(len(naxis))
+    corners = np.stack([ np.stack([ones, ones], axis=-1),
+                         np.stack([ones, naxis[:, 1]], axis=-1),
+                         np.stack([naxis[:, 0], naxis[:, 1]], axis=-1),
+                         np.stack([naxis[:, 0], ones], axis=-1) ], axis=1)
+    return pixels_to_world(corners, crpix, crval, cd, is_sin, lonpole, lat_first)
+
+
+def make_fast_wcs (header):
+    """
+    Return a fast WCS structure (FastWCS) for the given header (a FITS header or a dictionary of
+    header keys and values), if the header describes a two dimensional image with a TAN or SIN
+    celestial projection, in degrees, without any distortion. Otherwise, return None, signalling
+    that the image must be handled by Astropy.
+    """
+    if ((header is None) or (header.get('NAXIS') != 2) or (header.get('WCSAXES', 2) != 2)):
+        return None
+
+    naxis = (header.get('NAXIS1'), header.get('NAXIS2'))
+    ctype = (str(header.get('CTYPE1', '')).strip(), str(header.get('CTYPE2', '')).strip())
+    if ((not all(isinstance(nax, int) for nax in naxis)) or (not _is_fast_ctype(ctype))):
+        return None
+    if (any((str(header.get(key, 'deg')).strip() != 'deg') for key in ['CUNIT1', 'CUNIT2'])):
+        return None
+
+    has_cd = any(key in header for key in ['CD1_1', 'CD1_2', 'CD2_1', 'CD2_2'])
+    has_pc = any(key in header for key in ['PC1_1', 'PC1_2', 'PC2_1', 'PC2_2'])
+    rotated = any((header.get(key, 0) != 0) for key in _CROTA_KEYS)
+    if ((has_cd and has_pc) or ((not has_cd) and rotated)):
+        return None                         # let Astropy resolve these combinations
+    if (any(_DISTORTION_REGEX.match(key) for key in header.keys())):
+        return None
+
+    try:
+        crpix = (float(header.get('CRPIX1', 0.0)), float(header.get('CRPIX2', 0.0)))
+        crval = (float(header.get('CRVAL1', 0.0)), float(header.get('CRVAL2', 0.0)))
+        if (has_cd):
+            cd = np.array([[float(header.get('CD1_1', 0.0)), float(header.get('CD1_2', 0.0))],
+                           [float(header.get('CD2_1', 0.0)), float(header.get('CD2_2', 0.0))]])
+        else:
+            pc = np.array([[float(header.get('PC1_1', 1.0)), float(header.get('PC1_2', 0.0))],
+                           [float(header.get('PC2_1', 0.0)), float(header.get('PC2_2', 1.0))]])
+            cdelt = np.array([float(header.get('CDELT1', 1.0)), float(header.get('CDELT2', 1.0))])
+            cd = cdelt[:, np.newaxis] * pc
+        lat0 = crval[1] if (ctype[0].startswith('RA')) else crval[0]
+        lonpole = float(header.get('LONPOLE', 180.0 if (lat0 < 90.0) else 0.0))
+    except (TypeError, ValueError):         # non-numeric values: let Astropy report them
+        return None
+
+    if (np.linalg.det(cd) == 0.0):          # singular matrix: let Astropy report it
+        return None
+    return FastWCS(WcsParams(list(ctype), crpix, crval, cd, lonpole), naxis)
+
+
+def pixel_scales (cd):
+    """
+    Return the projection plane pixel scales, for each axis, of each of N images, as an
+    (N, 2) array, given the (N, 2, 2) array of their CD matrices. The same calculation as
+    astropy.wcs.utils.proj_plane_pixel_scales.
+    """
+    return np.sqrt((cd ** 2).sum(axis=-2))
+
+
+def pixels_to_world (pixels, crpix, crval, cd, is_sin, lonpole, lat_first):
+    """
+    Return the world coordinates, as an (N, K, 2) array in axis order, of K (1-based) pixel
+    positions in each of N images, given as an (N, K, 2) array, and the projection parameters
+    of the images (see fast_wcs_arrays). Implements the zenithal TAN and SIN projections
+    (without projection parameters) of Calabretta & Greisen (2002), sections 5.1.3 and 5.1.5,
+    and the spherical rotation of section 2.3.
+    """
+    offsets = pixels - crpix[:, np.newaxis, :]
+    inter = np.einsum('nij,nkj->nki', cd, offsets)  # intermediate world coordinates (degrees)
+    first = lat_first[:, np.newaxis]
+    x = np.where(first, inter[..., 1], inter[..., 0])  # longitude axis
+    y = np.where(first, inter[..., 0], inter[..., 1])  # latitude axis
+    lon0 = np.where(lat_first, crval[:, 1], crval[:, 0])[:, np.newaxis]
+    lat0 = np.radians(np.where(lat_first, crval[:, 0], crval[:, 1]))[:, np.newaxis]
+
+    # intermediate world coordinates to native spherical coordinates (phi, theta)
+    r_theta = np.radians(np.hypot(x, y))
+    phi = np.arctan2(x, -y)
+    with np.errstate(invalid='ignore'):     # points outside a SIN projection become NaN
+        theta = np.where(is_sin[:, np.newaxis], np.arccos(r_theta), np.arctan2(1.0, r_theta))
+
+    # native spherical coordinates to celestial coordinates
+    dphi = phi - np.radians(lonpole)[:, np.newaxis]
+    sin_theta = np.sin(theta)
+    cos_theta = np.cos(theta)
+    sin_lat = (sin_theta * np.sin(lat0)) + (cos_theta * np.cos(lat0) * np.cos(dphi))
+    lat = np.degrees(np.arcsin(np.clip(sin_lat, -1.0, 1.0)))
+    lon = lon0 + np.degrees(np.arctan2(-cos_theta * np.sin(dphi),
+                                       (sin_theta * np.cos(lat0)) -
+                                       (cos_theta * np.sin(lat0) * np.cos(dphi))))
+    lon = np.mod(lon, 360.0)
+
+    first = first[..., np.newaxis]
+    return np.where(first, np.stack([lat, lon], axis=-1), np.stack([lon, lat], axis=-1))
+
+
+def _is_fast_ctype (ctype):
+    """ Tell whether the given pair of CTYPE values names a celestial projection handled here. """
+    if (sorted(name[:4] for name in ctype) != ['DEC-', 'RA--']):
+        return False
+    codes = [ name[5:] for name in ctype ]
+    return ((codes[0] == codes[1]) and (codes[0] in FAST_PROJECTIONS) and
+            all(len(name) == 8 for name in ctype))
@@ -0,0 +1,299 @@
+#
+# Module to scan FITS header cards directly from the header blocks of a FITS file,
+# decoding only the values of selected keywords, without building an Astropy header.
+#   Written by: Tom Hicks. 1/18/21.
+#   Last Modified: Add generator of raw header bytes and decoding of header bytes.
+#
+import re
+
+import imdtk.core.fits_utils as fits_utils
+from imdtk.core import FitsHeaderInfo
+from imdtk.core.fits_utils import FITS_BLOCK_SIZE, FITS_IGNORE_KEYS
+
+
+# length, in bytes, of each card (keyword record) in a FITS header
+CARD_LENGTH = 80
+
+# length of the keyword name field at the start of each card
+KEYWORD_LENGTH = 8
+
+# keyword which continues a long string value from the previous card
+CONTINUE_KEY = 'CONTINUE'
+
+# keyword which introduces a card with a long keyword name
+HIERARCH_KEY = 'HIERARCH'
+
+# the value indicator which follows the keyword name in a card with a value
+VALUE_INDICATOR = '= '
+
+# encoding of FITS header cards
+CARD_ENCODING = 'ascii'
+
+# initial size of the buffer into which a header is read (grown as needed)
+HEADER_BUFFER_SIZE = 4 * FITS_BLOCK_SIZE
+
+# the (padded) END card which terminates a FITS header
+_END_CARD = b'END' + (b' ' * (CARD_LENGTH - 3))
+
+# regular expressions to recognize numeric card values (FITS 4.0: 4.2.3 & 4.2.4)
+_INTEGER_REGEX = re.compile(r'^[+-]?\d+$')
+_FLOAT_REGEX = re.compile(r'^[+-]?(\d+\.?\d*|\.\d+)([DE][+-]?\d+)?$')
+_COMPLEX_REGEX = re.compile(r'^\(\s*([^,\s]+)\s*,\s*([^,\s]+)\s*\)$')
+
+
+def fields_from_cards (cards, keys=None, ignore=FITS_IGNORE_KEYS):
+    """
+    Return a dictionary of keys and values from the given iterable of card strings,
+    decoding only the values of the selected keys (see read_header_fields).
+    """
+    fields = dict()
+    continued = None                        # key of a string value which may be continued
+    for card in cards:
+        (key, value_str) = parse_card(card)
+        if (key == CONTINUE_KEY):
+            if (continued is not None):
+                (more, _) = _parse_string(card[KEYWORD_LENGTH:].lstrip())
+                fields[continued] = fields[continued][:-1] + more
+                continued = continued if (more.endswith('&')) else None
+            continue
+
+        continued = None
+        if ((key in ignore) or (not fits_utils.is_selected_key(key, keys))):
+            continue
+
+        if (value_str is None):             # commentary card: value is the text
+            fields[key] = card[KEYWORD_LENGTH:].rstrip()
+        else:
+            value = parse_value(value_str)
+            fields[key] = value
+            if (isinstance(value, str) and value.endswith('&')):
+                continued = key
+    return fields
+
+
+def fields_from_bytes (header_bytes, keys=None, ignore=FITS_IGNORE_KEYS):
+    """
+    Return a dictionary of keys and values from the given raw header bytes, decoding only
+    the values of the selected keys (see read_header_fields).
+    """
+    return fields_from_cards(gen_cards(header_bytes), keys=keys, ignore=ignore)
+
+
+def gen_cards (header_bytes):
+    """
+    Generator to yield each card, as a string, of the given header bytes, up to
+    (but not including) the END card. The given bytes may be a bytes, bytearray, or
+    memoryview object and are decoded one card at a time.
+    """
+    for start in range(0, len(header_bytes) - CARD_LENGTH + 1, CARD_LENGTH):
+        card = bytes(header_bytes[start:start + CARD_LENGTH])
+        if (card == _END_CARD):
+            return
+        yield card.decode(CARD_ENCODING, errors='replace')
+
+
+def gen_header_bytes (fd):
+    """
+    Generator to follow the chain of HDU headers from the current position of the given
+    open (binary) FITS file, yielding a tuple of the offset and the raw bytes (a memoryview)
+    of each header (see read_header_bytes). The data segment following each header is
+    skipped without being read.
+
+    Note: the current file position is moved as a side-effect of this method!
+    """
+    while True:
+        header = read_header_bytes(fd)
+        if (header is None):                # no more headers: EOF or not a valid header
+            return
+        yield header
+        structure = fields_from_bytes(header[1], keys=[])
+        fd.seek(fits_utils.calculate_data_length(structure), 1)  # skip over data segment
+
+
+def gen_hdu_fields (fd, keys=None, ignore=FITS_IGNORE_KEYS):
+    """
+    Generator to follow the chain of HDU headers from the current position of the given
+    open (binary) FITS file, yielding a header information record (FitsHeaderInfo) for each
+    HDU, whose header is a dictionary of keys and values (see read_header_fields).
+    The data segment following each header is skipped without being read.
+
+    Note: the current file position is moved as a side-effect of this method!
+    """
+    while True:
+        hdr_info = read_header_fields(fd, keys=keys, ignore=ignore)
+        if (hdr_info is None):              # no more headers: EOF or not a valid header
+            return
+        yield hdr_info
+        fd.seek(fits_utils.calculate_data_length(hdr_info.hdr), 1)  # skip over data segment
+
+
+def get_hdu_fields (fd, which_hdu=0, keys=None, ignore=FITS_IGNORE_KEYS):
+    """
+    Return a dictionary of keys and values for the cards in the header of the selected
+    HDU (default: 0 (the first HDU)) of the given open (binary) FITS file, or None,
+    if the given HDU index is out of range. See read_header_fields for the keyword
+    selection and filtering applied.
+
+    Note: the current file position is moved as a side-effect of this method!
+    """
+    fd.seek(0, 0)                           # move to beginning of file
+    for hdu_index, hdr_info in enumerate(gen_hdu_fields(fd, keys=keys, ignore=ignore)):
+        if (hdu_index == which_hdu):
+            return hdr_info.hdr
+    return None
+
+
+def parse_card (card):
+    """
+    Return a tuple of the keyword name and the value string (including any comment)
+    of the given card string. For commentary cards (those without a value indicator),
+    the value string is the commentary text.
+    """
+    key = card[:KEYWORD_LENGTH].rstrip()
+    if (key == HIERARCH_KEY):               # long keyword: name extends to the '=' sign
+        (name, sep, rest) = card[KEYWORD_LENGTH:].partition('=')
+        if (sep):
+            return (' '.join(name.split()), rest)
+    if (card[KEYWORD_LENGTH:KEYWORD_LENGTH + 2] == VALUE_INDICATOR):
+        return (key, card[KEYWORD_LENGTH + 2:])
+    return (key, None)
+
+
+def parse_value (value_str):
+    """
+    Return the Python value for the given card value string (the part of the card
+    following the value indicator), ignoring any trailing comment. Values are parsed
+    as strings, logicals, integers, floats, or complex numbers, per the FITS Standard 4.0,
+    section 4.2. Returns None for an undefined (empty) value.
+    """
+    text = value_str.lstrip()
+    if (text.startswith("'")):              # character string value
+        return _parse_string(text)[0]
+
+    token = text.partition('/')[0].strip()  # remove any comment
+    if (not token):
+        return None
+    if (token == 'T'):
+        return True
+    if (token == 'F'):
+        return False
+    if (_INTEGER_REGEX.match(token)):
+        return int(token)
+    if (_FLOAT_REGEX.match(token)):
+        return float(token.replace('D', 'E'))
+    match = _COMPLEX_REGEX.match(token)
+    if (match):
+        return complex(parse_value(match.group(1)), parse_value(match.group(2)))
+    return token                            # unrecognized: keep the raw token
+
+
+def read_header_bytes (fd, header_length=None):
+    """
+    Read the raw bytes of the FITS header at the current position of the given open (binary)
+    file, block by block, stopping at the block containing the END card. Returns a tuple of
+    the starting offset of the header and a memoryview of the header bytes (a whole number
+    of blocks, including the END card), or None if the file does not contain a complete
+    header at the current position.
+
+    The blocks are read directly into a preallocated buffer, which is doubled in size when
+    full, and only each newly read block is checked, card by card, for the END card, so the
+    cost of reading a header is linear in its size. If the length of the header is already
+    known and given, it is read with a single read.
+
+    Note: the current file position is moved as a side-effect of this method!
+    """
+    start = fd.tell()
+    if (header_length is not None):         # header length is known: read it all at once
+        buffer = bytearray(header_length)
+        if (_read_into(fd, memoryview(buffer)) < header_length):
+            return None
+        return (start, memoryview(buffer))
+
+    buffer = bytearray(HEADER_BUFFER_SIZE)
+    length = 0                              # number of header bytes read so far
+    while True:
+        if ((length + FITS_BLOCK_SIZE) > len(buffer)):  # buffer full: double its size
+            buffer.extend(bytes(len(buffer)))
+        with memoryview(buffer) as view:    # released before the buffer may be resized
+            with view[length:length + FITS_BLOCK_SIZE] as block:
+                if (_read_into(fd, block) < FITS_BLOCK_SIZE):  # abort on EOF or truncated file
+                    return None
+                if ((length == 0) and (not bytes(block[:KEYWORD_LENGTH]).strip())):
+                    return None             # not a header: blank first card
+                found_end = _has_end_card(block)
+        length += FITS_BLOCK_SIZE
+        if (found_end):
+            return (start, memoryview(buffer)[:length])
+
+
+def read_header_fields (fd, keys=None, ignore=FITS_IGNORE_KEYS, header_length=None):
+    """
+    Read the FITS header from the given open (binary) file at the current file position,
+    block by block, stopping at the END card (see read_header_bytes). Returns a header
+    information record (FitsHeaderInfo) whose header is a dictionary of keys and values,
+    or None if the file does not contain a complete header at the current position.
+
+    Only the values of selected keys are decoded: the result dictionary will not contain
+    entries for keys in the given "ignore list" and, if a collection of selected keys is
+    given, will contain only those keys (and the structure keys, which are needed to
+    locate the data segment). Long string values, continued over CONTINUE cards, are joined.
+    As with Astropy headers, only the last value found for duplicate keys is kept.
+    If the length of the header is already known and given, it is read with a single read.
+
+    Note: the current file position is moved as a side-effect of this method!
+    """
+    header = read_header_bytes(fd, header_length=header_length)
+    if (header is None):
+        return None
+    (start, header_bytes) = header
+    return FitsHeaderInfo(start, len(header_bytes), fields_from_bytes(header_bytes, keys, ignore))
+
+
+def _has_end_card (block):
+    """ Tell whether the given block of header bytes contains the END card. """
+    for start in range(0, len(block), CARD_LENGTH):
+        if (block[start:start + CARD_LENGTH] == _END_CARD):
+            return True
+    return False
+
+
+def _parse_string (text):
+    """
+    Parse a quoted FITS string value from the start of the given text, returning a tuple
+    of the string value (with trailing spaces removed) and the remainder of the text.
+    Two successive quotes within the string represent a single quote.
+    """
+    chars = []
+    idx = 1                                 # skip opening quote
+    while (idx < len(text)):
+        ch = text[idx]
+        if (ch == "'"):
+            if (text[idx + 1:idx + 2] == "'"):  # escaped quote
+                chars.append("'")
+                idx += 2
+                continue
+            return (''.join(chars).rstrip(), text[idx + 1:])
+        chars.append(ch)
+        idx += 1
+    return (''.join(chars).rstrip(), '')    # unterminated string: take the rest
+
+
+def _read_into (fd, view):
+    """
+    Read from the given open (binary) file into the given writable memoryview, until the view
+    is full or the file ends, and return the number of bytes read. Files which do not support
+    readinto are read with read, copying the bytes into the view.
+    """
+    readinto = getattr(fd, 'readinto', None)
+    count = 0
+    while (count < len(view)):
+        if (readinto is not None):
+            nbytes = readinto(view[count:])
+        else:
+            chunk = fd.read(len(view) - count)
+            nbytes = len(chunk)
+            view[count:count + nbytes] = chunk
+        if (not nbytes):                    # end of file
+            break
+        count += nbytes
+    return count
@@ -1,29 +1,65 @@
 #
 # Class for manipulating FITS files within the the iRods filesystem.
 #   Written by: Tom Hicks. 11/1/20.
-#   Last Modified: Add variable for iRods FITS file extents.
+#   Last Modified: Also return the changed files whose old results must be replaced.
 #
 import os
 import sys
 import copy
 import datetime as dt
-from math import ceil
+import fnmatch
+import gzip
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+from irods.exception import DataObjectDoesNotExist, NetworkException
 
 from astropy.io import fits
 from astropy.io.fits.hdu.hdulist import HDUList
 from astropy import wcs
 
+import imdtk.core.fits_cards as fits_cards
 import imdtk.core.fits_utils as fits_utils
-from imdtk.core import FitsHeaderInfo
-from imdtk.core.fits_utils import FITS_BLOCK_SIZE, FITS_END_KEY, FITS_IGNORE_KEYS
-from imdtk.core.irods_helper import IRodsHelper
-from imdtk.core.misc_utils import product
+from imdtk.core.adaptive_limiter import LimitedReader, make_adaptive_limiter
+from imdtk.core import FitsHeaderInfo, HduIndexEntry
+from imdtk.core.fits_utils import DATA_CHUNK_SIZE, FITS_BLOCK_SIZE, FITS_IGNORE_KEYS
+from imdtk.core.fits_utils import FITS_STRUCTURE_KEYS
+from imdtk.core.header_cache import IRODS_SOURCE, header_from_bytes, open_header_cache
+from imdtk.core.irods_helper import DEFAULT_LISTING_MODE, IRodsHelper
+from imdtk.core.misc_utils import gen_read_ahead
+from imdtk.core.read_ahead_reader import DEFAULT_WINDOW_SIZE, ReadAheadReader
 
 
 FITS_ENCODING = 'utf-8'
 
 # file suffixes for identifying FITS files
-IRODS_FITS_EXTENTS = [ '.fits' ]            # can only handle uncompressed iRods files
+IRODS_FITS_EXTENTS = [ '.fits', '.fits.gz' ]  # gzip files are decompressed as they are read
+
+# size used for compressed files, whose uncompressed size is not known until they are read
+UNKNOWN_SIZE = sys.maxsize
+
+# number of table data reads to fetch ahead of the chunk currently being processed
+TABLE_READ_AHEAD = 2
+
+# name of the metadata item (AVU), attached to a FITS file by IRodsMetadataSink, which records
+# the signature of the version of the file from which the rest of its metadata was derived
+SOURCE_SIGNATURE_KEY = 'imdtk_source_signature'
+
+# name of the content metadata item (AVU) which records the ObsCore data product type of a file
+CONTENT_TYPE_KEY = 'dataproduct_type'
+
+# recorded data product types of the files which may hold images
+IMAGE_CONTENT_TYPES = [ 'cube', 'image' ]
+
+# smallest uncompressed file which can hold an image: a header block and at least one data block
+MIN_IMAGE_FILE_SIZE = 2 * FITS_BLOCK_SIZE
+
+# errors in reading an iRods file which signal an overloaded server or network
+READ_FAILURES = (NetworkException, ConnectionError, TimeoutError)
+
+# Maximum number of files whose HDU indices are cached: least recently used are dropped first.
+HDU_INDEX_CACHE_SIZE = 256
 
 IRODS_FILE_ATTRIBUTES =[ 'checksum', 'create_time', 'modify_time', 'name',
                          'owner_name', 'owner_zone', 'path', 'size',
@@ -38,52 +74,83 @@ class FitsIRodsHelper (IRodsHelper):
         Constructor of class for manipulating FITS files within the the iRods filesystem.
         """
         super().__init__(args, connect)
+        self._hdu_indices = OrderedDict()   # LRU cache of HDU indices, keyed by file identity
+        self._hdu_indices_lock = threading.Lock()
+        read_ahead_kb = args.get('read_ahead_kb')  # size of read-ahead window: 0 to disable
+        self.read_ahead_size = (read_ahead_kb * 1024) if (read_ahead_kb is not None) else DEFAULT_WINDOW_SIZE
+        self.header_cache = open_header_cache(args)  # persistent header cache: None if disabled
+        self.listing_mode = args.get('listing_mode') or DEFAULT_LISTING_MODE
+        self._listed_files = dict()         # data objects found by listing, keyed by path
+        self._listed_metadata = dict()      # content metadata of listed files, keyed by path
+        self.read_limiter = make_adaptive_limiter(args, 'iRods reads', self.max_sessions)  # None unless adaptive
+        self.skip_names = args.get('skip_names') or []  # name patterns of files which are not images
+
+
+    def add_hdu_index_entry (self, hdu_index, hdr_info):
+        """
+        Append an entry, for the HDU whose header information record (FitsHeaderInfo) is given,
+        to the given HDU index and return the new entry. The header information must be for
+        the HDU which immediately follows the last HDU already in the index.
+        """
+        header = hdr_info.hdr
+        entry = HduIndexEntry(hdr_info.offset, hdr_info.length,
+                              self.calculate_data_length(header), header.get('XTENSION', 'PRIMARY'))
+        hdu_index['entries'].append(entry)
+        return entry
 
 
     def calculate_data_length (self, header):
-        '''
+        """
         Calculate the length of the data segment following the given header information.
-        Each FITS header has enough information to predict the location of the next header.
-        Calculations based on the FITS Standard version 4.0, revision 8/13/2018.
-        '''
-        if (header.get('NAXIS') == 0):         # FITS 4.0: 4.4.1.1
-            return 0
+        See fits_utils.calculate_data_length.
+        """
+        return fits_utils.calculate_data_length(header)
 
-        if (header.get('SIMPLE', False) is True):  # Primary Header
-            return self.calc_data_length(header, primary=True)
 
-        elif (header.get('XTENSION', None) in ['IMAGE', 'TABLE']):
-            return self.calc_data_length(header)
+    def calc_data_length (self, header, GCOUNT=1, PCOUNT=0, primary=False):
+        """
+        Calculate the length (in bytes) of the data segment following the given header.
+        See fits_utils.calc_data_length.
+        """
+        return fits_utils.calc_data_length(header, GCOUNT=GCOUNT, PCOUNT=PCOUNT, primary=primary)
 
-        elif (header.get('XTENSION', None) in ['BINTABLE']):
-            return self.calc_data_length(header, PCOUNT=header.get('PCOUNT', 1))
 
-        else:
-            raise RuntimeError('Unrecognized XTENSION type while calculating HDU data length')
+    def cleanup (self):
+        """ Cleanup the current session and close the header cache, if any. """
+        if (self.header_cache is not None):
+            self.header_cache.close()
+            self.header_cache = None
+        super().cleanup()
 
 
-    def calc_data_length (self, header, GCOUNT=1, PCOUNT=0, primary=False):
+    def decode_table_chunk (self, header, chunk_bytes, row_count):
         """
-        Calculate the length (in bytes) of the data segment following the given header.
-        Defaults are provided for PCOUNT and GCOUNT but must be overridden by the calling
-        function, where needed, as per the FITS Standard 4.0, section 7.1.
-        PCOUNT and GCOUNT are not used by the Primary header, as per section 4.4.1.
+        Decode the given bytes, containing row_count rows of the table described by the given
+        table header, and return the rows as an astropy.io.fits.fitsrec.FITS_rec.
         """
-        if (header.get('NAXIS') == 0):      # sanity check per FITS 4.0: section 4.4.1.1
-            return 0
+        return self.make_table_hdu(header, chunk_bytes, row_count).data
 
-        B = fits_utils.bitpix_size(header['BITPIX']) / 8
-        N = [header[f'NAXIS{idx}'] for idx in range(1, header['NAXIS'] + 1)]
 
-        if (0 in N):                        # per FITS 4.0: 4.4.1.1, 7.1.1
-            return 0                        # zero in any NAXISn => no data blocks
+    def file_signature (self, irods_fits_file):
+        """
+        Return a string identifying the current version of the given iRods file, by its size,
+        checksum (if it has one), and modification time, all of which come with the file from
+        the catalog, so no request is made to the server.
+        """
+        checksum = getattr(irods_fits_file, 'checksum', None) or ''
+        modify_time = getattr(irods_fits_file, 'modify_time', None)
+        return f"{irods_fits_file.size}:{checksum}:{modify_time}"
 
-        if (primary):                       # if this is the primary header
-            blocks = ceil(B * (product(N)) / FITS_BLOCK_SIZE)
-        else:                               # else this is an extension header
-            blocks = ceil(B * GCOUNT * (PCOUNT + product(N)) / FITS_BLOCK_SIZE)
 
-        return (blocks * FITS_BLOCK_SIZE)
+    def fits_file_size (self, irods_fits_file):
+        """
+        Return the size of the (uncompressed) FITS data in the given iRods FITS file.
+        The size of a compressed file is not known until it has been read, so UNKNOWN_SIZE is
+        returned for those files: reads of compressed files are limited by the end of the file.
+        """
+        if (self.is_compressed_file(irods_fits_file)):
+            return UNKNOWN_SIZE
+        return irods_fits_file.size
 
 
     def gen_fits_file_paths (self, irods_root_dir, topdown=True):
@@ -93,6 +160,59 @@ class FitsIRodsHelper (IRodsHelper):
                 yield file_path
 
 
+    def gen_table_chunks (self, irff_fd, irff_size, hdr_info, chunk_size=DATA_CHUNK_SIZE):
+        """
+        Generator to yield successive chunks (of at most chunk_size rows) of the data of the
+        table whose header information record (FitsHeaderInfo) is given, given an open iRods
+        FITS file and its size. Each chunk is an astropy.io.fits.fitsrec.FITS_rec.
+
+        The rows are read, in large sequential reads, by a background thread which runs
+        ahead of the processing of the chunks, so network reads overlap with that processing.
+        A table with a heap (variable length array columns) cannot be decoded without its
+        heap, so the data of such a table is read in full and then yielded in chunks.
+
+        Note: the current file position is moved as a side-effect of this method!
+        """
+        header = hdr_info.hdr
+        data_offset = hdr_info.offset + hdr_info.length
+
+        if (header.get('PCOUNT', 0) > 0):   # table has a heap: read the entire HDU
+            irff_fd.seek(hdr_info.offset, 0)
+            hdu_len = hdr_info.length + self.calculate_data_length(header)
+            hdu = self.read_hdu(irff_fd, irff_size, hdu_len)
+            if (hdu is not None):
+                yield from fits_utils.gen_data_chunks(hdu.data, chunk_size)
+            return
+
+        row_length = header.get('NAXIS1', 0)
+        reads = self.gen_table_reads(irff_fd, irff_size, data_offset, row_length,
+                                     header.get('NAXIS2', 0), chunk_size)
+        for (row_count, chunk_bytes) in gen_read_ahead(reads, TABLE_READ_AHEAD):
+            yield self.decode_table_chunk(header, chunk_bytes, row_count)
+
+
+    def gen_table_reads (self, irff_fd, irff_size, data_offset, row_length, row_total,
+                         chunk_size=DATA_CHUNK_SIZE):
+        """
+        Generator to read the rows of a table sequentially, starting at the given data offset,
+        and yield tuples of the number of rows read and the bytes of those rows. Each read is
+        of at most chunk_size rows of row_length bytes each.
+        Raises OSError if the file ends before all rows of the table have been read.
+
+        Note: the current file position is moved as a side-effect of this method!
+        """
+        if ((row_length < 1) or (row_total < 1)):  # no rows: nothing to read
+            return
+
+        irff_fd.seek(data_offset, 0)        # move to start of the data segment
+        for start in range(0, row_total, chunk_size):
+            row_count = min(chunk_size, row_total - start)
+            chunk_bytes = self.read_chunk(irff_fd, irff_size, chunk_size=(row_count * row_length))
+            if (chunk_bytes is None):
+                raise OSError("Table data truncated after {} of {} rows".format(start, row_total))
+            yield (row_count, chunk_bytes)
+
+
     def get_column_info (self, irods_fits_file, hdu):
         """
         Return a dictionary of metadata describing the columns of the table in the
@@ -109,13 +229,28 @@ class FitsIRodsHelper (IRodsHelper):
         return col_md
 
 
+    def get_column_info_from_header (self, header):
+        """
+        Return a dictionary of metadata describing the columns of the table described by
+        the given table header (see get_column_info). Only the header cards are needed:
+        the information is taken from an empty table built from the header.
+        """
+        if (not self.is_catalog_header(header)):
+            return None
+        return self.get_column_info(None, self.make_table_hdu(header))
+
+
     def get_content_metadata (self, irff=None):
         """
         Return a dictionary of content metadata (if any) attached to the given iRods file.
         Content metadata is about the content of the file, not about the iRods file itself.
+        The metadata of a file found by the last listing was prefetched, so is not queried again.
         """
         cmd = dict()
 
+        if (irff and (irff.path in self._listed_files)):  # metadata prefetched by the listing
+            return { md.keyword: md.value for md in self._listed_metadata.get(irff.path, ()) }
+
         if (irff):
             cmd = getattr(irff, 'metadata', lambda: None)
             if (cmd):
@@ -124,32 +259,80 @@ class FitsIRodsHelper (IRodsHelper):
         return cmd
 
 
+    def get_fits_file (self, irff_path):
+        """
+        Return the iRods FITS file (data object) at the given absolute path. A file found by
+        the last listing (see list_fits_file_paths) is returned without querying the server again.
+
+        :raises irods.exception.DataObjectDoesNotExist if file not found or not readable
+        """
+        irff = self._listed_files.get(irff_path)
+        if (irff is None):
+            return self.getf(irff_path, absolute=True)
+        if (irff.manager.sess is not self._session):  # rebind to the session of this thread
+            irff = copy.copy(irff)
+            irff.manager = self._session.data_objects
+            irff._meta = None
+        return irff
+
+
     def get_hdu (self, irods_fits_file, which_hdu=0):
         """
         Return the specified HDU (default: 0 (the first HDU)) of the given iRods FITS file.
         Returns None if the specified HDU is out of range.
         """
-        with irods_fits_file.open('r+') as irff_fd:
-            return self.get_hdu_at(irff_fd, irods_fits_file.size, which_hdu)
+        hdu_index = self.get_hdu_index(irods_fits_file)
+        with self.open_fits_file(irods_fits_file) as irff_fd:
+            return self.get_hdu_at(irff_fd, self.fits_file_size(irods_fits_file), which_hdu,
+                                   hdu_index=hdu_index)
 
 
-    def get_hdu_at (self, irff_fd, irff_size, which_hdu=0):
+    def get_hdu_at (self, irff_fd, irff_size, which_hdu=0, hdu_index=None):
         """
         Follow the chain of HDU headers and return the specified HDU,
         given an open iRods FITS file and its size.
         Returns None if the specified HDU is out of range.
+        If the HDU is already in the given HDU index, it is read with a single seek and read.
 
         Note: the current file position is moved as a side-effect of this method!
         """
-        hdr_info = self.get_header_info_at(irff_fd, irff_size, which_hdu)
-        if (hdr_info is None):              # failed to find the desired header
-            return None                     # signal failure
-
-        data_len = self.calc_data_length(hdr_info.hdr)  # find length of data segment
-        hdu_len = hdr_info.length + data_len  # calculate total length of HDU
-
-        irff_fd.seek(hdr_info.offset, 0)      # seek to start of HDU
-        return self.read_hdu(irff_fd, irff_size, hdu_len)
+        if ((hdu_index is not None) and (which_hdu < len(hdu_index['entries']))):
+            entry = hdu_index['entries'][which_hdu]
+        else:
+            hdr_info = self.get_header_info_at(irff_fd, irff_size, which_hdu, hdu_index=hdu_index)
+            if (hdr_info is None):          # failed to find the desired header
+                return None                 # signal failure
+            entry = HduIndexEntry(hdr_info.offset, hdr_info.length,
+                                  self.calc_data_length(hdr_info.hdr), None)
+
+        irff_fd.seek(entry.offset, 0)       # seek to start of HDU
+        return self.read_hdu(irff_fd, irff_size, entry.hdr_length + entry.data_length)
+
+
+    def get_hdu_index (self, irods_fits_file):
+        """
+        Return the cached HDU index for the given iRods FITS file, creating a new, empty index
+        if the file has not been seen before. The index is keyed by the path, size, and
+        modification time of the file, so a file which changes is indexed afresh. Only the
+        indices of the most recently used files (HDU_INDEX_CACHE_SIZE) are kept.
+
+        An HDU index is a dictionary containing a list of HDU index entries (HduIndexEntry),
+        holding the offset, header length, data length, and type of each HDU, in file order.
+        The entries are filled lazily, as the chain of HDUs is walked, and a 'complete'
+        flag is set once the end of the chain has been reached.
+        """
+        key = (str(irods_fits_file.path), irods_fits_file.size,
+               getattr(irods_fits_file, 'modify_time', None))
+        with self._hdu_indices_lock:
+            hdu_index = self._hdu_indices.get(key)
+            if (hdu_index is None):
+                hdu_index = self.new_hdu_index()
+                self._hdu_indices[key] = hdu_index
+                if (len(self._hdu_indices) > HDU_INDEX_CACHE_SIZE):
+                    self._hdu_indices.popitem(last=False)
+            else:
+                self._hdu_indices.move_to_end(key)
+        return hdu_index
 
 
     def get_header (self, irods_fits_file, which_hdu=0):
@@ -157,11 +340,11 @@ class FitsIRodsHelper (IRodsHelper):
         Return a FITS header for the specified HDU (default: 0 (the first HDU)) of
         the given iRods FITS file or return None, if the given HDU index is out of range.
         """
-        with irods_fits_file.open('r+') as irff_fd:
-            return self.get_header_at(irff_fd, irods_fits_file.size, which_hdu)
+        header_bytes = self.get_header_bytes(irods_fits_file, which_hdu)
+        return header_from_bytes(header_bytes) if (header_bytes is not None) else None
 
 
-    def get_header_at (self, irff_fd, irff_size, which_hdu=0):
+    def get_header_at (self, irff_fd, irff_size, which_hdu=0, hdu_index=None):
         """
         Follow the chain of HDU headers to return the header for
         the specified HDU, given an open iRods FITS file and its size.
@@ -169,53 +352,91 @@ class FitsIRodsHelper (IRodsHelper):
 
         Note: the current file position is moved as a side-effect of this method!
         """
-        hdr_info = self.get_header_info_at(irff_fd, irff_size, which_hdu)
+        hdr_info = self.get_header_info_at(irff_fd, irff_size, which_hdu, hdu_index=hdu_index)
         return hdr_info.hdr if (hdr_info is not None) else None
 
 
-    def get_header_info_at (self, irff_fd, irff_size, which_hdu=0):
+    def get_header_bytes (self, irods_fits_file, which_hdu=0):
+        """
+        Return the raw bytes of the header of the specified HDU (default: 0 (the first HDU))
+        of the given iRods FITS file or return None, if the given HDU index is out of range.
+        If the header cache is enabled, the header is taken from the cache, when it is there,
+        without opening the file, and is added to the cache, when it is not.
+        """
+        file_key = self.irods_file_key(irods_fits_file)
+        if (self.header_cache is not None):
+            header_bytes = self.header_cache.get(file_key, which_hdu)
+            if (header_bytes is not None):
+                return header_bytes
+
+        hdu_index = self.get_hdu_index(irods_fits_file)
+        irff_size = self.fits_file_size(irods_fits_file)
+        with self.open_fits_file(irods_fits_file) as irff_fd:
+            offset = self.locate_hdu(irff_fd, irff_size, which_hdu, hdu_index)
+            if (offset is None):            # no such HDU or unable to read the chain
+                return None                 # signal failure
+
+            irff_fd.seek(offset, 0)         # move to start of the desired HDU
+            header = fits_cards.read_header_bytes(
+                irff_fd, header_length=self.indexed_header_length(hdu_index, which_hdu))
+
+        if (header is None):                # unable to read a complete header
+            return None
+        (start, header_bytes) = header
+        if ((start + len(header_bytes)) > irff_size):  # header runs past the end of the file
+            return None
+
+        header_bytes = bytes(header_bytes)
+        if (which_hdu == len(hdu_index['entries'])):
+            structure = fits_cards.fields_from_bytes(header_bytes, keys=[])
+            self.add_hdu_index_entry(hdu_index, FitsHeaderInfo(start, len(header_bytes), structure))
+        if (self.header_cache is not None):
+            self.header_cache.put(file_key, which_hdu, start, header_bytes)
+        return header_bytes
+
+
+    def get_header_info_at (self, irff_fd, irff_size, which_hdu=0, hdu_index=None):
         """
         Follow the chain of HDU headers to return a header information record for
         the specified HDU, given an open iRods FITS file and its size.
         Returns None if the specified HDU is out of range.
 
+        If an HDU index for the file is given (see get_hdu_index), the walk of the chain
+        resumes from the last HDU in the index, rather than from the primary HDU, and
+        any HDUs walked are added to the index: the header of an HDU which is already
+        in the index is read with a single seek and read.
+
         Note: the current file position is moved as a side-effect of this method!
         """
-        # always have to read the primary header to start
-        irff_fd.seek(0, 0)                  # move to beginning of file
-        hdr_info = self.read_header(irff_fd, irff_size)
-        if (hdr_info is None):              # if unable to read first header
-            return None                     # signal failure
+        if (hdu_index is None):             # no index given: walk the chain from the start
+            hdu_index = self.new_hdu_index()
 
-        hdr_index = 0                       # just read primary header
-        while (hdr_index < which_hdu):
-            datalen = self.calculate_data_length(hdr_info.hdr)
-            pos = irff_fd.seek(datalen, 1)  # skip over data segment
-            if (pos >= irff_size):          # exit condition: abort if at or past EOF
-                return None                 # exits on truncated file or no such HDU
-
-            hdr_info = self.read_header(irff_fd, irff_size)  # try to read next header
-            if (hdr_info is None):          # if unable to read a header at current position
-                return None                 # signal failure
-            else:                           # else we got another header
-                hdr_index += 1
+        offset = self.locate_hdu(irff_fd, irff_size, which_hdu, hdu_index)
+        if (offset is None):                # no such HDU or unable to read the chain
+            return None                     # signal failure
 
-        return hdr_info                     # success: return the desired header information
+        irff_fd.seek(offset, 0)             # move to start of the desired HDU
+        hdr_info = self.read_header(irff_fd, irff_size,
+                                    header_length=self.indexed_header_length(hdu_index, which_hdu))
+        if ((hdr_info is not None) and (which_hdu == len(hdu_index['entries']))):
+            self.add_hdu_index_entry(hdu_index, hdr_info)
+        return hdr_info                     # return the desired header information
 
 
-    def get_header_fields (self, irods_fits_file, which_hdu=0, ignore=FITS_IGNORE_KEYS):
+    def get_header_fields (self, irods_fits_file, which_hdu=0, ignore=FITS_IGNORE_KEYS, keys=None):
         """
         Return a dictionary of keys and values for the cards in the selected HDU
         (default: 0 (the first HDU)) or None, if the given HDU index is out of range.
         The result dictionary will not contain entries for cards whose keys are
-        in the given "ignore list". Note that the result dictionary will contain only the
-        last value found for duplicate keys.
+        in the given "ignore list" and, if a collection of selected keys is given, will
+        contain only those keys (and the structure keys). Note that the result dictionary
+        will contain only the last value found for duplicate keys.
+        The header cards are scanned directly: no Astropy header is built.
         """
-        header = self.get_header(irods_fits_file, which_hdu)
-        if (header):
-            return fits_utils.get_fields_from_header(header, ignore)
-        else:
+        header_bytes = self.get_header_bytes(irods_fits_file, which_hdu)
+        if (header_bytes is None):
             return None
+        return fits_cards.fields_from_bytes(header_bytes, keys=keys, ignore=ignore)
 
 
     def get_irods_file_info (self, irff=None):
@@ -252,6 +473,43 @@ class FitsIRodsHelper (IRodsHelper):
         return wcs.WCS(header) if (header is not None) else None
 
 
+    def image_skip_reason (self, irods_fits_file, content_metadata=None):
+        """
+        Return the reason why the given iRods FITS file can not hold an image, judged only from
+        its catalog information: its size, its name (see the skip_names argument), and the data
+        product type recorded in the given content metadata, if any. Returns None if the file
+        may hold an image. The reasons are: 'empty', 'too_small', 'name', and 'content_type'.
+        """
+        if (irods_fits_file.size == 0):
+            return 'empty'
+        if ((not self.is_compressed_file(irods_fits_file)) and (irods_fits_file.size < MIN_IMAGE_FILE_SIZE)):
+            return 'too_small'
+        if (any(fnmatch.fnmatchcase(irods_fits_file.name, pattern) for pattern in self.skip_names)):
+            return 'name'
+        content_type = (content_metadata or dict()).get(CONTENT_TYPE_KEY)
+        if ((content_type is not None) and (str(content_type).lower() not in IMAGE_CONTENT_TYPES)):
+            return 'content_type'
+        return None
+
+
+    def indexed_header_length (self, hdu_index, which_hdu):
+        """
+        Return the length of the header of the specified HDU, if that HDU is in the given
+        HDU index, else return None.
+        """
+        entries = hdu_index['entries']
+        return entries[which_hdu].hdr_length if (which_hdu < len(entries)) else None
+
+
+    def irods_file_key (self, irods_fits_file):
+        """
+        Return a header cache file key identifying the current version of the given iRods file,
+        by its path, size, and checksum (or its modification time, if it has no checksum).
+        """
+        stamp = getattr(irods_fits_file, 'checksum', None) or getattr(irods_fits_file, 'modify_time', None)
+        return (IRODS_SOURCE, str(irods_fits_file.path), irods_fits_file.size, str(stamp))
+
+
     def is_catalog_header (self, header):
         """
         Tell whether the given FITS HDU header is for a catalog or not.
@@ -263,6 +521,11 @@ class FitsIRodsHelper (IRodsHelper):
             return False
 
 
+    def is_compressed_file (self, irods_fits_file):
+        """ Tell whether the given iRods FITS file is gzip compressed or not. """
+        return fits_utils.is_gzip_filename(str(irods_fits_file.path))
+
+
     def is_image_header (self, header):
         """
         Tell whether the given FITS HDU header is for an image or not.
@@ -304,6 +567,128 @@ class FitsIRodsHelper (IRodsHelper):
             return False
 
 
+    def list_fits_file_paths (self, irods_root_path):
+        """
+        Return a sorted list of the absolute paths of all FITS files in the file tree under the
+        given absolute root path. In 'query' listing mode, the files are found with a few paged
+        catalog queries, filtered by file extension on the server, and the data objects found
+        are remembered, so that they need not be fetched again (see get_fits_file). The content
+        metadata of all those files is prefetched, in a few more queries, into an index read by
+        get_content_metadata. In 'walk' listing mode, the tree is walked collection by collection.
+
+        :raises irods.exception.CollectionDoesNotExist if the root collection is not found.
+        """
+        if (self.listing_mode == 'walk'):
+            irods_root_dir = self.getc(irods_root_path, absolute=True)
+            return sorted(self.gen_fits_file_paths(irods_root_dir))
+
+        data_objects = self.list_data_objects(irods_root_path, suffixes=IRODS_FITS_EXTENTS)
+        self._listed_files = { dobj.path: dobj for dobj in data_objects
+                               if fits_utils.is_fits_filename(dobj.path) }
+        self._listed_metadata = self.list_metadata(irods_root_path, suffixes=IRODS_FITS_EXTENTS)
+        return list(self._listed_files.keys())
+
+
+    def locate_hdu (self, irff_fd, irff_size, which_hdu, hdu_index):
+        """
+        Return the offset of the specified HDU, given an open iRods FITS file, its size,
+        and an HDU index for the file. Returns None if the specified HDU is out of range.
+
+        HDUs already in the index are located without any reads. Otherwise, the chain of
+        HDUs is walked from the last HDU in the index, reading only the structure keywords
+        of each intervening header, which are added to the index as they are found.
+        The header of the specified HDU itself is not read.
+
+        Note: the current file position may be moved as a side-effect of this method!
+        """
+        entries = hdu_index['entries']
+        while (len(entries) < which_hdu):
+            if (hdu_index['complete']):     # end of chain already found: no such HDU
+                return None
+
+            offset = self.next_hdu_offset(hdu_index)
+            if (offset >= irff_size):       # exit condition: abort if at or past EOF
+                hdu_index['complete'] = True
+                return None                 # exits on truncated file or no such HDU
+
+            irff_fd.seek(offset, 0)         # move to start of next header
+            hdr_info = fits_cards.read_header_fields(irff_fd, keys=FITS_STRUCTURE_KEYS, ignore=[])
+            if (hdr_info is None):          # if unable to read a header at this position
+                hdu_index['complete'] = True
+                return None                 # signal failure
+            self.add_hdu_index_entry(hdu_index, hdr_info)
+
+        if (which_hdu < len(entries)):      # HDU already indexed
+            return entries[which_hdu].offset
+
+        if (hdu_index['complete']):         # end of chain already found: no such HDU
+            return None
+        offset = self.next_hdu_offset(hdu_index)
+        return offset if (offset < irff_size) else None
+
+
+    def make_table_hdu (self, header, data_bytes=b'', row_count=0):
+        """
+        Return a table HDU, described by the given table header, containing row_count rows
+        decoded from the given bytes (default: an empty table). Decoding is left to Astropy,
+        by prefixing the bytes with a copy of the table header, resized to the given number
+        of rows (without a heap), and padding them to a full FITS block.
+        """
+        table_header = header.copy()
+        table_header['NAXIS2'] = row_count
+        table_header['PCOUNT'] = 0
+        table_header.remove('THEAP', ignore_missing=True)
+        padding = b'\0' * (-len(data_bytes) % FITS_BLOCK_SIZE)
+        hdu_bytes = table_header.tostring().encode(FITS_ENCODING) + data_bytes + padding
+        return HDUList.fromstring(hdu_bytes)[0]
+
+
+    def new_hdu_index (self):
+        """ Return a new, empty HDU index (see get_hdu_index). """
+        return { 'entries': [], 'complete': False }
+
+
+    def next_hdu_offset (self, hdu_index):
+        """ Return the offset just past the end of the last HDU in the given HDU index. """
+        if (not hdu_index['entries']):
+            return 0
+        last = hdu_index['entries'][-1]
+        return last.offset + last.hdr_length + last.data_length
+
+
+    @contextmanager
+    def open_fits_file (self, irods_fits_file):
+        """
+        Context manager to open the given iRods FITS file for reading. A gzip compressed file is
+        decompressed as it is read, so only as much of the file as is actually read (or skipped
+        over, when seeking forward) is transferred and inflated: reading a header near the
+        start of the file costs about the same as reading it from an uncompressed file.
+
+        Unless disabled, reads of the iRods file are made through a read-ahead buffer, which
+        fetches a large window of the file (see the read_ahead_kb argument) in each request,
+        so a typical header arrives in a single round-trip, rather than one per FITS block.
+
+        If adaptive concurrency is enabled, the number of iRods opens, reads, and seeks in
+        progress at one time, by all threads, is governed by the read limiter (see
+        AdaptiveLimiter). Only those calls are limited and timed: not the caller's processing.
+        """
+        limiter = self.read_limiter
+        with (nullcontext() if (limiter is None) else limiter.slot(READ_FAILURES)):
+            irff_fd = irods_fits_file.open('r')
+        with irff_fd:
+            raw_fd = irff_fd if (limiter is None) else LimitedReader(irff_fd, limiter, READ_FAILURES)
+            if (self.read_ahead_size > 0):
+                raw_fd = ReadAheadReader(raw_fd, window_size=self.read_ahead_size)
+            if (self.is_compressed_file(irods_fits_file)):
+                with gzip.GzipFile(fileobj=raw_fd, mode='rb') as gzip_fd:
+                    try:
+                        yield gzip_fd
+                    except EOFError as eofe:  # report truncated files as other read errors
+                        raise OSError(str(eofe))
+            else:
+                yield raw_fd
+
+
     def read_chunk (self, irff_fd, irff_size, chunk_size=FITS_BLOCK_SIZE):
         """
         Read and return a chunk of bytes from the given open file at the current file position.
@@ -315,7 +700,10 @@ class FitsIRodsHelper (IRodsHelper):
         pos = irff_fd.tell()                # current position in file
         if ((pos + chunk_size) > irff_size):  # not enough data left to read
             return None                     # signal failure
-        return irff_fd.read(chunk_size)     # read and return chunck
+        chunk = irff_fd.read(chunk_size)    # read chunk
+        if (len(chunk) < chunk_size):       # file ended early: size was not known in advance
+            return None                     # signal failure
+        return chunk
 
 
     def read_hdu (self, irff_fd, irff_size, hdu_size):
@@ -338,35 +726,101 @@ class FitsIRodsHelper (IRodsHelper):
             return None                     # signal failure
 
 
-    def read_header (self, irff_fd, irff_size):
+    def read_header (self, irff_fd, irff_size, header_length=None):
         """
         Read and return the FITS header from the given open file at the current file position.
 
         Returns the header in a header information object (FitsHeaderInfo) along with
         the header offset (from the start of the stream) and header length.
 
-        Returns None if the file does not contain a full block of bytes from
+        Returns None if the file does not contain a complete header from
         the current file position.
 
+        The header blocks are read into a single growing buffer, checking only each new block
+        for the END card, and decoded straight from that buffer (see fits_cards.read_header_bytes).
+        If the length of the header is already known (e.g., from an HDU index) and given,
+        the header is read with a single read, rather than block by block.
+
         Note: the current file position is moved as a side-effect of this method!
         """
-        header_str = b''
-        length = 0
-        start = irff_fd.tell()              # save absolute starting position
-        pos = start                         # absolute current position
+        if (irff_fd.tell() >= irff_size):   # safety check: abort on empty or truncated file
+            return None
 
-        while True:
-            if (pos >= irff_size):          # safety check: abort on empty or truncated file
-                return None                 # exit out now
+        header = fits_cards.read_header_bytes(irff_fd, header_length=header_length)
+        if (header is None):                # unable to read a complete header
+            return None
 
-            block = irff_fd.read(FITS_BLOCK_SIZE)  # read next block
-            header_str += block                    # append block data
-            length += FITS_BLOCK_SIZE              # increment block length
+        (start, header_bytes) = header
+        if ((start + len(header_bytes)) > irff_size):  # header runs past the end of the file
+            return None
 
-            if (header_str.strip().endswith(FITS_END_KEY)):
-                # make a FITS header from the collected bytes
-                header = fits.Header.fromstring(header_str.decode(FITS_ENCODING))
-                # return a header info object
-                return FitsHeaderInfo(start, length, header)
+        # make a FITS header from the collected bytes and return it in a header info object
+        hdr = fits.Header.fromstring(str(header_bytes, FITS_ENCODING))
+        return FitsHeaderInfo(start, len(header_bytes), hdr)
+
+
+    def select_changed_files (self, irff_paths, manifest=None):
+        """
+        Return a triple of the list of those of the given iRods FITS file paths whose files are new
+        or have changed since they were last processed, a dictionary of the signatures (see
+        file_signature) of those files, keyed by path, and the set of the paths of those files
+        which were processed before (i.e., changed, not new), whose old results must be replaced.
+        A file is unchanged if its current signature is the one recorded for it in the given
+        ingest manifest or, if no manifest is given, the one recorded in its source signature
+        metadata item (see IRodsMetadataSink). Files found by the last listing (in 'query' mode)
+        are checked without any requests to the server.
+        """
+        recorded = manifest.signatures(irff_paths) if (manifest is not None) else dict()
+        changed = []
+        signatures = dict()
+        replaced = set()
+        for irff_path in irff_paths:
+            try:
+                irff = self.get_fits_file(irff_path)
+            except DataObjectDoesNotExist:  # let processing report the missing file
+                changed.append(irff_path)
+                continue
+            signature = self.file_signature(irff)
+            if (manifest is None):
+                previous = self.get_content_metadata(irff).get(SOURCE_SIGNATURE_KEY)
+            else:
+                previous = recorded.get(irff_path)
+            if (previous != signature):
+                changed.append(irff_path)
+                signatures[irff_path] = signature
+                if (previous is not None):
+                    replaced.add(irff_path)
+        return (changed, signatures, replaced)
+
+
+    def select_image_files (self, irff_paths):
+        """
+        Return a pair of the list of those of the given iRods FITS file paths whose files may hold
+        images (see image_skip_reason), and a dictionary of the numbers of files skipped, keyed by
+        the reason they were skipped. No file is opened: files found by the last listing (in
+        'query' mode) are judged from the listing, without any requests to the server.
+        """
+        selected = []
+        skip_counts = dict()
+        for irff_path in irff_paths:
+            try:
+                irff = self.get_fits_file(irff_path)
+            except DataObjectDoesNotExist:  # let processing report the missing file
+                selected.append(irff_path)
+                continue
+            reason = self.image_skip_reason(irff, self.get_content_metadata(irff))
+            if (reason is None):
+                selected.append(irff_path)
             else:
-                pos = irff_fd.tell()
+                skip_counts[reason] = skip_counts.get(reason, 0) + 1
+        return (selected, skip_counts)
+
+
+    def update_metaf (self, file_path, metadata, absolute=False, remove_only=False):
+        """
+        Change the metadata of the specified file (see IRodsHelper.update_metaf). The file is
+        forgotten by the last listing, so its changed metadata will be queried when next needed.
+        """
+        changed = super().update_metaf(file_path, metadata, absolute=absolute, remove_only=remove_only)
+        self._listed_files.pop(self.path_to(file_path, absolute), None)
+        return changed
@@ -1,10 +1,14 @@
 #
 # Module to provide FITS utility functions for Astrolabe code.
 #   Written by: Tom Hicks. 1/26/2020.
-#   Last Modified: Redo image/catalog files tests.
+#   Last Modified: Add test for gzip compressed filenames.
 #
 import fnmatch
 import os
+from math import ceil
+from string import digits
+
+import numpy as np
 
 from astropy import wcs
 from astropy.time import Time
@@ -12,7 +16,7 @@ from astropy.table import Table
 from astropy.wcs.utils import proj_plane_pixel_scales
 
 from imdtk.core.file_utils import is_acceptable_filename, gen_file_paths, validate_file_path
-from imdtk.core.misc_utils import to_JSON
+from imdtk.core.misc_utils import product, to_JSON
 
 
 # patterns for identifying FITS and gzipped FITS files
@@ -22,6 +26,9 @@ _GZFITS_PAT = "*.fits.gz"
 # size, in bytes, of each FITS file chunk
 FITS_BLOCK_SIZE = 2880
 
+# default number of rows in each chunk of catalog data processed at one time
+DATA_CHUNK_SIZE = 10000
+
 # keyword byte string identifying the last (unpadded!) card in a FITS Header
 FITS_END_KEY = b'END'
 
@@ -32,6 +39,11 @@ FITS_EXTENTS = [ '.fits', '.fits.gz' ]
 # The empty key string is important: it removes any non-Key/Value lines.
 FITS_IGNORE_KEYS = [ 'COMMENT', 'HISTORY', '' ]
 
+# Header keywords which describe the structure of an HDU. These are always kept when
+# the header keywords are projected onto a list of selected keywords.
+FITS_STRUCTURE_KEYS = [ 'BITPIX', 'GCOUNT', 'NAXIS', 'NTABLE', 'PCOUNT', 'SIMPLE',
+                        'VOTMETA', 'XTENSION' ]
+
 # MIME type for FITS files
 FITS_MIME_TYPE = 'image/fits'
 
@@ -49,6 +61,54 @@ def bitpix_size (bitpix):
     return abs(int(bitpix))
 
 
+def calc_data_length (header, GCOUNT=1, PCOUNT=0, primary=False):
+    """
+    Calculate the length (in bytes) of the data segment following the given header.
+    Defaults are provided for PCOUNT and GCOUNT but must be overridden by the calling
+    function, where needed, as per the FITS Standard 4.0, section 7.1.
+    PCOUNT and GCOUNT are not used by the Primary header, as per section 4.4.1.
+    The header may be a FITS header or a dictionary of header keys and values.
+    """
+    if (header.get('NAXIS') == 0):      # sanity check per FITS 4.0: section 4.4.1.1
+        return 0
+
+    B = bitpix_size(header['BITPIX']) / 8
+    N = [header[f'NAXIS{idx}'] for idx in range(1, header['NAXIS'] + 1)]
+
+    if (0 in N):                        # per FITS 4.0: 4.4.1.1, 7.1.1
+        return 0                        # zero in any NAXISn => no data blocks
+
+    if (primary):                       # if this is the primary header
+        blocks = ceil(B * (product(N)) / FITS_BLOCK_SIZE)
+    else:                               # else this is an extension header
+        blocks = ceil(B * GCOUNT * (PCOUNT + product(N)) / FITS_BLOCK_SIZE)
+
+    return (blocks * FITS_BLOCK_SIZE)
+
+
+def calculate_data_length (header):
+    """
+    Calculate the length of the data segment following the given header information.
+    Each FITS header has enough information to predict the location of the next header.
+    Calculations based on the FITS Standard version 4.0, revision 8/13/2018.
+    The header may be a FITS header or a dictionary of header keys and values.
+    """
+    if (header.get('NAXIS') == 0):         # FITS 4.0: 4.4.1.1
+        return 0
+
+    if (header.get('SIMPLE', False) is True):  # Primary Header
+        return calc_data_length(header, primary=True)
+
+    elif (header.get('XTENSION', None) in ['IMAGE', 'TABLE']):
+        return calc_data_length(header)
+
+    elif (header.get('XTENSION', None) in ['BINTABLE']):
+        return calc_data_length(header, PCOUNT=header.get('PCOUNT', 1))
+
+    else:
+        raise RuntimeError('Unrecognized XTENSION type while calculating HDU data length')
+
+
 def fits_file_exists (filepath):
     """ Tell whether the given filepath names an existing, readable FITS file or not. """
     return validate_file_path(filepath, FITS_EXTENTS)
@@ -73,6 +133,15 @@ def gen_fits_file_paths (root_dir):
             yield file_path
 
 
+def gen_data_chunks (data, chunk_size=DATA_CHUNK_SIZE):
+    """
+    Generator to yield successive chunks (of at most chunk_size rows) of the given
+    astropy.io.fits.fitsrec.FITS_rec data. Each chunk is itself a FITS_rec.
+    """
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
 def get_column_info (hdus_list, which_hdu=1):
     """
     Return a dictionary of metadata describing the columns of the table in the
@@ -89,31 +158,34 @@ def get_column_info (hdus_list, which_hdu=1):
     return col_md
 
 
-def get_fields_from_header (header, ignore=FITS_IGNORE_KEYS):
+def get_fields_from_header (header, ignore=FITS_IGNORE_KEYS, keys=None):
     """
     Return a dictionary of keys and values for the cards in the given FITS header.
     The result dictionary will not contain entries for cards whose keys are
-    in the given "ignore list". Note that the result dictionary will contain only the
-    last value found for duplicate keys.
+    in the given "ignore list". If a collection of selected keys is given, the result
+    will contain only those keys (and the structure keys: see is_selected_key).
+    Note that the result dictionary will contain only the last value found for duplicate keys.
     """
     hdrs = dict()
-    filtered = [ card for card in header.items() if (card[0] not in ignore) ]
+    filtered = [ card for card in header.items()
+                 if ((card[0] not in ignore) and is_selected_key(card[0], keys)) ]
     hdrs.update(filtered)
     return hdrs
 
 
-def get_header_fields (hdus_list, which_hdu=0, ignore=FITS_IGNORE_KEYS):
+def get_header_fields (hdus_list, which_hdu=0, ignore=FITS_IGNORE_KEYS, keys=None):
     """
     Return a dictionary of keys and values for the cards in the selected HDU
     (default: 0 (the first HDU)) or None, if the given HDU index is out of range.
     The result dictionary will not contain entries for cards whose keys are
-    in the given "ignore list". Note that the result dictionary will contain only the
-    last value found for duplicate keys.
+    in the given "ignore list". If a collection of selected keys is given, the result
+    will contain only those keys (and the structure keys: see is_selected_key).
+    Note that the result dictionary will contain only the last value found for duplicate keys.
     """
     if (which_hdu >= len(hdus_list)):       # sanity check
         return None
     header = hdus_list[which_hdu].header
-    return get_fields_from_header(header, ignore)
+    return get_fields_from_header(header, ignore, keys)
 
 
 def get_image_corners (wcs):
@@ -199,14 +271,21 @@ def has_image_data (ff_hdus_list, which_hdu=0):
     Assumes: an image extension HDU will be of type IMAGE.
     NB: we currently recognize only primary HDU "images" with 2D axises.
     """
+    if (len(ff_hdus_list) <= which_hdu):    # sanity check
+        return False
+    return has_image_header(ff_hdus_list[which_hdu].header, which_hdu)
+
+
+def has_image_header (header, which_hdu=0):
+    """
+    Tell whether the given header, of the given HDU (defaults to the Primary HDU), describes
+    image data, using the same heuristics as has_image_data. The header may be a FITS
+    header or a dictionary of header keys and values.
+    """
     if (which_hdu == 0):                    # heuristic for Primary HDU
-        if (ff_hdus_list[which_hdu].header.get('NAXIS') == 2):
-            return True
-        else:
-            return False
+        return (header.get('NAXIS') == 2)
     else:                                   # it's an extension and so marked
-        return ( (len(ff_hdus_list) > which_hdu) and
-                 (ff_hdus_list[which_hdu].header.get('XTENSION') == 'IMAGE') )
+        return (header.get('XTENSION') == 'IMAGE')
 
 
 def is_fits_file (fyl):
@@ -219,6 +298,21 @@ def is_fits_filename (filename, extents=FITS_EXTENTS):
     return is_acceptable_filename(filename, extents)
 
 
+def is_gzip_filename (filename):
+    """ Return True if the given filename string names a gzip compressed file, else False. """
+    return str(filename).endswith('.gz')
+
+
+def is_selected_key (key, keys=None):
+    """
+    Tell whether the given header key is selected by the given collection of keys.
+    All keys are selected if no collection is given. The structure keys (including
+    the NAXISn keys), needed to locate and characterize the data, are always selected.
+    """
+    return ( (keys is None) or (key in keys) or (key in FITS_STRUCTURE_KEYS) or
+             (key.startswith('NAXIS') and key[5:].isdigit()) )
+
+
 def lookup_pixtype (bitpix, default='UNKNOWN'):
     """
     Return the pixel data type for the given FITS header code value from the BITPIX field.
@@ -227,12 +321,65 @@ def lookup_pixtype (bitpix, default='UNKNOWN'):
     return PIXTYPE_TABLE.get(bitpix, default)
 
 
+def column_values (col_data, col_format=''):
+    """
+    Return a list of Python values for the given column of FITS table data, converting
+    the entire column at once. Vector columns become lists, complex values become
+    [real, imaginary] lists, bit (X) columns become strings of '0' and '1' characters,
+    and variable length array columns become lists (or strings, for character arrays).
+
+    :param col_data: a numpy array of values for a single column of a FITS_rec.
+    :param col_format: the FITS format (TFORMn) string for the column.
+    """
+    fmt_code = str(col_format).lstrip(digits)[:1]
+
+    if (col_data.dtype.kind == 'O'):        # variable length arrays: one array per row
+        return [ _array_values(arr) for arr in col_data ]
+
+    if (col_data.dtype.kind == 'c'):        # complex: split into [real, imaginary] pairs
+        return np.stack((col_data.real, col_data.imag), axis=-1).tolist()
+
+    if ((fmt_code == 'X') and (len(col_data) > 0)):  # bits: convert to bit strings
+        bits = col_data.reshape(len(col_data), -1).astype(np.uint8) + ord('0')
+        nbits = bits.shape[1]
+        return np.char.decode(np.ascontiguousarray(bits).view(f"S{nbits}").ravel(),
+                              'ascii').tolist()
+
+    return col_data.tolist()                # use numpy.ndarray conversion function
+
+
+def columns_from_data (data):
+    """
+    Return a list of columns for the given astropy.io.fits.fitsrec.FITS_rec data.
+    Each column in the returned list is a homogeneous list of values for the column.
+    """
+    return [ column_values(data.field(idx), col.format)
+             for idx, col in enumerate(data.columns) ]
+
+
 def rows_from_data (data):
     """
     Return a list of rows for the given astropy.io.fits.fitsrec.FITS_rec data.
     Each row in the returned list is a heterogeneous list of values for the row.
+    The data is converted column by column, then transposed into rows.
+    """
+    columns = columns_from_data(data)
+    return [ list(row) for row in zip(*columns) ]
+
+
+def _array_values (arr):
+    """
+    Return a list of Python values for the given variable length array or,
+    if the array contains characters, return the array as a single string.
     """
-    return data.tolist()                    # use numpy.ndarray conversion function
+    if (arr.dtype.kind == 'S'):
+        return b''.join(arr.tolist()).decode('ascii')
+    elif (arr.dtype.kind == 'U'):
+        return ''.join(arr.tolist())
+    elif (arr.dtype.kind == 'c'):
+        return np.stack((arr.real, arr.imag), axis=-1).tolist()
+    else:
+        return arr.tolist()
 
 
 # def table_to_JSON (table, orient='values'):
@@ -0,0 +1,299 @@
+#
+# Class implementing a persistent, size-bounded cache of raw FITS header bytes, stored in
+# an SQLite database file and shared by all tools (and tool invocations) which read headers.
+#   Written by: Tom Hicks. 1/22/21.
+#   Last Modified: Keep the total size of the cache in a table, maintained by triggers.
+#
+import gzip
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from astropy.io import fits
+
+from config.settings import DEFAULT_HEADER_CACHE_FILEPATH, DEFAULT_HEADER_CACHE_MAX_MB
+import imdtk.core.fits_cards as fits_cards
+import imdtk.core.fits_utils as fits_utils
+
+
+# sources of the files whose headers are cached
+LOCAL_SOURCE = 'local'
+IRODS_SOURCE = 'irods'
+
+# when evicting entries, shrink the cache to this fraction of its maximum size
+EVICTION_TARGET = 0.9
+
+# seconds to wait for a lock on the cache database held by another process
+LOCK_TIMEOUT = 30
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS headers (
+  source TEXT NOT NULL,
+  path TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  stamp TEXT NOT NULL,
+  hdu INTEGER NOT NULL,
+  offset INTEGER NOT NULL,
+  nbytes INTEGER NOT NULL,
+  last_used REAL NOT NULL,
+  header BLOB NOT NULL,
+  PRIMARY KEY (source, path, hdu)
+)"""
+
+_CREATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS headers_last_used ON headers (last_used)"
+
+# The total size of the cached headers is kept in a one-row table, maintained by triggers,
+# so that it is never summed over the whole cache and stays correct for every process.
+_CREATE_SIZE_SQL = [
+    "CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), nbytes INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO cache_size (id, nbytes) SELECT 0, TOTAL(nbytes) FROM headers",
+    """CREATE TRIGGER IF NOT EXISTS headers_size_insert AFTER INSERT ON headers BEGIN
+         UPDATE cache_size SET nbytes = nbytes + NEW.nbytes WHERE id = 0; END""",
+    """CREATE TRIGGER IF NOT EXISTS headers_size_delete AFTER DELETE ON headers BEGIN
+         UPDATE cache_size SET nbytes = nbytes - OLD.nbytes WHERE id = 0; END""",
+    """CREATE TRIGGER IF NOT EXISTS headers_size_update AFTER UPDATE OF nbytes ON headers BEGIN
+         UPDATE cache_size SET nbytes = nbytes - OLD.nbytes + NEW.nbytes WHERE id = 0; END"""
+]
+
+
+class HeaderCache (object):
+    """
+    Persistent cache of the raw header bytes of the HDUs of FITS files. Each entry is keyed by
+    a file key, which identifies a particular version of a file (see local_file_key), and an
+    HDU index. Raw header bytes are stored, rather than parsed headers, so a cached header can
+    be decoded either into a dictionary of selected fields or into an Astropy header.
+    A cache may be shared by several threads: access to its database connection is serialized.
+
+    The cache is bounded in size: when it grows past its maximum size, the least recently
+    used entries are evicted. Errors in accessing the cache are never fatal: a failed lookup
+    is treated as a cache miss and a failed store is ignored.
+    """
+
+    def __init__ (self, cache_path=DEFAULT_HEADER_CACHE_FILEPATH,
+                  max_bytes=(DEFAULT_HEADER_CACHE_MAX_MB * 1024 * 1024)):
+        """
+        Constructor of a header cache stored in the SQLite database at the given path,
+        which is created if it does not already exist.
+        """
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()      # serializes use of the connection by threads
+        self._conn = sqlite3.connect(cache_path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA recursive_triggers = ON")  # rows replaced by a put fire the delete trigger
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")  # size table is initialized once, by one process
+            self._conn.execute(_CREATE_TABLE_SQL)
+            self._conn.execute(_CREATE_INDEX_SQL)
+            for size_sql in _CREATE_SIZE_SQL:
+                self._conn.execute(size_sql)
+
+
+    def clear (self):
+        """ Remove all entries from the cache and return the number of entries removed. """
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM headers").rowcount
+
+
+    def close (self):
+        """ Close the connection to the cache database. """
+        with self._lock:
+            if (self._conn is not None):
+                self._conn.close()
+                self._conn = None
+
+
+    def evict (self, max_bytes):
+        """
+        Remove the least recently used entries until the total size of the cached headers
+        is no more than the given number of bytes. Returns the number of entries removed.
+        """
+        removed = 0
+        total = self.total_bytes()
+        if (total <= max_bytes):
+            return removed
+
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT rowid, nbytes FROM headers ORDER BY last_used").fetchall()
+            doomed = []
+            for (rowid, nbytes) in rows:
+                if (total <= max_bytes):
+                    break
+                doomed.append((rowid,))
+                total -= nbytes
+            self._conn.executemany("DELETE FROM headers WHERE rowid = ?", doomed)
+            removed = len(doomed)
+        return removed
+
+
+    def get (self, file_key, which_hdu):
+        """
+        Return the cached header bytes for the specified HDU of the file identified by the
+        given file key, or None if the header is not cached.
+        """
+        return self.get_many(file_key, [which_hdu]).get(which_hdu)
+
+
+    def get_many (self, file_key, hdus):
+        """
+        Return a dictionary of the cached header bytes, keyed by HDU index, for those of the
+        specified HDUs of the file identified by the given file key which are in the cache.
+        """
+        (source, path, size, stamp) = file_key
+        hdus = list(hdus)
+        try:
+            with self._lock, self._conn:
+                rows = self._conn.execute(
+                    "SELECT hdu, header FROM headers WHERE source = ? AND path = ? "
+                    "AND size = ? AND stamp = ? AND hdu IN ({})".format(','.join('?' * len(hdus))),
+                    [source, path, size, stamp] + hdus).fetchall()
+                if (rows):
+                    self._conn.execute(
+                        "UPDATE headers SET last_used = ? WHERE source = ? AND path = ? "
+                        "AND hdu IN ({})".format(','.join('?' * len(rows))),
+                        [time.time(), source, path] + [row[0] for row in rows])
+        except sqlite3.Error:               # cache errors are never fatal: treat as a miss
+            return dict()
+        return { hdu: bytes(header) for (hdu, header) in rows }
+
+
+    def prune (self, max_bytes=None, older_than=None, stale=False):
+        """
+        Remove entries from the cache and return the number of entries removed.
+        If a number of seconds is given in older_than, entries which have not been used for that
+        long are removed. If stale is True, entries for local files which no longer exist or
+        which have changed are removed. Finally, if a maximum number of bytes is given, the
+        least recently used entries are evicted until the cache is no larger than that.
+        """
+        removed = 0
+        if (older_than is not None):
+            with self._lock, self._conn:
+                removed += self._conn.execute(
+                    "DELETE FROM headers WHERE last_used < ?",
+                    [time.time() - older_than]).rowcount
+
+        if (stale):
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT DISTINCT path, size, stamp FROM headers WHERE source = ?",
+                    [LOCAL_SOURCE]).fetchall()
+            doomed = [ (LOCAL_SOURCE, path) for (path, size, stamp) in rows
+                       if (local_file_key(path) != (LOCAL_SOURCE, path, size, stamp)) ]
+            with self._lock, self._conn:
+                removed += max(0, self._conn.executemany(  # counts no changes made by triggers
+                    "DELETE FROM headers WHERE source = ? AND path = ?", doomed).rowcount)
+
+        if (max_bytes is not None):
+            removed += self.evict(max_bytes)
+        return removed
+
+
+    def put (self, file_key, which_hdu, offset, header_bytes):
+        """
+        Store the given header bytes, found at the given offset, for the specified HDU of the
+        file identified by the given file key, replacing any entry for another version of the
+        file. Evicts the least recently used entries if the cache grows too large.
+        """
+        (source, path, size, stamp) = file_key
+        header_bytes = bytes(header_bytes)
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO headers "
+                    "(source, path, size, stamp, hdu, offset, nbytes, last_used, header) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (source, path, size, stamp, which_hdu, offset, len(header_bytes),
+                     time.time(), header_bytes))
+            with self._lock:
+                if (self.total_bytes() > self.max_bytes):
+                    self.evict(int(self.max_bytes * EVICTION_TARGET))
+        except sqlite3.Error as sqlerr:     # cache errors are never fatal: skip storing
+            print("(HeaderCache.put): WARNING: unable to store header in cache '{}': {}".format(
+                self.cache_path, sqlerr), file=sys.stderr)
+
+
+    def stats (self):
+        """
+        Return a dictionary of statistics about the cache: the number of entries,
+        the number of distinct files, and the total size of the cached headers.
+        """
+        with self._lock:
+            (entries, files, nbytes) = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT source || ':' || path), TOTAL(nbytes) FROM headers"
+            ).fetchone()
+        return { 'cache_file': self.cache_path, 'entries': entries, 'files': files,
+                 'total_bytes': int(nbytes), 'max_bytes': self.max_bytes }
+
+
+    def total_bytes (self):
+        """ Return the total size, in bytes, of all the cached headers, as kept up to date by triggers. """
+        with self._lock:
+            return int(self._conn.execute("SELECT nbytes FROM cache_size WHERE id = 0").fetchone()[0])
+
+
+
+def get_local_headers (header_cache, fits_file, hdus):
+    """
+    Return a dictionary of the raw header bytes, keyed by HDU index, for the specified HDUs of
+    the given local FITS file (which may be gzip compressed). HDUs which are out of range are
+    omitted. Headers are taken from the given header cache, when present there. Otherwise,
+    the file is read once, as far as the last specified HDU, and every header passed over
+    is stored in the cache. The header cache may be None, in which case the file is always read.
+    """
+    hdus = set(hdus)
+    file_key = None                         # None if not caching or if file is missing
+    if (header_cache is not None):
+        file_key = local_file_key(fits_file)  # if file is missing, the open will fail below
+    headers = header_cache.get_many(file_key, hdus) if (file_key is not None) else dict()
+    if (len(headers) == len(hdus)):         # all found in cache
+        return headers
+
+    last_hdu = max(hdus)
+    opener = gzip.open if (fits_utils.is_gzip_filename(fits_file)) else open
+    with opener(fits_file, 'rb') as fd:
+        for hdu_index, (offset, header_bytes) in enumerate(fits_cards.gen_header_bytes(fd)):
+            header_bytes = bytes(header_bytes)
+            if (file_key is not None):
+                header_cache.put(file_key, hdu_index, offset, header_bytes)
+            if (hdu_index in hdus):
+                headers[hdu_index] = header_bytes
+            if (hdu_index >= last_hdu):
+                break
+    return headers
+
+
+def header_from_bytes (header_bytes):
+    """ Return an Astropy FITS header decoded from the given raw header bytes. """
+    return fits.Header.fromstring(bytes(header_bytes).decode(fits_cards.CARD_ENCODING, errors='replace'))
+
+
+def local_file_key (fits_file):
+    """
+    Return a file key identifying the current version of the given local file, by its absolute
+    path, size, and modification time, or None if the file does not exist.
+    """
+    path = os.path.abspath(fits_file)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (LOCAL_SOURCE, path, stat.st_size, str(stat.st_mtime_ns))
+
+
+def open_header_cache (args):
+    """
+    Return a header cache for the cache database path given by the 'header_cache' argument in
+    the given arguments dictionary, or None if header caching was not requested or if the
+    cache can not be opened (in which case processing continues without a cache).
+    """
+    cache_path = args.get('header_cache')
+    if (not cache_path):
+        return None
+    try:
+        return HeaderCache(cache_path)
+    except sqlite3.Error as sqlerr:
+        print("({}): WARNING: unable to open header cache '{}': {}".format(
+            args.get('TOOL_NAME'), cache_path, sqlerr), file=sys.stderr)
+        return None
@@ -0,0 +1,145 @@
+#
+# Class implementing a persistent manifest of the files ingested by incremental pipelines,
+# stored in an SQLite database file, recording the version (signature) of each file ingested.
+#   Written by: Tom Hicks. 1/30/21.
+#   Last Modified: Name database targets by database and table. No manifest when only outputting.
+#
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+# seconds to wait for a lock on the manifest database held by another process
+LOCK_TIMEOUT = 30
+
+# number of recorded files buffered before they are written to the manifest database
+FLUSH_EVERY = 1000
+
+# maximum number of paths looked up in a single query (below the SQLite parameter limit)
+LOOKUP_BATCH_SIZE = 500
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS ingested (
+  target TEXT NOT NULL,
+  path TEXT NOT NULL,
+  signature TEXT NOT NULL,
+  ingested REAL NOT NULL,
+  PRIMARY KEY (target, path)
+)"""
+
+
+class IngestManifest (object):
+    """
+    Persistent manifest of the files ingested into a target (a database table or other sink).
+    For each file, the manifest records the signature of the version of the file which was
+    ingested (see FitsIRodsHelper.file_signature), so that an incremental run of a pipeline can
+    skip the files which have not changed since. Recorded files are buffered and written in
+    batches: the buffer is flushed when full and when the manifest is closed. A manifest may
+    be shared by several threads: access to its database connection is serialized.
+    """
+
+    def __init__ (self, manifest_path, target):
+        """
+        Constructor of a manifest, of the files ingested into the named target, stored in the
+        SQLite database at the given path, which is created if it does not already exist.
+        """
+        self.manifest_path = manifest_path
+        self.target = target
+        self._lock = threading.RLock()      # serializes use of the connection by threads
+        self._pending = dict()              # signatures recorded but not yet written, by path
+        self._conn = sqlite3.connect(manifest_path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(_CREATE_TABLE_SQL)
+
+
+    def close (self):
+        """ Write any buffered records and close the connection to the manifest database. """
+        with self._lock:
+            if (self._conn is not None):
+                self.flush()
+                self._conn.close()
+                self._conn = None
+
+
+    def flush (self):
+        """ Write any buffered records to the manifest database. """
+        with self._lock:
+            if (self._pending):
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO ingested (target, path, signature, ingested) "
+                        "VALUES (?, ?, ?, ?)",
+                        [ (self.target, path, sig, now) for (path, sig) in self._pending.items() ])
+                self._pending = dict()
+
+
+    def record (self, path, signature):
+        """ Record the ingestion of the version of the file at the given path with the given signature. """
+        with self._lock:
+            self._pending[path] = signature
+            if (len(self._pending) >= FLUSH_EVERY):
+                self.flush()
+
+
+    def signatures (self, paths):
+        """
+        Return a dictionary of the recorded signatures, keyed by path, of those of the files at
+        the given paths which have been ingested into the target of this manifest.
+        """
+        paths = list(paths)
+        found = dict()
+        with self._lock:
+            self.flush()                    # include any buffered records
+            for start in range(0, len(paths), LOOKUP_BATCH_SIZE):
+                batch = paths[start:(start + LOOKUP_BATCH_SIZE)]
+                rows = self._conn.execute(
+                    "SELECT path, signature FROM ingested WHERE target = ? AND path IN ({})".format(
+                        ','.join('?' * len(batch))), [self.target] + batch).fetchall()
+                found.update(rows)
+        return found
+
+
+    def stats (self):
+        """ Return a dictionary of statistics about the manifest: the number of files recorded for its target. """
+        with self._lock:
+            self.flush()
+            (files,) = self._conn.execute(
+                "SELECT COUNT(*) FROM ingested WHERE target = ?", [self.target]).fetchone()
+        return { 'manifest_file': self.manifest_path, 'target': self.target, 'files': files }
+
+
+
+def database_target (dbconfig, table_name):
+    """
+    Return the manifest target name of the named table in the database described by the
+    given database configuration: the host, port, and name of the database (but not the user
+    or password within the database URI) followed by the table name.
+    """
+    db_uri = urlsplit(dbconfig.get('db_uri') or '')
+    location = db_uri.hostname or ''
+    if (db_uri.port):
+        location = f"{location}:{db_uri.port}"
+    return f"{location}{db_uri.path or '/'}.{table_name}"
+
+
+def open_ingest_manifest (args, target):
+    """
+    Return a manifest, of the files ingested into the named target, for the manifest database
+    path given by the 'manifest' argument in the given arguments dictionary, or None if the
+    given arguments do not request a manifest (see wants_manifest).
+
+    :raises sqlite3.Error if the manifest database can not be opened.
+    """
+    if (not wants_manifest(args)):
+        return None
+    return IngestManifest(args.get('manifest'), target)
+
+
+def wants_manifest (args):
+    """
+    Tell whether the given arguments dictionary requests incremental processing with a
+    manifest of the files ingested. Results which are only output are never ingested.
+    """
+    return bool(args.get('incremental') and args.get('manifest') and (not args.get('output_only')))
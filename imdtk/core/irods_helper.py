@@ -1,19 +1,26 @@
 #
 # Helper class for iRods commands: manipulate the filesystem, including metadata.
 #   Written by: Tom Hicks. 10/15/20.
-#   Last Modified: Move iRods default files/paths here. Pass iRods root dir in args. Use fStrings.
+#   Last Modified: Optionally serve iRods from a local directory tree, with simulated latency.
 #
 import os
 import sys
 import errno
 import pathlib as pl
+import threading
+from contextlib import contextmanager
 
 from irods.session import iRODSSession
 from irods.collection import iRODSCollection
 from irods.data_object import iRODSDataObject
-from irods.meta import iRODSMeta
+from irods.exception import SYS_UNMATCHED_API_NUM
+from irods.meta import AVUOperation, iRODSMeta
+from irods.column import Like
+from irods.models import Collection, DataObject, DataObjectMeta
 
 from imdtk.core import Metadatum
+from imdtk.core.irods_session_pool import DEFAULT_MAX_SESSIONS, IRodsSessionPool
+from imdtk.core.local_irods import LocalIRodsSession
 
 
 # Default directory for iRods configuration files
@@ -25,9 +32,25 @@ DEFAULT_IRODS_AUTH_FILENAME = '.irodsA'
 # Default environment configuration file for iRods.
 DEFAULT_IRODS_ENV_FILENAME = 'irods_environment.json'
 
+# Modes of listing the files in a collection tree: with a few paged catalog queries
+# for all the data objects under the root path, or by walking the tree collection by collection.
+LISTING_MODES = [ 'query', 'walk' ]
+DEFAULT_LISTING_MODE = 'query'
+
+# Number of rows returned in each page of results from a catalog query.
+QUERY_PAGE_SIZE = 1000
+
+# Environment variable which may specify a local directory tree to serve in place of iRods.
+LOCAL_ROOT_ENV_VAR = 'IMDTK_IRODS_LOCAL_ROOT'
+
 
 class IRodsHelper:
-    """ Helper class for managing an iRods client connection. """
+    """
+    Helper class for managing an iRods client connection. A single helper instance may be
+    shared by several threads: each thread which checks out a session from the helper's
+    session pool (see pooled_session) uses that session, and its own root and current
+    working directories, for all helper operations until the session is returned.
+    """
 
     @staticmethod
     def cleanup_session (session):
@@ -36,6 +59,32 @@ class IRodsHelper:
             session.cleanup()
 
 
+    @staticmethod
+    def metadata_changes (current, metadata, remove_only=False):
+        """
+        Return a pair of lists of metadata items (iRODSMeta): the items to be removed from, and
+        the items to be added to, an iRods node with the given current metadata items, so that the
+        node's metadata will reflect the given dictionary of metadata. Normally, each key of the
+        dictionary should end with exactly one item, whose value is the string form of its value.
+        If the remove_only flag is True, all items with keys matching dictionary keys are removed.
+        Items with other keys are never changed.
+        """
+        desired = { str(key): str(val) for (key, val) in metadata.items() }
+        removes = []
+        unchanged = set()                   # keys which already have exactly the desired value
+        for avu in current:
+            if (avu.name not in desired):
+                continue
+            if ((not remove_only) and (avu.value == desired[avu.name]) and (not avu.units) and
+                (avu.name not in unchanged)):
+                unchanged.add(avu.name)
+            else:
+                removes.append(avu)
+        adds = [] if (remove_only) else [ iRODSMeta(key, val) for (key, val) in desired.items()
+                                          if (key not in unchanged) ]
+        return (removes, adds)
+
+
     @staticmethod
     def to_dirpath (dir_path):
         """ Add a trailing slash to the given directory path to mark it is an iRods
@@ -73,6 +122,12 @@ class IRodsHelper:
             print(f"(IRodsHelper.__init__): default_irods_env_file={self.default_irods_env_file}",
                   file=sys.stderr)
 
+        self._local = threading.local()     # per-thread session, root, and cwd state
+        self._main_state = dict(session=None, root=None, cwdpath=None)  # state of other threads
+        self._pool = None                   # pool of sessions for threads: None until needed
+        self._pool_lock = threading.Lock()
+        self.max_sessions = args.get('irods_max_sessions') or DEFAULT_MAX_SESSIONS
+
         self._cwdpath = None                # current working directory - a PurePath
         self._root = None                   # root directory path - a PurePath
         self._session = None                # current session - None until connected
@@ -80,6 +135,36 @@ class IRodsHelper:
             self.connect()
 
 
+    @property
+    def _cwdpath (self):
+        """ The current working directory of the calling thread - a PurePath. """
+        return self.thread_state()['cwdpath']
+
+    @_cwdpath.setter
+    def _cwdpath (self, value):
+        self.thread_state()['cwdpath'] = value
+
+
+    @property
+    def _root (self):
+        """ The root directory path of the calling thread - a PurePath. """
+        return self.thread_state()['root']
+
+    @_root.setter
+    def _root (self, value):
+        self.thread_state()['root'] = value
+
+
+    @property
+    def _session (self):
+        """ The session used by the calling thread. """
+        return self.thread_state()['session']
+
+    @_session.setter
+    def _session (self, value):
+        self.thread_state()['session'] = value
+
+
     def cleanup (self):
         """ Cleanup the current session. """
         self.disconnect()
@@ -183,7 +268,11 @@ class IRodsHelper:
 
 
     def disconnect (self):
-        """ Close down and cleanup the current session. """
+        """ Close down and cleanup the current session and any pooled sessions. """
+        with self._pool_lock:
+            if (self._pool is not None):
+                self._pool.close()
+                self._pool = None
         if (self._session):
             self._session.cleanup()
             self._session = None
@@ -286,6 +375,18 @@ class IRodsHelper:
         return self._session.data_objects.get(filepath)
 
 
+    def get_local_root (self, args):
+        """
+        Return the path to a local directory tree to be served in place of iRods, read from
+        the given arguments OR from the environment variable IMDTK_IRODS_LOCAL_ROOT, or
+        None if neither specifies one (the normal case: connect to an iRods server).
+        """
+        local_root = args.get('irods_local_root') or os.environ.get(LOCAL_ROOT_ENV_VAR)
+        if (self._DEBUG and local_root):
+            print(f"(IRodsHelper.get_local_root): local_root={local_root}", file=sys.stderr)
+        return local_root
+
+
     def get_metac (self, dir_path, absolute=False):
         """ Get the metadata for the specified directory relative to the iRods
             current working directory (default) OR relative to the users root directory,
@@ -304,6 +405,19 @@ class IRodsHelper:
         return [Metadatum(item.name, item.value) for item in obj.metadata.items()]
 
 
+    def get_pool (self):
+        """
+        Return the pool of sessions used by threads, creating it, bounded by the maximum
+        number of sessions, if necessary. The pooled sessions are created from the same
+        environment and authentication files as the main session.
+        """
+        with self._pool_lock:
+            if (self._pool is None):
+                self._pool = IRodsSessionPool(self.make_session, max_sessions=self.max_sessions,
+                                              debug=self._DEBUG)
+            return self._pool
+
+
     def get_root (self):
         """ Get directory information for the users root directory. """
         return self._session.collections.get(self._root)
@@ -319,14 +433,71 @@ class IRodsHelper:
         return isinstance(node, iRODSDataObject)
 
 
+    def list_data_objects (self, root_path, suffixes=None, page_size=QUERY_PAGE_SIZE):
+        """
+        Return a list, sorted by path, of the data objects (iRODSDataObject) in the collection
+        tree under the given absolute root path, optionally limited to those whose names end
+        with one of the given suffixes (see query_tree). Each data object is built from the
+        query results, so it carries the same information (path, size, checksum, modify time,
+        replicas, etc.) as one fetched by getf, without any further queries.
+        """
+        replicas = dict()                   # replica rows by replica number, keyed by data object ID
+        for row in self.query_tree(root_path, [DataObject, Collection], suffixes, page_size):
+            replicas.setdefault(row[DataObject.id], dict())[row[DataObject.replica_number]] = row
+
+        data_objects = [ self.make_data_object(list(rows.values())) for rows in replicas.values() ]
+        if (self._DEBUG):
+            print(f"(IRodsHelper.list_data_objects): found {len(data_objects)} data objects under '{root_path}'",
+                  file=sys.stderr)
+        return sorted(data_objects, key=lambda dobj: dobj.path)
+
+
+    def list_metadata (self, root_path, suffixes=None, page_size=QUERY_PAGE_SIZE):
+        """
+        Return a dictionary of the metadata (AVUs) attached to the data objects in the
+        collection tree under the given absolute root path, optionally limited to those whose
+        names end with one of the given suffixes (see query_tree). The dictionary is keyed by
+        the path of each data object which has metadata: each value is a tuple of Metadatum,
+        in the order the metadata were attached.
+        """
+        columns = [ DataObjectMeta.id, DataObjectMeta.name, DataObjectMeta.value,
+                    DataObject.name, Collection.name ]
+        avus = dict()                       # metadata by ID (unique over replicas), keyed by path
+        for row in self.query_tree(root_path, columns, suffixes, page_size):
+            path = f"{row[Collection.name]}/{row[DataObject.name]}"
+            avus.setdefault(path, dict())[row[DataObjectMeta.id]] = Metadatum(
+                row[DataObjectMeta.name], row[DataObjectMeta.value])
+
+        return { path: tuple(mds[md_id] for md_id in sorted(mds)) for (path, mds) in avus.items() }
+
+
+    def make_data_object (self, rows):
+        """
+        Return a data object (iRODSDataObject) built from the given catalog query result rows,
+        one row per replica, each of which contains all DataObject and Collection columns.
+        """
+        collection = iRODSCollection(self._session.collections, rows[0])
+        return iRODSDataObject(self._session.data_objects, collection, rows)
+
+
     def make_session (self):
         """
-        Create and return an iRods session using the given arguments dictionary.
+        Create and return an iRods session using the given arguments dictionary. If a local
+        root directory is specified (see get_local_root), the session is a stand-in which serves
+        that local directory tree, delaying each request by the latency (irods_latency_ms) and
+        each transfer by the bandwidth (irods_bandwidth_mbs), if given, to simulate a server.
 
         :raises: a custom FileNotFoundError if the environment or authentication
                  filepaths are not provided in the arguments, the environment,
                  or in an imported default application variable.
         """
+        local_root = self.get_local_root(self.args)
+        if (local_root):
+            latency_ms = self.args.get('irods_latency_ms') or 0
+            bandwidth_mbs = self.args.get('irods_bandwidth_mbs')
+            return LocalIRodsSession(local_root, latency=(latency_ms / 1000.0),
+                                     bandwidth=((bandwidth_mbs * 1_000_000) if bandwidth_mbs else None))
+
         env_file = self.get_environment_file(self.args)
         auth_file = self.get_authentication_file(self.args)
         return iRODSSession(irods_authentication_file=auth_file, irods_env_file=env_file)
@@ -359,6 +530,27 @@ class IRodsHelper:
             return self.cwd_rel_path(apath)       # expand to full path
 
 
+    @contextmanager
+    def pooled_session (self, timeout=None):
+        """
+        Context manager which checks a session out of the session pool for the calling thread.
+        Within the block, all operations of this helper called by that thread use the pooled
+        session, with root and current working directories initialized from the main state.
+        The session is returned to the pool, and the thread's state discarded, on exit.
+        """
+        if (getattr(self._local, 'state', None) is not None):  # already have a pooled session
+            yield self._session
+            return
+
+        with self.get_pool().session(timeout=timeout) as session:
+            self._local.state = dict(session=session, root=self._main_state['root'],
+                                     cwdpath=self._main_state['cwdpath'])
+            try:
+                yield session
+            finally:
+                self._local.state = None
+
+
     def put_file (self, local_file, file_path, absolute=False):
         """ Upload the specified local file to the specified path, relative to the iRods
             current working directory (default) OR relative to the users root directory,
@@ -374,12 +566,36 @@ class IRodsHelper:
     def put_metaf (self, file_path, metadata, absolute=False):
         """ Attach the given metadata on the file specified relative to the iRods
             current working directory (default) OR relative to the users root directory,
-            if the absolute argument is True.
+            if the absolute argument is True. Each key ends with a single value.
         """
-        obj = self.getf(file_path, absolute=absolute)
-        for key, val in metadata.items():
-            skey = str(key)
-            obj.metadata[skey] = iRODSMeta(skey, str(val))
+        return self.update_metaf(file_path, metadata, absolute=absolute)
+
+
+    def query_tree (self, root_path, columns, suffixes=None, page_size=QUERY_PAGE_SIZE):
+        """
+        Generator to yield the result rows, for the given columns (or models), of catalog queries
+        over all the data objects in the collection tree under the given absolute root path,
+        optionally limited to those whose names end with one of the given suffixes. Rather than
+        walking the tree collection by collection, this runs a few paged catalog queries: for the
+        root collection and for all collections below it, for each suffix. The suffixes are
+        matched by the server. The rows of a data object with several replicas are repeated.
+        """
+        root = str(root_path).rstrip('/') or '/'
+        below_root = root.rstrip('/') + '/'
+        coll_criteria = [ Like(Collection.name, f"{below_root}%") ]
+        if (root != '/'):
+            coll_criteria.append(Collection.name == root)
+        name_criteria = [ Like(DataObject.name, f"%{suffix}") for suffix in suffixes ] if suffixes else [ None ]
+
+        for coll_criterion in coll_criteria:
+            for name_criterion in name_criteria:
+                query = self._session.query(*columns).filter(coll_criterion)
+                if (name_criterion is not None):
+                    query = query.filter(name_criterion)
+                for row in query.limit(page_size):  # fetches all pages of results
+                    coll_name = row[Collection.name]
+                    if ((coll_name == root) or coll_name.startswith(below_root)):  # LIKE '_' is a wildcard
+                        yield row
 
 
     def remove_metaf (self, file_path, metadata, absolute=False):
@@ -387,9 +603,7 @@ class IRodsHelper:
             current working directory (default) OR relative to the users root directory,
             if the absolute argument is True.
         """
-        obj = self.getf(file_path, absolute=absolute)
-        for key in metadata.keys():
-            del(obj.metadata[key])                # deletes all metadata items with this key
+        return self.update_metaf(file_path, metadata, absolute=absolute, remove_only=True)
 
 
     def root (self):
@@ -430,6 +644,41 @@ class IRodsHelper:
         self.cd_root()                      # cd back to root after changing root dir
 
 
+    def thread_state (self):
+        """
+        Return the dictionary of session, root, and current working directory state used by
+        the calling thread: its own state while it holds a pooled session, else the main state.
+        """
+        state = getattr(self._local, 'state', None)
+        return self._main_state if (state is None) else state
+
+
+    def update_metaf (self, file_path, metadata, absolute=False, remove_only=False):
+        """
+        Change the metadata of the existing file specified relative to the iRods current working
+        directory (default) OR relative to the users root directory, if the absolute argument is
+        True, to reflect the given metadata dictionary (see metadata_changes). The current metadata
+        of the file is read once and only the differences are applied, all in one atomic operation,
+        so either all or none of the changes are made. Returns the number of items changed.
+        """
+        filepath = self.path_to(file_path, absolute)
+        current = self._session.metadata.get(DataObject, filepath)
+        (removes, adds) = self.metadata_changes(current, metadata, remove_only)
+        operations = [ AVUOperation(operation='remove', avu=avu) for avu in removes ] + \
+                     [ AVUOperation(operation='add', avu=avu) for avu in adds ]
+        if (operations):
+            try:
+                self._session.metadata.apply_atomic_operations(DataObject, filepath, *operations)
+            except SYS_UNMATCHED_API_NUM:   # older server: apply the changes one by one
+                for op in operations:
+                    getattr(self._session.metadata, op.operation)(DataObject, filepath, op.avu)
+
+        if (self._DEBUG):
+            print(f"(IRodsHelper.update_metaf): {filepath}: removed {len(removes)}, added {len(adds)}",
+                  file=sys.stderr)
+        return len(operations)
+
+
     def walk (self, root_dir=None, topdown=True):
         """
         Collection tree generator. For each subcollection in the root dir, yield a 3-tuple
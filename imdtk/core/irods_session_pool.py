@@ -0,0 +1,200 @@
+#
+# Class to manage a bounded pool of iRods sessions, shared among threads.
+#   Written by: Tom Hicks. 1/27/21.
+#   Last Modified: Name the errors which cause a session to be discarded.
+#
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from irods.exception import NetworkException
+
+
+# Default maximum number of sessions (connections) open at one time.
+DEFAULT_MAX_SESSIONS = 4
+
+# Default number of seconds a session may sit idle before it is health-checked on checkout.
+DEFAULT_CHECK_AFTER = 60
+
+# Network errors which may leave a session unusable: a session in use when one occurs is discarded.
+SESSION_FAILURES = (NetworkException, OSError, EOFError)
+
+
+class PoolExhausted (Exception):
+    """ Raised when no session becomes available within the time allowed for a checkout. """
+    pass
+
+
+class IRodsSessionPool:
+    """
+    A thread-safe pool of iRods sessions. Sessions are created on demand by a factory
+    function, up to a maximum number, then checked out to a single thread at a time and
+    returned to the pool for reuse. Sessions which have been idle for a while are
+    health-checked before being checked out again; failing sessions are replaced.
+    """
+
+    @staticmethod
+    def default_health_check (session):
+        """ Tell whether the given session can still talk to the server: query the zone collection. """
+        return session.collections.exists(f"/{session.zone}")
+
+
+    def __init__ (self, session_factory, max_sessions=DEFAULT_MAX_SESSIONS,
+                  check_after=DEFAULT_CHECK_AFTER, health_check=None, debug=False):
+        """
+        Constructor of a session pool which uses the given no-argument function to create new
+        sessions, allowing at most max_sessions to exist at one time. Idle sessions older than
+        check_after seconds are tested with the given health check function (which takes a
+        session and returns a boolean) before reuse.
+        """
+        if ((max_sessions is None) or (max_sessions < 1)):
+            raise ValueError(f"The maximum number of sessions must be positive, not '{max_sessions}'.")
+        self._DEBUG = debug
+        self._session_factory = session_factory
+        self._health_check = health_check or IRodsSessionPool.default_health_check
+        self.check_after = check_after
+        self.max_sessions = max_sessions
+        self._available = threading.Condition(threading.Lock())
+        self._idle = []                     # list of (session, time returned) pairs
+        self._in_use = set()                # ids of the sessions currently checked out
+        self._creating = 0                  # number of slots reserved for sessions being created
+        self._closed = False
+
+
+    def checkin (self, session, healthy=True):
+        """
+        Return the given session, previously checked out of this pool, for reuse. A session
+        which the caller knows to be broken should be returned with healthy=False, so that it
+        will be discarded instead.
+        """
+        with self._available:
+            self._in_use.discard(id(session))
+            if (healthy and (not self._closed)):
+                self._idle.append((session, time.monotonic()))
+                session = None
+            self._available.notify()
+        self.cleanup_session(session)
+
+
+    def checkout (self, timeout=None):
+        """
+        Return a session for the exclusive use of the calling thread until it is checked in,
+        waiting at most timeout seconds (forever if None) for a session to become available.
+
+        :raises PoolExhausted if no session becomes available within the timeout.
+        """
+        deadline = None if (timeout is None) else (time.monotonic() + timeout)
+        while (True):
+            (session, idle_since) = self._reserve(deadline)
+            if (session is None):           # a slot was reserved for a new session
+                return self._create()
+            if (self.is_healthy(session, idle_since)):
+                return session
+            self.checkin(session, healthy=False)  # discard the failed session, then try again
+
+
+    def cleanup_session (self, session):
+        """ Cleanup the given session, ignoring any errors. """
+        if (session is not None):
+            try:
+                session.cleanup()
+            except Exception as ex:
+                if (self._DEBUG):
+                    print(f"(IRodsSessionPool.cleanup_session): {ex}", file=sys.stderr)
+
+
+    def close (self):
+        """ Cleanup all idle sessions; sessions still checked out are cleaned up when returned. """
+        with self._available:
+            self._closed = True
+            idle = [ session for (session, idle_since) in self._idle ]
+            self._idle = []
+            self._available.notify_all()
+        for session in idle:
+            self.cleanup_session(session)
+
+
+    def is_healthy (self, session, idle_since):
+        """
+        Tell whether the given session, idle since the given (monotonic) time, may be reused.
+        Recently used sessions are assumed to be healthy, others are checked with the server.
+        """
+        if ((time.monotonic() - idle_since) < self.check_after):
+            return True
+        try:
+            return bool(self._health_check(session))
+        except Exception as ex:
+            if (self._DEBUG):
+                print(f"(IRodsSessionPool.is_healthy): health check failed: {ex}", file=sys.stderr)
+            return False
+
+
+    @contextmanager
+    def session (self, timeout=None):
+        """
+        Context manager which checks out a session for the duration of a block and returns it
+        to the pool afterwards. A session in use when an iRods network error occurs is discarded.
+        """
+        session = self.checkout(timeout=timeout)
+        healthy = False
+        try:
+            yield session
+            healthy = True
+        except SESSION_FAILURES:            # network errors may leave the session unusable
+            raise
+        except Exception:                   # other errors do not reflect on the session
+            healthy = True
+            raise
+        finally:
+            self.checkin(session, healthy=healthy)
+
+
+    def stats (self):
+        """ Return a dictionary of the numbers of idle and checked out sessions. """
+        with self._available:
+            return { 'idle': len(self._idle), 'in_use': len(self._in_use) + self._creating,
+                     'max_sessions': self.max_sessions }
+
+
+    def _create (self):
+        """ Create a new session for the slot already reserved by the calling thread. """
+        try:
+            session = self._session_factory()
+        except BaseException:
+            with self._available:           # give back the reserved slot
+                self._creating -= 1
+                self._available.notify()
+            raise
+        with self._available:
+            self._creating -= 1
+            self._in_use.add(id(session))
+        if (self._DEBUG):
+            print(f"(IRodsSessionPool._create): created session {session}", file=sys.stderr)
+        return session
+
+
+    def _reserve (self, deadline):
+        """
+        Wait until an idle session or a free slot is available, then return a pair of the idle
+        session and the time it became idle, or (None, None) if a slot for a new session was
+        reserved instead.
+
+        :raises PoolExhausted if the deadline (a monotonic time or None) passes before then.
+        """
+        with self._available:
+            while (True):
+                if (self._closed):
+                    raise PoolExhausted("The iRods session pool has been closed.")
+                if (self._idle):
+                    (session, idle_since) = self._idle.pop()  # most recently used first
+                    self._in_use.add(id(session))
+                    return (session, idle_since)
+                if ((len(self._in_use) + self._creating) < self.max_sessions):
+                    self._creating += 1     # reserve a slot for the session about to be created
+                    return (None, None)
+                remaining = None if (deadline is None) else (deadline - time.monotonic())
+                if ((remaining is not None) and (remaining <= 0)):
+                    raise PoolExhausted(
+                        f"No iRods session became available: all {self.max_sessions} are in use.")
+                self._available.wait(remaining)
@@ -0,0 +1,831 @@
+#
+# A stand-in for an iRods session, backed by a local directory tree, for offline benchmarking.
+#   Written by: Tom Hicks. 1/29/21.
+#   Last Modified: Batch the writes of the store file, until the sessions are cleaned up.
+#
+import atexit
+import base64
+import copy
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+from irods.collection import iRODSCollection
+from irods.column import Criterion
+from irods.data_object import iRODSDataObject
+from irods.exception import CollectionDoesNotExist, DataObjectDoesNotExist
+from irods.exception import MultipleResultsFound, NoResultFound
+from irods.meta import iRODSMeta
+from irods.models import Collection, DataObject, DataObjectMeta, Model
+
+
+# Name of the file, in the local root directory, which holds the metadata of the local tree.
+METADATA_STORE_FILENAME = '.irods_metadata.json'
+
+# Default zone and user names, used when they cannot be inferred from the local tree.
+DEFAULT_ZONE = 'tempZone'
+DEFAULT_USERNAME = 'rods'
+
+# Server version reported by local sessions.
+LOCAL_SERVER_VERSION = (4, 2, 8)
+
+# Default number of rows returned in each page of results from a catalog query (as for iRods).
+DEFAULT_PAGE_SIZE = 500
+
+# Name of the (only) resource holding the replicas of local files.
+LOCAL_RESOURCE = 'localResc'
+
+
+class LocalStore:
+    """
+    The state shared by all the local sessions over one local root directory: the metadata
+    attached to files and collections and the registered file checksums, persisted in a
+    JSON file within the root directory, and the counts of simulated server requests.
+    Changes are batched: the file is rewritten only when the store is saved, which is done
+    when a session is cleaned up and when the program exits.
+    """
+
+    def __init__ (self, root):
+        """ Constructor of the store for the given local root directory. """
+        self.root = root
+        self.filepath = os.path.join(root, METADATA_STORE_FILENAME)
+        self.lock = threading.RLock()
+        self.save_lock = threading.Lock()  # serializes writes of the file, outside the main lock
+        self.changed = False                # has the data changed since the file was written?
+        self.calls = 0                      # number of simulated server requests
+        self.bytes = 0                      # number of file bytes transferred
+        self.data = dict(next_id=1, avus=dict(DataObject=dict(), Collection=dict()), checksums=dict())
+        if (os.path.isfile(self.filepath)):
+            with open(self.filepath) as store_file:
+                self.data.update(json.load(store_file))
+        for model_name in ('DataObject', 'Collection'):
+            self.data['avus'].setdefault(model_name, dict())
+
+
+    def charge (self, calls=1, nbytes=0):
+        """ Count the given number of requests and file bytes transferred. """
+        with self.lock:
+            self.calls += calls
+            self.bytes += nbytes
+
+
+    def mark_changed (self):
+        """ Note that the data has changed and must be written by the next save. The caller holds the lock. """
+        self.changed = True
+
+
+    def save (self):
+        """
+        Write the store to its file, if changed, atomically replacing any previous version.
+        Only the copying of the data holds the lock: the file is written outside it.
+        """
+        with self.save_lock:
+            with self.lock:
+                if (not self.changed):
+                    return
+                contents = json.dumps(self.data)
+                self.changed = False
+            temp_path = f"{self.filepath}.tmp"
+            with open(temp_path, 'w') as store_file:
+                store_file.write(contents)
+            os.replace(temp_path, self.filepath)
+
+
+    def stats (self):
+        """ Return a dictionary of the numbers of simulated requests and bytes transferred. """
+        with self.lock:
+            return { 'calls': self.calls, 'bytes': self.bytes }
+
+
+_STORES = dict()                            # shared stores, keyed by real path of the local root
+_STORES_LOCK = threading.Lock()
+
+
+def coerce (value, target):
+    """ Return the given target converted, if possible, to the type of the given value. """
+    if (isinstance(value, int) and isinstance(target, str)):
+        try:
+            return int(target)
+        except ValueError:
+            return target
+    if (isinstance(value, datetime) and isinstance(target, (int, float))):
+        return datetime.fromtimestamp(target, timezone.utc)
+    return target
+
+
+def get_store (root):
+    """ Return the store shared by all sessions over the given local root directory. """
+    with _STORES_LOCK:
+        real_root = os.path.realpath(root)
+        if (real_root not in _STORES):
+            _STORES[real_root] = LocalStore(real_root)
+        return _STORES[real_root]
+
+
+@atexit.register
+def save_stores ():
+    """ Write the changes of all the shared stores, whose root directories remain, to their files. """
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+    for store in stores:
+        if (os.path.isdir(store.root)):
+            store.save()
+
+
+def in_model (column, model):
+    """ Tell whether the given column belongs to the given model (NB: Column == makes Criteria). """
+    return any((column is col) for col in model._columns)
+
+
+def matches (criterion, row):
+    """ Tell whether the given row satisfies the given query criterion. """
+    value = row.get(criterion.query_key)
+    target = criterion.value
+    if (criterion.op in ('like', 'not like')):
+        pattern = ''.join(('.*' if (char == '%') else '.' if (char == '_') else re.escape(char))
+                          for char in str(target))
+        found = (value is not None) and (re.fullmatch(pattern, str(value), re.DOTALL) is not None)
+        return found if (criterion.op == 'like') else (not found)
+    if (value is None):
+        return False
+    if (criterion.op == 'in'):
+        return any((value == coerce(value, item)) for item in target)
+    if (criterion.op == 'between'):
+        return coerce(value, target[0]) <= value <= coerce(value, target[1])
+    target = coerce(value, target)
+    return { '=': value == target, '<>': value != target, '<': value < target,
+             '>': value > target, '<=': value <= target, '>=': value >= target }[criterion.op]
+
+
+def model_columns (model_or_column):
+    """ Return a list of the columns of the given model class, or a list of the given column. """
+    if (isinstance(model_or_column, type) and issubclass(model_or_column, Model)):
+        return list(model_or_column._columns)
+    return [ model_or_column ]
+
+
+def to_time (seconds):
+    """ Return the given POSIX timestamp as a UTC datetime, truncated to the second (as for iRods). """
+    return datetime.fromtimestamp(int(seconds), timezone.utc)
+
+
+class LocalQuery:
+    """
+    Stand-in for an iRods catalog query (GenQuery) over the local tree. The query results
+    are rows of the selected columns for data objects, their metadata (AVUs), or collections,
+    depending on the models of the columns selected or filtered on. Like iRods, the limit sets
+    the size of the pages in which results are fetched: each page costs one request.
+    """
+
+    def __init__ (self, session, columns, criteria=(), page_size=DEFAULT_PAGE_SIZE,
+                  offset=0, order=()):
+        self.session = session
+        self.columns = columns
+        self.criteria = list(criteria)
+        self.page_size = page_size
+        self._offset = offset
+        self.order = list(order)
+
+
+    def __iter__ (self):
+        return self.get_results()
+
+
+    def add_keyword (self, *args, **kwargs):
+        """ Query keywords have no effect on local queries. """
+        return self
+
+
+    def all (self):
+        """ Return a list of all the result rows. """
+        return list(self.get_results())
+
+
+    def copy (self, **changes):
+        """ Return a copy of this query with the given attributes changed. """
+        query = copy.copy(self)
+        query.criteria = list(self.criteria)
+        query.order = list(self.order)
+        for (name, value) in changes.items():
+            setattr(query, name, value)
+        return query
+
+
+    def filter (self, *criteria):
+        """ Return a copy of this query, further restricted by the given criteria. """
+        return self.copy(criteria=self.criteria + list(criteria))
+
+
+    def first (self):
+        """ Return the first result row, or None if there are no results. """
+        for row in self.get_results():
+            return row
+        return None
+
+
+    def get_batches (self):
+        """ Generator to yield the result rows in pages (lists), charging a request per page. """
+        rows = self.session.select_rows(self.selected_columns(), self.criteria)
+        for (column, descending) in reversed(self.order):
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=descending)
+        rows = rows[self._offset:]
+        npages = max(1, math.ceil(len(rows) / self.page_size))
+        for page in range(npages):
+            self.session.delay()
+            yield rows[(page * self.page_size):((page + 1) * self.page_size)]
+
+
+    def get_results (self):
+        """ Generator to yield all of the result rows, from all pages. """
+        for batch in self.get_batches():
+            yield from batch
+
+
+    def limit (self, page_size):
+        """ Return a copy of this query which fetches results in pages of the given size. """
+        return self.copy(page_size=page_size)
+
+
+    def offset (self, offset):
+        """ Return a copy of this query which skips the given number of result rows. """
+        return self.copy(_offset=offset)
+
+
+    def one (self):
+        """
+        Return the only result row.
+
+        :raises NoResultFound or MultipleResultsFound unless there is exactly one row.
+        """
+        rows = self.all()
+        if (not rows):
+            raise NoResultFound()
+        if (len(rows) > 1):
+            raise MultipleResultsFound()
+        return rows[0]
+
+
+    def order_by (self, column, order='asc'):
+        """ Return a copy of this query whose results are sorted by the given column. """
+        return self.copy(order=self.order + [ (column, (order == 'desc')) ])
+
+
+    def selected_columns (self):
+        """ Return the list of columns selected by this query. """
+        return [ col for arg in self.columns for col in model_columns(arg) ]
+
+
+class LocalFileRaw (io.RawIOBase):
+    """ A raw file object for a local file which charges a request for each read, write, and seek. """
+
+    def __init__ (self, session, fd):
+        super().__init__()
+        self.session = session
+        self.fd = fd
+
+
+    def close (self):
+        if (not self.closed):
+            self.fd.close()
+            self.session.delay()
+        super().close()
+
+
+    def readable (self):
+        return self.fd.readable()
+
+
+    def readinto (self, buffer):
+        count = self.fd.readinto(buffer)
+        self.session.delay(nbytes=count or 0)
+        return count
+
+
+    def seek (self, offset, whence=io.SEEK_SET):
+        self.session.delay()
+        return self.fd.seek(offset, whence)
+
+
+    def seekable (self):
+        return True
+
+
+    def tell (self):
+        return self.fd.tell()
+
+
+    def writable (self):
+        return self.fd.writable()
+
+
+    def write (self, data):
+        count = self.fd.write(data)
+        self.session.delay(nbytes=count or 0)
+        return count
+
+
+class LocalManager:
+    """ Base class of the managers of a local session. """
+
+    def __init__ (self, session):
+        self.sess = session
+
+
+class LocalCollectionManager (LocalManager):
+    """ Stand-in for the iRods collection manager, over the directories of the local tree. """
+
+    def create (self, path, recurse=True, **options):
+        """ Create the collection at the given path, and any missing parents, and return it. """
+        self.sess.delay()
+        os.makedirs(self.sess.local_path(path, CollectionDoesNotExist), exist_ok=True)
+        return self.get(path)
+
+
+    def exists (self, path):
+        """ Tell whether there is a collection at the given path. """
+        self.sess.delay()
+        try:
+            return os.path.isdir(self.sess.local_path(path, CollectionDoesNotExist))
+        except CollectionDoesNotExist:
+            return False
+
+
+    def get (self, path):
+        """
+        Return the collection (iRODSCollection) at the given path.
+
+        :raises irods.exception.CollectionDoesNotExist if there is no such collection.
+        """
+        self.sess.delay()
+        return iRODSCollection(self, self.sess.collection_row(str(path)))
+
+
+    def remove (self, path, recurse=True, force=False, **options):
+        """ Remove the collection at the given path, with its contents when recurse is True. """
+        self.sess.delay()
+        path = str(path).rstrip('/')
+        local_path = self.sess.local_path(path, CollectionDoesNotExist)
+        if (not os.path.isdir(local_path)):
+            raise CollectionDoesNotExist(path)
+        if (recurse):
+            shutil.rmtree(local_path)
+        else:
+            os.rmdir(local_path)
+        self.sess.forget(path, tree=True)
+
+
+class LocalDataObjectManager (LocalManager):
+    """ Stand-in for the iRods data object manager, over the files of the local tree. """
+
+    def chksum (self, path, **options):
+        """
+        Return the SHA-256 checksum of the file at the given path, in iRods format, computing it
+        (as the server would, without a transfer) and registering it only if it is not current.
+        """
+        self.sess.delay()
+        return self.sess.checksum(str(path), compute=True)
+
+
+    def exists (self, path):
+        """ Tell whether there is a data object at the given path. """
+        self.sess.delay()
+        try:
+            return os.path.isfile(self.sess.local_path(path, DataObjectDoesNotExist))
+        except DataObjectDoesNotExist:
+            return False
+
+
+    def get (self, path, local_path=None, **options):
+        """
+        Return the data object (iRODSDataObject) at the given path, first copying its
+        contents to the given local path, if any.
+
+        :raises irods.exception.DataObjectDoesNotExist if there is no such data object.
+        """
+        self.sess.delay()
+        row = self.sess.data_object_row(str(path))
+        if (local_path):
+            self.sess.copy_file(row[DataObject.path], local_path)
+        collection = iRODSCollection(self.sess.collections, row)
+        return iRODSDataObject(self, collection, [ row ])
+
+
+    def open (self, path, mode, finalize_on_close=True, **options):
+        """ Open the data object at the given path and return a buffered file object for it. """
+        self.sess.delay()
+        local_path = self.sess.local_path(path, DataObjectDoesNotExist)
+        if (('r' in mode) and (not os.path.isfile(local_path))):
+            raise DataObjectDoesNotExist(str(path))
+        local_mode = { 'r': 'rb', 'w': 'wb', 'a': 'ab', 'r+': 'r+b', 'w+': 'w+b', 'a+': 'a+b' }.get(
+            mode.replace('b', ''), 'rb')
+        raw = LocalFileRaw(self.sess, open(local_path, local_mode))
+        return io.BufferedReader(raw) if (local_mode == 'rb') else io.BufferedRandom(raw)
+
+
+    def put (self, local_path, path, **options):
+        """ Copy the given local file to the given path, or into the collection at that path. """
+        self.sess.delay()
+        path = str(path)
+        if (os.path.isdir(self.sess.local_path(path, DataObjectDoesNotExist))):
+            path = f"{path.rstrip('/')}/{os.path.basename(local_path)}"
+        self.sess.copy_file(local_path, self.sess.local_path(path, DataObjectDoesNotExist))
+        self.sess.forget(path)
+
+
+    def unlink (self, path, force=False, **options):
+        """ Remove the data object at the given path. """
+        self.sess.delay()
+        local_path = self.sess.local_path(path, DataObjectDoesNotExist)
+        if (not os.path.isfile(local_path)):
+            raise DataObjectDoesNotExist(str(path))
+        os.remove(local_path)
+        self.sess.forget(str(path))
+
+
+class LocalMetadataManager (LocalManager):
+    """ Stand-in for the iRods metadata manager, over the metadata of the local store. """
+
+    def __init__ (self, session, **opts):
+        super().__init__(session)
+        self._opts = dict(admin=False, timestamps=False, iRODSMeta_type=iRODSMeta, reload=True)
+        self._opts.update(opts)
+
+
+    def __call__ (self, **opts):
+        """ Return a copy of this manager with the given options. """
+        return LocalMetadataManager(self.sess, **dict(self._opts, **opts))
+
+
+    def add (self, model, path, meta, **opts):
+        """ Attach the given metadata item (iRODSMeta) to the object at the given path. """
+        self.apply(model, path, [ ('add', meta) ])
+
+
+    def apply (self, model, path, changes):
+        """
+        Apply the given list of (operation, iRODSMeta) changes to the metadata of the object
+        of the given model at the given path, all at once, in a single request.
+        """
+        self.sess.delay()
+        path = str(path)
+        self.sess.check_exists(model, path)
+        store = self.sess.store
+        with store.lock:
+            avus = store.data['avus'][model.__name__]
+            avu_list = list(avus.get(path, []))
+            for (operation, meta) in changes:
+                key = [ meta.name, meta.value, meta.units ]
+                if (operation == 'add'):
+                    if (not any((avu[1:] == key) for avu in avu_list)):
+                        avu_list.append([ store.data['next_id'] ] + key)
+                        store.data['next_id'] += 1
+                elif (operation == 'set'):
+                    avu_list = [ avu for avu in avu_list if (avu[1] != meta.name) ]
+                    avu_list.append([ store.data['next_id'] ] + key)
+                    store.data['next_id'] += 1
+                else:
+                    avu_list = [ avu for avu in avu_list if (avu[1:] != key) ]
+            if (avu_list):
+                avus[path] = avu_list
+            else:
+                avus.pop(path, None)
+            store.mark_changed()
+
+
+    def apply_atomic_operations (self, model, path, *operations):
+        """ Apply the given AVU operations (AVUOperation) to the object at the given path, atomically. """
+        self.apply(model, path, [ (op.operation, op.avu) for op in operations ])
+
+
+    def get (self, model, path):
+        """ Return a list of the metadata items (iRODSMeta) attached to the object at the given path. """
+        if (model is None):
+            return []
+        self.sess.delay()
+        return [ iRODSMeta(name, value, units, avu_id=avu_id)
+                 for (avu_id, name, value, units) in self.sess.avus(model, str(path)) ]
+
+
+    def remove (self, model, path, meta, **opts):
+        """ Remove the given metadata item (iRODSMeta) from the object at the given path. """
+        self.apply(model, path, [ ('remove', meta) ])
+
+
+    def set (self, model, path, meta, **opts):
+        """ Replace all metadata items with the name of the given item by the given item. """
+        self.apply(model, path, [ ('set', meta) ])
+
+
+class LocalIRodsSession:
+    """
+    A stand-in for an iRods session (iRODSSession) which serves the iRods namespace from a local
+    directory tree: the directory at the local root is the iRods root collection ('/'), its
+    subdirectories are collections, and its files are data objects. The metadata attached to
+    files and collections is kept in a JSON file in the local root. The session implements the
+    calls used by ImdTk: collection and data object get/exists/create/put/open/unlink, reading,
+    writing, and seeking open files, catalog queries (so collection walks work), and metadata
+    get/add/remove/set and atomic operations.
+
+    To make benchmarks of remote access reproducible, each simulated server request is delayed
+    by the given latency (in seconds), and transfers of file contents by the time taken at the
+    given bandwidth (in bytes per second). The requests and bytes are counted (see stats).
+    """
+
+    @staticmethod
+    def single_subdir (dir_path):
+        """ Return the name of the only (non-hidden) subdirectory of the given directory, or None. """
+        if (not os.path.isdir(dir_path)):
+            return None
+        subdirs = [ entry.name for entry in os.scandir(dir_path)
+                    if (entry.is_dir() and (not entry.name.startswith('.'))) ]
+        return subdirs[0] if (len(subdirs) == 1) else None
+
+
+    def __init__ (self, root, zone=None, username=None, latency=0.0, bandwidth=None):
+        """
+        Constructor of a session over the given local root directory. When not given, the zone
+        and user names are inferred from the directory tree, which is then expected to hold
+        a single zone directory containing a home directory with a single user directory.
+        The user's home collection is created if it does not already exist.
+        """
+        self.root = os.path.realpath(root)
+        if (not os.path.isdir(self.root)):
+            raise FileNotFoundError(f"Local iRods root directory '{root}' not found.")
+        self.zone = zone or self.single_subdir(self.root) or DEFAULT_ZONE
+        self.username = username or self.single_subdir(os.path.join(self.root, self.zone, 'home')) \
+            or DEFAULT_USERNAME
+        self.latency = latency or 0.0
+        self.bandwidth = bandwidth
+        self.server_version = LOCAL_SERVER_VERSION
+        self.store = get_store(self.root)
+        self.collections = LocalCollectionManager(self)
+        self.data_objects = LocalDataObjectManager(self)
+        self.metadata = LocalMetadataManager(self)
+        os.makedirs(self.local_path(f"/{self.zone}/home/{self.username}"), exist_ok=True)
+
+
+    def avus (self, model, path):
+        """ Return a list of the [id, name, value, units] metadata of the object at the given path. """
+        with self.store.lock:
+            return [ list(avu) for avu in self.store.data['avus'][model.__name__].get(path, []) ]
+
+
+    def check_exists (self, model, path):
+        """
+        Check that an object of the given model exists at the given path.
+
+        :raises irods.exception.DataObjectDoesNotExist or CollectionDoesNotExist if it does not.
+        """
+        if (model is Collection):
+            if (not os.path.isdir(self.local_path(path, CollectionDoesNotExist))):
+                raise CollectionDoesNotExist(path)
+        elif (not os.path.isfile(self.local_path(path, DataObjectDoesNotExist))):
+            raise DataObjectDoesNotExist(path)
+
+
+    def checksum (self, path, compute=False):
+        """
+        Return the registered checksum of the file at the given path, if it is still current.
+        Otherwise return None or, if compute is True, compute, register, and return the checksum.
+        """
+        local_path = self.local_path(path, DataObjectDoesNotExist)
+        stat = os.stat(local_path)
+        with self.store.lock:
+            entry = self.store.data['checksums'].get(path)
+        if (entry and (entry[:2] == [ stat.st_size, stat.st_mtime_ns ])):
+            return entry[2]
+        if (not compute):
+            return None
+        sha = hashlib.sha256()
+        with open(local_path, 'rb') as local_file:
+            for chunk in iter(lambda: local_file.read(io.DEFAULT_BUFFER_SIZE * 128), b''):
+                sha.update(chunk)
+        checksum = 'sha2:' + base64.b64encode(sha.digest()).decode('ascii')
+        with self.store.lock:
+            self.store.data['checksums'][path] = [ stat.st_size, stat.st_mtime_ns, checksum ]
+            self.store.mark_changed()
+        return checksum
+
+
+    def cleanup (self):
+        """ Local sessions hold no connections: just write any changes of the shared store. """
+        self.store.save()
+
+
+    def collection_paths (self, criteria):
+        """
+        Return a list of the paths of the collections which the given query criteria could
+        select: those named by an equality criterion on the collection or parent collection
+        name, or those matching a fixed prefix of the collection name, else all collections.
+        """
+        for crit in criteria:
+            if ((crit.op == '=') and (crit.query_key is Collection.name)):
+                return [ str(crit.value).rstrip('/') or '/' ]
+            if ((crit.op == '=') and (crit.query_key is Collection.parent_name)):
+                parent = str(crit.value).rstrip('/') or '/'
+                return [ f"{parent.rstrip('/')}/{name}" for name in self.list_dir(parent)[0] ]
+        top = '/'
+        for crit in criteria:
+            if ((crit.op == 'like') and (crit.query_key is Collection.name)):
+                prefix = re.split('[%_]', str(crit.value), maxsplit=1)[0]  # before any wildcard
+                prefix_dir = prefix[:prefix.rfind('/')] or '/'
+                if (len(prefix_dir) > len(top)):
+                    top = prefix_dir
+        return self.tree_paths(top)
+
+
+    def collection_row (self, path):
+        """
+        Return a catalog row, of all Collection columns, for the collection at the given path.
+
+        :raises irods.exception.CollectionDoesNotExist if there is no such collection.
+        """
+        path = path.rstrip('/') or '/'
+        local_path = self.local_path(path, CollectionDoesNotExist)
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            raise CollectionDoesNotExist(path)
+        if (not os.path.isdir(local_path)):
+            raise CollectionDoesNotExist(path)
+        row = { col: None for col in Collection._columns }
+        row.update({
+            Collection.id: stat.st_ino, Collection.name: path,
+            Collection.parent_name: (path.rsplit('/', 1)[0] or '/'),
+            Collection.owner_name: self.username, Collection.owner_zone: self.zone,
+            Collection.create_time: to_time(stat.st_ctime),
+            Collection.modify_time: to_time(stat.st_mtime), Collection.inheritance: '0'
+        })
+        return row
+
+
+    def copy_file (self, source, destination):
+        """ Copy the source file to the destination file, charging for the transfer. """
+        shutil.copyfile(source, destination)
+        self.delay(nbytes=os.path.getsize(destination))
+
+
+    def data_object_row (self, path, coll_row=None, stat=None):
+        """
+        Return a catalog row, of all DataObject and Collection columns, for the (single replica)
+        data object at the given path, given the row of its collection, if already known.
+
+        :raises irods.exception.DataObjectDoesNotExist if there is no such data object.
+        """
+        (coll_path, name) = path.rsplit('/', 1)
+        coll_path = coll_path or '/'
+        local_path = self.local_path(path, DataObjectDoesNotExist)
+        try:
+            stat = stat or os.stat(local_path)
+            coll_row = coll_row or self.collection_row(coll_path)
+        except (OSError, CollectionDoesNotExist):
+            raise DataObjectDoesNotExist(path)
+        if (not os.path.isfile(local_path)):
+            raise DataObjectDoesNotExist(path)
+        row = { col: None for col in DataObject._columns }
+        row.update(coll_row)
+        row.update({
+            DataObject.id: stat.st_ino, DataObject.name: name,
+            DataObject.collection_id: coll_row[Collection.id],
+            DataObject.size: stat.st_size, DataObject.replica_number: 0,
+            DataObject.replica_status: '1', DataObject.resource_name: LOCAL_RESOURCE,
+            DataObject.resc_hier: LOCAL_RESOURCE, DataObject.path: local_path,
+            DataObject.checksum: self.checksum(path), DataObject.comments: '',
+            DataObject.owner_name: self.username, DataObject.owner_zone: self.zone,
+            DataObject.create_time: to_time(stat.st_ctime),
+            DataObject.modify_time: to_time(stat.st_mtime)
+        })
+        return row
+
+
+    def data_rows (self, coll_paths):
+        """ Return a list of the rows of all the data objects in the collections at the given paths. """
+        rows = []
+        for coll_path in coll_paths:
+            try:
+                coll_row = self.collection_row(coll_path)
+            except CollectionDoesNotExist:
+                continue
+            for name in self.list_dir(coll_path)[1]:
+                try:
+                    rows.append(self.data_object_row(f"{coll_path.rstrip('/')}/{name}", coll_row))
+                except DataObjectDoesNotExist:  # removed while listing
+                    pass
+        return rows
+
+
+    def delay (self, nbytes=0):
+        """
+        Simulate one request to the server, transferring the given number of file bytes:
+        count it and wait for the latency plus the transfer time at the session bandwidth.
+        """
+        self.store.charge(nbytes=nbytes)
+        wait = self.latency + ((nbytes / self.bandwidth) if (self.bandwidth and nbytes) else 0)
+        if (wait > 0):
+            time.sleep(wait)
+
+
+    def forget (self, path, tree=False):
+        """ Drop the metadata and checksum of the object at (or, if tree, objects under) the given path. """
+        below = f"{path.rstrip('/')}/"
+        with self.store.lock:
+            tables = list(self.store.data['avus'].values()) + [ self.store.data['checksums'] ]
+            changed = False
+            for table in tables:
+                for key in [ key for key in table if ((key == path) or (tree and key.startswith(below))) ]:
+                    del table[key]
+                    changed = True
+            if (changed):
+                self.store.mark_changed()
+
+
+    def list_dir (self, path):
+        """
+        Return a pair of lists of the sorted names of the subdirectories and of the files in the
+        local directory for the collection at the given path (empty if there is no such directory).
+        """
+        try:
+            entries = list(os.scandir(self.local_path(path, CollectionDoesNotExist)))
+        except (OSError, CollectionDoesNotExist):
+            return ([], [])
+        skip = (METADATA_STORE_FILENAME, f"{METADATA_STORE_FILENAME}.tmp") if (path == '/') else ()
+        dirs = sorted(entry.name for entry in entries if entry.is_dir())
+        files = sorted(entry.name for entry in entries
+                       if (entry.is_file() and (entry.name not in skip)))
+        return (dirs, files)
+
+
+    def local_path (self, path, not_found=DataObjectDoesNotExist):
+        """
+        Return the local filesystem path for the given absolute iRods path.
+
+        :raises the given not found exception if the path is not absolute or leaves the local tree.
+        """
+        path = str(path)
+        parts = [ part for part in path.split('/') if part ]
+        if ((not path.startswith('/')) or any((part in ('.', '..')) for part in parts)):
+            raise not_found(path)
+        return os.path.join(self.root, *parts)
+
+
+    def meta_rows (self, row):
+        """ Return a list of rows, one for each metadata item of the data object of the given row. """
+        meta_rows = []
+        path = f"{row[Collection.name].rstrip('/')}/{row[DataObject.name]}"
+        for (avu_id, name, value, units) in self.avus(DataObject, path):
+            meta_row = dict(row)
+            meta_row.update({ DataObjectMeta.id: avu_id, DataObjectMeta.name: name,
+                              DataObjectMeta.value: value, DataObjectMeta.units: units })
+            meta_rows.append(meta_row)
+        return meta_rows
+
+
+    def query (self, *columns):
+        """ Return a catalog query (LocalQuery) for the given columns or models. """
+        return LocalQuery(self, columns)
+
+
+    def select_rows (self, columns, criteria):
+        """
+        Return a list of the rows, restricted to the given columns, which satisfy the given
+        criteria. The rows describe metadata items, data objects, or collections, depending on
+        the models of the columns selected or filtered on.
+        """
+        used = columns + [ crit.query_key for crit in criteria if isinstance(crit, Criterion) ]
+        coll_paths = self.collection_paths(criteria)
+        if (any(in_model(col, DataObjectMeta) for col in used)):
+            rows = [ meta_row for row in self.data_rows(coll_paths) for meta_row in self.meta_rows(row) ]
+        elif (any(in_model(col, DataObject) for col in used)):
+            rows = self.data_rows(coll_paths)
+        else:
+            rows = []
+            for path in coll_paths:
+                try:
+                    rows.append(self.collection_row(path))
+                except CollectionDoesNotExist:
+                    pass
+        return [ { col: row.get(col) for col in columns }
+                 for row in rows if all(matches(crit, row) for crit in criteria) ]
+
+
+    def stats (self):
+        """ Return a dictionary of the numbers of simulated requests and bytes transferred. """
+        return self.store.stats()
+
+
+    def tree_paths (self, top):
+        """ Return a sorted list of the paths of the collection at the given path and all below it. """
+        paths = []
+        pending = [ top ]
+        while (pending):
+            path = pending.pop()
+            paths.append(path)
+            pending.extend(f"{path.rstrip('/')}/{name}" for name in self.list_dir(path)[0])
+        return sorted(paths) if os.path.isdir(self.local_path(top, CollectionDoesNotExist)) else []
@@ -1,11 +1,75 @@
 #
 # Miscellaneous Utility Methods.
 #   Written by: Tom Hicks. 5/22/2020.
-#   Last Modified: Add product function.
+#   Last Modified: Add batching generator.
 #
 import json
 import operator
+import queue
+import threading
 from functools import reduce
+from itertools import islice
+
+
+# marker placed on a read-ahead queue when the producing generator is exhausted
+_READ_AHEAD_END = object()
+
+
+def gen_batches (iterable, batch_size):
+    """
+    Generator to yield lists of (up to) batch_size consecutive items of the given iterable.
+    Only the last list yielded may be shorter than batch_size.
+    """
+    iterator = iter(iterable)
+    batch_size = max(1, batch_size)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if (not batch):
+            return
+        yield batch
+
+
+def gen_read_ahead (producer, depth=2):
+    """
+    Generator to yield the items of the given producer iterable while a background
+    thread runs ahead, fetching up to depth items before they are requested. This lets
+    slow (e.g., network) reads overlap with the processing of previously fetched items.
+    Any exception raised by the producer is re-raised, in the calling thread, in order.
+    """
+    fetched = queue.Queue(maxsize=max(1, depth))
+    stopped = threading.Event()
+
+    def put (item):                         # enqueue unless the consumer has gone away
+        while (not stopped.is_set()):
+            try:
+                fetched.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce ():
+        try:
+            for item in producer:
+                if (not put((item, None))):
+                    return
+            put((_READ_AHEAD_END, None))
+        except Exception as ex:
+            put((None, ex))
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            (item, error) = fetched.get()
+            if (error is not None):
+                raise error
+            if (item is _READ_AHEAD_END):
+                return
+            yield item
+    finally:
+        stopped.set()                       # release producer if stopped early
+        worker.join()
 
 
 def get_in (a_dictionary, keys):
@@ -1,8 +1,10 @@
 #
 # Module to curate FITS data with a PostgreSQL database.
 #   Written by: Tom Hicks. 7/24/2020.
-#   Last Modified: Set priviledges for newly created tables. Replace most format strings.
+#   Last Modified: Add generation of SQL to delete the rows of a file.
 #
+import re
+
 from config.settings import DEC_ALIASES, ID_ALIASES, RA_ALIASES, SQL_FIELDS_HYBRID
 import imdtk.exceptions as errors
 from imdtk.core.misc_utils import keep_characters, missing_entries, to_JSON
@@ -11,7 +13,7 @@ from string import ascii_letters, digits
 
 UNSUPPORTED = 'UNSUPPORTED'
 
-# Map FITS format codes (TDISPn keywords) to PostgreSQL data type declarations.
+# Map FITS format codes (TFORMn and TDISPn keywords) to PostgreSQL data type declarations.
 #
 # Format
 # Code     Description                     8-bit bytes
@@ -33,8 +35,13 @@ UNSUPPORTED = 'UNSUPPORTED'
 # X        bit                             *
 # Z        hexadecimal integer             1
 #
+# Complex values are stored as two element [real, imaginary] arrays. Array descriptors (P & Q)
+# are mapped to arrays of their element type by fits_format_to_sql.
+#
 _FITS_FORMAT_TO_SQL = {
     'A': 'text',
+    'B': 'smallint',
+    'C': 'real[]',
     'D': 'double precision',
     'E': 'real',
     'F': 'real',
@@ -42,16 +49,37 @@ _FITS_FORMAT_TO_SQL = {
     'J': 'integer',
     'K': 'bigint',
     'L': 'boolean',
+    'M': 'double precision[]',
     'O': 'bytea',
     'X': 'bit',
     'Z': 'bytea',
-    'B': UNSUPPORTED,  # 'Unsigned byte',
-    'C': UNSUPPORTED,  # 'single precision complex',
-    'M': UNSUPPORTED,  # 'double precision complex',
-    'P': UNSUPPORTED,  # 'array descriptor',
-    'Q': UNSUPPORTED,  # 'array descriptor'
+    'P': UNSUPPORTED,  # 'array descriptor': handled separately
+    'Q': UNSUPPORTED,  # 'array descriptor': handled separately
+}
+
+# FITS integer format codes whose values may be offset (TZEROn) or scaled (TSCALn).
+_FITS_INTEGER_CODES = [ 'B', 'I', 'J', 'K' ]
+
+# Map FITS integer format codes to the TZEROn offset which marks the FITS conventions for
+# signed bytes and unsigned integers (FITS 4.0: table 19) and to the wider SQL type required.
+_FITS_TZERO_TO_SQL = {
+    'B': (-128, 'smallint'),
+    'I': (32768, 'integer'),
+    'J': (2147483648, 'bigint'),
+    'K': (9223372036854775808, 'numeric(20)'),
 }
 
+# Regular expression to split a FITS format into a repeat count, a type code, and a trailing
+# display width, with optional EN/ES variant and exponent width (TDISPn, e.g. ES12.4E2),
+# or an array descriptor element type & maximum length (TFORMn).
+_FITS_FORMAT_REGEX = re.compile(r'^\s*(\d*)([A-Z])(?:([A-Z])(?:\(\d*\))?|[NS]?[\d.]*(?:E\d+)?)\s*$')
+
+# Escapes for the characters which are special within a COPY text format data value.
+_COPY_TEXT_ESCAPES = str.maketrans({ '\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r' })
+
+# COPY text format representation of a null value.
+_COPY_NULL = '\\N'
+
 # Restricted set of characters allowed for database identifiers by cleaning function
 DB_ID_CHARS = set(ascii_letters + digits + '_')
 
@@ -84,33 +112,79 @@ def clean_id (identifier, allowed=DB_ID_CHARS):
         raise errors.ProcessingError(errMsg)
 
 
-def fits_format_to_sql (tform):
+def copy_rows_text (data):
+    """
+    Return a single string containing the given list of data row lists in the PostgreSQL
+    COPY text format: one line per row, with tab separated values. This string is
+    suitable for loading with the statement generated by gen_copy_rows.
+    """
+    return ''.join(['\t'.join([copy_value_text(val) for val in row]) + '\n' for row in data])
+
+
+def copy_value_text (value):
+    """
+    Return the PostgreSQL COPY text format representation of the given data value.
+    Lists (possibly nested) become array literals, and backslashes, tabs, and
+    line breaks are escaped.
+    """
+    if (value is None):
+        return _COPY_NULL
+    return _sql_literal_str(value).translate(_COPY_TEXT_ESCAPES)
+
+
+def fits_format_to_sql (tform, tzero=None, tscal=None):
     """
     Map the given FITS column format field into the corresponding SQL type declaration.
+    Columns with a repeat count greater than one, and variable length array columns,
+    are mapped to SQL arrays of the element type. Integer columns which are offset
+    or scaled (by the optional TZEROn and TSCALn values) are mapped to wider types.
 
     :param tform: a FITS columnn format field for translation.
+    :param tzero: optional TZEROn offset value for the column.
+    :param tscal: optional TSCALn scaling value for the column.
     :return an SQL type declaration string, corresponding to the given FITS format code.
     :raises ProcessingError if tform specifies a type not supported by the database.
     """
-    fmt_code = tform
-    if (tform and len(tform) > 1):
-        fmt_code = tform[0:1]
+    parsed = parse_fits_format(tform)
+    if (parsed is None):
+        errMsg = f"FITS data column format '{tform}' is not supported."
+        raise errors.ProcessingError(errMsg)
 
-    sql_decl = _FITS_FORMAT_TO_SQL.get(fmt_code, UNSUPPORTED)
-    if (sql_decl != UNSUPPORTED):
-        return sql_decl
-    else:
+    (repeat, fmt_code, elem_code) = parsed
+
+    if (fmt_code in ['P', 'Q']):            # variable length array descriptor
+        if (elem_code == 'A'):              # a variable length string
+            return 'text'
+        elem_decl = scalar_format_to_sql(elem_code, tzero, tscal)
+        if (elem_decl == UNSUPPORTED):
+            errMsg = f"FITS data column format '{tform}' is not supported."
+            raise errors.ProcessingError(errMsg)
+        return f"{elem_decl}[]"
+
+    sql_decl = scalar_format_to_sql(fmt_code, tzero, tscal)
+    if (sql_decl == UNSUPPORTED):
         errMsg = f"FITS data column format '{tform}' is not supported."
         raise errors.ProcessingError(errMsg)
 
+    if (fmt_code == 'A'):                   # repeat count is the string length
+        return sql_decl
+    elif (fmt_code == 'X'):                 # repeat count is the number of bits
+        return f"{sql_decl}({repeat})" if (repeat > 1) else sql_decl
+    elif (repeat > 1):                      # a fixed length vector column
+        return f"{sql_decl}[]"
+    else:
+        return sql_decl
+
 
-def gen_column_decls_sql (column_names, column_formats):
+def gen_column_decls_sql (column_names, column_formats, column_zeros=None, column_scales=None):
     """
     Generate the SQL column declarations for a table, given lists of column names
     and FITS format specs.
 
     :param column_names: a list of column name strings
     :param column_formats: a list of FITS format specifiers strings
+    :param column_zeros: an optional list of FITS column offsets (TZEROn values)
+    :param column_scales: an optional list of FITS column scale factors (TSCALn values)
 
     :return a list of SQL declaration strings for the table columns (no trailing commas!)
     :raises ProcessingError if the given column name and format lists are not the same size.
@@ -119,12 +193,32 @@ def gen_column_decls_sql (column_names, column_formats):
         errMsg = "Column name and format lists must be the same length."
         raise errors.ProcessingError(errMsg)
 
-    col_types = [fits_format_to_sql(fmt) for fmt in column_formats]
+    num_cols = len(column_formats)
+    zeros = column_zeros or [None] * num_cols
+    scales = column_scales or [None] * num_cols
+    if ((len(zeros) != num_cols) or (len(scales) != num_cols)):
+        errMsg = "Column offset and scale lists must be the same length as the format list."
+        raise errors.ProcessingError(errMsg)
+
+    col_types = [fits_format_to_sql(fmt, zero, scal)
+                 for fmt, zero, scal in zip(column_formats, zeros, scales)]
     col_names_clean = [clean_id(name) for name in column_names]  # clean the column names
     return ["{0} {1}".format(n, t) for n, t in zip(col_names_clean, col_types)]
 
 
-def gen_create_table_sql (args, dbconfig, column_names, column_formats):
+def gen_copy_rows (dbconfig, table_name):
+    """
+    Return a COPY statement to load the named table, from standard input, with rows in
+    the PostgreSQL COPY text format (see copy_rows_text). As with gen_insert_rows,
+    the values of each row must be in table column order.
+    """
+    schema_clean = clean_id(dbconfig.get('db_schema_name'))
+    table_clean = clean_id(table_name)
+    return f"COPY {schema_clean}.{table_clean} FROM STDIN;"
+
+
+def gen_create_table_sql (args, dbconfig, column_names, column_formats,
+                          column_zeros=None, column_scales=None):
     """
     Generate the SQL for creating a table, given column names, FITS format specs, and
     general arguments.
@@ -133,6 +227,8 @@ def gen_create_table_sql (args, dbconfig, column_names, column_formats):
     :param dbconfig: dictionary containing database parameters.
     :param column_names: a list of column name strings.
     :param column_formats: a list of FITS format specifiers strings.
+    :param column_zeros: an optional list of FITS column offsets (TZEROn values).
+    :param column_scales: an optional list of FITS column scale factors (TSCALn values).
 
     :return a list of SQL declaration strings for the table columns (no trailing commas!)
     :raises ProcessingError if any database parameters required by this module are missing.
@@ -147,13 +243,32 @@ def gen_create_table_sql (args, dbconfig, column_names, column_formats):
     ddl = []
 
     ddl.extend(gen_search_path_sql(argmix))
-    ddl.extend(gen_table_sql(argmix, column_names, column_formats))
+    ddl.extend(gen_table_sql(argmix, column_names, column_formats, column_zeros, column_scales))
     ddl.extend(gen_table_indices_sql(argmix, column_names))
     ddl.extend(gen_table_grants_sql(argmix))
 
     return ddl
 
 
+def gen_delete_file_rows (dbconfig, file_path, table_name, hybrid=False):
+    """
+    Return appropriate data structures for deleting the rows for the FITS file with the given
+    path from the named table, via a database access library. Currently using Psycopg2,
+    so return a tuple of a DELETE template string and a sequence of values.
+    In a hybrid table, the file path is found within the JSON metadata field.
+    """
+    if (not file_path):                     # sanity check
+        errMsg = "(gen_delete_file_rows): A file path is required to delete the rows of a file."
+        raise errors.ProcessingError(errMsg)
+
+    schema_clean = clean_id(dbconfig.get('db_schema_name'))
+    table_clean = clean_id(table_name)
+
+    field = "metadata->>'file_path'" if (hybrid) else 'file_path'
+    sql_fmt_str = f"delete from {schema_clean}.{table_clean} where {field} = %s;"
+    return (sql_fmt_str, [file_path])
+
+
 def gen_hybrid_insert (dbconfig, datadict, table_name):
     """
     Return appropriate data structures for inserting the given data dictionary
@@ -259,7 +374,34 @@ def gen_table_grants_sql (argmix):
     return ddl                              # return list of SQL statements to execute
 
 
-def gen_table_sql (argmix, column_names, column_formats):
+def gen_stats_table_sql (argmix):
+    """
+    Generate and return a list of SQL statements to create the column statistics table,
+    if it does not already exist.
+
+    :param argmix: dictionary containing both CLI and database arguments used by this method:
+                   stats_table, db_schema_name, db_user
+    :return: a list of SQL statements to execute to create the column statistics table.
+    """
+    ddl = []                                # hold list of SQL statements to execute
+
+    dbuser_clean  = clean_id(argmix.get('db_user'))
+    schema_clean = clean_id(argmix.get('db_schema_name'))
+    statstbl_clean = clean_id(argmix.get('stats_table'))
+
+    columns = ',\n'.join([
+        'table_name text', 'column_name text', 'row_count bigint', 'value_count bigint',
+        'null_count bigint', 'min_value double precision', 'max_value double precision' ])
+    ctable = f"CREATE TABLE IF NOT EXISTS {schema_clean}.{statstbl_clean} ({columns});"
+    ddl.append(ctable)
+
+    altable = f"ALTER TABLE {schema_clean}.{statstbl_clean} OWNER TO {dbuser_clean};"
+    ddl.append(altable)
+
+    return ddl                              # return list of SQL statements to execute
+
+
+def gen_table_sql (argmix, column_names, column_formats, column_zeros=None, column_scales=None):
     """
     Generate and return a list of SQL statements to create a table.
 
@@ -267,11 +409,14 @@ def gen_table_sql (argmix, column_names, column_formats):
                    catalog_table, db_schema_name, db_user
     :param column_names: a list of column name strings.
     :param column_formats: a list of FITS format specifiers strings.
+    :param column_zeros: an optional list of FITS column offsets (TZEROn values).
+    :param column_scales: an optional list of FITS column scale factors (TSCALn values).
     :return: a list of SQL statements to execute to create the table.
     """
     ddl = []                                # hold list of SQL statements to execute
 
-    col_decls = gen_column_decls_sql(column_names, column_formats)  # already cleaned
+    col_decls = gen_column_decls_sql(column_names, column_formats,  # already cleaned
+                                     column_zeros, column_scales)
     columns = ',\n'.join(col_decls)
 
     cattbl_clean = clean_id(argmix.get('catalog_table'))
@@ -347,3 +492,97 @@ def gen_table_indices_sql (argmix, column_names):
             "CREATE INDEX {0}_{1}_idx on {2}.{3} USING btree ({4});".format(cattbl_clean, ra, schema_clean, cattbl_clean, ra) )
 
     return ddl                              # return list of SQL strings
+
+
+def parse_fits_format (tform):
+    """
+    Parse the given FITS column format field into its component parts.
+
+    :param tform: a FITS column format (TFORMn) or display format (TDISPn) string.
+    :return a tuple of repeat count, format code, and array descriptor element code
+            (None unless the format code is an array descriptor) OR None if the given
+            format could not be parsed.
+    """
+    if (not tform):
+        return None
+
+    match = _FITS_FORMAT_REGEX.match(tform)
+    if (match is None):
+        return None
+
+    (repeat_str, fmt_code, elem_code) = match.groups()
+    if ((elem_code is not None) and (fmt_code not in ['P', 'Q'])):
+        return None                         # only array descriptors have an element code
+
+    repeat = int(repeat_str) if (repeat_str) else 1
+    return (repeat, fmt_code, elem_code)
+
+
+def scalar_format_to_sql (fmt_code, tzero=None, tscal=None):
+    """
+    Map the given single FITS format code into the corresponding SQL type declaration,
+    widening integer types which are offset or scaled by the given TZEROn and TSCALn values.
+    Returns UNSUPPORTED if the format code has no corresponding SQL type.
+    """
+    sql_decl = _FITS_FORMAT_TO_SQL.get(fmt_code, UNSUPPORTED)
+    if (fmt_code not in _FITS_INTEGER_CODES):
+        return sql_decl
+
+    zero = _number_or_none(tzero) or 0
+    scale = _number_or_none(tscal)
+    if ((scale is not None) and (scale != 1)):  # scaled integers become floating point
+        return 'double precision'
+
+    if (zero != 0):
+        (unsigned_zero, unsigned_decl) = _FITS_TZERO_TO_SQL.get(fmt_code)
+        if (zero == unsigned_zero):         # FITS signed byte or unsigned integer convention
+            return unsigned_decl
+        else:                               # any other offset: treat as a physical value
+            return 'double precision'
+
+    return sql_decl
+
+
+def _array_element_str (value):
+    """ Return the given value as an element of a PostgreSQL array literal. """
+    if (value is None):
+        return 'NULL'
+    if (isinstance(value, (list, tuple))):
+        return _sql_literal_str(value)
+    text = _sql_literal_str(value)
+    if (isinstance(value, (str, bytes))):   # quote strings: they may contain delimiters
+        text = '"{}"'.format(text.replace('\\', '\\\\').replace('"', '\\"'))
+    return text
+
+
+def _number_or_none (value):
+    """
+    Return the given FITS keyword value as a number or None, if the value is missing,
+    empty (as reported by Astropy column information), or not a number.
+    """
+    if ((value is None) or (value == '')):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _sql_literal_str (value):
+    """
+    Return the given (non-null) Python value as a string which PostgreSQL
+    will accept as input for a column of the corresponding type.
+    """
+    if (isinstance(value, bool)):
+        return 't' if value else 'f'
+    if (isinstance(value, float)):
+        if (value != value):                # NaN
+            return 'NaN'
+        if (value in (float('inf'), float('-inf'))):
+            return 'Infinity' if (value > 0) else '-Infinity'
+        return repr(value)
+    if (isinstance(value, bytes)):
+        return value.decode('utf-8', errors='replace')
+    if (isinstance(value, (list, tuple))):
+        return '{' + ','.join([_array_element_str(val) for val in value]) + '}'
+    return str(value)
@@ -1,26 +1,56 @@
 #
 # Module to interact with a PostgreSQL database.
 #   Written by: Tom Hicks. 7/25/2020.
-#   Last Modified: Add insert_rows_sql method. Implement fill_table* methods. Update for rename to gen_insert_row.
+#   Last Modified: Add methods to replace the rows of a file within one transaction.
 #
+import io
 import sys
 
 import psycopg2
 from psycopg2.extras import execute_values
 
 import imdtk.exceptions as errors
+import imdtk.core.column_stats as col_stats
 import imdtk.core.pg_gen_sql as pg_gen
 
 
-def create_table (args, dbconfig, column_names, column_formats):
+def copy_table (dbconfig, data_chunks, catalog_table):
     """
-    Create a new table using the given command line arguments,
-    database parameters, and lists of column names and column formats.
+    Load the rows from the given iterable of data chunks (each a list of data row lists)
+    into the named catalog table using the given DB parameters. Each chunk is sent with a
+    COPY statement as soon as it is produced, and all chunks are loaded within a single
+    transaction. Returns the total number of rows loaded.
+    """
+    copy_sql = pg_gen.gen_copy_rows(dbconfig, catalog_table)
+    row_count = 0
+
+    db_uri = dbconfig.get('db_uri')
+    conn = psycopg2.connect(db_uri)
+    try:
+        with conn:
+            with conn.cursor() as cursor:
+                for data in data_chunks:
+                    if (data):
+                        cursor.copy_expert(copy_sql, io.StringIO(pg_gen.copy_rows_text(data)))
+                        row_count += len(data)
+    finally:
+        conn.close()
+
+    return row_count
+
+
+def create_table (args, dbconfig, column_names, column_formats,
+                 column_zeros=None, column_scales=None):
+    """
+    Create a new table using the given command line arguments, database parameters,
+    lists of column names and column formats, and optional lists of column offsets
+    (TZEROn) and scales (TSCALn).
 
     Raises ProcessingError if the column name or format vectors are not present in
     the input OR if the vectors are not the same size.
     """
-    sql_list = create_table_sql(args, dbconfig, column_names, column_formats)
+    sql_list = create_table_sql(args, dbconfig, column_names, column_formats,
+                                column_zeros, column_scales)
 
     db_uri = dbconfig.get('db_uri')
     conn = psycopg2.connect(db_uri)
@@ -33,19 +63,23 @@ def create_table (args, dbconfig, column_names, column_formats):
         conn.close()
 
 
-def create_table_str (args, dbconfig, column_names, column_formats):
+def create_table_str (args, dbconfig, column_names, column_formats,
+                     column_zeros=None, column_scales=None):
     """
     Return an SQL string to create a new table using the given command line arguments,
-    database parameters, and lists of column names and column formats.
+    database parameters, lists of column names and column formats, and optional lists
+    of column offsets (TZEROn) and scales (TSCALn).
 
     Raises ProcessingError if the column name or format vectors are not present in
     the input OR if the vectors are not the same size.
     """
-    sql_list = create_table_sql(args, dbconfig, column_names, column_formats)
+    sql_list = create_table_sql(args, dbconfig, column_names, column_formats,
+                                column_zeros, column_scales)
     return '\n'.join(sql_list)
 
 
-def create_table_sql (args, dbconfig, column_names, column_formats):
+def create_table_sql (args, dbconfig, column_names, column_formats,
+                     column_zeros=None, column_scales=None):
     """
     Create a new table with the given table name, columns, and types as specified by
     the given catalog metadata dictionary using the given DB parameters.
@@ -57,7 +91,8 @@ def create_table_sql (args, dbconfig, column_names, column_formats):
     if (column_names is not None and
         column_formats is not None and
         (len(column_names) == len(column_formats))):
-        return pg_gen.gen_create_table_sql(args, dbconfig, column_names, column_formats)
+        return pg_gen.gen_create_table_sql(args, dbconfig, column_names, column_formats,
+                                           column_zeros, column_scales)
     else:
         errMsg = 'Column name and format lists must be the same length.'
         raise errors.ProcessingError(errMsg)
@@ -85,6 +120,23 @@ def execute_sql (dbconfig, sql_query_string, sql_values):
         conn.close()
 
 
+def execute_sql_list (dbconfig, sql_statements):
+    """
+    Open a database connection using the given DB configuration and execute, in order and
+    within a single transaction, each of the given pairs of an SQL format string and an SQL
+    values list FOR SIDE EFFECT (i.e. no values are returned). See execute_sql.
+    """
+    db_uri = dbconfig.get('db_uri')
+    conn = psycopg2.connect(db_uri)
+    try:
+        with conn:
+            with conn.cursor() as cursor:
+                for (sql_query_string, sql_values) in sql_statements:
+                    cursor.execute(sql_query_string, sql_values)
+    finally:
+        conn.close()
+
+
 def fetch_rows (dbconfig, sql_query_string, sql_values):
     """
     Open a database connection using the given DB configuration and execute the given SQL
@@ -125,6 +177,37 @@ def fill_table (dbconfig, data, catalog_table):
     return len(data)                              # assume all rows correctly inserted
 
 
+def fill_stats_table (args, dbconfig, stats, catalog_table):
+    """
+    Insert the given column statistics, for the named catalog table, into the statistics
+    table named by the 'stats_table' argument, creating the statistics table if necessary.
+    Returns the number of statistics rows inserted.
+    """
+    pg_gen.check_missing_parameters(dbconfig)
+
+    argmix = args.copy()                    # combine CLI and DB arguments
+    argmix.update(dbconfig)
+
+    rows = col_stats.stats_to_rows(stats, catalog_table)
+    if (not rows):                          # sanity check
+        errMsg = "(fill_stats_table): Empty column statistics cannot be inserted into table."
+        raise errors.ProcessingError(errMsg)
+
+    db_uri = dbconfig.get('db_uri')
+    conn = psycopg2.connect(db_uri)
+    try:
+        with conn:
+            with conn.cursor() as cursor:
+                for ddl in pg_gen.gen_stats_table_sql(argmix):
+                    cursor.execute(ddl, [])
+                sql_fmt_str = pg_gen.gen_insert_rows(dbconfig, args.get('stats_table'))
+                execute_values(cursor, sql_fmt_str, rows)
+    finally:
+        conn.close()
+
+    return len(rows)
+
+
 def fill_table_str (dbconfig, data, catalog_table):
     """
     Return a single EXAMPLE SQL string to insert the FIRST data row ONLY into the
@@ -246,6 +329,28 @@ def list_table_names (args, dbconfig, db_schema=None):
     return tables
 
 
+def replace_hybrid_row (dbconfig, datadict, table_name):
+    """
+    Replace any rows, in the named hybrid SQL/JSON table, for the file path in the given data
+    dictionary with the given data dictionary, using the given DB parameters. The old rows are
+    deleted and the new row inserted within a single transaction.
+    """
+    execute_sql_list(dbconfig, [
+        pg_gen.gen_delete_file_rows(dbconfig, datadict.get('file_path'), table_name, hybrid=True),
+        pg_gen.gen_hybrid_insert(dbconfig, datadict, table_name) ])
+
+
+def replace_row (dbconfig, datadict, table_name):
+    """
+    Replace any rows, in the named SQL table, for the file path in the given data dictionary
+    with the given data dictionary, using the given DB parameters. The old rows are deleted
+    and the new row inserted within a single transaction.
+    """
+    execute_sql_list(dbconfig, [
+        pg_gen.gen_delete_file_rows(dbconfig, datadict.get('file_path'), table_name),
+        pg_gen.gen_insert_row(dbconfig, datadict, table_name) ])
+
+
 def sql_as_string (dbconfig, sql_query_string, sql_values):
     """
     Return a query string after arguments binding. The string returned is exactly the
@@ -0,0 +1,172 @@
+#
+# Class to buffer the reads of a (remote) file, fetching a large window of the file
+# with each request, so that many small reads cost only a single round-trip.
+#   Written by: Tom Hicks. 1/21/21.
+#   Last Modified: Initial creation.
+#
+import io
+
+
+# default size, in bytes, of the first window read from a file
+DEFAULT_WINDOW_SIZE = 128 * 1024
+
+# default limit, in bytes, to which the window may grow during a long sequential read
+DEFAULT_MAX_WINDOW_SIZE = 4 * 1024 * 1024
+
+
+class ReadAheadReader (object):
+    """
+    Read-only, seekable file wrapper which reads ahead of the current position of the wrapped
+    file in large windows. Reads and seeks which fall within the current window are served
+    from memory, without any request to the wrapped file. When a read runs off the end of
+    the window, the next window is read starting at the current position.
+
+    The window grows adaptively: each time a read continues sequentially from the end of
+    the previous window, the next window is doubled in size (up to a limit), so a long header
+    takes only a few requests. A seek away from the window (e.g., to skip over a data segment)
+    resets the window to its initial size. Reads at least as large as the window (e.g., of
+    table data) bypass the window and are passed to the wrapped file directly.
+    """
+
+    def __init__ (self, fd, window_size=DEFAULT_WINDOW_SIZE, max_window_size=DEFAULT_MAX_WINDOW_SIZE):
+        """
+        Constructor of a read-ahead wrapper for the given open (binary) file, starting with
+        windows of the given size, which may grow up to the given maximum size.
+        """
+        self.fd = fd
+        self.mode = 'rb'
+        self.window_size = window_size
+        self.max_window_size = max(window_size, max_window_size)
+        self._next_size = window_size       # size of the next window to be read
+        self._pos = fd.tell()               # logical position of this reader
+        self._raw_pos = self._pos           # position of the wrapped file
+        self._window = b''                  # current window of file bytes
+        self._window_start = self._pos      # file offset of the start of the current window
+        self.requests = 0                   # number of reads requested from the wrapped file
+
+
+    def __enter__ (self):
+        return self
+
+
+    def __exit__ (self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close (self):
+        """ Release the current window. The wrapped file is left open for its owner to close. """
+        self._window = b''
+
+
+    def read (self, size=-1):
+        """
+        Read and return up to size bytes (or all the remaining bytes, if size is negative or
+        omitted) from the current position. Fewer bytes are returned only at the end of the file.
+        """
+        if ((size is None) or (size < 0)):  # read everything remaining, without buffering
+            head = self._window_bytes(self._pos, None)
+            rest = self._raw_read(self._pos + len(head), -1)
+            self._pos += len(head) + len(rest)
+            return head + rest
+
+        chunks = [ self._window_bytes(self._pos, size) ]
+        wanted = size - len(chunks[0])
+        self._pos += len(chunks[0])
+        if (wanted > 0):
+            if (wanted >= self._next_size):  # large read: bypass the window
+                chunk = self._raw_read(self._pos, wanted)
+            else:
+                self._fill_window(self._pos, wanted)
+                chunk = self._window_bytes(self._pos, wanted)
+            self._pos += len(chunk)
+            chunks.append(chunk)
+        return b''.join(chunks) if (len(chunks) > 1) else chunks[0]
+
+
+    def readable (self):
+        return True
+
+
+    def readinto (self, buffer):
+        """ Read bytes into the given writable buffer and return the number of bytes read. """
+        view = memoryview(buffer).cast('B')
+        data = self.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+
+    def seek (self, offset, whence=io.SEEK_SET):
+        """
+        Move the current position to the given offset, interpreted relative to the given origin
+        (as for io.IOBase.seek), and return the new absolute position. No request is made of
+        the wrapped file unless the position is relative to the end of the file.
+        """
+        if (whence == io.SEEK_SET):
+            pos = offset
+        elif (whence == io.SEEK_CUR):
+            pos = self._pos + offset
+        elif (whence == io.SEEK_END):
+            pos = self._raw_seek(offset, io.SEEK_END)
+        else:
+            raise ValueError("Invalid whence ({}) for seek".format(whence))
+        if (pos < 0):
+            raise ValueError("Negative seek position {}".format(pos))
+        self._pos = pos
+        return pos
+
+
+    def seekable (self):
+        return True
+
+
+    def tell (self):
+        """ Return the current (logical) position of this reader. """
+        return self._pos
+
+
+    def _fill_window (self, pos, minimum=0):
+        """
+        Read the next window of the wrapped file, starting at the given position and holding
+        at least minimum bytes (unless the file ends first). The window size is doubled (up to
+        the limit) when the read continues on from the previous window, and reset to the
+        initial size otherwise.
+        """
+        if ((pos == self._window_end()) and self._window):
+            self._next_size = min(self._next_size * 2, self.max_window_size)
+        else:
+            self._next_size = self.window_size
+        self._window = self._raw_read(pos, max(self._next_size, minimum))
+        self._window_start = pos
+
+
+    def _raw_read (self, pos, size):
+        """ Read up to size bytes from the wrapped file, starting at the given position. """
+        if (self._raw_pos != pos):
+            self._raw_seek(pos, io.SEEK_SET)
+        data = self.fd.read(size)
+        self.requests += 1
+        self._raw_pos = pos + len(data)
+        return data
+
+
+    def _raw_seek (self, offset, whence):
+        """ Seek the wrapped file and return its new position. """
+        self._raw_pos = self.fd.seek(offset, whence)
+        return self._raw_pos
+
+
+    def _window_bytes (self, pos, size):
+        """
+        Return the bytes of the current window which lie at and after the given position,
+        up to size bytes (or to the end of the window, if size is None).
+        """
+        start = pos - self._window_start
+        if ((start < 0) or (start >= len(self._window))):
+            return b''
+        end = len(self._window) if (size is None) else (start + size)
+        return self._window[start:end]
+
+
+    def _window_end (self):
+        """ Return the file offset just past the end of the current window. """
+        return self._window_start + len(self._window)
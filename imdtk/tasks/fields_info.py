@@ -1,7 +1,7 @@
 #
 # Class to add information about desired fields to the FITS-derived metadata structure.
 #   Written by: Tom Hicks. 6/9/2020.
-#   Last Modified: Handle errors in load_fields_info.
+#   Last Modified: Hold fields info and defaults in the run context, not in each record.
 #
 import toml
 import sys
@@ -9,16 +9,19 @@ import sys
 from config.settings import DEFAULT_FIELDS_FILEPATH
 import imdtk.exceptions as errors
 from imdtk.tasks.i_task import IImdTask
+from imdtk.tasks.run_context import share_run_context
 
 
 class FieldsInfoTask (IImdTask):
-    """ Class which adds field information to a metadata structure. """
+    """ Class which adds field information to the run context of a metadata structure. """
 
     def __init__(self, args):
         """
-        Constructor for class which adds field information to a metadata structure.
+        Constructor for class which adds field information to the run context of a metadata structure.
         """
         super().__init__(args)
+        self.run_context = share_run_context(args)  # shared with the other tasks of the pipeline
+        self._fields_contexts = dict()      # (fields info, defaults) keyed by fields file path
 
 
     #
@@ -38,23 +41,33 @@ class FieldsInfoTask (IImdTask):
         if (self._DEBUG):
             print("({}): Loading from fields info file '{}'".format(self.TOOL_NAME, fields_file), file=sys.stderr)
 
-        fields_info = self.load_fields_info(fields_file)
+        # set the field information and defaults, for the whole run, into the shared run context
+        (self.run_context.fields_info, self.run_context.defaults) = self.get_fields_context(fields_file)
 
-        if (self._DEBUG):
-            print("({}): Read {} fields.".format(self.TOOL_NAME, len(fields_info)), file=sys.stderr)
-
-        metadata['fields_info'] = fields_info # add field information to metadata
-
-        defaults = self.extract_defaults(fields_info)
-        metadata['defaults'] = defaults     # add defaults dictionary to metadata
-
-        return metadata                     # return the results of processing
+        return metadata                     # return the metadata unchanged
 
 
     #
     # Non-interface and/or task-specific Methods
     #
 
+    def get_fields_context (self, fields_file):
+        """
+        Return a tuple of the fields info dictionary, loaded from the given filepath, and the
+        dictionary of field defaults extracted from it. These are run-level context: the file
+        is loaded only once per run and the same two dictionaries are shared, by reference,
+        among all the tasks of the run, so they must be treated as read-only.
+        """
+        context = self._fields_contexts.get(fields_file)
+        if (context is None):
+            fields_info = self.load_fields_info(fields_file)
+            if (self._DEBUG):
+                print("({}): Read {} fields.".format(self.TOOL_NAME, len(fields_info)), file=sys.stderr)
+            context = (fields_info, self.extract_defaults(fields_info))
+            self._fields_contexts[fields_file] = context
+        return context
+
+
     def load_fields_info (self, fields_file):
         """
         Load the fields info dictionary from the given filepath and return it.
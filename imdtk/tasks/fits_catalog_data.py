@@ -1,7 +1,7 @@
 #
 # Class to extract a catalog data table from a FITS file and output it as JSON.
 #   Written by: Tom Hicks. 8/12/2020.
-#   Last Modified: Redo image/catalog files tests.
+#   Last Modified: Add streaming of the table rows in chunks, without statistics.
 #
 import os
 import sys
@@ -10,6 +10,7 @@ from astropy.io import fits
 from astropy.table import Table
 
 import imdtk.exceptions as errors
+import imdtk.core.column_stats as col_stats
 import imdtk.core.fits_utils as fits_utils
 from imdtk.core.file_utils import gather_file_info
 from imdtk.tasks.i_task import IImdTask
@@ -50,7 +51,7 @@ class FitsCatalogDataTask (IImdTask):
                 cinfo = fits_utils.get_column_info(hdus_list, catalog_hdu)
 
                 fits_rec = hdus_list[catalog_hdu].data
-                data = fits_utils.rows_from_data(fits_rec)
+                (data, stats) = self.rows_and_stats(fits_rec)
                 table = Table.read(hdus_list, hdu=catalog_hdu)
                 meta = fits_utils.get_table_meta_attribute(table)
 
@@ -67,6 +68,49 @@ class FitsCatalogDataTask (IImdTask):
         if (cinfo is not None):             # add column metadata to the output
             outdata['column_info'] = cinfo
         outdata['meta'] = meta              # add extra table metadata to the output
+        outdata['column_stats'] = stats     # add the column statistics to the output
         outdata['data'] = data              # add the data table to the output
 
         return outdata                     # return the results of processing
+
+
+    #
+    # Non-interface and/or task-specific Methods
+    #
+
+    def gen_row_chunks (self, fits_file, catalog_hdu=1):
+        """
+        Generator to stream the data table of the given FITS catalog file, yielding each chunk
+        (of at most chunk_size rows) as a list of rows, without collecting column statistics.
+        Only one chunk of converted rows is held at a time, so memory use is bounded by the
+        chunk size rather than by the size of the table.
+        Raises UnsupportedType if there is no catalog in the HDU, or ProcessingError if the
+        table data can not be read.
+        """
+        chunk_size = self.args.get('chunk_size') or fits_utils.DATA_CHUNK_SIZE
+        try:
+            with fits.open(fits_file) as hdus_list:
+                if (not fits_utils.has_catalog_data(hdus_list, catalog_hdu)):
+                    errMsg = f"Skipping FITS file '{fits_file}': no catalog in HDU {catalog_hdu}"
+                    raise errors.UnsupportedType(errMsg)
+                for chunk in fits_utils.gen_data_chunks(hdus_list[catalog_hdu].data, chunk_size):
+                    yield fits_utils.rows_from_data(chunk)
+
+        except OSError as oserr:
+            errMsg = "Unable to read catalog data from FITS file '{}': {}.".format(fits_file, oserr)
+            raise errors.ProcessingError(errMsg)
+
+
+    def rows_and_stats (self, fits_rec):
+        """
+        Convert the given FITS table data into a list of rows, while collecting
+        statistics for each column, in a single pass over chunks of the data.
+        Returns a tuple of the list of rows and the column statistics structure.
+        """
+        chunk_size = self.args.get('chunk_size') or fits_utils.DATA_CHUNK_SIZE
+        stats = col_stats.new_column_stats(fits_rec.columns)
+        data = []
+        for chunk in fits_utils.gen_data_chunks(fits_rec, chunk_size):
+            col_stats.update_column_stats(stats, chunk)
+            data.extend(fits_utils.rows_from_data(chunk))
+        return (data, stats)
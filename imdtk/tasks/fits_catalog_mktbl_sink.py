@@ -1,7 +1,7 @@
 #
 # Class to create a new database table from the metadata of a FITS catalog file.
 #   Written by: Tom Hicks. 7/22/2020.
-#   Last Modified: Replace SQL only argument with more general output only argument.
+#   Last Modified: Pass column offsets and scales to the table creation methods.
 #
 import sys
 
@@ -73,7 +73,10 @@ class FitsCatalogMakeTableSink (ISQLSink):
         column_names = (md_utils.get_aliased_column_names(metadata) or
                         md_utils.get_column_names(metadata))
         column_formats = md_utils.get_column_formats(metadata)
-        pg_sql.create_table(self.args, dbconfig, column_names, column_formats)
+        column_zeros = md_utils.get_column_zeros(metadata)
+        column_scales = md_utils.get_column_scales(metadata)
+        pg_sql.create_table(self.args, dbconfig, column_names, column_formats,
+                            column_zeros, column_scales)
 
         if (self._VERBOSE):
             print("({}): Database table '{}' created.".format(self.TOOL_NAME, catalog_table), file=sys.stderr)
@@ -111,5 +114,8 @@ class FitsCatalogMakeTableSink (ISQLSink):
         column_names = (md_utils.get_aliased_column_names(metadata) or
                         md_utils.get_column_names(metadata))
         column_formats = md_utils.get_column_formats(metadata)
-        create_str = pg_sql.create_table_str(self.args, dbconfig, column_names, column_formats)
+        column_zeros = md_utils.get_column_zeros(metadata)
+        column_scales = md_utils.get_column_scales(metadata)
+        create_str = pg_sql.create_table_str(self.args, dbconfig, column_names, column_formats,
+                                             column_zeros, column_scales)
         self.output_SQL(create_str, comment=comment, file_path=file_path)
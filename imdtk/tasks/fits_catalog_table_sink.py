@@ -1,7 +1,7 @@
 #
 # Class to fill a DB table from the data of a FITS catalog file.
 #   Written by: Tom Hicks. 8/24/2020
-#   Last Modified: Replace SQL only argument with more general output only argument.
+#   Last Modified: Output column statistics only when asked for or in verbose mode.
 #
 import sys
 
@@ -48,16 +48,26 @@ class FitsCatalogFillTableSink (ISQLSink):
         # file information is needed by the SQL generation methods below
         file_info = md_utils.get_file_info(indata)
 
-        # read the catalog table data from the input data structure
+        # read the catalog table data, or the stream of data chunks, from the input data structure
         data = md_utils.get_data(indata)
+        data_chunks = md_utils.get_data_chunks(indata)
 
         # Decide whether we are creating a table in the DB or just outputting SQL statements.
         sql_only = self.args.get('output_only')
         if (sql_only):                      # if just outputting SQL
+            if (data_chunks is not None):   # example SQL only needs the first chunk
+                data = next(iter(data_chunks), [])
             self.write_table(dbconfig, data, catalog_table, file_info)
+        elif (data_chunks is not None):     # else streaming the chunks into the database
+            self.copy_table(dbconfig, data_chunks, catalog_table)
         else:                               # else creating the table in the database
             self.fill_table(dbconfig, data, catalog_table)
 
+        # output any column statistics collected while reading the catalog data
+        stats = md_utils.get_column_stats(indata)
+        if (stats is not None):
+            self.output_stats(dbconfig, stats, catalog_table, store=(not sql_only))
+
 
     #
     # Non-interface and/or task-specific Methods
@@ -68,8 +78,30 @@ class FitsCatalogFillTableSink (ISQLSink):
         return catalog_table in pg_sql.list_table_names(self.args, dbconfig)
 
 
+    def copy_table (self, dbconfig, data_chunks, catalog_table):
+        """
+        Call the database-specific method to fill an existing table from the given
+        iterable of data chunks, loading each chunk as it is produced.
+        Returns the number of records loaded into the table.
+        """
+        if (self._DEBUG):
+            print("({}): Copying into table: '{}'".format(self.TOOL_NAME, catalog_table), file=sys.stderr)
+
+        # open database connection and stream the chunks into the specified table
+        rec_cnt = pg_sql.copy_table(dbconfig, data_chunks, catalog_table)
+
+        if (self._VERBOSE):
+            print("({}): Database table '{}' filled with {} records.".format(
+                self.TOOL_NAME, catalog_table, rec_cnt), file=sys.stderr)
+
+        return rec_cnt
+
+
     def fill_table (self, dbconfig, data, catalog_table):
-        """ Call the database-specific method to fill an existing table with the given data."""
+        """
+        Call the database-specific method to fill an existing table with the given data.
+        Returns the number of records inserted into the table.
+        """
         if (self._DEBUG):
             print("({}): Filling table: '{}'".format(self.TOOL_NAME, catalog_table), file=sys.stderr)
 
@@ -80,6 +112,26 @@ class FitsCatalogFillTableSink (ISQLSink):
             print("({}): Database table '{}' filled with {} records.".format(
                 self.TOOL_NAME, catalog_table, rec_cnt), file=sys.stderr)
 
+        return rec_cnt
+
+
+    def output_stats (self, dbconfig, stats, catalog_table, store=True):
+        """
+        Output the given column statistics as JSON to the statistics file, if one is specified
+        (or to standard error in verbose mode) and, if a statistics table is specified and the
+        store flag is True, also insert the statistics into the statistics table.
+        """
+        stats_file = self.args.get('stats_file') or (sys.stderr if self._VERBOSE else None)
+        if (stats_file is not None):
+            self.output_JSON(stats, stats_file)
+
+        stats_table = self.args.get('stats_table')
+        if (stats_table and store):
+            stat_cnt = pg_sql.fill_stats_table(self.args, dbconfig, stats, catalog_table)
+            if (self._VERBOSE):
+                print("({}): Statistics for {} columns stored in table '{}'.".format(
+                    self.TOOL_NAME, stat_cnt, stats_table), file=sys.stderr)
+
 
     def write_table (self, dbconfig, data, catalog_table, file_info):
         """ Generate and output SQL that would create a new catalog table. """
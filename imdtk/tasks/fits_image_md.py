@@ -1,16 +1,17 @@
 #
 # Class for extracting header information from FITS files.
 #   Written by: Tom Hicks. 5/23/2020.
-#   Last Modified: Redo image/catalog files tests.
+#   Last Modified: Consult the persistent header cache, when enabled.
 #
+import gzip
 import os
 import sys
 
-from astropy.io import fits
-
 import imdtk.exceptions as errors
+import imdtk.core.fits_cards as fits_cards
 import imdtk.core.fits_utils as fits_utils
 from imdtk.core.file_utils import gather_file_info
+from imdtk.core.header_cache import get_local_headers, open_header_cache
 from imdtk.tasks.i_task import IImdTask
 
 
@@ -22,12 +23,21 @@ class FitsImageMetadataTask (IImdTask):
         Constructor for the class extracting header information from FITS files.
         """
         super().__init__(args)
+        self.header_keys = fits_utils.get_metadata_keys(args)  # keys to extract: None means all
+        self.header_cache = open_header_cache(args)  # persistent header cache: None if disabled
 
 
     #
     # Methods overriding IImdTask interface methods
     #
 
+    def cleanup (self):
+        """ Do any cleanup/shutdown tasks necessary for the task instance. """
+        if (self.header_cache is not None):
+            self.header_cache.close()
+        super().cleanup()
+
+
     def process (self, _):
         """
         Perform the main work of the task and return the results as a Python data structure.
@@ -41,14 +51,13 @@ class FitsImageMetadataTask (IImdTask):
         which_hdu = self.args.get('which_hdu', 0)
 
         try:
-            with fits.open(fits_file) as hdus_list:
-                if (not fits_utils.has_image_data(hdus_list)):
-                    errMsg = f"Skipping FITS file '{fits_file}': no image data in primary HDU"
-                    raise errors.UnsupportedType(errMsg)
+            (has_image, hdrs) = self.scan_header_fields(fits_file, which_hdu, ignore_list)
 
-                hdrs = fits_utils.get_header_fields(hdus_list, which_hdu, ignore_list)
+            if (not has_image):
+                errMsg = f"Skipping FITS file '{fits_file}': no image data in primary HDU"
+                raise errors.UnsupportedType(errMsg)
 
-        except OSError as oserr:
+        except (OSError, EOFError) as oserr:   # EOFError: truncated compressed file
             errMsg = "Unable to read image metadata from FITS file '{}': {}.".format(fits_file, oserr)
             raise errors.ProcessingError(errMsg)
 
@@ -59,3 +68,40 @@ class FitsImageMetadataTask (IImdTask):
         if (hdrs is not None):              # add the headers to the metadata
             metadata['headers'] = hdrs
         return metadata                     # return the results of processing
+
+
+    #
+    # Non-interface and/or task-specific Methods
+    #
+
+    def scan_header_fields (self, fits_file, which_hdu, ignore_list):
+        """
+        Scan the header cards of the given FITS file, without reading any data. A gzip compressed
+        file is decompressed only as far as the end of the header of the specified HDU.
+        Returns a tuple of a flag telling whether the primary HDU has image data and the
+        dictionary of selected header fields from the specified HDU (None, if the HDU
+        index is out of range). If the header cache is enabled, cached headers are decoded
+        and the file is read only if they are not already in the cache.
+        """
+        if (self.header_cache is not None):
+            headers = get_local_headers(self.header_cache, fits_file, [0, which_hdu])
+            has_image = ((0 in headers) and
+                         fits_utils.has_image_header(fits_cards.fields_from_bytes(headers[0], keys=[])))
+            hdrs = None
+            if (which_hdu in headers):
+                hdrs = fits_cards.fields_from_bytes(headers[which_hdu], keys=self.header_keys,
+                                                    ignore=ignore_list)
+            return (has_image, hdrs)
+
+        has_image = False
+        hdrs = None
+        opener = gzip.open if (fits_utils.is_gzip_filename(fits_file)) else open
+        with opener(fits_file, 'rb') as fd:
+            hdr_infos = fits_cards.gen_hdu_fields(fd, keys=self.header_keys, ignore=ignore_list)
+            for hdu_index, hdr_info in enumerate(hdr_infos):
+                if (hdu_index == 0):
+                    has_image = fits_utils.has_image_header(hdr_info.hdr)
+                if (hdu_index == which_hdu):
+                    hdrs = hdr_info.hdr
+                    break
+        return (has_image, hdrs)
@@ -1,13 +1,27 @@
 #
 # Class to calculate values for the ObsCore fields in a FITS-derived metadata structure.
 #   Written by: Tom Hicks. 6/14/2020.
-#   Last Modified: Update call to rewritten calc_wcs_coordinates.
+#   Last Modified: Compile the field plan from the fields info in the shared run context.
 #
 import abc
+import collections
+import functools
+import sys
 
+from astropy import wcs
+
+import imdtk.core.fits_cards as fits_cards
+from imdtk.core.fast_wcs import DEFAULT_WCS_MODE, compare_wcs, make_fast_wcs
+from imdtk.core.header_cache import header_from_bytes
 from imdtk.tasks.i_task import IImdTask
-import imdtk.tasks.metadata_utils as md_utils
 import imdtk.tasks.oc_calc_utils as occ_utils
+from imdtk.tasks.run_context import share_run_context
+
+
+# one step of a field calculation plan: the name of a desired field, the function (or None)
+# which calculates its value, the function (or None) which sets a fallback value for it,
+# and its default value (or None) from the fields info
+FieldStep = collections.namedtuple('FieldStep', ['field_name', 'calculator', 'default_setter', 'default'])
 
 
 class IObsCoreCalcTask (IImdTask):
@@ -51,6 +65,10 @@ class IObsCoreCalcTask (IImdTask):
         Constructor for class which calculates values for ObsCore fields in a metadata structure.
         """
         super().__init__(args)
+        self.wcs_mode = args.get('wcs_mode') or DEFAULT_WCS_MODE
+        self.run_context = share_run_context(args)  # shared with the other tasks of the pipeline
+        self._field_plan = None             # plan compiled from fields info and defaults
+        self._field_plan_sources = None     # (fields info, defaults) the plan was compiled from
 
 
 
@@ -68,9 +86,17 @@ class IObsCoreCalcTask (IImdTask):
         calculations = dict()               # structure for calculated results
 
         # calculate some initial values from the FITS file WCS information
-        occ_utils.calc_scale(wcs_info, calculations)
-        occ_utils.calc_corners(wcs_info, calculations)
+        occ_utils.calc_geometry_batch([wcs_info], [calculations])
+
+        return self.complete_results(wcs_info, metadata, calculations)
 
+
+    def complete_results (self, wcs_info, metadata, calculations):
+        """
+        Try to produce a value for each of the remaining fields desired in the results, given
+        the calculations dictionary which already holds the image geometry computed from the
+        WCS information. Returns the given calculations dictionary, with the values added.
+        """
         # copy any file information fields to results
         occ_utils.copy_file_info(metadata, calculations)
 
@@ -91,59 +117,119 @@ class IObsCoreCalcTask (IImdTask):
         For all desired fields, compute (or recompute) a value for each field.
         Values are extracted, calculated, or defaulted from existing metadata.
         If a value is produced for a field, store the field and its value into
-        the given calculations structure.
+        the given calculations structure. The steps taken for each field are
+        determined by a plan, compiled once from the fields info and defaults.
         """
-        defaults = md_utils.get_defaults(metadata)  # get defaults once
+        for step in self.get_field_plan():
+            if (step.calculator is not None):
+                step.calculator(wcs_info, metadata, calculations)
+            if (step.field_name not in calculations):  # if field still has no value
+                if (step.default_setter is not None):
+                    step.default_setter(metadata, calculations)
+                if ((step.default is not None) and (step.field_name not in calculations)):
+                    calculations[step.field_name] = step.default
 
-        # make a list of the desired fields (as listed in the fields info file)
-        fields_info = md_utils.get_fields_info(metadata)
-        desired = fields_info.keys() if fields_info else []
 
-        # try to calculate a value for each desired field
-        for field_name in desired:
-            self.calc_field_value(field_name, defaults, wcs_info, metadata, calculations)
-            if (field_name not in calculations):  # if field still has no value
-                self.set_default_value(field_name, defaults, wcs_info, metadata, calculations)
+    def compile_field_plan (self, fields_info, defaults):
+        """
+        Compile and return a plan for calculating the values of the desired fields, as listed
+        in the given fields info dictionary, with fallback values from the given defaults
+        dictionary. The plan is a list of steps (FieldStep), in the order of the fields info.
+        Fields which have no calculator, no fallback, and no default are omitted from the plan.
+        """
+        calculators = self.field_calculators()
+        default_setters = self.default_setters(defaults)
+        plan = []
+        for field_name in fields_info:
+            step = FieldStep(field_name, calculators.get(field_name),
+                             default_setters.get(field_name), defaults.get(field_name))
+            if (step[1:] != (None, None, None)):
+                plan.append(step)
+        return plan
+
+
+    def default_setters (self, defaults):
+        """
+        Return a dictionary of the functions which set a fallback value for a field, keyed
+        by field name. Each function is called with the metadata and calculations dictionaries.
+        This version calls abstract methods which call down to child concrete methods.
+        """
+        return {
+            'target_name': functools.partial(self.set_default_target_name, defaults),
+            'instrument_name': functools.partial(self.set_default_instrument_name, defaults)
+        }
 
 
-    def calc_field_value (self, field_name, defaults, wcs_info, metadata, calculations):
+    def field_calculators (self):
         """
-        Provide the opportunity to calculate (or recalculate) a value for the named field.
-        This version may call abstract methods which call down to the concrete methods.
+        Return a dictionary of the functions which calculate (or recalculate) a value for a field,
+        keyed by field name. Each function is called with the WCS information, metadata, and
+        calculations dictionaries. This version calls abstract methods which call down to the
+        concrete methods.
         """
-        if (field_name in ['s_ra', 's_dec']):
+        def wcs_coordinates (wcs_info, metadata, calculations):
             occ_utils.calc_wcs_coordinates(wcs_info, metadata, calculations)
 
-        elif (field_name in ['im_naxis1', 'im_naxis2']):
-            if (calculations.get('s_xel1') is not None):
-                calculations['im_naxis1'] = calculations.get('s_xel1')
-            if (calculations.get('s_xel2') is not None):
-                calculations['im_naxis2'] = calculations.get('s_xel2')
+        def image_size (wcs_info, metadata, calculations):
+            occ_utils.calc_image_size(calculations)
 
-        elif (field_name == 's_resolution'):
+        def spatial_resolution (wcs_info, metadata, calculations):
             self.calc_spatial_resolution(calculations)
 
-        elif (field_name == 'im_pixtype'):
+        def pixtype (wcs_info, metadata, calculations):
             occ_utils.calc_pixtype(metadata, calculations)
 
-        elif (field_name in ['access_estsize', 'file_size']):
+        def access_estsize (wcs_info, metadata, calculations):
             occ_utils.calc_access_estsize(metadata, calculations)
 
-        elif (field_name == 'access_url'):
+        def access_url (wcs_info, metadata, calculations):
             self.calc_access_url(metadata, calculations)
 
+        return {
+            's_ra': wcs_coordinates, 's_dec': wcs_coordinates,
+            'im_naxis1': image_size, 'im_naxis2': image_size,
+            's_resolution': spatial_resolution,
+            'im_pixtype': pixtype,
+            'access_estsize': access_estsize, 'file_size': access_estsize,
+            'access_url': access_url
+        }
 
-    def set_default_value (self, field_name, defaults, wcs_info, metadata, calculations):
+
+    def get_field_plan (self):
         """
-        Final effort to calculate or set a fallback/default value for the named field.
-        This version may call abstract methods which call down to child concrete methods.
+        Return the field calculation plan for the fields info and defaults in the run context.
+        The plan is compiled only when they differ from those of the previously compiled plan.
         """
-        if (field_name == 'target_name'):
-            self.set_default_target_name(defaults, metadata, calculations)
+        fields_info = self.run_context.fields_info or dict()
+        defaults = self.run_context.defaults or dict()
+        sources = (fields_info, defaults)
+        if (sources != self._field_plan_sources):  # identical or equal sources reuse the plan
+            self._field_plan = self.compile_field_plan(fields_info, defaults)
+            self._field_plan_sources = sources
+        return self._field_plan
 
-        elif (field_name == 'instrument_name'):
-            self.set_default_instrument_name(defaults, metadata, calculations)
 
-        # if field still has no value, try to set a default from the fields info
-        if (field_name not in calculations):
-            occ_utils.set_default(field_name, defaults, calculations)
+    def make_WCS (self, header_bytes, file_path):
+        """
+        Return a World Coordinate System structure from the given raw header bytes, read from
+        the given file, or None if no header bytes are given. In 'fast' WCS mode, the headers of
+        images with simple celestial projections yield a fast WCS, computed without Astropy,
+        while all other headers yield an Astropy WCS. In 'astropy' mode, an Astropy WCS is always
+        returned. In 'validate' mode, an Astropy WCS is returned but the results of the fast WCS,
+        when there is one, are compared with it and any disagreements are reported.
+        """
+        if (header_bytes is None):
+            return None
+
+        fast_info = None
+        if (self.wcs_mode != 'astropy'):
+            fast_info = make_fast_wcs(fits_cards.fields_from_bytes(header_bytes))
+            if ((fast_info is not None) and (self.wcs_mode == 'fast')):
+                return fast_info
+
+        wcs_info = wcs.WCS(header_from_bytes(header_bytes))
+        if (fast_info is not None):         # validating the fast WCS against Astropy
+            for diff in compare_wcs(fast_info, wcs_info):
+                print("({}): WARNING: fast WCS disagrees with Astropy for file '{}': {}".format(
+                    self.TOOL_NAME, file_path, diff), file=sys.stderr)
+        return wcs_info
@@ -1,7 +1,7 @@
 #
 # Abstract class defining the interface for task components.
 #   Written by: Tom Hicks. 5/27/2020.
-#   Last Modified: Add JSON keywords to output_JSON.
+#   Last Modified: Emit and pick up the run context at the head of a JSON stream.
 #
 import datetime
 import json
@@ -11,6 +11,7 @@ from config.settings import WORK_DIR
 import imdtk.exceptions as errors
 import imdtk.core.file_utils as file_utils
 import imdtk.tasks.metadata_utils as md_utils
+from imdtk.tasks.run_context import RUN_CONTEXT_KEY, get_run_context, share_run_context
 
 
 DEFAULT_INPUT_FORMAT = 'json'
@@ -128,11 +129,11 @@ class IImdTask ():
                 file_info = md_utils.get_file_info(metadata)
                 fname = file_info.get('file_name') if file_info else "NO_FILENAME"
                 outfile = self.gen_output_file_path(fname, out_fmt, self.TOOL_NAME)
-                self.output_JSON(metadata, outfile)
+                self.output_JSON(self.with_run_context(metadata, outfile), outfile)
             elif (outfile is not None):     # else if using the given filepath
-                self.output_JSON(metadata, outfile)
+                self.output_JSON(self.with_run_context(metadata, outfile), outfile)
             else:                           # else using standard output
-                self.output_JSON(metadata)
+                self.output_JSON(self.with_run_context(metadata, STDOUT_NAME))
 
         else:
             errMsg = "({}.process): Invalid output format '{}'.".format(self.TOOL_NAME, out_fmt)
@@ -170,6 +171,10 @@ class IImdTask ():
             with open(input_file) as infile:
                 metadata = json.load(infile)
 
+        # pick up any run context emitted at the head of the stream by an upstream task
+        if (isinstance(metadata, dict) and (RUN_CONTEXT_KEY in metadata)):
+            share_run_context(self.args).update(metadata.pop(RUN_CONTEXT_KEY))
+
         return metadata                     # return the results of processing
 
 
@@ -191,3 +196,16 @@ class IImdTask ():
             json.dump(data, outfile, indent=2, **json_keywords)
             outfile.write('\n')
             outfile.close()
+
+
+    def with_run_context (self, metadata, destination):
+        """
+        Return the given metadata, headed by the run context, if there is a run context holding
+        fields information which has not yet been emitted to the given output destination.
+        Otherwise, return the given metadata unchanged. The run context is thereby emitted only
+        once, at the head of each output stream, for downstream tasks to pick up.
+        """
+        context = get_run_context(self.args)
+        if ((context is None) or (not context.has_fields()) or (not context.first_emit(destination))):
+            return metadata
+        return { RUN_CONTEXT_KEY: context.as_dict(), **metadata }
@@ -0,0 +1,133 @@
+#
+# Class to stream a catalog data table from an iRods-resident FITS catalog file.
+#   Written by: Tom Hicks. 1/15/21.
+#   Last Modified: Get files through the helper, to reuse the data objects of a listing.
+#
+import sys
+
+from irods.exception import DataObjectDoesNotExist
+
+import imdtk.exceptions as errors
+import imdtk.core.column_stats as col_stats
+import imdtk.core.fits_utils as fits_utils
+from imdtk.core.fits_utils import FITS_BLOCK_SIZE
+from imdtk.tasks.i_task import IImdTask
+
+
+class IRodsFitsCatalogDataTask (IImdTask):
+    """ Class to stream a catalog data table from an iRods-resident FITS catalog file. """
+
+    def __init__(self, args, fits_irods_helper):
+        """
+        Constructor for class to stream a catalog data table from an iRods-resident FITS catalog file.
+        """
+        super().__init__(args)
+        self.irods = fits_irods_helper      # IRodsHelper instance
+
+
+    def cleanup (self):
+        """ Do any cleanup/shutdown tasks necessary for the task instance. """
+        if (self.irods):
+            self.irods.cleanup()
+        super().cleanup()
+
+
+    #
+    # Methods overriding IImdTask interface methods
+    #
+
+    def process (self, _):
+        """
+        Perform the main work of the task and return the results as a Python data structure.
+
+        Only the catalog header is read here: the returned structure contains a generator
+        of data chunks (under 'data_chunks'), which reads and converts the table rows as it
+        is consumed, and a column statistics structure which is filled in as the chunks
+        are consumed.
+        """
+        if (self._DEBUG):
+            print("({}.process): ARGS={}".format(self.TOOL_NAME, self.args), file=sys.stderr)
+
+        # get the selection and filtering arguments
+        catalog_hdu = self.args.get('catalog_hdu', 1)
+        ignore_list = self.args.get('ignore_list') or fits_utils.FITS_IGNORE_KEYS
+
+        # get the iRods file path argument of the file to be opened
+        irff_path = self.args.get('irods_fits_file')
+
+        try:
+            # get the FITS file at the specified path
+            irff = self.irods.get_fits_file(irff_path)
+
+            # sanity check on the given FITS file
+            if (irff.size < FITS_BLOCK_SIZE):
+                errMsg = "Skipping file too small to be a valid FITS file: '{}'".format(irff_path)
+                raise errors.UnsupportedType(errMsg)
+
+            # locate and read the header of the specified HDU, without reading its data
+            with self.irods.open_fits_file(irff) as irff_fd:
+                hdr_info = self.irods.get_header_info_at(irff_fd, self.irods.fits_file_size(irff),
+                                                         catalog_hdu, self.irods.get_hdu_index(irff))
+
+            if (hdr_info is None):          # unable to read the specified header
+                errMsg = "Unable to read catalog data from HDU {} of FITS file '{}'.".format(catalog_hdu, irff_path)
+                raise errors.ProcessingError(errMsg)
+
+            if (not self.irods.is_catalog_header(hdr_info.hdr)):
+                errMsg = "HDU {} is not a table header. Skipping FITS file '{}'.".format(catalog_hdu, irff_path)
+                raise errors.UnsupportedType(errMsg)
+
+            # get and save some common file information
+            file_info = self.irods.get_irods_file_info(irff)
+
+            # get the FITS header fields for the catalog HDU
+            hdrs = fits_utils.get_fields_from_header(hdr_info.hdr, ignore_list)
+
+            # get metadata about the columns in the table, from the header alone
+            cinfo = self.irods.get_column_info_from_header(hdr_info.hdr)
+
+        except DataObjectDoesNotExist as dodne:
+            errMsg = "Unable to find the specified iRods FITS file '{}'.".format(irff_path)
+            raise errors.ProcessingError(errMsg)
+
+        except OSError as oserr:
+            errMsg = "Unable to read catalog data from iRods FITS file '{}': {}.".format(irff_path, oserr)
+            raise errors.ProcessingError(errMsg)
+
+        stats = col_stats.new_column_stats([])  # columns are added from the first chunk
+
+        outdata = dict()                    # create overall ouput structure
+        outdata['file_info'] = file_info    # add previously gathered remote file information
+        if (hdrs is not None):              # add the headers to the output
+            outdata['headers'] = hdrs
+        if (cinfo is not None):             # add column metadata to the output
+            outdata['column_info'] = cinfo
+        outdata['column_stats'] = stats     # statistics filled in as the data is consumed
+        outdata['data_chunks'] = self.gen_row_chunks(irff, hdr_info, stats)
+        return outdata                      # return the results of processing
+
+
+    #
+    # Non-interface and/or task-specific Methods
+    #
+
+    def gen_row_chunks (self, irff, hdr_info, stats):
+        """
+        Generator to stream the data of the table, described by the given header information
+        record, from the given iRods FITS file, yielding each chunk as a list of rows.
+        The given column statistics structure is updated as each chunk is yielded.
+        Raises ProcessingError if the table data can not be read.
+        """
+        chunk_size = self.args.get('chunk_size') or fits_utils.DATA_CHUNK_SIZE
+        try:
+            irff_size = self.irods.fits_file_size(irff)
+            with self.irods.open_fits_file(irff) as irff_fd:
+                for chunk in self.irods.gen_table_chunks(irff_fd, irff_size, hdr_info, chunk_size):
+                    if (not stats['columns']):  # first chunk: initialize the statistics
+                        stats.update(col_stats.new_column_stats(chunk.columns))
+                    col_stats.update_column_stats(stats, chunk)
+                    yield fits_utils.rows_from_data(chunk)
+
+        except OSError as oserr:
+            errMsg = "Unable to read catalog data from iRods FITS file '{}': {}.".format(irff.path, oserr)
+            raise errors.ProcessingError(errMsg)
@@ -1,7 +1,7 @@
 #
 # Class to extract catalog metadata from iRods-resident FITS catalog files.
 #   Written by: Tom Hicks. 11/17/20.
-#   Last Modified: Fix: super cleanup call.
+#   Last Modified: Get files through the helper, to reuse the data objects of a listing.
 #
 import os
 import sys
@@ -52,17 +52,16 @@ class IRodsFitsCatalogMetadataTask (IImdTask):
 
         try:
             # get the FITS file at the specified path
-            irff = self.irods.getf(irff_path, absolute=True)
+            irff = self.irods.get_fits_file(irff_path)
 
             # sanity check on the given FITS file
             if (irff.size < FITS_BLOCK_SIZE):
                 errMsg = "Skipping file too small to be a valid FITS file: '{}'".format(irff_path)
                 raise errors.UnsupportedType(errMsg)
 
-            # actually read the file to get the specified HDU
-            hdu = self.irods.get_hdu(irff, catalog_hdu)
-            if (hdu):
-                header = hdu.header
+            # read only the header of the specified HDU: the table data is not needed
+            header = self.irods.get_header(irff, catalog_hdu)
+            if (header is not None):
                 if (not self.irods.is_catalog_header(header)):
                     errMsg = "HDU {} is not a table header. Skipping FITS file '{}'.".format(catalog_hdu, irff_path)
                     raise errors.ProcessingError(errMsg)
@@ -77,7 +76,7 @@ class IRodsFitsCatalogMetadataTask (IImdTask):
                 content_metadata = self.irods.get_content_metadata(irff)
 
                 # get and save metadata about the columns in the table
-                col_info = self.irods.get_column_info(irff, hdu)
+                col_info = self.irods.get_column_info_from_header(header)
 
                 # now try to read the FITS header from the FITS file
                 hdrs = fits_utils.get_fields_from_header(header, ignore_list)
@@ -1,7 +1,7 @@
 #
 # Class to extract image metadata from iRods-resident FITS image files.
 #   Written by: Tom Hicks. 10/15/20.
-#   Last Modified: Fix: super cleanup call.
+#   Last Modified: Get files through the helper, to reuse the data objects of a listing.
 #
 import os
 import sys
@@ -23,6 +23,7 @@ class IRodsFitsImageMetadataTask (IImdTask):
         """
         super().__init__(args)
         self.irods = fits_irods_helper      # IRodsHelper instance
+        self.header_keys = fits_utils.get_metadata_keys(args)  # keys to extract: None means all
 
 
     def cleanup (self):
@@ -52,17 +53,17 @@ class IRodsFitsImageMetadataTask (IImdTask):
 
         try:
             # get the FITS file at the specified path
-            irff = self.irods.getf(irff_path, absolute=True)
+            irff = self.irods.get_fits_file(irff_path)
 
             # sanity check on the given FITS file
             if (irff.size < FITS_BLOCK_SIZE):
                 errMsg = "Skipping file too small to be a valid FITS file: '{}'".format(irff_path)
                 raise errors.UnsupportedType(errMsg)
 
-            # actually read the file to get the specified header
-            header = self.irods.get_header(irff, which_hdu)
-            if (header):
-                if (not self.irods.is_image_header(header)):
+            # scan the header cards of the file to get the selected fields of the specified header
+            hdrs = self.irods.get_header_fields(irff, which_hdu, ignore_list, self.header_keys)
+            if (hdrs is not None):
+                if (not self.irods.is_image_header(hdrs)):
                     errMsg = "HDU {} is not an image header. Skipping FITS file '{}'.".format(which_hdu, irff_path)
                     raise errors.ProcessingError(errMsg)
 
@@ -75,9 +76,6 @@ class IRodsFitsImageMetadataTask (IImdTask):
                 # get any content metadata attached to the file
                 content_metadata = self.irods.get_content_metadata(irff)
 
-                # now try to read the FITS header from the FITS file
-                hdrs = fits_utils.get_fields_from_header(header, ignore_list)
-
             else:                           # unable to read the specified header
                 errMsg = "Unable to read image metadata from HDU {} of FITS file '{}'.".format(which_hdu, irff_path)
                 raise errors.ProcessingError(errMsg)
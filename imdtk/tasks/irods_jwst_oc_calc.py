@@ -1,10 +1,12 @@
 #
 # Class to calculate values for the ObsCore fields in an iRods FITS-file-derived metadata structure.
 #   Written by: Tom Hicks. 11/20/20.
-#   Last Modified: Fix: super cleanup call.
+#   Last Modified: Get files through the helper, to reuse the data objects of a listing.
 #
 import sys
 
+from irods.exception import DataObjectDoesNotExist
+
 import imdtk.exceptions as errors
 import imdtk.core.fits_utils as fits_utils
 from imdtk.core.fits_utils import FITS_BLOCK_SIZE, FITS_IGNORE_KEYS
@@ -34,26 +36,20 @@ class IRods_JWST_ObsCoreCalcTask (JWST_ObsCoreCalcTask):
 
 
     #
-    # Concrete method overriding JWST_ObsCoreCalcTask method
+    # Concrete methods overriding JWST_ObsCoreCalcTask methods
     #
 
-    def process (self, metadata):
+    def get_image_WCS (self, irff_path):
         """
-        Perform the main work of the task and return the results as a Python data structure.
-        This method overrides JWST_ObsCoreCalcTask method to use iRods file access.
+        Return the World Coordinate System information from the specified HDU of the iRods
+        FITS file at the given path, or raise a processing error if that information can not
+        be read. This method overrides JWST_ObsCoreCalcTask method to use iRods file access.
         """
-        if (self._DEBUG):
-            print("({}.process): ARGS={}".format(self.TOOL_NAME, self.args), file=sys.stderr)
-
-        # use the specified HDU of the FITS file to compute the WCS information
         which_hdu = self.args.get('which_hdu', 0)
 
-        # get the iRods file path argument of the file to be opened
-        irff_path = self.args.get('irods_fits_file')
-
         try:
             # get the FITS file at the specified path
-            irff = self.irods.getf(irff_path, absolute=True)
+            irff = self.irods.get_fits_file(irff_path)
 
             # sanity check on the given FITS file
             if (irff.size < FITS_BLOCK_SIZE):
@@ -64,9 +60,9 @@ class IRods_JWST_ObsCoreCalcTask (JWST_ObsCoreCalcTask):
                 print("({}): Reading iRods FITS file '{}'.".format(self.TOOL_NAME, irff_path), file=sys.stderr)
 
             # try to get the specified header and read WCS info from it
-            header = self.irods.get_header(irff, which_hdu)
-            if (header):
-                wcs_info = self.irods.get_WCS(header)
+            header_bytes = self.irods.get_header_bytes(irff, which_hdu)
+            if (header_bytes is not None):
+                wcs_info = self.make_WCS(header_bytes, irff_path)
             else:                           # unable to read the specified header
                 errMsg = "Unable to find or read HDU {} of FITS file '{}'.".format(which_hdu, irff_path)
                 raise errors.ProcessingError(errMsg)
@@ -84,6 +80,23 @@ class IRods_JWST_ObsCoreCalcTask (JWST_ObsCoreCalcTask):
             errMsg = "No WCS info found in iRods FITS file '{}'.".format(irff_path)
             raise errors.ProcessingError(errMsg)
 
+        return wcs_info
+
+
+    def process (self, metadata):
+        """
+        Perform the main work of the task and return the results as a Python data structure.
+        This method overrides JWST_ObsCoreCalcTask method to use iRods file access.
+        """
+        if (self._DEBUG):
+            print("({}.process): ARGS={}".format(self.TOOL_NAME, self.args), file=sys.stderr)
+
+        # get the iRods file path argument of the file to be opened
+        irff_path = self.args.get('irods_fits_file')
+
+        # use the specified HDU of the FITS file to compute the WCS information
+        wcs_info = self.get_image_WCS(irff_path)
+
         # try to produce values for each of the desired result fields
         calculated = self.calculate_results(wcs_info, metadata)
         metadata['calculated'] = calculated  # add calculations to metadata
@@ -1,7 +1,7 @@
 #
 # Class to sink incoming metadata to an iRods file.
 #   Written by: Tom Hicks. 11/30/2020.
-#   Last Modified: Add capability to just remove metadata items.
+#   Last Modified: Record the signature of the source file, for incremental runs.
 #
 import sys
 
@@ -9,6 +9,7 @@ from irods.exception import CollectionDoesNotExist, DataObjectDoesNotExist, Netw
 
 import imdtk.exceptions as errors
 import imdtk.tasks.metadata_utils as md_utils
+from imdtk.core.fits_irods_helper import SOURCE_SIGNATURE_KEY
 from imdtk.core.misc_utils import remove_entries
 from imdtk.tasks.i_task import STDOUT_NAME, IImdTask
 
@@ -51,7 +52,7 @@ class IRodsMetadataSink (IImdTask):
 
         # check the iRods metadata target file path for validity
         try:
-            self.irods.getf(imd_path, absolute=True)
+            imd_file = self.irods.get_fits_file(imd_path)  # a file found by listing is not fetched again
 
         except (CollectionDoesNotExist, DataObjectDoesNotExist, NoResultFound):
             errMsg = "Unable to find iRods file for metadata alteration at '{}'.".format(imd_path)
@@ -66,6 +67,11 @@ class IRodsMetadataSink (IImdTask):
         if (not remove_only):
             remove_entries(sink_data, ignore=self.skip_list)
 
+        # when annotating the input file itself, record the version of the file from which the
+        # metadata was derived, so that incremental runs can skip the file until it changes
+        if ((not remove_only) and (imd_path == self.args.get('irods_fits_file'))):
+            sink_data[SOURCE_SIGNATURE_KEY] = self.irods.file_signature(imd_file)
+
         # decide whether we are changing metadata in iRods or just outputting it
         output_only = self.args.get('output_only')
         if (not output_only):               # if storing metadata to iRods
@@ -100,24 +106,22 @@ class IRodsMetadataSink (IImdTask):
         """
         Attach or remove the items in the given data dictionary to/from the iRods file
         at the specified path. If the remove_only flag is True, file metadata items with
-        keys matching input item keys are removed from the iRods file.
+        keys matching input item keys are removed from the iRods file. The current metadata
+        of the file is read once and only the items which differ are removed or added, all in
+        a single atomic operation.
         """
         if (self._DEBUG):
             print(f"({self.TOOL_NAME}.update_metadata): imd_path={imd_path}, remove_only={remove_only} metadata={sink_data}", file=sys.stderr)
 
         try:
-            if (remove_only):
-                # try to remove the specified metadata from the iRods file node
-                self.irods.remove_metaf(imd_path, sink_data, absolute=True)
-                action = 'removed from'
-            else:
-                # try to attach the given metadata to the iRods file node
-                self.irods.put_metaf(imd_path, sink_data, absolute=True)
-                action = 'attached to'
+            # try to remove the specified metadata from OR attach the given metadata to the iRods file node
+            changed = self.irods.update_metaf(imd_path, sink_data, absolute=True, remove_only=remove_only)
+            action = 'removed from' if (remove_only) else 'attached to'
 
         except (NetworkException, Exception) as ex:
             errMsg = f"Unable to alter the metadata of the iRods file at '{imd_path}'. Exception: {ex}"
             raise errors.ProcessingError(errMsg)
 
         if (self._VERBOSE):
-            print(f"({self.TOOL_NAME}): Metadata {action} iRods file '{imd_path}'", file=sys.stderr)
+            print(f"({self.TOOL_NAME}): Metadata {action} iRods file '{imd_path}' ({changed} items changed)",
+                  file=sys.stderr)
@@ -1,16 +1,14 @@
 #
 # Class to calculate values for the ObsCore fields in a FITS-derived metadata structure.
 #   Written by: Tom Hicks. 6/13/2020.
-#   Last Modified: Refactor to allow abstract calc and default setting methods.
+#   Last Modified: Add batch processing, calculating the geometry of a batch at once.
 #
 import sys
 
-from astropy.io import fits
-
 from config.settings import IMAGE_FETCH_PREFIX
 import imdtk.exceptions as errors
-import imdtk.core.fits_utils as fits_utils
 import imdtk.tasks.metadata_utils as md_utils
+from imdtk.core.header_cache import get_local_headers, open_header_cache
 import imdtk.tasks.oc_calc_utils as occ_utils
 from imdtk.tasks.i_oc_calc import IObsCoreCalcTask
 
@@ -34,12 +32,20 @@ class JWST_ObsCoreCalcTask (IObsCoreCalcTask):
         Constructor for class which calculates values for ObsCore fields in a metadata structure.
         """
         super().__init__(args)
+        self.header_cache = open_header_cache(args)  # persistent header cache: None if disabled
 
 
     #
     # Concrete methods overriding IImdTask and implementing IObsCoreCalcTask abstract methods
     #
 
+    def cleanup (self):
+        """ Do any cleanup/shutdown tasks necessary for the task instance. """
+        if (self.header_cache is not None):
+            self.header_cache.close()
+        super().cleanup()
+
+
     def process (self, metadata):
         """
         Perform the main work of the task on the given metadata and return the results
@@ -54,19 +60,7 @@ class JWST_ObsCoreCalcTask (IObsCoreCalcTask):
             print("({}): Reading FITS file '{}'".format(self.TOOL_NAME, fits_file), file=sys.stderr)
 
         # compute the WCS information from the specified HDU of the FITS file
-        which_hdu = self.args.get('which_hdu', 0)
-
-        try:
-            with fits.open(fits_file) as hdus_list:
-                wcs_info = fits_utils.get_WCS(hdus_list, which_hdu)
-
-        except OSError as oserr:
-            errMsg = "Unable to read WCS info FITS file '{}': {}.".format(fits_file, oserr)
-            raise errors.ProcessingError(errMsg)
-
-        if (wcs_info is None):
-            errMsg = "No WCS info found in FITS file '{}'.".format(fits_file)
-            raise errors.ProcessingError(errMsg)
+        wcs_info = self.get_image_WCS(fits_file)
 
         # try to produce values for each of the desired result fields
         calculated = self.calculate_results(wcs_info, metadata)
@@ -92,6 +86,56 @@ class JWST_ObsCoreCalcTask (IObsCoreCalcTask):
         occ_utils.calc_spatial_resolution(calculations, filter_resolutions)
 
 
+    def get_image_WCS (self, fits_file):
+        """
+        Return the World Coordinate System information from the specified HDU of the given
+        FITS file, or raise a processing error if that information can not be read.
+        """
+        which_hdu = self.args.get('which_hdu', 0)
+
+        try:
+            header_bytes = get_local_headers(self.header_cache, fits_file, [which_hdu]).get(which_hdu)
+            wcs_info = self.make_WCS(header_bytes, fits_file)
+
+        except OSError as oserr:
+            errMsg = "Unable to read WCS info FITS file '{}': {}.".format(fits_file, oserr)
+            raise errors.ProcessingError(errMsg)
+
+        if (wcs_info is None):
+            errMsg = "No WCS info found in FITS file '{}'.".format(fits_file)
+            raise errors.ProcessingError(errMsg)
+
+        return wcs_info
+
+
+    def process_batch (self, metadatas):
+        """
+        Perform the main work of the task on each of the given metadata structures, derived
+        from a batch of FITS files, and return a list of the results, in the same order: for each
+        file, either its metadata, with the calculated values added, or the processing error which
+        prevented that. The image geometry of all the files in the batch is calculated at once.
+        """
+        results = list(metadatas)
+        wcs_infos = dict()                  # WCS info of each file, keyed by batch position
+        for idx, metadata in enumerate(metadatas):
+            file_info = md_utils.get_file_info(metadata) or dict()
+            try:
+                wcs_infos[idx] = self.get_image_WCS(file_info.get('file_path'))
+            except errors.ProcessingError as pe:
+                results[idx] = pe
+
+        # calculate the geometry for the whole batch, then the remaining values for each file
+        calculations_list = [ dict() for idx in wcs_infos ]
+        occ_utils.calc_geometry_batch(list(wcs_infos.values()), calculations_list)
+        for (idx, wcs_info), calculations in zip(wcs_infos.items(), calculations_list):
+            try:
+                results[idx]['calculated'] = self.complete_results(wcs_info, results[idx], calculations)
+            except errors.ProcessingError as pe:
+                results[idx] = pe
+
+        return results
+
+
     def set_default_instrument_name (self, defaults, metadata, calculations):
         """
         Use the given metadata to create a fallback/default instrument name.
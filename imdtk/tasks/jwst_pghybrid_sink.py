@@ -1,7 +1,7 @@
 #
 # Class to sink incoming image metadata to a Hybrid (SQL/JSON) PostgreSQL database.
 #   Written by: Tom Hicks. 7/3/2020.
-#   Last Modified: Remove unused DB import.
+#   Last Modified: Replace the rows already stored for a re-ingested file.
 #
 import sys
 
@@ -78,9 +78,13 @@ class JWST_HybridPostgreSQLSink (ISQLSink):
         dbconfig_file = self.args.get('dbconfig_file') or DEFAULT_DBCONFIG_FILEPATH
         dbconfig = self.load_sql_db_config(dbconfig_file)
 
-        # execute SQL to store the given data dictionary into the named table
+        # execute SQL to store the given data dictionary into the named table,
+        # replacing any rows already stored for the file (e.g., when it is re-ingested)
         table_name = self.args.get('table_name') or DEFAULT_HYBRID_TABLE_NAME
-        pg_sql.insert_hybrid_row(dbconfig, outdata, table_name)
+        if (self.args.get('replace_existing')):
+            pg_sql.replace_hybrid_row(dbconfig, outdata, table_name)
+        else:
+            pg_sql.insert_hybrid_row(dbconfig, outdata, table_name)
 
         if (self._VERBOSE):
             print("({}): Results stored in '{}'".format(self.TOOL_NAME, table_name), file=sys.stderr)
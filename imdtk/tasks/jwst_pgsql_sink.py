@@ -1,7 +1,7 @@
 #
 # Class to sink incoming image metadata to a PostgreSQL database.
 #   Written by: Tom Hicks. 6/21/2020.
-#   Last Modified: Retain and output file size now.
+#   Last Modified: Replace the rows already stored for a re-ingested file.
 #
 import sys
 
@@ -85,9 +85,13 @@ class JWST_ObsCorePostgreSQLSink (ISQLSink):
         dbconfig_file = self.args.get('dbconfig_file') or DEFAULT_DBCONFIG_FILEPATH
         dbconfig = self.load_sql_db_config(dbconfig_file)
 
-        # execute SQL to store the given data dictionary into the named table
+        # execute SQL to store the given data dictionary into the named table,
+        # replacing any rows already stored for the file (e.g., when it is re-ingested)
         table_name = self.args.get('table_name') or DEFAULT_METADATA_TABLE_NAME
-        pg_sql.insert_row(dbconfig, outdata, table_name)
+        if (self.args.get('replace_existing')):
+            pg_sql.replace_row(dbconfig, outdata, table_name)
+        else:
+            pg_sql.insert_row(dbconfig, outdata, table_name)
 
         if (self._VERBOSE):
             print("({}): Results stored in '{}'".format(self.TOOL_NAME, table_name), file=sys.stderr)
@@ -1,7 +1,7 @@
 #
 # Utilities to the various metadata components in a FITS-derived metadata structure.
 #   Written by: Tom Hicks. 6/13/2020.
-#   Last Modified: Add getter for the data table in catalog metadata.
+#   Last Modified: Add getter for the streamed chunks of catalog data.
 #
 from imdtk.core.misc_utils import get_in
 
@@ -57,6 +57,26 @@ def get_column_formats (metadata):
     return get_in(metadata, ['column_info', 'format'])
 
 
+def get_column_scales (metadata):
+    """ Accessor for the column scale (TSCALn) list embedded in the given catalog metadata structure. """
+    return get_in(metadata, ['column_info', 'bscale'])
+
+
+def get_column_stats (metadata):
+    """ Accessor for the column statistics structure embedded in the given catalog data structure. """
+    return metadata.get('column_stats')
+
+
+def get_column_zeros (metadata):
+    """ Accessor for the column offset (TZEROn) list embedded in the given catalog metadata structure. """
+    return get_in(metadata, ['column_info', 'bzero'])
+
+
 def get_data (metadata):
     """ Accessor for the data table embedded in the given metadata/data structure. """
     return metadata.get('data')
+
+
+def get_data_chunks (metadata):
+    """ Accessor for the iterable of data table chunks embedded in the given data structure. """
+    return metadata.get('data_chunks')
@@ -1,13 +1,14 @@
 #
 # Class to report on the presence of missing fields in the FITS-derived metadata structure.
 #   Written by: Tom Hicks. 6/13/2020.
-#   Last Modified: Raise exception on missing calculated data.
+#   Last Modified: Read the fields info from the shared run context.
 #
 import sys
 
 import imdtk.exceptions as errors
 import imdtk.tasks.metadata_utils as md_utils
 from imdtk.tasks.i_task import IImdTask
+from imdtk.tasks.run_context import share_run_context
 
 
 class MissingFieldsTask (IImdTask):
@@ -18,6 +19,7 @@ class MissingFieldsTask (IImdTask):
         Constructor for class which reports on missing fields in a metadata structure.
         """
         super().__init__(args)
+        self.run_context = share_run_context(args)  # shared with the other tasks of the pipeline
 
 
     #
@@ -56,7 +58,11 @@ class MissingFieldsTask (IImdTask):
             errMsg = "The 'calculated' data, required by this program, is missing from the input."
             raise errors.ProcessingError(errMsg)
 
-        fields_info = md_utils.get_fields_info(metadata)
+        if (not self.run_context.has_fields()):
+            errMsg = "The fields information, required by this program, is missing from the run context."
+            raise errors.ProcessingError(errMsg)
+
+        fields_info = self.run_context.fields_info
         for field_name, props in fields_info.items():
             if (field_name not in calculated):
                 req_fld = 'Required' if props.get('required') else 'Optional'
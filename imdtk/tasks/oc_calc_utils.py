@@ -1,9 +1,10 @@
 #
 # Utilities to calculate values for the ObsCore fields in a FITS-derived metadata structure.
 #   Written by: Tom Hicks. 6/11/2020.
-#   Last Modified: Test & convert CRVALs from header to floats.
+#   Last Modified: Add image size calculation.
 #
 import imdtk.exceptions as errors
+import imdtk.core.fast_wcs as fast_wcs
 import imdtk.core.fits_utils as fits_utils
 import imdtk.tasks.metadata_utils as md_utils
 
@@ -54,6 +55,52 @@ def calc_scale (wcs_info, calculations):
         calculations['im_scale'] = scale[0]
 
 
+def calc_geometry_batch (wcs_infos, calculations_list):
+    """
+    Calculate the scale, corner points, and spatial limits for each of a batch of images,
+    given the FITS file WCS information for each image, and store them in the corresponding
+    dictionary of the given list of calculations dictionaries.
+
+    The geometry of all the images with a fast WCS is calculated at once, by vectorized
+    operations on the arrays of their WCS keyword values. The geometry of any other images
+    is calculated one image at a time (see calc_scale and calc_corners).
+    """
+    fast_indices = [ idx for idx, wcs_info in enumerate(wcs_infos)
+                     if isinstance(wcs_info, fast_wcs.FastWCS) ]
+    if (fast_indices):
+        wcs_arrays = fast_wcs.fast_wcs_arrays([ wcs_infos[idx] for idx in fast_indices ])
+        scales = fast_wcs.pixel_scales(wcs_arrays[2])
+        corners = fast_wcs.footprints(*wcs_arrays)
+        lo_limits = corners.min(axis=1)
+        hi_limits = corners.max(axis=1)
+        for row, idx in enumerate(fast_indices):
+            calculations = calculations_list[idx]
+            calculations['im_scale'] = scales[row][0]
+            for num, corner in enumerate(corners[row], 1):  # LowerLeft, clockwise
+                set_corner_field(calculations, f"im_ra{num}", f"im_dec{num}", corner)
+            calculations['spat_lolimit1'] = lo_limits[row][0]
+            calculations['spat_hilimit1'] = hi_limits[row][0]
+            calculations['spat_lolimit2'] = lo_limits[row][1]
+            calculations['spat_hilimit2'] = hi_limits[row][1]
+
+    fast_set = set(fast_indices)
+    for idx, wcs_info in enumerate(wcs_infos):
+        if (idx not in fast_set):
+            calc_scale(wcs_info, calculations_list[idx])
+            calc_corners(wcs_info, calculations_list[idx])
+
+
+def calc_image_size (calculations):
+    """
+    Copy the already calculated image dimensions (s_xel1 and s_xel2), when present,
+    into the image size fields (im_naxis1 and im_naxis2).
+    """
+    if (calculations.get('s_xel1') is not None):
+        calculations['im_naxis1'] = calculations.get('s_xel1')
+    if (calculations.get('s_xel2') is not None):
+        calculations['im_naxis2'] = calculations.get('s_xel2')
+
+
 def calc_pixtype (metadata, calculations):
     """
     Calculate the value string for the ObsCore im_pixeltype field based on the value
@@ -0,0 +1,69 @@
+#
+# Class to hold the run-level context shared by the tasks of a pipeline.
+#   Written by: Tom Hicks. 10/19/2026.
+#   Last Modified: Initial creation.
+#
+
+# key of the run context: in the task arguments and at the head of a JSON output stream
+RUN_CONTEXT_KEY = 'run_context'
+
+
+class RunContext ():
+    """
+    Class holding the run-level context: the fields information and defaults, which are the
+    same for all the metadata records of a run and so are not carried in each record.
+    The context is shared, through the task arguments, by all the tasks of a pipeline.
+    """
+
+    def __init__(self, fields_info=None, defaults=None):
+        """
+        Constructor for class holding the run-level context shared by the tasks of a pipeline.
+        """
+        self.fields_info = fields_info      # dictionary of fields info, treated as read-only
+        self.defaults = defaults            # dictionary of field defaults, treated as read-only
+        self._emitted = set()               # output destinations the context was emitted to
+
+
+    def as_dict (self):
+        """ Return the context as a dictionary, suitable for output at the head of a stream. """
+        return { 'fields_info': self.fields_info, 'defaults': self.defaults }
+
+
+    def first_emit (self, destination):
+        """
+        Return True the first time this is called for the given output destination and False
+        thereafter: the context is emitted only once, at the head of each output stream.
+        """
+        if (destination in self._emitted):
+            return False
+        self._emitted.add(destination)
+        return True
+
+
+    def has_fields (self):
+        """ Return True if the fields information has been set in this context. """
+        return (self.fields_info is not None)
+
+
+    def update (self, context):
+        """ Set this context from the given dictionary, as read from the head of a stream. """
+        self.fields_info = context.get('fields_info')
+        self.defaults = context.get('defaults')
+
+
+
+def get_run_context (args):
+    """ Return the run context shared through the given task arguments, or None if none. """
+    return args.get(RUN_CONTEXT_KEY)
+
+
+def share_run_context (args):
+    """
+    Return the run context shared through the given task arguments, first adding a new,
+    empty run context to the arguments if they do not yet have one.
+    """
+    context = args.get(RUN_CONTEXT_KEY)
+    if (context is None):
+        context = RunContext()
+        args[RUN_CONTEXT_KEY] = context
+    return context
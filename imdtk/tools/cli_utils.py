@@ -1,17 +1,21 @@
 #
 # Class defining utility methods for tool components CLI.
 #   Written by: Tom Hicks. 6/1/2020.
-#   Last Modified: Correct doc string: iRods metadata file argument not required.
+#   Last Modified: Keep the exit codes unique across tools.
 #
 import argparse
+import os
 import sys
 
 from config.settings import DEFAULT_IMD_ALIASES_FILEPATH, DEFAULT_DBCONFIG_FILEPATH
 from config.settings import DEFAULT_FIELDS_FILEPATH, DEFAULT_METADATA_TABLE_NAME
+from config.settings import DEFAULT_HEADER_CACHE_FILEPATH, DEFAULT_INGEST_MANIFEST_FILEPATH
 from imdtk.version import VERSION
+from imdtk.core.fast_wcs import DEFAULT_WCS_MODE, WCS_MODES
 from imdtk.core.file_utils import good_dir_path, good_file_path, validate_file_path
-from imdtk.core.fits_utils import FITS_EXTENTS, FITS_IGNORE_KEYS, is_fits_filename
+from imdtk.core.fits_utils import DATA_CHUNK_SIZE, FITS_EXTENTS, FITS_IGNORE_KEYS, is_fits_filename
 from imdtk.core.fits_irods_helper import IRODS_FITS_EXTENTS
+from imdtk.core.irods_helper import DEFAULT_LISTING_MODE, LISTING_MODES
 
 
 # required arguments:
@@ -24,6 +28,28 @@ ALIAS_FILE_EXIT_CODE = 30
 DBCONFIG_FILE_EXIT_CODE = 31
 FIELDS_FILE_EXIT_CODE = 32
 INPUT_FILE_EXIT_CODE = 33
+WORKERS_EXIT_CODE = 34
+KEY_FILE_EXIT_CODE = 35
+READ_AHEAD_EXIT_CODE = 36
+HEADER_CACHE_EXIT_CODE = 37
+MANIFEST_EXIT_CODE = 39
+CHUNK_SIZE_EXIT_CODE = 40
+LOCAL_IRODS_EXIT_CODE = 41
+
+# errors of particular tools (kept here, so that all exit codes are unique):
+CACHE_ERROR_EXIT_CODE = 38                  # header cache can not be opened or pruned
+
+# default number of parallel workers for pipelines which support them
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def add_adaptive_argument (parser, tool_name):
+    """ Add the argument, selecting adaptive concurrency, to the given argparse parser object. """
+    parser.add_argument(
+        '-ac', '--adaptive', dest='adaptive', action='store_true',
+        default=False,
+        help='Adapt the number of concurrent reads or loads, up to the number of workers, to the server response [default: False]'
+    )
 
 
 def add_aliases_argument (parser, tool_name, default_msg=DEFAULT_IMD_ALIASES_FILEPATH):
@@ -55,6 +81,16 @@ def add_catalog_table_argument (parser, tool_name, default_msg='no default'):
     )
 
 
+def add_chunk_size_argument (parser, tool_name):
+    """ Add the argument, specifying the number of catalog rows read and loaded at a time,
+        to the given argparse parser object. """
+    parser.add_argument(
+        '-cs', '--chunk-size', dest='chunk_size', metavar='rows',
+        default=argparse.SUPPRESS, type=int,
+        help="Number of catalog table rows to read and load at a time [default: {}]".format(DATA_CHUNK_SIZE)
+    )
+
+
 def add_collection_argument (parser, tool_name, default_msg='no default'):
     """ Add the argument, naming a specific data collection within the database,
         to the given argparse parser object. """
@@ -109,6 +145,16 @@ def add_hdu_argument (parser, tool_name):
     )
 
 
+def add_header_cache_argument (parser, tool_name):
+    """ Add the argument, enabling the persistent cache of FITS headers and optionally
+        specifying the path to the cache database file, to the given argparse parser object. """
+    parser.add_argument(
+        '-hc', '--header-cache', dest='header_cache', metavar='filepath',
+        nargs='?', const=DEFAULT_HEADER_CACHE_FILEPATH, default=argparse.SUPPRESS,
+        help="Cache FITS headers in a database file, shared by all tool runs [default: no caching; if no file is given: {}]".format(DEFAULT_HEADER_CACHE_FILEPATH)
+    )
+
+
 def add_ignore_list_argument (parser, tool_name):
     """ Add the argument, specifying a single header keyword to ignore in the input,
         to the given argparse parser object. """
@@ -119,6 +165,30 @@ def add_ignore_list_argument (parser, tool_name):
     )
 
 
+def add_incremental_arguments (parser, tool_name, manifest_required=False):
+    """ Add the arguments, selecting incremental processing of only new or changed files and
+        optionally specifying the path to the ingest manifest database file, to the given
+        argparse parser object. If the manifest is required, incremental processing always
+        uses one: the default manifest if no other is specified. """
+    parser.add_argument(
+        '-inc', '--incremental', dest='incremental', action='store_true',
+        default=False,
+        help='Process only the files which are new or changed since they were last processed [default: False]'
+    )
+
+    if (manifest_required):
+        manifest_help = "Record processed files in a manifest database file [default: {}]".format(
+            DEFAULT_INGEST_MANIFEST_FILEPATH)
+    else:
+        manifest_help = "Record processed files in a manifest database file [default: no manifest: use the source signature metadata of the files; if no file is given: {}]".format(DEFAULT_INGEST_MANIFEST_FILEPATH)
+    parser.add_argument(
+        '-mf', '--manifest', dest='manifest', metavar='filepath',
+        nargs='?', const=DEFAULT_INGEST_MANIFEST_FILEPATH,
+        default=(DEFAULT_INGEST_MANIFEST_FILEPATH if manifest_required else argparse.SUPPRESS),
+        help=manifest_help
+    )
+
+
 def add_input_dir_argument (parser, tool_name):
     """ Add the argument, specifying the path to a directory of input files,
         to the given argparse parser object. """
@@ -167,6 +237,49 @@ def add_irods_md_file_argument (parser, tool_name):
     )
 
 
+def add_keyfile_argument (parser, tool_name):
+    """ Add the argument, specifying the path to a file of header keywords to be extracted,
+        to the given argparse parser object. """
+    parser.add_argument(
+        '-k', '--keyfile', dest='keyfile', metavar='filepath',
+        default=argparse.SUPPRESS,
+        help="Path to a file of header keywords to extract, one per line [default: all keywords]"
+    )
+
+
+def add_listing_mode_argument (parser, tool_name):
+    """ Add the argument, selecting how the files in an iRods collection tree are listed,
+        to the given argparse parser object. """
+    parser.add_argument(
+        '-lm', '--listing-mode', dest='listing_mode',
+        default=argparse.SUPPRESS,
+        choices=LISTING_MODES,
+        help="How to list iRods files: 'query' with bulk catalog queries; 'walk' collection by collection [default: \"{}\"]".format(DEFAULT_LISTING_MODE)
+    )
+
+
+def add_local_irods_arguments (parser, tool_name):
+    """ Add the arguments, specifying a local directory tree to be served in place of iRods and
+        the simulated latency and bandwidth of its requests, to the given argparse parser object. """
+    parser.add_argument(
+        '--irods-local-root', dest='irods_local_root', metavar='dirpath',
+        default=argparse.SUPPRESS,
+        help='Path to a local directory tree to serve in place of iRods, for benchmarking [default: (use iRods)]'
+    )
+
+    parser.add_argument(
+        '--irods-latency', dest='irods_latency_ms', metavar='ms',
+        default=argparse.SUPPRESS, type=float,
+        help='Simulated latency, in milliseconds, of each request to the local iRods tree [default: 0]'
+    )
+
+    parser.add_argument(
+        '--irods-bandwidth', dest='irods_bandwidth_mbs', metavar='MB/s',
+        default=argparse.SUPPRESS, type=float,
+        help='Simulated bandwidth, in megabytes per second, of transfers from the local iRods tree [default: (unlimited)]'
+    )
+
+
 def add_output_arguments (parser, tool_name):
     """ Add common output directive and file arguments to the given argparse parser object. """
     parser.add_argument(
@@ -211,6 +324,16 @@ def add_output_only_argument (parser, tool_name):
 #     )
 
 
+def add_read_ahead_argument (parser, tool_name):
+    """ Add the argument, specifying the size of the read-ahead window used when reading
+        iRods files, to the given argparse parser object. """
+    parser.add_argument(
+        '-ra', '--read-ahead', dest='read_ahead_kb', metavar='KB',
+        default=argparse.SUPPRESS, type=int,
+        help='Size, in kilobytes, of the window read ahead from iRods files (0 to disable) [default: 128]'
+    )
+
+
 def add_report_format_argument (parser, tool_name):
     """ Add a report format specification argument to the given argparse parser object. """
     parser.add_argument(
@@ -241,6 +364,31 @@ def add_shared_arguments (parser, tool_name):
     )
 
 
+def add_skip_names_argument (parser, tool_name):
+    """ Add the argument, specifying a name pattern of files which do not hold images
+        and are to be skipped, to the given argparse parser object. """
+    parser.add_argument(
+        '-sn', '--skip-name', dest='skip_names', metavar='pattern', action='append',
+        help="Skip FITS files whose names match this pattern (may be repeated) [default: none]"
+    )
+
+
+def add_stats_arguments (parser, tool_name):
+    """ Add the arguments, specifying where to output the column statistics collected
+        while loading catalog data, to the given argparse parser object. """
+    parser.add_argument(
+        '-sf', '--stats-file', dest='stats_file', metavar='filepath',
+        default=argparse.SUPPRESS,
+        help='File path of file to hold the column statistics as JSON [default: none (standard error in verbose mode)]'
+    )
+
+    parser.add_argument(
+        '-st', '--stats-table', dest='stats_table', metavar='table-name',
+        default=argparse.SUPPRESS,
+        help='Name of a database table in which to also store the column statistics [default: none]'
+    )
+
+
 def add_table_name_argument (parser, tool_name, default_msg='no default'):
     """ Add the argument, naming a database table, to the given argparse parser object. """
     parser.add_argument(
@@ -251,6 +399,28 @@ def add_table_name_argument (parser, tool_name, default_msg='no default'):
 
 
 
+def add_wcs_mode_argument (parser, tool_name):
+    """ Add the argument, selecting how the WCS information of images is computed,
+        to the given argparse parser object. """
+    parser.add_argument(
+        '-wm', '--wcs-mode', dest='wcs_mode',
+        default=argparse.SUPPRESS,
+        choices=WCS_MODES,
+        help="How to compute WCS information: 'fast' for simple projections, else Astropy; 'astropy' always; 'validate' compares the two [default: \"{}\"]".format(DEFAULT_WCS_MODE)
+    )
+
+
+def add_workers_argument (parser, tool_name, default=DEFAULT_WORKERS):
+    """ Add the argument, specifying the number of parallel workers to use,
+        to the given argparse parser object. """
+    parser.add_argument(
+        '-w', '--workers', dest='workers', metavar='N',
+        default=default, type=int,
+        help="Number of files to process in parallel [default: {}]".format(default)
+    )
+
+
+
 def check_catalog_table (catalog_table_name, tool_name, exit_code=CATALOG_TABLE_EXIT_CODE):
     """
     Check that the required catalog table name is provided If not, then exit
@@ -270,6 +440,15 @@ def check_alias_file (alias_file, tool_name, exit_code=ALIAS_FILE_EXIT_CODE):
             exit_with_error(tool_name, exit_code, "A readable aliases file must be specified.")
 
 
+def check_chunk_size (chunk_size, tool_name, exit_code=CHUNK_SIZE_EXIT_CODE):
+    """
+    Check that the given catalog chunk size, if given, is a positive number. If not, then exit
+    the entire program here with the specified (or default) system exit code.
+    """
+    if ((chunk_size is not None) and (chunk_size < 1)):
+        exit_with_error(tool_name, exit_code, "The chunk size must be a positive number of rows.")
+
+
 def check_dbconfig_file (dbconfig_file, tool_name, exit_code=DBCONFIG_FILE_EXIT_CODE):
     """
     If a path to a DB configuration file is given, check that it is a good path. If not,
@@ -301,6 +480,19 @@ def check_fits_file (fits_file, tool_name, exit_code=FITS_FILE_EXIT_CODE):
         exit_with_error(tool_name, exit_code, "A readable, valid FITS image file must be specified.")
 
 
+def check_header_cache (header_cache, tool_name, exit_code=HEADER_CACHE_EXIT_CODE):
+    """
+    If the given header cache file path is not None, check that the directory which is to hold
+    the cache file exists. If not, then exit the entire program here with the specified
+    (or default) system exit code.
+    """
+    if (header_cache is not None):
+        cache_dir = os.path.dirname(os.path.abspath(header_cache))
+        if (not os.path.isdir(cache_dir)):
+            errMsg = "The directory to hold the header cache file '{}' does not exist.".format(header_cache)
+            exit_with_error(tool_name, exit_code, errMsg)
+
+
 def check_input_dir (input_dir, tool_name, exit_code=INPUT_DIR_EXIT_CODE):
     """
     Check that the required input directory path is a valid path. If not, then exit
@@ -328,7 +520,68 @@ def check_irods_fits_file (fits_file, tool_name, exit_code=FITS_FILE_EXIT_CODE):
     """
     if (not is_fits_filename(fits_file, IRODS_FITS_EXTENTS)):
         exit_with_error(tool_name, exit_code,
-                        "A readable, valid, uncompressed FITS file must be specified.")
+                        "A readable, valid FITS file must be specified.")
+
+
+def check_key_file (key_file, tool_name, exit_code=KEY_FILE_EXIT_CODE):
+    """
+    If a path to a header keywords file is given, check that it is a good path. If not,
+    then exit the entire program here with the specified (or default) system exit code.
+    """
+    if (key_file):                          # if keywords file given, check it
+        if (not good_file_path(key_file)):
+            exit_with_error(tool_name, exit_code,
+                            "A readable header keywords file must be specified.")
+
+
+def check_local_irods (args, tool_name, exit_code=LOCAL_IRODS_EXIT_CODE):
+    """
+    If a local directory tree is to be served in place of iRods, check that the directory exists
+    and that its simulated latency and bandwidth, if given, are not negative and positive. If not,
+    then exit the entire program here with the specified (or default) system exit code.
+    """
+    local_root = args.get('irods_local_root')
+    if ((local_root is not None) and (not good_dir_path(local_root))):
+        exit_with_error(tool_name, exit_code,
+                        "The local iRods root directory '{}' is not a readable directory.".format(local_root))
+    latency_ms = args.get('irods_latency_ms')
+    if ((latency_ms is not None) and (latency_ms < 0)):
+        exit_with_error(tool_name, exit_code, "The simulated iRods latency must not be negative.")
+    bandwidth_mbs = args.get('irods_bandwidth_mbs')
+    if ((bandwidth_mbs is not None) and (bandwidth_mbs <= 0)):
+        exit_with_error(tool_name, exit_code, "The simulated iRods bandwidth must be a positive number.")
+
+
+def check_manifest (args, tool_name, exit_code=MANIFEST_EXIT_CODE):
+    """
+    If files are to be processed incrementally, using an ingest manifest, check that the
+    directory which is to hold the manifest file exists. If not, then exit the entire program
+    here with the specified (or default) system exit code.
+    """
+    manifest = args.get('manifest')
+    if (args.get('incremental') and (manifest is not None)):
+        manifest_dir = os.path.dirname(os.path.abspath(manifest))
+        if (not os.path.isdir(manifest_dir)):
+            errMsg = "The directory to hold the ingest manifest file '{}' does not exist.".format(manifest)
+            exit_with_error(tool_name, exit_code, errMsg)
+
+
+def check_read_ahead (read_ahead_kb, tool_name, exit_code=READ_AHEAD_EXIT_CODE):
+    """
+    Check that the given read-ahead window size, if given, is not negative. If it is, then exit
+    the entire program here with the specified (or default) system exit code.
+    """
+    if ((read_ahead_kb is not None) and (read_ahead_kb < 0)):
+        exit_with_error(tool_name, exit_code, "The read-ahead size must not be negative.")
+
+
+def check_workers (workers, tool_name, exit_code=WORKERS_EXIT_CODE):
+    """
+    Check that the given number of parallel workers is a positive number. If not, then exit
+    the entire program here with the specified (or default) system exit code.
+    """
+    if ((workers is None) or (workers < 1)):
+        exit_with_error(tool_name, exit_code, "The number of workers must be a positive number.")
 
 
 def exit_with_error (tool_name, exit_code, exit_msg):
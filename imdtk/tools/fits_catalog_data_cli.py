@@ -2,7 +2,7 @@
 #
 # Module to extract a catalog data table from a FITS file and output it as JSON.
 #   Written by: Tom Hicks. 8/12/2020.
-#   Last Modified: Warn on unsupported file type error.
+#   Last Modified: Add catalog chunk size argument.
 #
 import argparse
 import sys
@@ -37,6 +37,7 @@ def main (argv=None):
     cli_utils.add_shared_arguments(parser, TOOL_NAME)
     cli_utils.add_fits_file_argument(parser, TOOL_NAME)
     cli_utils.add_catalog_hdu_argument(parser, TOOL_NAME)
+    cli_utils.add_chunk_size_argument(parser, TOOL_NAME)
     cli_utils.add_output_arguments(parser, TOOL_NAME)
 
     # actually parse the arguments from the command line
@@ -51,6 +52,9 @@ def main (argv=None):
     fits_file = args.get('fits_file')
     cli_utils.check_fits_file(fits_file, TOOL_NAME)  # may system exit here and not return!
 
+    # check the optional number of catalog rows read and loaded at a time
+    cli_utils.check_chunk_size(args.get('chunk_size'), TOOL_NAME)  # may system exit here and not return!
+
     # add additional arguments to args
     args['TOOL_NAME'] = TOOL_NAME
 
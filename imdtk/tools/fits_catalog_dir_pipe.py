@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+#
+# Python pipeline to create a PostreSQL database table from the catalog metadata of a
+# directory of FITS catalog files, all having the same schema, and to fill the table,
+# in parallel, with the catalog data from each of the files.
+#   Written by: Tom Hicks. 1/12/21.
+#   Last Modified: Stream each catalog into the table in chunks, without statistics.
+#
+import argparse
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import psycopg2
+
+from config.settings import DEFAULT_CAT_ALIASES_FILEPATH, DEFAULT_DBCONFIG_FILEPATH
+import imdtk.exceptions as errors
+import imdtk.tasks.metadata_utils as md_utils
+import imdtk.tools.cli_utils as cli_utils
+from imdtk.core.adaptive_limiter import make_adaptive_limiter
+from imdtk.core.fits_utils import gen_fits_file_paths
+
+from imdtk.tasks.catalog_aliases import CatalogAliasesTask
+from imdtk.tasks.fits_catalog_data import FitsCatalogDataTask
+from imdtk.tasks.fits_catalog_md import FitsCatalogMetadataTask
+from imdtk.tasks.fits_catalog_mktbl_sink import FitsCatalogMakeTableSink
+from imdtk.tasks.fits_catalog_table_sink import FitsCatalogFillTableSink
+
+
+# Program name for this tool.
+TOOL_NAME = 'fits_cat_dir_pipe'
+
+# Error code of a failed load caused by an unavailable or overloaded database server.
+DB_UNAVAILABLE_ERROR_CODE = 503
+
+
+def main (argv=None):
+    """
+    The main method for the pipeline. This method is called from the command line,
+    processes the command line arguments and calls into the ImdTk library to do its work.
+    This main method takes no arguments so it can be called by setuptools.
+    """
+
+    # the main method takes no arguments so it can be called by setuptools
+    if (argv is None):                      # if called by setuptools
+        argv = sys.argv[1:]                 # then fetch the arguments from the system
+
+    # setup command line argument parsing and add shared arguments
+    parser = argparse.ArgumentParser(
+        prog=TOOL_NAME,
+        formatter_class=argparse.RawTextHelpFormatter,
+        description='Pipeline to create and fill a PostgreSQL database table from a directory of FITS catalogs.'
+    )
+
+    cli_utils.add_shared_arguments(parser, TOOL_NAME)
+    cli_utils.add_input_dir_argument(parser, TOOL_NAME)
+    cli_utils.add_catalog_hdu_argument(parser, TOOL_NAME)
+    cli_utils.add_aliases_argument(parser, TOOL_NAME, default_msg=DEFAULT_CAT_ALIASES_FILEPATH)
+    cli_utils.add_output_arguments(parser, TOOL_NAME)
+    cli_utils.add_database_arguments(parser, TOOL_NAME)
+    cli_utils.add_catalog_table_argument(parser, TOOL_NAME)
+    cli_utils.add_chunk_size_argument(parser, TOOL_NAME)
+    cli_utils.add_workers_argument(parser, TOOL_NAME)
+    cli_utils.add_adaptive_argument(parser, TOOL_NAME)
+
+    # actually parse the arguments from the command line
+    args = vars(parser.parse_args(argv))
+
+    # if debugging, set verbose and echo input arguments
+    if (args.get('debug')):
+        args['verbose'] = True              # if debug turn on verbose too
+        print("({}.main): ARGS={}".format(TOOL_NAME, args), file=sys.stderr)
+
+    # check the required catalog directory path for validity
+    input_dir = args.get('input_dir')
+    cli_utils.check_input_dir(input_dir, TOOL_NAME)  # may system exit here and not return!
+
+    # if database config file path given, check the file path for validity
+    dbconfig_file = args.get('dbconfig_file')
+    cli_utils.check_dbconfig_file(dbconfig_file, TOOL_NAME)  # may system exit here and not return!
+
+    # check the required catalog table name
+    catalog_table = args.get('catalog_table')
+    cli_utils.check_catalog_table(catalog_table, TOOL_NAME)  # may system exit here and not return!
+
+    # check the number of parallel loading workers
+    workers = args.get('workers')
+    cli_utils.check_workers(workers, TOOL_NAME)  # may system exit here and not return!
+
+    # check the optional number of catalog rows read and loaded at a time
+    cli_utils.check_chunk_size(args.get('chunk_size'), TOOL_NAME)  # may system exit here and not return!
+
+    # add additional arguments to args
+    args['TOOL_NAME'] = TOOL_NAME
+
+    # instantiate the tasks which form the pipeline
+    fits_catalog_mdTask = FitsCatalogMetadataTask(args)
+    catalog_aliasesTask = CatalogAliasesTask(args)
+    fits_catalog_mktbl_sinkTask = FitsCatalogMakeTableSink(args)
+
+    if (args.get('verbose')):
+        print("({}): Processing FITS catalogs in '{}'.".format(TOOL_NAME, input_dir), file=sys.stderr)
+
+    # read the metadata of each catalog and keep only those whose schema matches the first
+    failures = []
+    first_md = None
+    load_files = []
+    for fits_file in sorted(gen_fits_file_paths(input_dir)):
+        args['fits_file'] = fits_file       # reset the FITS file argument to next file
+        try:
+            metadata = catalog_aliasesTask.process(fits_catalog_mdTask.process(None))
+        except errors.ProcessingError as pe:
+            failures.append(file_failure(fits_file, pe.error_code, pe.message))
+            continue
+
+        if (first_md is None):
+            first_md = metadata
+        elif (catalog_schema(metadata) != catalog_schema(first_md)):
+            errMsg = "Catalog schema does not match the schema of '{}'.".format(
+                md_utils.get_file_info(first_md).get('file_path'))
+            failures.append(file_failure(fits_file, errors.UnsupportedType.ERROR_CODE, errMsg))
+            continue
+
+        load_files.append(fits_file)
+
+    if (first_md is None):
+        errMsg = "({}): ERROR: No readable FITS catalogs found in '{}'.".format(TOOL_NAME, input_dir)
+        print(errMsg, file=sys.stderr)
+        sys.exit(errors.ImageNotFound.ERROR_CODE)
+
+    # create the table once, from the metadata of the first catalog
+    args['fits_file'] = md_utils.get_file_info(first_md).get('file_path')
+    try:
+        fits_catalog_mktbl_sinkTask.output_results(first_md)  # sink to DB: nothing returned
+
+    except errors.ProcessingError as pe:
+        errMsg = "({}): ERROR: Processing Error ({}): {}".format(
+            TOOL_NAME, pe.error_code, pe.message)
+        print(errMsg, file=sys.stderr)
+        sys.exit(pe.error_code)
+
+    # fill the table from all the compatible catalogs, unless only outputting the SQL
+    loaded = []
+    if (not args.get('output_only')):
+        dbconfig = fits_catalog_mktbl_sinkTask.load_sql_db_config(
+            args.get('dbconfig_file') or DEFAULT_DBCONFIG_FILEPATH)
+        limiter = make_adaptive_limiter(args, 'catalog loads', workers)  # None unless adaptive
+        for (fits_file, row_count, error) in load_catalog_files(args, dbconfig, load_files, workers, limiter):
+            if (error is None):
+                loaded.append({ 'file_path': fits_file, 'rows': row_count })
+                if (args.get('verbose')):
+                    print("({}): Loaded {} rows from FITS file '{}'.".format(
+                        TOOL_NAME, row_count, fits_file), file=sys.stderr)
+            else:
+                failures.append(error)
+                errMsg = "({}): ERROR: Processing Error ({}): FITS file '{}': {}".format(
+                    TOOL_NAME, error.get('error_code'), fits_file, error.get('message'))
+                print(errMsg, file=sys.stderr)
+        if (args.get('verbose') and (limiter is not None)):
+            limiter_stats = limiter.stats()
+            print("({}): Concurrent loads ended limited to {} ({} increases, {} decreases).".format(
+                TOOL_NAME, limiter_stats['limit'], limiter_stats['increases'],
+                limiter_stats['decreases']), file=sys.stderr)
+
+    # output a single summary of the per-file row counts and failures
+    summary = dict()
+    summary['catalog_table'] = catalog_table
+    summary['total_rows'] = sum([ld.get('rows') for ld in loaded])
+    summary['loaded'] = sorted(loaded, key=lambda ld: ld.get('file_path'))
+    summary['failed'] = failures
+    summary_file = sys.stderr if (args.get('output_only')) else args.get('output_file')
+    fits_catalog_mktbl_sinkTask.output_JSON(summary, summary_file)
+
+    if (args.get('verbose')):
+        print("({}): Loaded {} of {} FITS catalogs into table '{}'.".format(
+            TOOL_NAME, len(loaded), len(loaded) + len(failures), catalog_table), file=sys.stderr)
+
+
+def catalog_schema (metadata):
+    """
+    Return a tuple of the (aliased) column names, formats, offsets, and scales from the given
+    catalog metadata, by which two catalogs can be compared for compatibility.
+    """
+    names = md_utils.get_aliased_column_names(metadata) or md_utils.get_column_names(metadata)
+    return (tuple(names or []),
+            tuple(md_utils.get_column_formats(metadata) or []),
+            tuple(md_utils.get_column_zeros(metadata) or []),
+            tuple(md_utils.get_column_scales(metadata) or []))
+
+
+def file_failure (fits_file, error_code, message):
+    """ Return a summary entry for the given FITS file, which failed with the given error. """
+    return { 'file_path': fits_file, 'error_code': error_code, 'message': message }
+
+
+def load_catalog_file (args, dbconfig, fits_file):
+    """
+    Stream the data table from the given FITS catalog file into the existing catalog table,
+    a chunk of rows (see the chunk_size argument) at a time, so that memory use does not grow
+    with the size of the catalog. No column statistics are collected. This function is run
+    within a separate worker process.
+
+    Returns a tuple of the FITS file path, the number of rows inserted, and a failure
+    summary entry (None if the load succeeded). Errors are returned, not raised, since
+    the application exceptions can not be passed back from a worker process.
+    """
+    file_args = dict(args, fits_file=fits_file)
+    try:
+        data_chunks = FitsCatalogDataTask(file_args).gen_row_chunks(
+            fits_file, file_args.get('catalog_hdu', 1))
+        fill_sink = FitsCatalogFillTableSink(file_args)
+        row_count = fill_sink.copy_table(dbconfig, data_chunks, file_args.get('catalog_table'))
+        return (fits_file, row_count, None)  # an empty tile is not an error
+
+    except errors.ProcessingError as pe:
+        return (fits_file, 0, file_failure(fits_file, pe.error_code, pe.message))
+
+    except psycopg2.OperationalError as oe:  # connection failures and timeouts
+        return (fits_file, 0, file_failure(fits_file, DB_UNAVAILABLE_ERROR_CODE, str(oe)))
+
+    except Exception as ex:
+        return (fits_file, 0, file_failure(fits_file, errors.ServerError.ERROR_CODE, str(ex)))
+
+
+def load_catalog_files (args, dbconfig, fits_files, workers, limiter=None):
+    """
+    Generator to load the given FITS catalog files using a pool of worker processes,
+    yielding a result tuple for each file (see load_catalog_file). To bound memory use,
+    no more than twice the number of workers are submitted to the pool at any one time.
+    If an adaptive limiter is given, the number of files loading at any one time is instead
+    governed by that limiter, which is told the time taken by each load and whether it
+    failed because the database was unavailable.
+    """
+    def finished (done):
+        for future in done:
+            elapsed = time.monotonic() - pending.pop(future)
+            (fits_file, row_count, error) = future.result()
+            if (limiter is not None):
+                unavailable = (error is not None) and (error.get('error_code') == DB_UNAVAILABLE_ERROR_CODE)
+                limiter.release(elapsed, failed=unavailable)
+            yield (fits_file, row_count, error)
+
+    def may_submit ():
+        if (limiter is not None):
+            return limiter.acquire(timeout=0)
+        return (len(pending) < (2 * workers))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = dict()                    # submission times of the pending loads, by future
+        for fits_file in fits_files:
+            while (not may_submit()):
+                yield from finished(wait(pending, return_when=FIRST_COMPLETED).done)
+            future = executor.submit(load_catalog_file, args, dbconfig, fits_file)
+            pending[future] = time.monotonic()
+
+        while (pending):
+            yield from finished(wait(pending, return_when=FIRST_COMPLETED).done)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 #
 # Python pipeline to store catalog data in an existing PostreSQL database table.
 #   Written by: Tom Hicks. 8/26/20.
-#   Last Modified: Warn on unsupported file type error.
+#   Last Modified: Add catalog chunk size argument.
 #
 import argparse
 import sys
@@ -43,6 +43,8 @@ def main (argv=None):
     cli_utils.add_output_arguments(parser, TOOL_NAME)
     cli_utils.add_database_arguments(parser, TOOL_NAME)
     cli_utils.add_catalog_table_argument(parser, TOOL_NAME)
+    cli_utils.add_chunk_size_argument(parser, TOOL_NAME)
+    cli_utils.add_stats_arguments(parser, TOOL_NAME)
 
     # actually parse the arguments from the command line
     args = vars(parser.parse_args(argv))
@@ -68,6 +70,9 @@ def main (argv=None):
     catalog_table = args.get('catalog_table')
     cli_utils.check_catalog_table(catalog_table, TOOL_NAME)  # may system exit here and not return!
 
+    # check the optional number of catalog rows read and loaded at a time
+    cli_utils.check_chunk_size(args.get('chunk_size'), TOOL_NAME)  # may system exit here and not return!
+
     # add additional arguments to args
     args['TOOL_NAME'] = TOOL_NAME
 
@@ -2,7 +2,7 @@
 #
 # Module to fill a table from the metadata of a FITS catalog file.
 #   Written by: Tom Hicks. 8/24/2020
-#   Last Modified: Initial creation.
+#   Last Modified: Add column statistics arguments.
 #
 import argparse
 import sys
@@ -39,6 +39,7 @@ def main (argv=None):
     cli_utils.add_output_arguments(parser, TOOL_NAME)
     cli_utils.add_database_arguments(parser, TOOL_NAME)
     cli_utils.add_catalog_table_argument(parser, TOOL_NAME)
+    cli_utils.add_stats_arguments(parser, TOOL_NAME)
 
     # actually parse the arguments from the command line
     args = vars(parser.parse_args(argv))
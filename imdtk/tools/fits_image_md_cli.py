@@ -2,7 +2,7 @@
 #
 # Module to extract image metadata from a FITS file and output it as JSON.
 #   Written by: Tom Hicks. 5/21/2020.
-#   Last Modified: Warn on unsupported file type error.
+#   Last Modified: Add header cache argument.
 #
 import argparse
 import sys
@@ -37,7 +37,9 @@ def main (argv=None):
     cli_utils.add_shared_arguments(parser, TOOL_NAME)
     cli_utils.add_fits_file_argument(parser, TOOL_NAME)
     cli_utils.add_hdu_argument(parser, TOOL_NAME)
+    cli_utils.add_header_cache_argument(parser, TOOL_NAME)
     cli_utils.add_ignore_list_argument(parser, TOOL_NAME)
+    cli_utils.add_keyfile_argument(parser, TOOL_NAME)
     cli_utils.add_output_arguments(parser, TOOL_NAME)
 
     # actually parse the arguments from the command line
@@ -52,6 +54,13 @@ def main (argv=None):
     fits_file = args.get('fits_file')
     cli_utils.check_fits_file(fits_file, TOOL_NAME)  # may system exit here and not return!
 
+    # if header keywords file path given, check the file path for validity
+    key_file = args.get('keyfile')
+    cli_utils.check_key_file(key_file, TOOL_NAME)  # may system exit here and not return!
+
+    # if header cache file path given, check the path for validity
+    cli_utils.check_header_cache(args.get('header_cache'), TOOL_NAME)  # may system exit here and not return!
+
     # add additional arguments to args
     args['TOOL_NAME'] = TOOL_NAME
 
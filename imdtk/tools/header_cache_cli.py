@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#
+# Module to report on and prune the persistent cache of FITS headers.
+#   Written by: Tom Hicks. 1/22/21.
+#   Last Modified: Take the cache error exit code from the CLI utilities.
+#
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+from config.settings import DEFAULT_HEADER_CACHE_FILEPATH
+import imdtk.tools.cli_utils as cli_utils
+from imdtk.core.header_cache import HeaderCache
+
+
+# Program name for this tool.
+TOOL_NAME = 'hdr_cache'
+
+# Number of seconds in a day.
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def main (argv=None):
+    """
+    The main method for the tool. This method is called from the command line,
+    processes the command line arguments and calls into the ImdTk library to do its work.
+    This main method takes no arguments so it can be called by setuptools.
+    """
+
+    # the main method takes no arguments so it can be called by setuptools
+    if (argv is None):                      # if called by setuptools
+        argv = sys.argv[1:]                 # then fetch the arguments from the system
+
+    # setup command line argument parsing and add shared arguments
+    parser = argparse.ArgumentParser(
+        prog=TOOL_NAME,
+        formatter_class=argparse.RawTextHelpFormatter,
+        description='Report on and prune the persistent cache of FITS headers.'
+    )
+
+    cli_utils.add_shared_arguments(parser, TOOL_NAME)
+    cli_utils.add_header_cache_argument(parser, TOOL_NAME)
+
+    parser.add_argument(
+        '-ms', '--max-size', dest='max_size', metavar='MB', type=int,
+        default=argparse.SUPPRESS,
+        help='Evict the least recently used headers until the cache is no larger than this'
+    )
+
+    parser.add_argument(
+        '-ot', '--older-than', dest='older_than', metavar='days', type=float,
+        default=argparse.SUPPRESS,
+        help='Remove headers which have not been used in this number of days'
+    )
+
+    parser.add_argument(
+        '--stale', dest='stale', action='store_true',
+        default=False,
+        help='Remove headers of local files which no longer exist or have changed [default: False]'
+    )
+
+    parser.add_argument(
+        '--clear', dest='clear', action='store_true',
+        default=False,
+        help='Remove all headers from the cache [default: False]'
+    )
+
+    # actually parse the arguments from the command line
+    args = vars(parser.parse_args(argv))
+
+    # if debugging, set verbose and echo input arguments
+    if (args.get('debug')):
+        args['verbose'] = True              # if debug turn on verbose too
+        print("({}.main): ARGS={}".format(TOOL_NAME, args), file=sys.stderr)
+
+    # use the default cache file, if no other cache file is specified
+    cache_path = args.get('header_cache') or DEFAULT_HEADER_CACHE_FILEPATH
+    if (not os.path.isfile(cache_path)):
+        cli_utils.exit_with_error(TOOL_NAME, cli_utils.CACHE_ERROR_EXIT_CODE,
+                                  "Header cache file '{}' not found.".format(cache_path))
+
+    # open the cache, prune it as requested, and report on its contents
+    try:
+        header_cache = HeaderCache(cache_path)
+        if (args.get('clear')):
+            removed = header_cache.clear()
+        else:
+            max_size = args.get('max_size')
+            older_than = args.get('older_than')
+            removed = header_cache.prune(
+                max_bytes=(max_size * 1024 * 1024) if (max_size is not None) else None,
+                older_than=(older_than * SECONDS_PER_DAY) if (older_than is not None) else None,
+                stale=args.get('stale'))
+        report = header_cache.stats()
+        report['removed'] = removed
+        header_cache.close()
+
+    except sqlite3.Error as sqlerr:
+        cli_utils.exit_with_error(TOOL_NAME, cli_utils.CACHE_ERROR_EXIT_CODE,
+                                  "Unable to prune header cache '{}': {}.".format(cache_path, sqlerr))
+
+    print(json.dumps(report, indent=2))
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# Python pipeline to stream catalog data from an iRods-resident FITS file into
+# an existing PostreSQL database table.
+#   Written by: Tom Hicks. 1/15/21.
+#   Last Modified: Add catalog chunk size argument.
+#
+import argparse
+import sys
+
+import imdtk.exceptions as errors
+import imdtk.tools.cli_utils as cli_utils
+from imdtk.core.fits_irods_helper import FitsIRodsHelper
+
+from imdtk.tasks.fits_catalog_table_sink import FitsCatalogFillTableSink
+from imdtk.tasks.irods_fits_catalog_data import IRodsFitsCatalogDataTask
+
+
+# Program name for this tool.
+TOOL_NAME = 'irods_fits_cat_table_pipe'
+
+
+def main (argv=None):
+    """
+    The main method for the pipeline. This method is called from the command line,
+    processes the command line arguments and calls into the ImdTk library to do its work.
+    This main method takes no arguments so it can be called by setuptools.
+    """
+
+    # the main method takes no arguments so it can be called by setuptools
+    if (argv is None):                      # if called by setuptools
+        argv = sys.argv[1:]                 # then fetch the arguments from the system
+
+    # setup command line argument parsing and add shared arguments
+    parser = argparse.ArgumentParser(
+        prog=TOOL_NAME,
+        formatter_class=argparse.RawTextHelpFormatter,
+        description='Pipeline to stream catalog data from an iRods FITS file into an existing PostgreSQL database table.'
+    )
+
+    cli_utils.add_shared_arguments(parser, TOOL_NAME)
+    cli_utils.add_local_irods_arguments(parser, TOOL_NAME)
+    cli_utils.add_irods_fits_file_argument(parser, TOOL_NAME)
+    cli_utils.add_read_ahead_argument(parser, TOOL_NAME)
+    cli_utils.add_catalog_hdu_argument(parser, TOOL_NAME)
+    cli_utils.add_output_arguments(parser, TOOL_NAME)
+    cli_utils.add_database_arguments(parser, TOOL_NAME)
+    cli_utils.add_catalog_table_argument(parser, TOOL_NAME)
+    cli_utils.add_chunk_size_argument(parser, TOOL_NAME)
+    cli_utils.add_stats_arguments(parser, TOOL_NAME)
+
+    # actually parse the arguments from the command line
+    args = vars(parser.parse_args(argv))
+
+    # if debugging, set verbose and echo input arguments
+    if (args.get('debug')):
+        args['verbose'] = True              # if debug turn on verbose too
+        print("({}.main): ARGS={}".format(TOOL_NAME, args), file=sys.stderr)
+
+    # if a local directory tree is to be served in place of iRods, check its arguments
+    cli_utils.check_local_irods(args, TOOL_NAME)  # may system exit here and not return!
+
+    # get the iRods file path argument of the file to be opened
+    irff_path = args.get('irods_fits_file')
+
+    # the specified FITS file must have a valid FITS extension
+    cli_utils.check_irods_fits_file(irff_path, TOOL_NAME)  # may system exit here and not return!
+
+    # if database config file path given, check the file path for validity
+    dbconfig_file = args.get('dbconfig_file')
+    cli_utils.check_dbconfig_file(dbconfig_file, TOOL_NAME)  # may system exit here and not return!
+
+    # check the required catalog table name
+    catalog_table = args.get('catalog_table')
+    cli_utils.check_catalog_table(catalog_table, TOOL_NAME)  # may system exit here and not return!
+
+    # if read-ahead window size given, check it for validity
+    cli_utils.check_read_ahead(args.get('read_ahead_kb'), TOOL_NAME)  # may system exit here and not return!
+
+    # check the optional number of catalog rows read and loaded at a time
+    cli_utils.check_chunk_size(args.get('chunk_size'), TOOL_NAME)  # may system exit here and not return!
+
+    # add additional arguments to args
+    args['TOOL_NAME'] = TOOL_NAME
+
+    # get an instance of the iRods accessor class
+    firh = FitsIRodsHelper(args)
+
+    # instantiate the tasks which form the pipeline
+    irods_fits_catalog_dataTask = IRodsFitsCatalogDataTask(args, firh)
+    fits_catalog_fillTask = FitsCatalogFillTableSink(args)
+
+    # compose and call the pipeline tasks
+    if (args.get('verbose')):
+        print("({}): Processing iRods FITS file '{}'.".format(TOOL_NAME, irff_path), file=sys.stderr)
+
+    try:
+        fits_catalog_fillTask.output_results(           # sink to DB: nothing returned
+            irods_fits_catalog_dataTask.process(None))  # streaming data source
+
+    except errors.UnsupportedType as ute:
+        errMsg = "({}): WARNING: Unsupported File Type ({}): {}".format(
+            TOOL_NAME, ute.error_code, ute.message)
+        print(errMsg, file=sys.stderr)
+        sys.exit(ute.error_code)
+
+    except errors.ProcessingError as pe:
+        errMsg = "({}): ERROR: Processing Error ({}): {}".format(
+            TOOL_NAME, pe.error_code, pe.message)
+        print(errMsg, file=sys.stderr)
+        sys.exit(pe.error_code)
+
+    finally:
+        irods_fits_catalog_dataTask.cleanup()
+        firh.cleanup()                      # cleanup resources opened here
+
+    if (args.get('verbose')):
+        print("({}): Processed iRods FITS file '{}'.".format(TOOL_NAME, irff_path), file=sys.stderr)
+
+
+
+if __name__ == "__main__":
+    main()
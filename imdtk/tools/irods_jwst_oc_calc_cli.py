@@ -2,7 +2,7 @@
 #
 # Module to calculate values for the ObsCore fields from metadata derived from an iRods-resident FITS file.
 #   Written by: Tom Hicks. 1/20/20.
-#   Last Modified: Call cleanup on fits irods helper.
+#   Last Modified: Add arguments to serve iRods from a local directory tree, for benchmarking.
 #
 import argparse
 import sys
@@ -36,9 +36,13 @@ def main (argv=None):
     )
 
     cli_utils.add_shared_arguments(parser, TOOL_NAME)
+    cli_utils.add_local_irods_arguments(parser, TOOL_NAME)
     cli_utils.add_input_file_argument(parser, TOOL_NAME)
     cli_utils.add_irods_fits_file_argument(parser, TOOL_NAME)
+    cli_utils.add_read_ahead_argument(parser, TOOL_NAME)
     cli_utils.add_hdu_argument(parser, TOOL_NAME)
+    cli_utils.add_header_cache_argument(parser, TOOL_NAME)
+    cli_utils.add_wcs_mode_argument(parser, TOOL_NAME)
     cli_utils.add_collection_argument(parser, TOOL_NAME)
     cli_utils.add_output_arguments(parser, TOOL_NAME)
 
@@ -50,10 +54,19 @@ def main (argv=None):
         args['verbose'] = True              # if debug turn on verbose too
         print("({}.main): ARGS={}".format(TOOL_NAME, args), file=sys.stderr)
 
+    # if a local directory tree is to be served in place of iRods, check its arguments
+    cli_utils.check_local_irods(args, TOOL_NAME)  # may system exit here and not return!
+
     # if input file path given, check the file path for validity
     input_file = args.get('input_file')
     cli_utils.check_input_file(input_file, TOOL_NAME)  # may system exit here and not return!
 
+    # if read-ahead window size given, check it for validity
+    cli_utils.check_read_ahead(args.get('read_ahead_kb'), TOOL_NAME)  # may system exit here and not return!
+
+    # if header cache file path given, check the path for validity
+    cli_utils.check_header_cache(args.get('header_cache'), TOOL_NAME)  # may system exit here and not return!
+
     # add additional arguments to args
     args['TOOL_NAME'] = TOOL_NAME
 
@@ -2,7 +2,7 @@
 #
 # Module to sink incoming metadata by attaching it to an iRods file.
 #   Written by: Tom Hicks. 12/20/20.
-#   Last Modified: Add capability to just remove metadata items. Call cleanup on fits irods helper.
+#   Last Modified: Add arguments to serve iRods from a local directory tree, for benchmarking.
 #
 import argparse
 import sys
@@ -37,6 +37,7 @@ def main (argv=None):
     )
 
     cli_utils.add_shared_arguments(parser, TOOL_NAME)
+    cli_utils.add_local_irods_arguments(parser, TOOL_NAME)
     cli_utils.add_input_file_argument(parser, TOOL_NAME)
     cli_utils.add_irods_md_file_argument(parser, TOOL_NAME)
 
@@ -55,6 +56,9 @@ def main (argv=None):
         args['verbose'] = True              # if debug turn on verbose too
         print("({}.main): ARGS={}".format(TOOL_NAME, args), file=sys.stderr)
 
+    # if a local directory tree is to be served in place of iRods, check its arguments
+    cli_utils.check_local_irods(args, TOOL_NAME)  # may system exit here and not return!
+
     # if input file path given, check the file path for validity
     input_file = args.get('input_file')
     cli_utils.check_input_file(input_file, TOOL_NAME)  # may system exit here and not return!
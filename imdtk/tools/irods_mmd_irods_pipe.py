@@ -3,16 +3,21 @@
 # Python pipeline to extract image metadata from FITS images in an iRods directory,
 # and attach it to the same files as iRods metadata.
 #   Written by: Tom Hicks. 11/30/20.
-#   Last Modified: More cleanup on fits irods helper.
+#   Last Modified: Update for selection of changed files returning the replaced files.
 #
 import argparse
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import imdtk.exceptions as errors
 import imdtk.tools.cli_utils as cli_utils
 
 from imdtk.core.fits_irods_helper import FitsIRodsHelper
 from imdtk.core.fits_utils import gen_fits_file_paths
+from imdtk.core.ingest_manifest import open_ingest_manifest
+from imdtk.core.irods_session_pool import SESSION_FAILURES
 from imdtk.tasks.fields_info import FieldsInfoTask
 from imdtk.tasks.image_aliases import ImageAliasesTask
 from imdtk.tasks.irods_fits_image_md import IRodsFitsImageMetadataTask
@@ -24,6 +29,9 @@ from imdtk.tasks.miss_report import MissingFieldsTask
 # Program name for this tool.
 TOOL_NAME = 'irods_mmd_irods_pipe'
 
+# Lock held while writing the report or the errors of a file, so that output is not interleaved.
+OUTPUT_LOCK = threading.Lock()
+
 
 def main (argv=None):
     """
@@ -44,15 +52,25 @@ def main (argv=None):
     )
 
     cli_utils.add_shared_arguments(parser, TOOL_NAME)
+    cli_utils.add_local_irods_arguments(parser, TOOL_NAME)
     cli_utils.add_input_dir_argument(parser, TOOL_NAME)
+    cli_utils.add_listing_mode_argument(parser, TOOL_NAME)
+    cli_utils.add_skip_names_argument(parser, TOOL_NAME)
+    cli_utils.add_incremental_arguments(parser, TOOL_NAME)
+    cli_utils.add_read_ahead_argument(parser, TOOL_NAME)
     cli_utils.add_hdu_argument(parser, TOOL_NAME)
+    cli_utils.add_header_cache_argument(parser, TOOL_NAME)
+    cli_utils.add_wcs_mode_argument(parser, TOOL_NAME)
     cli_utils.add_ignore_list_argument(parser, TOOL_NAME)
+    cli_utils.add_keyfile_argument(parser, TOOL_NAME)
     cli_utils.add_aliases_argument(parser, TOOL_NAME)
     cli_utils.add_fields_info_argument(parser, TOOL_NAME)
     cli_utils.add_collection_argument(parser, TOOL_NAME)
     cli_utils.add_report_format_argument(parser, TOOL_NAME)
     cli_utils.add_output_arguments(parser, TOOL_NAME)
     cli_utils.add_output_only_argument(parser, TOOL_NAME)
+    cli_utils.add_workers_argument(parser, TOOL_NAME, default=1)
+    cli_utils.add_adaptive_argument(parser, TOOL_NAME)
 
     # actually parse the arguments from the command line
     args = vars(parser.parse_args(argv))
@@ -62,20 +80,33 @@ def main (argv=None):
         args['verbose'] = True              # if debug turn on verbose too
         print("({}.main): ARGS={}".format(TOOL_NAME, args), file=sys.stderr)
 
+    # if a local directory tree is to be served in place of iRods, check its arguments
+    cli_utils.check_local_irods(args, TOOL_NAME)  # may system exit here and not return!
+
+    # if header keywords file path given, check the file path for validity
+    key_file = args.get('keyfile')
+    cli_utils.check_key_file(key_file, TOOL_NAME)  # may system exit here and not return!
+
+    # if read-ahead window size given, check it for validity
+    cli_utils.check_read_ahead(args.get('read_ahead_kb'), TOOL_NAME)  # may system exit here and not return!
+
+    # if header cache file path given, check the path for validity
+    cli_utils.check_header_cache(args.get('header_cache'), TOOL_NAME)  # may system exit here and not return!
+
+    # if processing incrementally with an ingest manifest, check the manifest path for validity
+    cli_utils.check_manifest(args, TOOL_NAME)  # may system exit here and not return!
+
+    # check the number of parallel annotation workers
+    workers = args.get('workers')
+    cli_utils.check_workers(workers, TOOL_NAME)  # may system exit here and not return!
+
     # add additional arguments to args
     args['TOOL_NAME'] = TOOL_NAME
+    args['irods_max_sessions'] = workers    # one pooled iRods session per worker
 
     # get an instance of the iRods accessor class
     firh = FitsIRodsHelper(args)
 
-    # instantiate the tasks which form the pipeline
-    irods_fits_image_mdTask = IRodsFitsImageMetadataTask(args, firh)
-    image_aliasesTask = ImageAliasesTask(args)
-    fields_infoTask = FieldsInfoTask(args)
-    irods_jwst_oc_calcTask = IRods_JWST_ObsCoreCalcTask(args, firh)
-    miss_reportTask = MissingFieldsTask(args)
-    irods_md_sinkTask = IRodsMetadataSink(args, firh)
-
     # get and check the required image directory path for validity
     input_dir = args.get('input_dir')
     if (not firh.collection_exists(input_dir)):
@@ -83,49 +114,194 @@ def main (argv=None):
         cli_utils.irods_input_dir_exit(TOOL_NAME, input_dir)  # error exit out here: never returns
 
     # make of list of absolute iRods file paths pointing to FITS files
-    ir_dir = firh.getc(input_dir, absolute=True)
-    irff_paths = [fpath for fpath in firh.gen_fits_file_paths(ir_dir)]
+    irff_paths = firh.list_fits_file_paths(input_dir)
+
+    # skip the files which can not hold images, judged from the listing, before any are read
+    (irff_paths, skip_counts) = firh.select_image_files(irff_paths)
+    if (args.get('verbose') and skip_counts):
+        print("({}): Skipping {} FITS files which can not hold images ({}).".format(
+            TOOL_NAME, sum(skip_counts.values()),
+            ', '.join(f"{reason}: {count}" for (reason, count) in sorted(skip_counts.items()))),
+              file=sys.stderr)
+
+    # if processing incrementally, select only the files which are new or changed since last processed
+    manifest = open_ingest_manifest(args, TOOL_NAME)  # None when only outputting the metadata
+    signatures = dict()
+    if (args.get('incremental')):
+        listed_count = len(irff_paths)
+        # the metadata of re-processed files is replaced by the sink, so none are set aside here
+        (irff_paths, signatures, _) = firh.select_changed_files(irff_paths, manifest)
+        if (args.get('verbose')):
+            print("({}): Skipping {} unchanged FITS files.".format(
+                TOOL_NAME, listed_count - len(irff_paths)), file=sys.stderr)
 
     # call the pipeline on each FITS file in the input directory:
     if (args.get('verbose')):
         print("({}): Processing FITS files in '{}'.".format(TOOL_NAME, input_dir), file=sys.stderr)
 
+    start_time = time.perf_counter()
     proc_count = 0                                # initialize count of processed files
-    for irff_path in irff_paths:
-        args['irods_fits_file'] = irff_path       # reset the FITS file argument to next file
-        args['irods_md_file'] = irff_path         # reset metadata target file to the same file
+    for (irff_path, error) in annotate_files(args, firh, irff_paths, workers):
+        if (error is None):
+            proc_count += 1                       # increment count of processed files
+        else:
+            report_error(error)
+        if ((error is None) and (manifest is not None) and (irff_path in signatures)):
+            manifest.record(irff_path, signatures[irff_path])  # record only the files annotated
 
-        if (args.get('verbose')):
+    elapsed = time.perf_counter() - start_time
+
+    # cleanup resources opened here: the tasks share the iRods helper and open nothing else
+    if (manifest is not None):
+        manifest.close()
+    firh.cleanup()
+
+    if (args.get('verbose')):
+        print("({}): Processed iRods {} FITS files in {:.1f} seconds ({:.2f} files/second).".format(
+            TOOL_NAME, proc_count, elapsed, (proc_count / elapsed) if (elapsed > 0) else 0.0),
+              file=sys.stderr)
+        if (firh.read_limiter is not None):
+            limiter_stats = firh.read_limiter.stats()
+            print("({}): Concurrent iRods reads ended limited to {} ({} increases, {} decreases).".format(
+                TOOL_NAME, limiter_stats['limit'], limiter_stats['increases'],
+                limiter_stats['decreases']), file=sys.stderr)
+
+
+def annotate_file (args, firh, irff_path, pipelines):
+    """
+    Extract the image metadata from the given iRods FITS file, calculate the ObsCore fields
+    from it, and attach them to the same file as iRods metadata. Uses the pipeline of tasks
+    belonging to the calling thread, held in the given thread-local (see get_pipeline).
+
+    Returns a pair of the FITS file path and the exception which stopped the processing of
+    that file, or None if the file was processed. Errors are returned, rather than raised,
+    so that an error in one file does not affect the processing of other files.
+    """
+    pipeline = get_pipeline(args, firh, pipelines)
+    file_args = pipeline['args']
+    file_args['irods_fits_file'] = irff_path   # reset the FITS file argument to next file
+    file_args['irods_md_file'] = irff_path     # reset metadata target file to the same file
+
+    if (args.get('verbose')):
+        with OUTPUT_LOCK:
             print("({}): Processing FITS file '{}'.".format(TOOL_NAME, irff_path), file=sys.stderr)
 
+    try:
+        metadata = pipeline['irods_jwst_oc_calcTask'].process(
+            pipeline['fields_infoTask'].process(
+                pipeline['image_aliasesTask'].process(
+                    pipeline['irods_fits_image_mdTask'].process(None))))  # metadata source
+
+        with OUTPUT_LOCK:                         # report: passes data through
+            metadata = pipeline['miss_reportTask'].process(metadata)
+
+        pipeline['irods_md_sinkTask'].output_results(metadata)  # sink: nothing returned
+        return (irff_path, None)
+
+    except (errors.UnsupportedType, errors.ProcessingError) as err:
+        return (irff_path, err)
+
+    except Exception as ex:                       # do not let one file stop the others
+        error = errors.ServerError(
+            "Unexpected error processing iRods FITS file '{}': {}".format(irff_path, ex))
+        error.__cause__ = ex                      # keep the original error: see network_failure
+        return (irff_path, error)
+
+
+def annotate_files (args, firh, irff_paths, workers):
+    """
+    Generator to annotate the given iRods FITS files (see annotate_file), yielding a result
+    pair for each file. With a single worker, the files are annotated in order, using the
+    helper's main iRods session. Otherwise, the files are annotated concurrently by a pool of
+    worker threads, each using an iRods session checked out of the helper's session pool,
+    so that the header reads and metadata writes of different files overlap. To bound memory
+    use, no more than twice the number of workers are submitted to the pool at any one time.
+
+    A pooled session in use when a file fails from an iRods network error is discarded by the
+    pool, rather than handed to the next file. The task pipelines of the worker threads are
+    created afresh for each call, so that no tasks are carried over from a previous run.
+    """
+    pipelines = threading.local()           # the pipeline of task instances of each thread
+
+    if (workers == 1):
+        for irff_path in irff_paths:
+            yield annotate_file(args, firh, irff_path, pipelines)
+        return
+
+    def pooled_annotate_file (irff_path):
+        result = None
         try:
-            irods_md_sinkTask.output_results(     # sink: nothing returned
-                miss_reportTask.process(          # report: passes data through
-                    irods_jwst_oc_calcTask.process(
-                        fields_infoTask.process(
-                            image_aliasesTask.process(
-                                irods_fits_image_mdTask.process(None))))))  # metadata source
+            with firh.pooled_session():
+                result = annotate_file(args, firh, irff_path, pipelines)
+                failure = network_failure(result[1])
+                if (failure is not None):
+                    raise failure           # the pool discards the session on a network error
+        except SESSION_FAILURES:
+            if (result is None):            # a session could not be checked out: give up
+                raise
+        return result
 
-            proc_count += 1                       # increment count of processed files
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for irff_path in irff_paths:
+            if (len(pending) >= (2 * workers)):
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(pooled_annotate_file, irff_path))
 
-        except errors.UnsupportedType as ute:
-            errMsg = "({}): WARNING: Unsupported File Type ({}): {}".format(
-                TOOL_NAME, ute.error_code, ute.message)
-            print(errMsg, file=sys.stderr)
+        while (pending):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
 
-        except errors.ProcessingError as pe:
-            errMsg = "({}): ERROR: Processing Error ({}): {}".format(
-                TOOL_NAME, pe.error_code, pe.message)
-            print(errMsg, file=sys.stderr)
 
-    # call cleanup method for tasks which opened resources
-    irods_md_sinkTask.cleanup()
-    irods_jwst_oc_calcTask.cleanup()
-    irods_fits_image_mdTask.cleanup()
-    firh.cleanup()                          # cleanup resources opened here
+def get_pipeline (args, firh, pipelines):
+    """
+    Return a dictionary of the instances of the tasks which form the pipeline, and of the
+    arguments given to them, for the calling thread, creating them if necessary, and keeping
+    them in the given thread-local. Each thread has its own task instances and arguments,
+    since the tasks take the path of the file to be processed from their arguments, but all
+    threads share the given iRods helper.
+    """
+    pipeline = getattr(pipelines, 'pipeline', None)
+    if (pipeline is None):
+        task_args = dict(args)
+        pipeline = {
+            'args': task_args,
+            'irods_fits_image_mdTask': IRodsFitsImageMetadataTask(task_args, firh),
+            'image_aliasesTask': ImageAliasesTask(task_args),
+            'fields_infoTask': FieldsInfoTask(task_args),
+            'irods_jwst_oc_calcTask': IRods_JWST_ObsCoreCalcTask(task_args, firh),
+            'miss_reportTask': MissingFieldsTask(task_args),
+            'irods_md_sinkTask': IRodsMetadataSink(task_args, firh)
+        }
+        pipelines.pipeline = pipeline
+    return pipeline
 
-    if (args.get('verbose')):
-        print("({}): Processed iRods {} FITS files.".format(TOOL_NAME, proc_count), file=sys.stderr)
+
+def network_failure (error):
+    """
+    Return the iRods network error which caused the given processing error, found by following
+    the chain of exceptions raised while handling others, or None if there is no such error.
+    """
+    while (error is not None):
+        if (isinstance(error, SESSION_FAILURES)):
+            return error
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def report_error (error):
+    """ Report the given error, raised in processing a single file, on standard error. """
+    if (isinstance(error, errors.UnsupportedType)):
+        errMsg = "({}): WARNING: Unsupported File Type ({}): {}".format(
+            TOOL_NAME, error.error_code, error.message)
+    else:
+        errMsg = "({}): ERROR: Processing Error ({}): {}".format(
+            TOOL_NAME, error.error_code, error.message)
+    with OUTPUT_LOCK:
+        print(errMsg, file=sys.stderr)
 
 
 
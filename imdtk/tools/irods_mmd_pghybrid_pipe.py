@@ -3,18 +3,19 @@
 # Python pipeline to extract image metadata from FITS images in an iRods directory,
 # storing the metadata into a PostreSQL/JSON hybrid database.
 #   Written by: Tom Hicks. 11/24/20.
-#   Last Modified: More cleanup on fits irods helper.
+#   Last Modified: Replace the stored rows of the changed files which are re-ingested.
 #
 import argparse
 import sys
 
-from config.settings import DEFAULT_HYBRID_TABLE_NAME
+from config.settings import DEFAULT_DBCONFIG_FILEPATH, DEFAULT_HYBRID_TABLE_NAME
 
 import imdtk.exceptions as errors
 import imdtk.tools.cli_utils as cli_utils
 
 from imdtk.core.fits_irods_helper import FitsIRodsHelper
 from imdtk.core.fits_utils import gen_fits_file_paths
+from imdtk.core.ingest_manifest import database_target, open_ingest_manifest, wants_manifest
 from imdtk.tasks.fields_info import FieldsInfoTask
 from imdtk.tasks.image_aliases import ImageAliasesTask
 from imdtk.tasks.irods_fits_image_md import IRodsFitsImageMetadataTask
@@ -46,9 +47,17 @@ def main (argv=None):
     )
 
     cli_utils.add_shared_arguments(parser, TOOL_NAME)
+    cli_utils.add_local_irods_arguments(parser, TOOL_NAME)
     cli_utils.add_input_dir_argument(parser, TOOL_NAME)
+    cli_utils.add_listing_mode_argument(parser, TOOL_NAME)
+    cli_utils.add_skip_names_argument(parser, TOOL_NAME)
+    cli_utils.add_incremental_arguments(parser, TOOL_NAME, manifest_required=True)
+    cli_utils.add_read_ahead_argument(parser, TOOL_NAME)
     cli_utils.add_hdu_argument(parser, TOOL_NAME)
+    cli_utils.add_header_cache_argument(parser, TOOL_NAME)
+    cli_utils.add_wcs_mode_argument(parser, TOOL_NAME)
     cli_utils.add_ignore_list_argument(parser, TOOL_NAME)
+    cli_utils.add_keyfile_argument(parser, TOOL_NAME)
     cli_utils.add_aliases_argument(parser, TOOL_NAME)
     cli_utils.add_fields_info_argument(parser, TOOL_NAME)
     cli_utils.add_collection_argument(parser, TOOL_NAME)
@@ -65,6 +74,22 @@ def main (argv=None):
         args['verbose'] = True              # if debug turn on verbose too
         print("({}.main): ARGS={}".format(TOOL_NAME, args), file=sys.stderr)
 
+    # if a local directory tree is to be served in place of iRods, check its arguments
+    cli_utils.check_local_irods(args, TOOL_NAME)  # may system exit here and not return!
+
+    # if header keywords file path given, check the file path for validity
+    key_file = args.get('keyfile')
+    cli_utils.check_key_file(key_file, TOOL_NAME)  # may system exit here and not return!
+
+    # if read-ahead window size given, check it for validity
+    cli_utils.check_read_ahead(args.get('read_ahead_kb'), TOOL_NAME)  # may system exit here and not return!
+
+    # if header cache file path given, check the path for validity
+    cli_utils.check_header_cache(args.get('header_cache'), TOOL_NAME)  # may system exit here and not return!
+
+    # if processing incrementally, check the ingest manifest path for validity
+    cli_utils.check_manifest(args, TOOL_NAME)  # may system exit here and not return!
+
     # add additional arguments to args
     args['TOOL_NAME'] = TOOL_NAME
 
@@ -86,8 +111,34 @@ def main (argv=None):
         cli_utils.irods_input_dir_exit(TOOL_NAME, input_dir)  # error exit out here: never returns
 
     # make of list of absolute iRods file paths pointing to FITS files
-    ir_dir = firh.getc(input_dir, absolute=True)
-    irff_paths = [fpath for fpath in firh.gen_fits_file_paths(ir_dir)]
+    irff_paths = firh.list_fits_file_paths(input_dir)
+
+    # skip the files which can not hold images, judged from the listing, before any are read
+    (irff_paths, skip_counts) = firh.select_image_files(irff_paths)
+    if (args.get('verbose') and skip_counts):
+        print("({}): Skipping {} FITS files which can not hold images ({}).".format(
+            TOOL_NAME, sum(skip_counts.values()),
+            ', '.join(f"{reason}: {count}" for (reason, count) in sorted(skip_counts.items()))),
+              file=sys.stderr)
+
+    # if processing incrementally, select only the files which are new or changed since last ingested
+    manifest = None
+    if (wants_manifest(args)):                    # the manifest is of the database and table loaded
+        try:
+            dbconfig = jwst_pghyb_sinkTask.load_sql_db_config(args.get('dbconfig_file') or DEFAULT_DBCONFIG_FILEPATH)
+        except errors.ProcessingError as pe:
+            firh.cleanup()                        # cleanup resources opened here
+            cli_utils.exit_with_error(TOOL_NAME, pe.error_code, pe.message)  # never returns
+        table_name = args.get('table_name') or DEFAULT_HYBRID_TABLE_NAME
+        manifest = open_ingest_manifest(args, database_target(dbconfig, table_name))
+    signatures = dict()
+    replaced = set()                              # changed files whose stored rows are replaced
+    if (manifest is not None):
+        listed_count = len(irff_paths)
+        (irff_paths, signatures, replaced) = firh.select_changed_files(irff_paths, manifest)
+        if (args.get('verbose')):
+            print("({}): Skipping {} unchanged FITS files.".format(
+                TOOL_NAME, listed_count - len(irff_paths)), file=sys.stderr)
 
     # call the pipeline on each FITS file in the input directory:
     if (args.get('verbose')):
@@ -96,6 +147,7 @@ def main (argv=None):
     proc_count = 0                                # initialize count of processed files
     for irff_path in irff_paths:
         args['irods_fits_file'] = irff_path       # reset the FITS file argument to next file
+        args['replace_existing'] = (irff_path in replaced)  # replace rows of a re-ingested file
 
         if (args.get('verbose')):
             print("({}): Processing FITS file '{}'.".format(TOOL_NAME, irff_path), file=sys.stderr)
@@ -109,6 +161,8 @@ def main (argv=None):
                                 irods_fits_image_mdTask.process(None))))))  # metadata source
 
             proc_count += 1                       # increment count of processed files
+            if (irff_path in signatures):         # record only the files loaded
+                manifest.record(irff_path, signatures[irff_path])
 
         except errors.UnsupportedType as ute:
             errMsg = "({}): WARNING: Unsupported File Type ({}): {}".format(
@@ -124,6 +178,8 @@ def main (argv=None):
     jwst_pghyb_sinkTask.cleanup()
     irods_jwst_oc_calcTask.cleanup()
     irods_fits_image_mdTask.cleanup()
+    if (manifest is not None):
+        manifest.close()
     firh.cleanup()                          # cleanup resources opened here
 
     if (args.get('verbose')):
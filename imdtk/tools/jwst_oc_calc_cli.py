@@ -2,7 +2,7 @@
 #
 # Module to calculate values for the ObsCore fields in a FITS-derived metadata structure.
 #   Written by: Tom Hicks. 6/11/2020.
-#   Last Modified: Reorder CLI arguments.
+#   Last Modified: Add WCS mode argument.
 #
 import argparse
 import sys
@@ -38,6 +38,8 @@ def main (argv=None):
     cli_utils.add_input_file_argument(parser, TOOL_NAME)
     cli_utils.add_fits_file_argument(parser, TOOL_NAME)
     cli_utils.add_hdu_argument(parser, TOOL_NAME)
+    cli_utils.add_header_cache_argument(parser, TOOL_NAME)
+    cli_utils.add_wcs_mode_argument(parser, TOOL_NAME)
     cli_utils.add_collection_argument(parser, TOOL_NAME)
     cli_utils.add_output_arguments(parser, TOOL_NAME)
 
@@ -57,6 +59,9 @@ def main (argv=None):
     fits_file = args.get('fits_file')
     cli_utils.check_fits_file(fits_file, TOOL_NAME)    # may system exit here and not return!
 
+    # if header cache file path given, check the path for validity
+    cli_utils.check_header_cache(args.get('header_cache'), TOOL_NAME)  # may system exit here and not return!
+
     # add additional arguments to args
     args['TOOL_NAME'] = TOOL_NAME
 
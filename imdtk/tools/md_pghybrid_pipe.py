@@ -2,7 +2,7 @@
 #
 # Python pipeline to extract image metadata and store it into a PostreSQL/JSON hybrid database.
 #   Written by: Tom Hicks. 11/25/2020.
-#   Last Modified: Initial creation.
+#   Last Modified: Add WCS mode argument.
 #
 import argparse
 import sys
@@ -45,7 +45,10 @@ def main (argv=None):
     cli_utils.add_shared_arguments(parser, TOOL_NAME)
     cli_utils.add_fits_file_argument(parser, TOOL_NAME)
     cli_utils.add_hdu_argument(parser, TOOL_NAME)
+    cli_utils.add_header_cache_argument(parser, TOOL_NAME)
+    cli_utils.add_wcs_mode_argument(parser, TOOL_NAME)
     cli_utils.add_ignore_list_argument(parser, TOOL_NAME)
+    cli_utils.add_keyfile_argument(parser, TOOL_NAME)
     cli_utils.add_aliases_argument(parser, TOOL_NAME)
     cli_utils.add_fields_info_argument(parser, TOOL_NAME)
     cli_utils.add_collection_argument(parser, TOOL_NAME)
@@ -66,6 +69,13 @@ def main (argv=None):
     fits_file = args.get('fits_file')
     cli_utils.check_fits_file(fits_file, TOOL_NAME)  # may system exit here and not return!
 
+    # if header keywords file path given, check the file path for validity
+    key_file = args.get('keyfile')
+    cli_utils.check_key_file(key_file, TOOL_NAME)  # may system exit here and not return!
+
+    # if header cache file path given, check the path for validity
+    cli_utils.check_header_cache(args.get('header_cache'), TOOL_NAME)  # may system exit here and not return!
+
     # add additional arguments to args
     args['TOOL_NAME'] = TOOL_NAME
 
@@ -3,7 +3,7 @@
 # Python pipeline to extract image metadata from each FITS images in a directory, storing
 # the metadata into a Hybrid PostreSQL/JSON database.
 #   Written by: Tom Hicks. 7/20/2020.
-#   Last Modified: Update for tool rename.
+#   Last Modified: Calculate ObsCore values for batches of files.
 #
 import argparse
 import sys
@@ -14,6 +14,7 @@ import imdtk.exceptions as errors
 import imdtk.tools.cli_utils as cli_utils
 
 from imdtk.core.fits_utils import gen_fits_file_paths
+from imdtk.core.misc_utils import gen_batches
 from imdtk.tasks.fields_info import FieldsInfoTask
 from imdtk.tasks.fits_image_md import FitsImageMetadataTask
 from imdtk.tasks.image_aliases import ImageAliasesTask
@@ -25,6 +26,9 @@ from imdtk.tasks.miss_report import MissingFieldsTask
 # Program name for this tool.
 TOOL_NAME = 'mmd_pghybrid_pipe'
 
+# Number of FITS files whose ObsCore values are calculated together, as a batch.
+BATCH_SIZE = 64
+
 
 def main (argv=None):
     """
@@ -47,7 +51,10 @@ def main (argv=None):
     cli_utils.add_shared_arguments(parser, TOOL_NAME)
     cli_utils.add_input_dir_argument(parser, TOOL_NAME)
     cli_utils.add_hdu_argument(parser, TOOL_NAME)
+    cli_utils.add_header_cache_argument(parser, TOOL_NAME)
+    cli_utils.add_wcs_mode_argument(parser, TOOL_NAME)
     cli_utils.add_ignore_list_argument(parser, TOOL_NAME)
+    cli_utils.add_keyfile_argument(parser, TOOL_NAME)
     cli_utils.add_aliases_argument(parser, TOOL_NAME)
     cli_utils.add_fields_info_argument(parser, TOOL_NAME)
     cli_utils.add_collection_argument(parser, TOOL_NAME)
@@ -68,6 +75,13 @@ def main (argv=None):
     input_dir = args.get('input_dir')
     cli_utils.check_input_dir(input_dir, TOOL_NAME)  # may system exit here and not return!
 
+    # if header keywords file path given, check the file path for validity
+    key_file = args.get('keyfile')
+    cli_utils.check_key_file(key_file, TOOL_NAME)  # may system exit here and not return!
+
+    # if header cache file path given, check the path for validity
+    cli_utils.check_header_cache(args.get('header_cache'), TOOL_NAME)  # may system exit here and not return!
+
     # add additional arguments to args
     args['TOOL_NAME'] = TOOL_NAME
 
@@ -85,36 +99,54 @@ def main (argv=None):
 
     proc_count = 0                                # initialize count of processed files
 
-    for img_file in gen_fits_file_paths(input_dir):
-        args['fits_file'] = img_file              # reset the FITS file argument to next file
+    for img_files in gen_batches(gen_fits_file_paths(input_dir), BATCH_SIZE):
+        metadatas = []                            # metadata for the batch of files
+
+        for img_file in img_files:
+            args['fits_file'] = img_file          # reset the FITS file argument to next file
+
+            if (args.get('verbose')):
+                print("({}): Processing FITS file '{}'.".format(TOOL_NAME, img_file), file=sys.stderr)
 
-        if (args.get('verbose')):
-            print("({}): Processing FITS file '{}'.".format(TOOL_NAME, img_file), file=sys.stderr)
+            try:
+                metadatas.append(
+                    fields_infoTask.process(
+                        image_aliasesTask.process(
+                            fits_image_mdTask.process(None))))  # metadata source
 
-        try:
-            jwst_pghybrid_sinkTask.output_results(  # sink: nothing returned
-                miss_reportTask.process(          # report: passes data through
-                    jwst_oc_calcTask.process(
-                        fields_infoTask.process(
-                            image_aliasesTask.process(
-                                fits_image_mdTask.process(None))))))  # metadata source
+            except errors.ProcessingError as pe:  # includes unsupported file types
+                report_error(pe)
 
-            proc_count += 1                       # increment count of processed files
+        # calculate the ObsCore values for the batch, then report on and store each file's values
+        for result in jwst_oc_calcTask.process_batch(metadatas):
+            try:
+                if (isinstance(result, errors.ProcessingError)):
+                    raise result                  # calculation failed for this file
 
-        except errors.UnsupportedType as ute:
-            errMsg = "({}): WARNING: Unsupported File Type ({}): {}".format(
-                TOOL_NAME, ute.error_code, ute.message)
-            print(errMsg, file=sys.stderr)
+                jwst_pghybrid_sinkTask.output_results(  # sink: nothing returned
+                    miss_reportTask.process(result))  # report: passes data through
 
-        except errors.ProcessingError as pe:
-            errMsg = "({}): ERROR: Processing Error ({}): {}".format(
-                TOOL_NAME, pe.error_code, pe.message)
-            print(errMsg, file=sys.stderr)
+                proc_count += 1                   # increment count of processed files
+
+            except errors.ProcessingError as pe:  # includes unsupported file types
+                report_error(pe)
 
     if (args.get('verbose')):
         print("({}): Processed {} FITS files.".format(TOOL_NAME, proc_count), file=sys.stderr)
 
 
 
+def report_error (error):
+    """ Report the given error, raised in processing a single file, on standard error. """
+    if (isinstance(error, errors.UnsupportedType)):
+        errMsg = "({}): WARNING: Unsupported File Type ({}): {}".format(
+            TOOL_NAME, error.error_code, error.message)
+    else:
+        errMsg = "({}): ERROR: Processing Error ({}): {}".format(
+            TOOL_NAME, error.error_code, error.message)
+    print(errMsg, file=sys.stderr)
+
+
+
 if __name__ == "__main__":
     main()
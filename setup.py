@@ -17,6 +17,7 @@ setup(
             'fits_cat_md     = imdtk.tools.fits_catalog_md_cli:main',
             'fits_cat_mktbl  = imdtk.tools.fits_catalog_mktbl_sink_cli:main',
             'fits_img_md     = imdtk.tools.fits_image_md_cli:main',
+            'hdr_cache       = imdtk.tools.header_cache_cli:main',
             'img_aliases     = imdtk.tools.image_aliases_cli:main',
             'irods_fits_cat_md  = imdtk.tools.irods_fits_catalog_md_cli:main',
             'irods_fits_img_md  = imdtk.tools.irods_fits_image_md_cli:main',
@@ -28,8 +29,10 @@ setup(
             'miss_report     = imdtk.tools.miss_report_cli:main',
             'no_op           = imdtk.tools.nop_cli:main',
             'pickle_sink     = imdtk.tools.pickle_sink_cli:main',
+            'fits_cat_dir_pipe    = imdtk.tools.fits_catalog_dir_pipe:main',
             'fits_cat_mktbl_pipe  = imdtk.tools.fits_catalog_mktbl_pipe:main',
             'fits_cat_table_pipe  = imdtk.tools.fits_catalog_table_pipe:main',
+            'irods_fits_cat_table_pipe = imdtk.tools.irods_fits_catalog_table_pipe:main',
             'irods_md_irods_pipe  = imdtk.tools.irods_md_irods_pipe:main',
             'irods_md_pghyb_pipe  = imdtk.tools.irods_md_pghybrid_pipe:main',
             'irods_md_pgsql_pipe  = imdtk.tools.irods_md_pgsql_pipe:main',
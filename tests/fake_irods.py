@@ -0,0 +1,89 @@
+#
+# Stand-ins for an iRods session and its catalog queries, for testing without an iRods server.
+#   Written by: Tom Hicks. 1/28/21.
+#   Last Modified: Reuse the local catalog query, rather than emulating queries here.
+#
+import types
+
+from irods.exception import DataObjectDoesNotExist
+from irods.meta import iRODSMeta
+from irods.models import Collection, DataObject, DataObjectMeta
+
+from imdtk.core.local_irods import LocalQuery, in_model, matches
+
+
+class FakeQuery (LocalQuery):
+    """ The local stand-in for an iRods catalog query, which also records the page sizes requested. """
+    def limit (self, page_size):
+        self.session.page_sizes.append(page_size)
+        return super().limit(page_size)
+
+
+class FakeMetadataManager (object):
+    """ Stand-in for an iRods metadata manager, over a dictionary of metadata item lists, keyed by path. """
+    def __init__ (self, avus):
+        self.avus = { path: [ iRODSMeta(*avu) for avu in avu_list ] for (path, avu_list) in avus.items() }
+        self.gets = 0
+        self.applied = []                   # list of the lists of operations applied
+
+    def get (self, model, path):
+        self.gets += 1
+        return list(self.avus.get(path, []))
+
+    def apply_atomic_operations (self, model, path, *operations):
+        self.applied.append(list(operations))
+        avu_list = self.avus.setdefault(path, [])
+        for op in operations:
+            key = (op.avu.name, op.avu.value, op.avu.units)
+            if (op.operation == 'add'):
+                avu_list.append(op.avu)
+            else:
+                avu_list[:] = [ avu for avu in avu_list if ((avu.name, avu.value, avu.units) != key) ]
+
+
+class FakeCatalogSession (object):
+    """
+    Stand-in for an iRods session, whose catalog holds the given (path, size, replicas) files,
+    to which are attached the metadata in the given dictionary of (name, value) lists, keyed by path.
+    """
+    def __init__ (self, files, avus={}):
+        self.queries = 0
+        self.page_sizes = []
+        self.server_version = (4, 2, 8)
+        self.zone = 'zone'
+        self.username = 'test'
+        self.collections = types.SimpleNamespace(sess=self)
+        self.data_objects = types.SimpleNamespace(sess=self, get=self.get_data_object)
+        self.metadata = FakeMetadataManager(avus)
+        self.rows = []
+        self.meta_rows = []
+        columns = [ col for model in [DataObject, Collection, DataObjectMeta]
+                    for (name, col) in vars(model).items() if not name.startswith('_') ]
+        for (idx, (path, size, nreplicas)) in enumerate(files):
+            for repl in range(nreplicas):
+                row = { col: None for col in columns }
+                row.update({ DataObject.id: idx, DataObject.name: path.rsplit('/', 1)[1],
+                             DataObject.size: size, DataObject.replica_number: repl,
+                             DataObject.checksum: f"sha2:{idx}", Collection.id: 100 + idx,
+                             Collection.name: path.rsplit('/', 1)[0] })
+                self.rows.append(row)
+                for (md_idx, (name, value)) in enumerate(avus.get(path, [])):
+                    meta_row = dict(row)
+                    meta_row.update({ DataObjectMeta.id: (1000 * idx) + md_idx,
+                                      DataObjectMeta.name: name, DataObjectMeta.value: value })
+                    self.meta_rows.append(meta_row)
+
+    def get_data_object (self, path):
+        raise DataObjectDoesNotExist(path)  # every cataloged file is found by listing
+
+    def delay (self, nbytes=0):
+        self.queries += 1                   # each page of query results costs one request
+
+    def query (self, *columns):
+        return FakeQuery(self, columns)
+
+    def select_rows (self, columns, criteria):
+        used = columns + [ crit.query_key for crit in criteria ]
+        rows = self.meta_rows if any(in_model(col, DataObjectMeta) for col in used) else self.rows
+        return [ { col: row.get(col) for col in columns }
+                 for row in rows if all(matches(crit, row) for crit in criteria) ]
@@ -0,0 +1,143 @@
+# Tests for the adaptive concurrency limiter module.
+#   Written by: Tom Hicks. 1/31/21.
+#   Last Modified: Add test of the limited file reader.
+#
+import io
+import threading
+import time
+import pytest
+
+from imdtk.core.adaptive_limiter import AdaptiveLimiter, LimitedReader, make_adaptive_limiter
+
+
+class TestAdaptiveLimiter(object):
+
+    def run_window (self, limiter, latency, failed=False, concurrent=None):
+        """ Complete a window of operations with the given latency, the given number at a time. """
+        total = max(limiter.window, limiter.limit)
+        for start in range(0, total, concurrent or limiter.limit):
+            count = min((concurrent or limiter.limit), total - start)
+            for idx in range(count):
+                assert limiter.acquire(timeout=0)
+            for idx in range(count):
+                limiter.release(latency, failed=failed)
+
+
+    def test_ctor (self):
+        assert AdaptiveLimiter('test', 8).limit == 4
+        assert AdaptiveLimiter('test', 1).limit == 1
+        assert AdaptiveLimiter('test', 8, initial_limit=20).limit == 8
+        with pytest.raises(ValueError):
+            AdaptiveLimiter('test', 0)
+        with pytest.raises(ValueError):
+            AdaptiveLimiter('test', 4, min_limit=5)
+
+
+    def test_acquire_timeout (self):
+        limiter = AdaptiveLimiter('test', 2, initial_limit=1)
+        assert limiter.acquire(timeout=0)
+        assert not limiter.acquire(timeout=0.01)
+        limiter.release(0.01)
+        assert limiter.acquire(timeout=0)
+
+
+    def test_increase (self):
+        limiter = AdaptiveLimiter('test', 4, initial_limit=2, window=4)
+        self.run_window(limiter, 0.01)
+        assert limiter.limit == 3           # limit reached: one more allowed
+        self.run_window(limiter, 0.01, concurrent=1)
+        assert limiter.limit == 3           # limit not reached: unchanged
+        self.run_window(limiter, 0.01)
+        self.run_window(limiter, 0.01)
+        assert limiter.limit == 4           # up to the maximum only
+        assert limiter.stats()['increases'] == 2
+
+
+    def test_decrease_latency (self):
+        limiter = AdaptiveLimiter('test', 16, initial_limit=8, window=8)
+        self.run_window(limiter, 0.01)
+        assert limiter.baseline == pytest.approx(0.01)
+        assert limiter.limit == 9
+        self.run_window(limiter, 0.05)
+        assert limiter.limit == 4           # latency well over baseline: halved
+        self.run_window(limiter, 0.05)
+        self.run_window(limiter, 0.05)
+        assert limiter.limit == 1
+        self.run_window(limiter, 0.05)
+        assert limiter.limit == 1           # down to the minimum only
+
+
+    def test_decrease_failures (self):
+        log = io.StringIO()
+        limiter = AdaptiveLimiter('test reads', 8, initial_limit=6, window=6, log_file=log)
+        limiter.acquire()
+        limiter.release(1.0, failed=True)
+        self.run_window(limiter, 0.01)
+        assert limiter.limit == 3
+        assert limiter.stats()['decreases'] == 1
+        assert log.getvalue() == "(AdaptiveLimiter): test reads: limit 6 -> 3: 1 of 6 operations failed\n"
+
+
+    def test_slot (self):
+        limiter = AdaptiveLimiter('test', 2, window=1)
+        with limiter.slot():
+            assert limiter.stats()['in_flight'] == 1
+        assert limiter.stats()['in_flight'] == 0
+
+        with pytest.raises(ValueError):
+            with limiter.slot(failure_types=(TimeoutError,)):
+                raise ValueError('not a server problem')
+        assert limiter.stats()['decreases'] == 0
+        with pytest.raises(TimeoutError):
+            with limiter.slot(failure_types=(TimeoutError,)):
+                raise TimeoutError('server too slow')
+        assert limiter.stats()['decreases'] == 1
+
+
+    def test_threads_bounded (self):
+        limiter = AdaptiveLimiter('test', 3, initial_limit=3, window=100)
+        peak = []
+        lock = threading.Lock()
+        def work ():
+            with limiter.slot():
+                with lock:
+                    peak.append(limiter.stats()['in_flight'])
+                time.sleep(0.01)
+        threads = [ threading.Thread(target=work) for idx in range(12) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert max(peak) <= 3
+        assert limiter.stats()['in_flight'] == 0
+
+
+    def test_limited_reader (self):
+        limiter = AdaptiveLimiter('test', 2, window=1)
+        class PeekingIO(io.BytesIO):
+            def read (self, size=-1):
+                assert limiter.stats()['in_flight'] == 1
+                return super().read(size)
+        reader = LimitedReader(PeekingIO(b'0123456789'), limiter)
+        assert reader.read(4) == b'0123'
+        assert reader.seek(8) == 8
+        assert reader.tell() == 8
+        buffer = bytearray(4)
+        assert reader.readinto(buffer) == 2
+        assert buffer[:2] == b'89'
+        assert limiter.stats()['in_flight'] == 0
+
+        limiter = AdaptiveLimiter('test', 4, window=2)
+        failing = LimitedReader(io.BytesIO(b''), limiter, failure_types=(TimeoutError,))
+        failing.fd.read = lambda size=-1: (_ for _ in ()).throw(TimeoutError('server too slow'))
+        for idx in range(2):
+            with pytest.raises(TimeoutError):
+                failing.read(4)
+        assert limiter.stats()['decreases'] == 1
+
+
+    def test_make_adaptive_limiter (self):
+        assert make_adaptive_limiter({}, 'test', 4) is None
+        limiter = make_adaptive_limiter({ 'adaptive': True, 'verbose': True }, 'test', 4)
+        assert (limiter.max_limit, limiter.limit) == (4, 2)
+        assert limiter.log_file is not None
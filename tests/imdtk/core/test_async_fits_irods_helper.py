@@ -0,0 +1,92 @@
+# Tests for the asynchronous iRods FITS file fetching module.
+#   Written by: Tom Hicks. 2/1/21.
+#   Last Modified: Test that given files are rebound to the session of the executing thread.
+#
+import asyncio
+import os
+import pathlib as pl
+import shutil
+import tempfile
+import pytest
+
+from astropy.io import fits
+from irods.exception import DataObjectDoesNotExist
+
+from imdtk.core.async_fits_irods_helper import AsyncFitsIRodsHelper
+from imdtk.core.fits_irods_helper import FitsIRodsHelper
+from tests import TEST_DIR, TEST_RESOURCES_DIR
+
+
+class TestAsyncFitsIRodsHelper(object):
+
+    vos = '/myZone/home/tester/vos'
+    fits_names = [ 'm13.fits', 'HorseHead.fits', 'small_table.fits' ]
+
+    @pytest.fixture
+    def firh (self):
+        """ A helper serving a local tree of FITS files, kept out of the system temporary directory. """
+        with tempfile.TemporaryDirectory(dir=TEST_DIR) as tmp_dir:
+            vos_dir = pl.Path(tmp_dir).joinpath('myZone', 'home', 'tester', 'vos')
+            os.makedirs(vos_dir)
+            for name in self.fits_names:
+                shutil.copy(f"{TEST_RESOURCES_DIR}/{name}", vos_dir)
+            firh = FitsIRodsHelper({ 'irods_local_root': tmp_dir, 'irods_max_sessions': 2 })
+            yield firh
+            firh.cleanup()
+
+
+    def test_get_header (self, firh):
+        async def fetch ():
+            async with AsyncFitsIRodsHelper(firh) as afirh:
+                irff = await afirh.get_fits_file(f"{self.vos}/m13.fits")
+                return (await afirh.get_header(irff), await afirh.get_header(irff.path, which_hdu=1))
+        (header, missing) = asyncio.run(fetch())
+        assert header == fits.getheader(f"{TEST_RESOURCES_DIR}/m13.fits")
+        assert missing is None              # HDU out of range
+
+
+    def test_get_header_rebound (self, firh):
+        bound = []
+        get_header = firh.get_header
+        def checked_get_header (irff, which_hdu=0):
+            bound.append(irff.manager.sess is firh.session())
+            return get_header(irff, which_hdu)
+        firh.get_header = checked_get_header
+        async def fetch ():
+            async with AsyncFitsIRodsHelper(firh) as afirh:
+                irff = firh.get_fits_file(f"{self.vos}/m13.fits")  # bound to the main session
+                return await afirh.get_header(irff)
+        assert asyncio.run(fetch()) == fits.getheader(f"{TEST_RESOURCES_DIR}/m13.fits")
+        assert bound == [ True ]
+
+
+    def test_get_hdu (self, firh):
+        async def fetch ():
+            async with AsyncFitsIRodsHelper(firh) as afirh:
+                return await afirh.get_hdu(f"{self.vos}/small_table.fits", which_hdu=1)
+        hdu = asyncio.run(fetch())
+        with fits.open(f"{TEST_RESOURCES_DIR}/small_table.fits") as hdus:
+            assert hdu.header == hdus[1].header
+
+
+    def test_get_headers (self, firh):
+        paths = [ f"{self.vos}/{name}" for name in (self.fits_names * 10) ]
+        async def fetch ():
+            async with AsyncFitsIRodsHelper(firh) as afirh:
+                assert afirh.max_connections == 2
+                return await afirh.get_headers(paths + [ f"{self.vos}/nosuch.fits" ], return_exceptions=True)
+        headers = asyncio.run(fetch())
+        assert len(headers) == 31
+        for (path, header) in zip(paths, headers):
+            assert header == fits.getheader(f"{TEST_RESOURCES_DIR}/{os.path.basename(path)}")
+        assert isinstance(headers[-1], DataObjectDoesNotExist)
+        stats = firh.get_pool().stats()     # sessions are created on demand: one may have served all
+        assert (stats['in_use'], stats['max_sessions']) == (0, 2)
+        assert 1 <= stats['idle'] <= 2
+
+
+    def test_run (self, firh):
+        async def fetch ():
+            async with AsyncFitsIRodsHelper(firh, max_connections=1) as afirh:
+                return await afirh.run(firh.file_exists, f"{self.vos}/m13.fits")
+        assert asyncio.run(fetch()) is True
@@ -0,0 +1,83 @@
+# Tests for the column statistics module.
+#   Written by: Tom Hicks. 1/14/21.
+#   Last Modified: Initial creation.
+#
+import numpy as np
+import pytest
+
+from astropy.io import fits
+
+import imdtk.core.column_stats as cstats
+import imdtk.core.fits_utils as fits_utils
+from tests import TEST_RESOURCES_DIR
+
+
+class TestColumnStats(object):
+
+    table_tstfyl  = f"{TEST_RESOURCES_DIR}/small_table.fits"
+
+    cols = [
+        fits.Column(name='n', format='J', null=-1, array=np.array([1, -1, 5, 7])),
+        fits.Column(name='f', format='E', array=np.array([1.5, np.nan, -5.0, 2.0])),
+        fits.Column(name='v', format='2D', array=np.array([[1, 2], [3, np.nan], [0, 4], [9, 8]])),
+        fits.Column(name='s', format='4A', array=np.array(['ab', 'cd', 'ef', 'gh']))
+    ]
+
+
+    def test_new_column_stats(self):
+        fits_rec = fits.BinTableHDU.from_columns(self.cols).data
+        stats = cstats.new_column_stats(fits_rec.columns)
+        print(stats)
+        assert stats['row_count'] == 0
+        assert len(stats['columns']) == 4
+        assert stats['columns'][0]['name'] == 'n'
+        assert stats['columns'][3]['min'] is None
+
+
+    def test_update_column_stats(self):
+        fits_rec = fits.BinTableHDU.from_columns(self.cols).data
+        stats = cstats.new_column_stats(fits_rec.columns)
+        cstats.update_column_stats(stats, fits_rec)
+        print(stats)
+        assert stats['row_count'] == 4
+        nstats, fstats, vstats, sstats = stats['columns']
+        assert (nstats['count'], nstats['null_count'], nstats['min'], nstats['max']) == (3, 1, 1, 7)
+        assert (fstats['count'], fstats['null_count'], fstats['min'], fstats['max']) == (3, 1, -5.0, 2.0)
+        assert (vstats['count'], vstats['null_count'], vstats['min'], vstats['max']) == (7, 1, 0.0, 9.0)
+        assert (sstats['count'], sstats['null_count'], sstats['min'], sstats['max']) == (4, 0, None, None)
+
+
+    def test_update_column_stats_chunked(self):
+        fits_rec = fits.BinTableHDU.from_columns(self.cols).data
+        whole = cstats.update_column_stats(cstats.new_column_stats(fits_rec.columns), fits_rec)
+        chunked = cstats.new_column_stats(fits_rec.columns)
+        for chunk in fits_utils.gen_data_chunks(fits_rec, 3):
+            cstats.update_column_stats(chunked, chunk)
+        assert chunked == whole
+
+
+    def test_update_column_stats_table(self):
+        with fits.open(self.table_tstfyl) as hdus_list:
+            fits_rec = hdus_list[1].data
+            stats = cstats.new_column_stats(fits_rec.columns)
+            for chunk in fits_utils.gen_data_chunks(fits_rec, 100):
+                cstats.update_column_stats(stats, chunk)
+        print(stats)
+        assert stats['row_count'] == 326    # number of data rows in test file
+        assert len(stats['columns']) == 18  # number of data columns in test file
+        assert stats['columns'][0]['min'] == 100
+        assert stats['columns'][0]['max'] == 32600
+
+
+    def test_stats_to_rows(self):
+        fits_rec = fits.BinTableHDU.from_columns(self.cols).data
+        stats = cstats.update_column_stats(cstats.new_column_stats(fits_rec.columns), fits_rec)
+        rows = cstats.stats_to_rows(stats, 'mytable')
+        print(rows)
+        assert len(rows) == 4
+        assert rows[0] == ['mytable', 'n', 4, 3, 1, 1, 7]
+        assert rows[3] == ['mytable', 's', 4, 4, 0, None, None]
+
+
+    def test_stats_to_rows_empty(self):
+        assert cstats.stats_to_rows({}, 'mytable') == []
@@ -0,0 +1,127 @@
+# Tests for the fast WCS module.
+#   Written by: Tom Hicks. 1/25/21.
+#   Last Modified: Initial creation.
+#
+import numpy as np
+import pytest
+from pytest import approx
+
+from astropy import wcs
+from astropy.io import fits
+from astropy.wcs.utils import proj_plane_pixel_scales
+
+import imdtk.core.fast_wcs as fast_wcs
+from tests import TEST_RESOURCES_DIR
+
+
+class TestFastWCS(object):
+
+    hh_tstfyl  = f"{TEST_RESOURCES_DIR}/HorseHead.fits"
+    m13_tstfyl = f"{TEST_RESOURCES_DIR}/m13.fits"
+
+    # a rotated, SIN projected image, with a CD matrix
+    sin_header = {
+        'NAXIS': 2, 'NAXIS1': 2048, 'NAXIS2': 1024,
+        'CTYPE1': 'RA---SIN', 'CTYPE2': 'DEC--SIN',
+        'CRPIX1': 1000.5, 'CRPIX2': 520.0, 'CRVAL1': 359.9, 'CRVAL2': -62.5,
+        'CD1_1': -1.2e-4, 'CD1_2': 3.0e-5, 'CD2_1': 3.1e-5, 'CD2_2': 1.2e-4
+    }
+
+
+    def full_wcs(self, header):
+        """ Return an Astropy WCS for the given dictionary of header fields. """
+        return wcs.WCS(fits.Header(header))
+
+
+    def test_make_fast_wcs_m13(self):
+        header = fits.getheader(self.m13_tstfyl)
+        fwcs = fast_wcs.make_fast_wcs(header)
+        assert fwcs is not None
+        assert list(fwcs.wcs.ctype) == ['RA---TAN', 'DEC--TAN']
+        assert fwcs.pixel_shape == (300, 300)
+        assert fast_wcs.compare_wcs(fwcs, wcs.WCS(header), tolerance=1e-9) == []
+
+
+    def test_make_fast_wcs_sin(self):
+        fwcs = fast_wcs.make_fast_wcs(self.sin_header)
+        assert fwcs is not None
+        full = self.full_wcs(self.sin_header)
+        assert fwcs.calc_footprint() == approx(full.calc_footprint(), abs=1e-9)
+        assert np.sqrt((fwcs.pixel_scale_matrix ** 2).sum(axis=0)) == approx(proj_plane_pixel_scales(full))
+
+
+    def test_make_fast_wcs_swapped_axes(self):
+        header = dict(self.sin_header, CTYPE1='DEC--TAN', CTYPE2='RA---TAN', CRVAL1=45.0, CRVAL2=120.0)
+        fwcs = fast_wcs.make_fast_wcs(header)
+        assert fwcs is not None
+        assert fast_wcs.compare_wcs(fwcs, self.full_wcs(header), tolerance=1e-9) == []
+
+
+    def test_make_fast_wcs_pc_matrix(self):
+        header = { key: val for key, val in self.sin_header.items() if not key.startswith('CD') }
+        header.update({ 'CDELT1': -1e-4, 'CDELT2': 1e-4, 'PC1_1': 0.8, 'PC1_2': -0.6,
+                        'PC2_1': 0.6, 'PC2_2': 0.8, 'LONPOLE': 170.0 })
+        fwcs = fast_wcs.make_fast_wcs(header)
+        assert fwcs is not None
+        assert fast_wcs.compare_wcs(fwcs, self.full_wcs(header), tolerance=1e-9) == []
+
+
+    def test_make_fast_wcs_pole(self):
+        header = dict(self.sin_header, CTYPE1='RA---TAN', CTYPE2='DEC--TAN', CRVAL2=90.0)
+        fwcs = fast_wcs.make_fast_wcs(header)
+        assert fwcs.wcs.lonpole == 0.0
+        assert fast_wcs.compare_wcs(fwcs, self.full_wcs(header), tolerance=1e-9) == []
+
+
+    def test_make_fast_wcs_fallback(self):
+        assert fast_wcs.make_fast_wcs(None) is None
+        assert fast_wcs.make_fast_wcs(dict()) is None
+        assert fast_wcs.make_fast_wcs(fits.getheader(self.hh_tstfyl)) is None  # DSS plate solution
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, NAXIS=3)) is None
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, CTYPE1='RA---ZEA', CTYPE2='DEC--ZEA')) is None
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, CTYPE1='RA---TAN-SIP', CTYPE2='DEC--TAN-SIP')) is None
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, CTYPE1='GLON-SIN', CTYPE2='GLAT-SIN')) is None
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, CTYPE1='RA---TAN')) is None
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, A_ORDER=2)) is None
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, PV2_1=0.1)) is None
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, CUNIT1='arcsec')) is None
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, PC1_1=1.0)) is None
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, CRVAL1='not a number')) is None
+        assert fast_wcs.make_fast_wcs(dict(self.sin_header, CD1_1=0.0, CD1_2=0.0)) is None
+
+
+    def test_make_fast_wcs_crota(self):
+        header = { key: val for key, val in self.sin_header.items() if not key.startswith('CD') }
+        header.update({ 'CDELT1': -1e-4, 'CDELT2': 1e-4, 'CROTA2': 0.0 })
+        assert fast_wcs.make_fast_wcs(header) is not None
+        header['CROTA2'] = 30.0
+        assert fast_wcs.make_fast_wcs(header) is None
+
+
+    def test_compare_wcs(self):
+        fwcs = fast_wcs.make_fast_wcs(self.sin_header)
+        shifted = self.full_wcs(dict(self.sin_header, CRVAL2=-62.4))
+        diffs = fast_wcs.compare_wcs(fwcs, shifted)
+        assert len(diffs) == 1
+        assert diffs[0].startswith('Footprint differs')
+
+        scaled = self.full_wcs(dict(self.sin_header, CD2_2=2.4e-4))
+        diffs = fast_wcs.compare_wcs(fwcs, scaled)
+        assert len(diffs) == 2
+        assert diffs[1].startswith('Pixel scales differ')
+
+
+    def test_pixels_to_world(self):
+        fwcs = fast_wcs.make_fast_wcs(self.sin_header)
+        pixels = np.array([[[1.0, 1.0], [1000.5, 520.0], [2048.0, 17.0]]])
+        world = fast_wcs.pixels_to_world(pixels, *fast_wcs.fast_wcs_arrays([fwcs])[:-1])
+        assert world.shape == (1, 3, 2)
+        assert world[0] == approx(self.full_wcs(self.sin_header).all_pix2world(pixels[0], 1), abs=1e-9)
+        assert world[0][1] == approx([359.9, -62.5])
+
+
+    def test_pixel_scales(self):
+        fwcs = fast_wcs.make_fast_wcs(fits.getheader(self.m13_tstfyl))
+        scales = fast_wcs.pixel_scales(fast_wcs.fast_wcs_arrays([fwcs])[2])
+        assert scales.shape == (1, 2)
+        assert scales[0] == approx([0.00027770002, 0.00027770002])
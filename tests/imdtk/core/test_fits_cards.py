@@ -0,0 +1,192 @@
+# Tests for the FITS header card scanning module.
+#   Written by: Tom Hicks. 1/18/21.
+#   Last Modified: Add tests of the header block reader.
+#
+import gzip
+import io
+import pytest
+
+from astropy.io import fits
+
+import imdtk.core.fits_cards as cards
+import imdtk.core.fits_utils as fits_utils
+from tests import TEST_RESOURCES_DIR
+
+
+class ReadOnlyIO(object):
+    """ Minimal file object which supports only read and tell (no readinto). """
+    def __init__ (self, content):
+        self.fd = io.BytesIO(content)
+
+    def read (self, size=-1):
+        return self.fd.read(size)
+
+    def tell (self):
+        return self.fd.tell()
+
+
+def long_header_bytes (count):
+    """ Return the bytes of a primary header containing the given number of HISTORY cards. """
+    header = fits.Header()
+    for idx in range(count):
+        header.add_history('processing step {}'.format(idx))
+    header['LASTKEY'] = 'last'
+    return fits.PrimaryHDU(header=header).header.tostring().encode('ascii')
+
+
+class TestFitsCards(object):
+
+    hh_tstfyl     = f"{TEST_RESOURCES_DIR}/HorseHead.fits"
+    m13_tstfyl    = f"{TEST_RESOURCES_DIR}/m13.fits"
+    table_tstfyl  = f"{TEST_RESOURCES_DIR}/small_table.fits"
+    empty_tstfyl  = f"{TEST_RESOURCES_DIR}/empty.txt"
+
+    wcs_keys = [ 'CTYPE1', 'CTYPE2', 'CRVAL1', 'CRVAL2', 'CRPIX1', 'CRPIX2' ]
+
+
+    def test_parse_card(self):
+        assert cards.parse_card("NAXIS   =                    2 / number of axes") == \
+            ('NAXIS', "                   2 / number of axes")
+        assert cards.parse_card("COMMENT   some commentary") == ('COMMENT', None)
+        assert cards.parse_card("HIERARCH ESO DET CHIP = 'chip1' / a chip") == \
+            ('ESO DET CHIP', " 'chip1' / a chip")
+        assert cards.parse_card(" " * 80) == ('', None)
+
+
+    def test_parse_value(self):
+        assert cards.parse_value("                   2 / comment") == 2
+        assert cards.parse_value("                 -17") == -17
+        assert cards.parse_value("                 1.5E3 / comment") == 1500.0
+        assert cards.parse_value("              2.5D-2") == 0.025
+        assert cards.parse_value("                  .5") == 0.5
+        assert cards.parse_value("                   T") is True
+        assert cards.parse_value("                   F / false") is False
+        assert cards.parse_value("         (1.5, -2.0)") == complex(1.5, -2.0)
+        assert cards.parse_value("                     / undefined") is None
+        assert cards.parse_value("") is None
+
+
+    def test_parse_value_strings(self):
+        assert cards.parse_value("'RA---TAN'           / type") == 'RA---TAN'
+        assert cards.parse_value("'a''b    '") == "a'b"
+        assert cards.parse_value("'  lead'") == '  lead'
+        assert cards.parse_value("''") == ''
+        assert cards.parse_value("'a / b' / comment") == 'a / b'
+
+
+    def test_fields_from_cards(self):
+        hdr = fits.Header()
+        hdr['LONGSTR'] = ('x' * 150) + "it's"
+        hdr['HIERARCH ESO DET CHIP NAME'] = 'chip'
+        hdr['CPLX'] = complex(1.5, -2)
+        hdr['FLT'] = 1.0e-30
+        hdr['QUOTE'] = "a'b  "
+        hdr['EMPTY'] = ''
+        hdr['COMMENT'] = 'a comment'
+        hdr_bytes = hdr.tostring().encode()
+
+        fields = cards.fields_from_cards(cards.gen_cards(hdr_bytes))
+        print(fields)
+        assert fields == fits_utils.get_fields_from_header(hdr)
+
+        fields = cards.fields_from_cards(cards.gen_cards(memoryview(hdr_bytes)), ignore=[])
+        assert fields == fits_utils.get_fields_from_header(hdr, ignore=[])
+        assert fields.get('COMMENT') == 'a comment'
+
+
+    def test_fields_from_cards_keys(self):
+        hdr = fits.Header([('SIMPLE', True), ('BITPIX', 8), ('NAXIS', 0), ('A', 1), ('B', 2)])
+        fields = cards.fields_from_cards(cards.gen_cards(hdr.tostring().encode()), keys=['B'])
+        print(fields)
+        assert fields == { 'SIMPLE': True, 'BITPIX': 8, 'NAXIS': 0, 'B': 2 }
+
+
+    def test_get_hdu_fields(self):
+        """ The scanned fields must match those from an Astropy header. """
+        for (fits_file, hdu_count) in [ (self.m13_tstfyl, 1), (self.hh_tstfyl, 2),
+                                        (self.table_tstfyl, 2) ]:
+            with fits.open(fits_file) as hdus_list, open(fits_file, 'rb') as fd:
+                for which_hdu in range(hdu_count):
+                    for ignore in [ fits_utils.FITS_IGNORE_KEYS, [] ]:
+                        fields = cards.get_hdu_fields(fd, which_hdu, ignore=ignore)
+                        print(fields)
+                        assert fields == fits_utils.get_header_fields(hdus_list, which_hdu, ignore)
+
+
+    def test_get_hdu_fields_keys(self):
+        with fits.open(self.m13_tstfyl) as hdus_list, open(self.m13_tstfyl, 'rb') as fd:
+            fields = cards.get_hdu_fields(fd, 0, keys=self.wcs_keys)
+            print(fields)
+            assert fields == fits_utils.get_header_fields(hdus_list, 0, keys=self.wcs_keys)
+            assert set(fields.keys()) == set(self.wcs_keys + ['SIMPLE', 'BITPIX', 'NAXIS',
+                                                              'NAXIS1', 'NAXIS2'])
+
+
+    def test_get_hdu_fields_badindex(self):
+        with open(self.m13_tstfyl, 'rb') as fd:
+            assert cards.get_hdu_fields(fd, 1) is None
+            assert cards.get_hdu_fields(fd, 99) is None
+
+
+    def test_gen_hdu_fields(self):
+        with open(self.hh_tstfyl, 'rb') as fd:
+            hdr_infos = [ hdr_info for hdr_info in cards.gen_hdu_fields(fd) ]
+        print(hdr_infos)
+        assert len(hdr_infos) == 2
+        assert hdr_infos[0].offset == 0
+        assert hdr_infos[0].length == 14400  # size of primary header
+        assert hdr_infos[1].offset == 14400 + 1592640  # after primary header and data
+        assert hdr_infos[1].length == 2880
+        assert hdr_infos[1].hdr.get('XTENSION') == 'TABLE'
+
+
+    def test_read_header_fields_empty(self):
+        assert cards.read_header_fields(io.BytesIO(b'')) is None
+        assert cards.read_header_fields(io.BytesIO(b' ' * 2880)) is None
+        with open(self.m13_tstfyl, 'rb') as fd:
+            truncated = io.BytesIO(fd.read(1000))
+        assert cards.read_header_fields(truncated) is None
+
+
+    def test_gen_hdu_fields_compressed(self):
+        with open(self.hh_tstfyl, 'rb') as fd:
+            packed = io.BytesIO(gzip.compress(fd.read()))
+        with open(self.hh_tstfyl, 'rb') as fd, gzip.GzipFile(fileobj=packed, mode='rb') as gzfd:
+            expected = [ hdr_info for hdr_info in cards.gen_hdu_fields(fd) ]
+            hdr_infos = [ hdr_info for hdr_info in cards.gen_hdu_fields(gzfd) ]
+        assert len(hdr_infos) == 2
+        assert hdr_infos == expected
+
+
+    def test_read_header_bytes(self):
+        with open(self.hh_tstfyl, 'rb') as fd:
+            (start, header_bytes) = cards.read_header_bytes(fd)
+            assert start == 0
+            assert len(header_bytes) == 14400
+            assert bytes(header_bytes).rstrip().endswith(b'END')
+            assert fd.tell() == 14400
+
+
+    def test_read_header_bytes_long(self):
+        raw = long_header_bytes(3000)       # many more blocks than the initial buffer
+        assert len(raw) > cards.HEADER_BUFFER_SIZE
+        (start, header_bytes) = cards.read_header_bytes(io.BytesIO(raw + (b'\0' * 2880)))
+        assert start == 0
+        assert bytes(header_bytes) == raw
+        hdr_info = cards.read_header_fields(io.BytesIO(raw))
+        assert hdr_info.length == len(raw)
+        assert hdr_info.hdr.get('LASTKEY') == 'last'
+
+
+    def test_read_header_bytes_length(self):
+        raw = long_header_bytes(100)
+        (start, header_bytes) = cards.read_header_bytes(io.BytesIO(raw), header_length=len(raw))
+        assert bytes(header_bytes) == raw
+        assert cards.read_header_bytes(io.BytesIO(raw[:-1]), header_length=len(raw)) is None
+
+
+    def test_read_header_bytes_no_readinto(self):
+        raw = long_header_bytes(300)
+        (start, header_bytes) = cards.read_header_bytes(ReadOnlyIO(raw))
+        assert bytes(header_bytes) == raw
+        assert cards.read_header_bytes(ReadOnlyIO(raw[:-2880])) is None
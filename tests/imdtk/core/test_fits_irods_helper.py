@@ -1,17 +1,60 @@
 # Tests for the iRods interface module.
 #   Written by: Tom Hicks. 11/5/20.
-#   Last Modified: Update for refactor of iRods default files/paths.
+#   Last Modified: Test the selection of changed files returning the replaced files.
 #
+import gzip
+import io
 import os
 import pytest
 
 import astropy
+import numpy as np
+from astropy.io import fits
 
 import imdtk.exceptions as errors
 import imdtk.core.fits_irods_helper as firh
 
 from imdtk.core import FitsHeaderInfo
-from tests import TEST_DIR
+from imdtk.core.ingest_manifest import IngestManifest
+from tests import TEST_DIR, TEST_RESOURCES_DIR
+from tests.fake_irods import FakeCatalogSession
+
+
+class CountingIO(io.BytesIO):
+    """ In-memory file which counts the number of reads made from it. """
+    def __init__ (self, content, counts):
+        super().__init__(content)
+        self.counts = counts
+
+    def read (self, size=-1):
+        self.counts['reads'] += 1
+        return super().read(size)
+
+    def readinto (self, buffer):
+        self.counts['reads'] += 1
+        return super().readinto(buffer)
+
+
+class LocalFile(object):
+    """ Stand-in for an iRods data object, backed by an in-memory copy of a local file. """
+    def __init__ (self, path, content):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.content = content
+        self.size = len(content)
+        self.counts = { 'reads': 0 }
+
+    def open (self, mode):
+        return CountingIO(self.content, self.counts)
+
+
+def local_file (path, compress=False):
+    """ Return a stand-in iRods data object for the given local file, optionally compressed. """
+    with open(path, 'rb') as fd:
+        content = fd.read()
+    if (compress):
+        return LocalFile(path + '.gz', gzip.compress(content))
+    return LocalFile(path, content)
 
 
 class TestFitsIRodsHelper(object):
@@ -31,6 +74,9 @@ class TestFitsIRodsHelper(object):
     irff_BAD =      '/iplant/home/hickst/vos/images/BAD.fits'
     irff_smallcat = '/iplant/home/hickst/vos/catalogs/small_table.fits'
 
+    local_smallcat = f"{TEST_RESOURCES_DIR}/small_table.fits"
+    local_hh = f"{TEST_RESOURCES_DIR}/HorseHead.fits"
+
 
     def test_create_helper_noconn (self):
         args = {}
@@ -46,6 +92,78 @@ class TestFitsIRodsHelper(object):
         assert ihelper is not None
 
 
+    def test_list_fits_file_paths (self):
+        ihelper = firh.FitsIRodsHelper({}, connect=False)
+        ihelper._session = FakeCatalogSession(
+            [ ('/zone/home/test/vos/m13.fits', 5760, 1), ('/zone/home/test/vos/notes.txt', 10, 1),
+              ('/zone/home/test/vos/a/m31.fits.gz', 5760, 1) ],
+            avus={ '/zone/home/test/vos/m13.fits': [('target', 'M13'), ('filter', 'R')] })
+
+        paths = ihelper.list_fits_file_paths('/zone/home/test/vos')
+        assert paths == [ '/zone/home/test/vos/a/m31.fits.gz', '/zone/home/test/vos/m13.fits' ]
+        queries = ihelper.session().queries
+        assert queries == 8                 # 2 collection criteria * 2 suffixes * (files + metadata)
+
+        irff = ihelper.get_fits_file('/zone/home/test/vos/m13.fits')
+        assert irff.size == 5760
+        assert ihelper.get_content_metadata(irff) == { 'target': 'M13', 'filter': 'R' }
+        assert ihelper.get_content_metadata(ihelper.get_fits_file(paths[0])) == dict()
+        assert ihelper.get_irods_metadata(irff).get('checksum') == 'sha2:0'
+        assert ihelper.session().queries == queries  # all read from the prefetched listing
+
+        assert ihelper.put_metaf(irff.path, { 'target': 'M13', 'filter': 'V' }, absolute=True) == 2
+        assert paths[0] in ihelper._listed_files
+        assert irff.path not in ihelper._listed_files  # changed metadata must be queried again
+
+
+    def test_select_changed_files (self):
+        vos = '/zone/home/test/vos'
+        files = [ (f"{vos}/m13.fits", 5760, 1), (f"{vos}/m31.fits", 5760, 1) ]
+        ihelper = firh.FitsIRodsHelper({}, connect=False)
+        ihelper._session = FakeCatalogSession(files)
+        paths = ihelper.list_fits_file_paths(vos)
+        signatures = { path: ihelper.file_signature(ihelper.get_fits_file(path)) for path in paths }
+        assert signatures[paths[0]].startswith('5760:sha2:0:')
+
+        # without a manifest, compare with the signature recorded in the metadata of each file
+        ihelper._session = FakeCatalogSession(
+            files, avus={ paths[0]: [(firh.SOURCE_SIGNATURE_KEY, signatures[paths[0]])],
+                          paths[1]: [(firh.SOURCE_SIGNATURE_KEY, 'old:signature')] })
+        ihelper.list_fits_file_paths(vos)
+        queries = ihelper.session().queries
+        (changed, changed_sigs, replaced) = ihelper.select_changed_files(paths + [f"{vos}/gone.fits"])
+        assert changed == [ paths[1], f"{vos}/gone.fits" ]
+        assert changed_sigs == { paths[1]: signatures[paths[1]] }
+        assert replaced == { paths[1] }
+        assert ihelper.session().queries == queries   # all read from the prefetched listing
+
+        # with a manifest, compare with the signature recorded in the manifest
+        manifest = IngestManifest(':memory:', 'table')
+        assert ihelper.select_changed_files(paths, manifest) == (paths, signatures, set())
+        manifest.record(paths[1], signatures[paths[1]])
+        manifest.record(paths[0], 'old:signature')
+        assert ihelper.select_changed_files(paths, manifest) == (
+            [ paths[0] ], { paths[0]: signatures[paths[0]] }, { paths[0] })
+
+
+    def test_select_image_files (self):
+        vos = '/zone/home/test/vos'
+        ihelper = firh.FitsIRodsHelper({ 'skip_names': [ '*_x1d.fits*' ] }, connect=False)
+        ihelper._session = FakeCatalogSession(
+            [ (f"{vos}/m13.fits", 5760, 1), (f"{vos}/empty.fits", 0, 1), (f"{vos}/tiny.fits", 2880, 1),
+              (f"{vos}/tiny.fits.gz", 200, 1), (f"{vos}/spec_x1d.fits.gz", 9000, 1),
+              (f"{vos}/cat.fits", 8640, 1), (f"{vos}/cube.fits", 8640, 1) ],
+            avus={ f"{vos}/cat.fits": [('dataproduct_type', 'catalog')],
+                   f"{vos}/cube.fits": [('dataproduct_type', 'Cube')] })
+        paths = ihelper.list_fits_file_paths(vos)
+        queries = ihelper.session().queries
+
+        (selected, skip_counts) = ihelper.select_image_files(paths + [ f"{vos}/gone.fits" ])
+        assert selected == [ f"{vos}/cube.fits", f"{vos}/m13.fits", f"{vos}/tiny.fits.gz", f"{vos}/gone.fits" ]
+        assert skip_counts == { 'content_type': 1, 'empty': 1, 'name': 1, 'too_small': 1 }
+        assert ihelper.session().queries == queries   # all judged from the prefetched listing
+
+
     def test_get_authentication_file (self):
         args = {}
         ihelper = firh.FitsIRodsHelper(args, connect=False)
@@ -230,3 +348,279 @@ class TestFitsIRodsHelper(object):
         paths = [ fpath for fpath in ihelper.gen_fits_file_paths(irdir) ]
         assert paths is not None
         assert len(paths) > 1
+
+
+    def test_gen_table_chunks (self):
+        """ Also tests gen_table_reads and decode_table_chunk, using a local file. """
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        fsize = os.path.getsize(self.local_smallcat)
+        with open(self.local_smallcat, 'rb') as fd:
+            hdr_info = ihelper.get_header_info_at(fd, fsize, 1)
+            chunks = [ chunk for chunk in ihelper.gen_table_chunks(fd, fsize, hdr_info, 100) ]
+
+        assert [len(chunk) for chunk in chunks] == [100, 100, 100, 26]
+        with fits.open(self.local_smallcat) as hdus_list:
+            whole = np.asarray(hdus_list[1].data)
+            assert (np.concatenate([np.asarray(chunk) for chunk in chunks]) == whole).all()
+            assert chunks[0].columns.names == hdus_list[1].columns.names
+
+
+    def test_gen_table_chunks_heap (self):
+        col = fits.Column(name='vla', format='PJ()',
+                          array=np.array([[1], [2, 3], [4, 5, 6]], dtype=object))
+        fd = io.BytesIO()                   # in-memory FITS file with a heap
+        fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU.from_columns([col])]).writeto(fd)
+
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        fsize = len(fd.getvalue())
+        hdr_info = ihelper.get_header_info_at(fd, fsize, 1)
+        chunks = [ chunk for chunk in ihelper.gen_table_chunks(fd, fsize, hdr_info, 2) ]
+
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        assert list(chunks[1][0]['vla']) == [4, 5, 6]
+
+
+    def test_gen_table_reads_truncated (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        fsize = os.path.getsize(self.local_smallcat)
+        with open(self.local_smallcat, 'rb') as fd:
+            hdr_info = ihelper.get_header_info_at(fd, fsize, 1)
+            data_offset = hdr_info.offset + hdr_info.length
+            with pytest.raises(OSError, match='truncated'):
+                reads = ihelper.gen_table_reads(fd, fsize, data_offset, 144, 1000, 400)
+                [ read for read in reads ]
+
+
+    def test_get_column_info_from_header (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        for (local_file, hdu_index) in [ (self.local_smallcat, 1), (self.local_hh, 1) ]:
+            with fits.open(local_file) as hdus_list:
+                header = hdus_list[hdu_index].header
+                expected = hdus_list[hdu_index].columns.info(output=False)
+                cinfo = ihelper.get_column_info_from_header(header)
+                print(cinfo)
+                assert cinfo == expected
+
+
+    def test_get_column_info_from_header_not_table (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        with fits.open(self.local_smallcat) as hdus_list:
+            assert ihelper.get_column_info_from_header(hdus_list[0].header) is None
+        assert ihelper.get_column_info_from_header(None) is None
+
+
+    def test_fits_file_size (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        assert ihelper.fits_file_size(local_file(self.local_hh)) == os.path.getsize(self.local_hh)
+        assert ihelper.fits_file_size(local_file(self.local_hh, compress=True)) == firh.UNKNOWN_SIZE
+
+
+    def test_is_compressed_file (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        assert ihelper.is_compressed_file(local_file(self.local_hh)) is False
+        assert ihelper.is_compressed_file(local_file(self.local_hh, compress=True)) is True
+
+
+    def test_get_header_compressed (self):
+        """ Also tests open_fits_file, get_header_info_at, read_header, and read_chunk. """
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        for local_path in [ self.local_hh, self.local_smallcat ]:
+            plain = local_file(local_path)
+            packed = local_file(local_path, compress=True)
+            for which_hdu in [0, 1]:
+                header = ihelper.get_header(packed, which_hdu)
+                print(header)
+                assert header is not None
+                assert header == ihelper.get_header(plain, which_hdu)
+            assert ihelper.get_header(packed, 2) is None
+
+
+    def test_get_hdu_compressed (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        hdu = ihelper.get_hdu(local_file(self.local_smallcat, compress=True), 1)
+        assert hdu is not None
+        with fits.open(self.local_smallcat) as hdus_list:
+            assert (np.asarray(hdu.data) == np.asarray(hdus_list[1].data)).all()
+
+
+    def test_get_header_fields_compressed (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        plain = local_file(self.local_hh)
+        packed = local_file(self.local_hh, compress=True)
+        for which_hdu in [0, 1]:
+            hflds = ihelper.get_header_fields(packed, which_hdu)
+            assert hflds is not None
+            assert hflds == ihelper.get_header_fields(plain, which_hdu)
+
+
+    def test_get_header_truncated_compressed (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        packed = local_file(self.local_hh, compress=True)
+        packed.content = packed.content[:len(packed.content) // 2]
+        with pytest.raises(OSError):
+            ihelper.get_header(packed, 1)
+
+
+    def test_get_hdu_index (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        irff = local_file(self.local_hh)
+        hdu_index = ihelper.get_hdu_index(irff)
+        assert hdu_index == { 'entries': [], 'complete': False }
+        assert ihelper.get_hdu_index(irff) is hdu_index
+        assert ihelper.get_hdu_index(local_file(self.local_hh)) is hdu_index
+        assert ihelper.get_hdu_index(local_file(self.local_smallcat)) is not hdu_index
+
+
+    def test_get_hdu_index_bounded (self, monkeypatch):
+        monkeypatch.setattr(firh, 'HDU_INDEX_CACHE_SIZE', 2)
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        hh_index = ihelper.get_hdu_index(local_file(self.local_hh))
+        cat_index = ihelper.get_hdu_index(local_file(self.local_smallcat))
+        assert ihelper.get_hdu_index(local_file(self.local_hh)) is hh_index  # now most recent
+        ihelper.get_hdu_index(local_file(self.local_hh, compress=True))
+        assert len(ihelper._hdu_indices) == 2
+        assert ihelper.get_hdu_index(local_file(self.local_hh)) is hh_index
+        assert ihelper.get_hdu_index(local_file(self.local_smallcat)) is not cat_index
+
+
+    def test_hdu_index_filled (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        irff = local_file(self.local_hh)
+        header = ihelper.get_header(irff, 1)
+        assert header is not None
+        entries = ihelper.get_hdu_index(irff)['entries']
+        assert len(entries) == 2
+        assert entries[0].offset == 0
+        assert entries[0].hdu_type == 'PRIMARY'
+        assert entries[1].offset == entries[0].hdr_length + entries[0].data_length
+        assert entries[1].hdu_type == header.get('XTENSION')
+        with fits.open(self.local_hh) as hdus_list:
+            for idx, entry in enumerate(entries):
+                info = hdus_list[idx].fileinfo()
+                assert entry.offset == info['hdrLoc']
+                assert entry.offset + entry.hdr_length == info['datLoc']
+                assert entry.data_length == info['datSpan']
+
+
+    def test_hdu_index_single_read (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        irff = local_file(self.local_hh)
+        header = ihelper.get_header(irff, 1)
+        irff.counts['reads'] = 0
+        assert ihelper.get_header(irff, 1) == header
+        assert irff.counts['reads'] == 1
+        irff.counts['reads'] = 0
+        assert ihelper.get_header(irff, 0) is not None
+        assert irff.counts['reads'] == 1
+        irff.counts['reads'] = 0
+        assert ihelper.get_hdu(irff, 1) is not None
+        assert irff.counts['reads'] == 1
+        irff.counts['reads'] = 0
+        hflds = ihelper.get_header_fields(irff, 1)
+        assert irff.counts['reads'] == 1
+        assert hflds == ihelper.get_header_fields(local_file(self.local_hh), 1)
+
+
+    def test_hdu_index_out_of_range (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        irff = local_file(self.local_hh)
+        assert ihelper.get_header(irff, 3) is None
+        hdu_index = ihelper.get_hdu_index(irff)
+        assert hdu_index['complete'] is True
+        assert len(hdu_index['entries']) == 2
+        irff.counts['reads'] = 0
+        assert ihelper.get_header(irff, 5) is None
+        assert ihelper.get_header_fields(irff, 2) is None
+        assert irff.counts['reads'] == 0
+
+
+    def test_hdu_index_compressed (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        plain = local_file(self.local_smallcat)
+        packed = local_file(self.local_smallcat, compress=True)
+        assert ihelper.get_header(packed, 1) == ihelper.get_header(plain, 1)
+        assert ihelper.get_hdu_index(packed)['entries'] == ihelper.get_hdu_index(plain)['entries']
+        assert ihelper.get_header(packed, 0) == ihelper.get_header(plain, 0)
+
+
+    def test_read_ahead_size (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        assert ihelper.read_ahead_size == firh.DEFAULT_WINDOW_SIZE
+        ihelper = firh.FitsIRodsHelper({ 'read_ahead_kb': 64 }, connect=False)
+        assert ihelper.read_ahead_size == 64 * 1024
+        ihelper = firh.FitsIRodsHelper({ 'read_ahead_kb': 0 }, connect=False)
+        assert ihelper.read_ahead_size == 0
+
+
+    def test_read_ahead_requests (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        irff = local_file(self.local_hh)
+        header = ihelper.get_header(irff, 1)
+        assert irff.counts['reads'] == 2    # one window per header: primary, then extension
+
+        noahead = firh.FitsIRodsHelper({ 'read_ahead_kb': 0 }, connect=False)
+        irff = local_file(self.local_hh)
+        assert noahead.get_header(irff, 1) == header
+        assert irff.counts['reads'] > 2     # one read per header block
+
+
+    def test_read_ahead_compressed (self):
+        ihelper = firh.FitsIRodsHelper({ 'read_ahead_kb': 8 }, connect=False)
+        plain = local_file(self.local_smallcat)
+        packed = local_file(self.local_smallcat, compress=True)
+        assert ihelper.get_header(packed, 1) == ihelper.get_header(plain, 1)
+        assert ihelper.get_header_fields(packed, 0) == ihelper.get_header_fields(plain, 0)
+
+
+    def test_read_limiter_slots (self):
+        ihelper = firh.FitsIRodsHelper(dict(self.defargs, adaptive=True, verbose=False), connect=False)
+        limiter = ihelper.read_limiter
+        slots = []
+        release = limiter.release
+        limiter.release = lambda latency, failed=False: (slots.append(latency), release(latency, failed))
+        irff = local_file(self.local_hh)
+        with ihelper.open_fits_file(irff) as irff_fd:
+            assert limiter.stats()['in_flight'] == 0   # no slot held while the caller works
+            opened = len(slots)
+            assert irff_fd.read(firh.FITS_BLOCK_SIZE)
+        assert opened == 1
+        assert len(slots) == 1 + irff.counts['reads']  # one slot for the open and for each read
+        assert limiter.stats()['in_flight'] == 0
+
+
+    def test_irods_file_key (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        irff = local_file(self.local_hh)
+        key = ihelper.irods_file_key(irff)
+        assert key == ('irods', self.local_hh, os.path.getsize(self.local_hh), 'None')
+        irff.checksum = 'sha2:abcd'
+        assert ihelper.irods_file_key(irff)[3] == 'sha2:abcd'
+
+
+    def test_header_cache (self):
+        args = dict(self.defargs, header_cache=':memory:')
+        ihelper = firh.FitsIRodsHelper(args, connect=False)
+        assert ihelper.header_cache is not None
+        irff = local_file(self.local_hh)
+        header = ihelper.get_header(irff, 1)
+        assert header is not None
+        key = ihelper.irods_file_key(irff)
+        assert ihelper.header_cache.get(key, 1) is not None
+
+        other = firh.FitsIRodsHelper(self.defargs, connect=False)
+        other.header_cache = ihelper.header_cache   # a new helper sharing the same cache
+        irff = local_file(self.local_hh)
+        assert other.get_header(irff, 1) == header
+        assert other.get_header_fields(irff, 1) == ihelper.get_header_fields(local_file(self.local_hh), 1)
+        assert irff.counts['reads'] == 0    # served from the cache without opening the file
+        other.header_cache.close()
+
+
+    def test_get_header_bytes (self):
+        ihelper = firh.FitsIRodsHelper(self.defargs, connect=False)
+        irff = local_file(self.local_hh)
+        header_bytes = ihelper.get_header_bytes(irff, 1)
+        with fits.open(self.local_hh) as hdus_list:
+            assert len(header_bytes) == hdus_list[1].fileinfo()['datLoc'] - hdus_list[1].fileinfo()['hdrLoc']
+        assert header_bytes.rstrip().endswith(b'END')
+        assert ihelper.get_header_bytes(irff, 2) is None
@@ -1,10 +1,12 @@
 # Tests of the FITS specific utilities module.
 #   Written by: Tom Hicks. 4/7/2020.
-#   Last Modified: Replace bitpix_size test lost in sync.
+#   Last Modified: Add test for gzip compressed filenames.
 #
 import json
 import pytest
 
+import numpy as np
+
 from astropy import wcs
 from astropy.table import Table
 from astropy.time.core import Time
@@ -75,6 +77,16 @@ class TestFitsUtils(object):
 
 
 
+    def test_gen_data_chunks(self):
+        with fits.open(self.table_tstfyl) as hdus_list:
+            fits_rec = hdus_list[1].data
+            chunks = [ chunk for chunk in utils.gen_data_chunks(fits_rec, 100) ]
+            assert len(chunks) == 4
+            assert [len(chunk) for chunk in chunks] == [100, 100, 100, 26]
+            assert chunks[1][0]['ID'] == fits_rec[100]['ID']
+
+
+
     def test_get_column_info(self):
         with fits.open(self.table_tstfyl) as hdus:
             col_info = utils.get_column_info(hdus)
@@ -134,6 +146,14 @@ class TestFitsUtils(object):
         assert 'COMMENT' not in hdrs        # removed by default
 
 
+    def test_get_header_fields_keys(self):
+        with fits.open(self.m13_tstfyl) as hdus:
+            hdrs = utils.get_header_fields(hdus, keys=['CTYPE1', 'CRVAL1', 'NOSUCHKEY'])
+        print(hdrs)
+        assert hdrs == { 'SIMPLE': True, 'BITPIX': 16, 'NAXIS': 2, 'NAXIS1': 300,
+                         'NAXIS2': 300, 'CTYPE1': 'RA---TAN', 'CRVAL1': 250.4226 }
+
+
     def test_get_header_fields_badindex(self):
         hdrs = None
         with fits.open(self.m13_tstfyl) as hdus:
@@ -310,6 +330,51 @@ class TestFitsUtils(object):
 
 
 
+    def test_has_image_header(self):
+        assert utils.has_image_header({ 'NAXIS': 2 }) is True
+        assert utils.has_image_header({ 'NAXIS': 0 }) is False
+        assert utils.has_image_header({ 'XTENSION': 'IMAGE' }, which_hdu=1) is True
+        assert utils.has_image_header({ 'XTENSION': 'TABLE' }, which_hdu=1) is False
+        with fits.open(self.hh_tstfyl) as hdus:
+            assert utils.has_image_header(hdus[0].header) is True
+            assert utils.has_image_header(hdus[1].header, which_hdu=1) is False
+
+
+    def test_calculate_data_length(self):
+        with fits.open(self.hh_tstfyl) as hdus:
+            assert utils.calculate_data_length(hdus[0].header) == 1592640
+            assert utils.calculate_data_length(hdus[1].header) == 40320
+        with fits.open(self.table_tstfyl) as hdus:
+            assert utils.calculate_data_length(hdus[0].header) == 2880  # VOTable metadata
+            assert utils.calculate_data_length(dict(hdus[1].header)) == 48960
+        with pytest.raises(RuntimeError):
+            utils.calculate_data_length({ 'NAXIS': 1, 'XTENSION': 'BOGUS' })
+
+
+    def test_calc_data_length(self):
+        hdr = { 'BITPIX': -32, 'NAXIS': 2, 'NAXIS1': 100, 'NAXIS2': 100 }
+        assert utils.calc_data_length(hdr, primary=True) == 40320
+        assert utils.calc_data_length(dict(hdr, NAXIS2=0), primary=True) == 0
+        assert utils.calc_data_length({ 'NAXIS': 0 }) == 0
+
+
+    def test_is_gzip_filename(self):
+        assert utils.is_gzip_filename('m13.fits.gz') is True
+        assert utils.is_gzip_filename('/usr/dummy/m13.fits.gz') is True
+        assert utils.is_gzip_filename('m13.fits') is False
+        assert utils.is_gzip_filename('m13.gz.fits') is False
+
+
+    def test_is_selected_key(self):
+        assert utils.is_selected_key('CTYPE1') is True
+        assert utils.is_selected_key('CTYPE1', ['CTYPE1']) is True
+        assert utils.is_selected_key('CTYPE2', ['CTYPE1']) is False
+        assert utils.is_selected_key('NAXIS', []) is True
+        assert utils.is_selected_key('NAXIS3', []) is True
+        assert utils.is_selected_key('NAXISX', []) is False
+        assert utils.is_selected_key('XTENSION', ['CTYPE1']) is True
+
+
     def test_is_fits_file(self):
         assert utils.is_fits_file('m13.fits') is True
         assert utils.is_fits_file('m13.fits.gz') is True
@@ -389,6 +454,34 @@ class TestFitsUtils(object):
 
 
 
+    def test_rows_from_data_vectors(self):
+        cols = [
+            fits.Column(name='u', format='I', bzero=32768, array=np.array([1, 65535], dtype=np.uint16)),
+            fits.Column(name='v', format='3E', array=np.ones((2, 3))),
+            fits.Column(name='c', format='C', array=np.array([1+2j, 3j])),
+            fits.Column(name='p', format='PJ()', array=np.array([np.array([1, 2]), np.array([3])], dtype=object)),
+            fits.Column(name='x', format='5X', array=np.array([[1, 0, 1, 0, 1], [0, 0, 0, 0, 1]], dtype=bool)),
+            fits.Column(name='pa', format='PA()', array=np.array(['xy', 'z'], dtype=object)),
+            fits.Column(name='s', format='10A', array=np.array(['ab', 'cde']))
+        ]
+        fits_rec = fits.BinTableHDU.from_columns(cols).data
+        data = utils.rows_from_data(fits_rec)
+        print(data)
+        assert data[0] == [1, [1.0, 1.0, 1.0], [1.0, 2.0], [1, 2], '10101', 'xy', 'ab']
+        assert data[1] == [65535, [1.0, 1.0, 1.0], [0.0, 3.0], [3], '00001', 'z', 'cde']
+        assert json.dumps(data) is not None
+
+
+    def test_columns_from_data(self):
+        with fits.open(self.table_tstfyl) as hdus_list:
+            fits_rec = hdus_list[1].data
+            cols = utils.columns_from_data(fits_rec)
+            assert cols is not None
+            assert len(cols) == 18          # number of data columns in test file
+            assert len(cols[0]) == 326      # number of data rows in test file
+
+
+
     def test_get_table_meta_attribute(self):
         with fits.open(self.table_tstfyl) as hdus_list:
             table = Table.read(hdus_list, hdu=1)
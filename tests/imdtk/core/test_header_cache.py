@@ -0,0 +1,192 @@
+# Tests for the persistent FITS header cache module.
+#   Written by: Tom Hicks. 1/22/21.
+#   Last Modified: Add test of keeping the total size of the cache.
+#
+import os
+import sqlite3
+import tempfile
+import threading
+import pytest
+
+from astropy.io import fits
+
+import imdtk.core.fits_cards as fits_cards
+import imdtk.core.header_cache as hcache
+from tests import TEST_DIR, TEST_RESOURCES_DIR
+
+
+class TestHeaderCache(object):
+
+    hh_tstfyl     = f"{TEST_RESOURCES_DIR}/HorseHead.fits"
+    m13_tstfyl    = f"{TEST_RESOURCES_DIR}/m13.fits"
+    table_tstfyl  = f"{TEST_RESOURCES_DIR}/small_table.fits"
+
+    file_key = (hcache.IRODS_SOURCE, '/iplant/home/test/m13.fits', 5760, 'sha2:abcd')
+
+
+    def test_put_get(self):
+        cache = hcache.HeaderCache(':memory:')
+        assert cache.get(self.file_key, 0) is None
+        cache.put(self.file_key, 0, 0, b'header0')
+        cache.put(self.file_key, 1, 2880, memoryview(b'header1'))
+        assert cache.get(self.file_key, 0) == b'header0'
+        assert cache.get(self.file_key, 1) == b'header1'
+        assert cache.get(self.file_key, 2) is None
+        assert cache.get_many(self.file_key, [0, 1, 2]) == { 0: b'header0', 1: b'header1' }
+        cache.close()
+
+
+    def test_changed_file(self):
+        cache = hcache.HeaderCache(':memory:')
+        cache.put(self.file_key, 0, 0, b'header0')
+        changed_key = self.file_key[:3] + ('sha2:efgh',)
+        assert cache.get(changed_key, 0) is None
+        cache.put(changed_key, 0, 0, b'new header0')
+        assert cache.get(changed_key, 0) == b'new header0'
+        assert cache.get(self.file_key, 0) is None
+        assert cache.stats().get('entries') == 1
+
+
+    def test_eviction(self):
+        cache = hcache.HeaderCache(':memory:', max_bytes=10000)
+        for idx in range(5):
+            key = (hcache.LOCAL_SOURCE, "/work/file{}.fits".format(idx), 100, 'stamp')
+            cache.put(key, 0, 0, b'x' * 2880)
+        assert cache.total_bytes() <= 10000
+        assert cache.get((hcache.LOCAL_SOURCE, '/work/file0.fits', 100, 'stamp'), 0) is None
+        assert cache.get((hcache.LOCAL_SOURCE, '/work/file4.fits', 100, 'stamp'), 0) is not None
+
+
+    def test_prune(self):
+        cache = hcache.HeaderCache(':memory:')
+        current_key = hcache.local_file_key(self.m13_tstfyl)
+        stale_key = current_key[:3] + ('0',)
+        missing_key = (hcache.LOCAL_SOURCE, '/no/such/file.fits', 100, '1')
+        cache.put(current_key, 0, 0, b'current')
+        cache.put(hcache.local_file_key(self.hh_tstfyl)[:3] + ('0',), 0, 0, b'stale')
+        cache.put(missing_key, 0, 0, b'missing')
+        cache.put(self.file_key, 0, 0, b'irods')
+        assert cache.prune() == 0
+        assert cache.prune(stale=True) == 2
+        assert cache.get(current_key, 0) == b'current'
+        assert cache.get(self.file_key, 0) == b'irods'  # iRods entries are not checked
+        assert cache.prune(older_than=3600) == 0
+        assert cache.prune(older_than=-1) == 2
+        assert cache.stats().get('entries') == 0
+
+
+    def test_prune_max_bytes(self):
+        cache = hcache.HeaderCache(':memory:')
+        cache.put(self.file_key, 0, 0, b'x' * 2880)
+        cache.put(self.file_key, 1, 2880, b'y' * 2880)
+        assert cache.prune(max_bytes=5760) == 0
+        assert cache.prune(max_bytes=3000) == 1
+        assert cache.prune(max_bytes=0) == 1
+        assert cache.clear() == 0
+
+
+    def test_total_bytes(self):
+        cache = hcache.HeaderCache(':memory:')
+        def summed ():
+            return int(cache._conn.execute("SELECT TOTAL(nbytes) FROM headers").fetchone()[0])
+        cache.put(self.file_key, 0, 0, b'x' * 2880)
+        cache.put(self.file_key, 1, 2880, b'y' * 5760)
+        assert cache.total_bytes() == summed() == 8640
+        cache.put(self.file_key, 1, 2880, b'z' * 2880)  # replaces the earlier entry
+        assert cache.total_bytes() == summed() == 5760
+        cache.evict(3000)
+        assert cache.total_bytes() == summed() == 2880
+        cache.prune(older_than=-1)
+        assert cache.total_bytes() == 0
+        cache.put(self.file_key, 0, 0, b'x' * 2880)
+        cache.clear()
+        assert cache.total_bytes() == 0
+
+
+    def test_total_bytes_existing(self):
+        with tempfile.TemporaryDirectory(dir=TEST_DIR) as tmp_dir:
+            cache_path = os.path.join(tmp_dir, 'cache.db')
+            conn = sqlite3.connect(cache_path)  # a cache made before its size was kept
+            with conn:
+                conn.execute(hcache._CREATE_TABLE_SQL)
+                conn.execute("INSERT INTO headers VALUES ('irods', '/a.fits', 1, 's', 0, 0, 2880, 0, x'00')")
+            conn.close()
+            cache = hcache.HeaderCache(cache_path)
+            assert cache.total_bytes() == 2880
+            cache.put(self.file_key, 0, 0, b'x' * 100)
+            cache.close()
+            assert hcache.HeaderCache(cache_path).total_bytes() == 2980
+
+
+    def test_threads(self):
+        cache = hcache.HeaderCache(':memory:')
+        def work (idx):
+            cache.put(self.file_key, idx, idx * 2880, b'header' + bytes([idx]))
+            assert cache.get(self.file_key, idx) == b'header' + bytes([idx])
+        threads = [ threading.Thread(target=work, args=[idx]) for idx in range(8) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert cache.stats().get('entries') == 8
+
+
+    def test_stats(self):
+        cache = hcache.HeaderCache(':memory:')
+        cache.put(self.file_key, 0, 0, b'x' * 2880)
+        cache.put(self.file_key, 1, 2880, b'y' * 5760)
+        stats = cache.stats()
+        assert stats.get('entries') == 2
+        assert stats.get('files') == 1
+        assert stats.get('total_bytes') == 8640
+
+
+    def test_local_file_key(self):
+        key = hcache.local_file_key(self.m13_tstfyl)
+        assert key[0] == hcache.LOCAL_SOURCE
+        assert key[1] == os.path.abspath(self.m13_tstfyl)
+        assert key[2] == os.path.getsize(self.m13_tstfyl)
+        assert hcache.local_file_key('/no/such/file.fits') is None
+
+
+    def test_get_local_headers(self):
+        cache = hcache.HeaderCache(':memory:')
+        headers = hcache.get_local_headers(cache, self.hh_tstfyl, [1])
+        assert list(headers.keys()) == [1]
+        assert cache.stats().get('entries') == 2   # primary header was passed over and cached
+        with fits.open(self.hh_tstfyl) as hdus_list:
+            for idx in [0, 1]:
+                header_bytes = cache.get(hcache.local_file_key(self.hh_tstfyl), idx)
+                assert hcache.header_from_bytes(header_bytes) == hdus_list[idx].header
+                assert fits_cards.fields_from_bytes(header_bytes).get('NAXIS') == hdus_list[idx].header['NAXIS']
+
+
+    def test_get_local_headers_cached(self):
+        cache = hcache.HeaderCache(':memory:')
+        key = hcache.local_file_key(self.m13_tstfyl)
+        cache.put(key, 0, 0, b'cached header')
+        assert hcache.get_local_headers(cache, self.m13_tstfyl, [0]) == { 0: b'cached header' }
+
+
+    def test_get_local_headers_badindex(self):
+        cache = hcache.HeaderCache(':memory:')
+        assert hcache.get_local_headers(cache, self.m13_tstfyl, [1]) == dict()
+        assert cache.stats().get('entries') == 1
+        with pytest.raises(OSError):
+            hcache.get_local_headers(cache, '/no/such/file.fits', [0])
+
+
+    def test_get_local_headers_nocache(self):
+        headers = hcache.get_local_headers(None, self.hh_tstfyl, [0, 1])
+        assert sorted(headers.keys()) == [0, 1]
+        with fits.open(self.hh_tstfyl) as hdus_list:
+            assert hcache.header_from_bytes(headers[1]) == hdus_list[1].header
+
+
+    def test_open_header_cache(self):
+        assert hcache.open_header_cache(dict()) is None
+        assert hcache.open_header_cache({ 'header_cache': None }) is None
+        cache = hcache.open_header_cache({ 'header_cache': ':memory:' })
+        assert cache is not None
+        cache.close()
+        assert hcache.open_header_cache({ 'header_cache': '/no/such/dir/cache.sqlite' }) is None
@@ -1,13 +1,19 @@
 # Tests for the iRods interface module.
 #   Written by: Tom Hicks. 10/20/20.
-#   Last Modified: Update for refactor of iRods default files/paths.
+#   Last Modified: Add tests of changing metadata by differences.
 #
 import os
+import pathlib as pl
+import threading
 import pytest
 
 import imdtk.exceptions as errors
+from imdtk.core import Metadatum
 from imdtk.core.irods_helper import IRodsHelper
 from irods.exception import CollectionDoesNotExist
+from irods.meta import iRODSMeta
+from tests.fake_irods import FakeCatalogSession
+
 
 class TestIRodsHelper(object):
 
@@ -69,6 +75,114 @@ class TestIRodsHelper(object):
         assert ihelper is not None
 
 
+    def test_pooled_session (self):
+        """ Test that pooled sessions, roots, and cwds are kept separate for each thread. """
+        ihelper = IRodsHelper({ 'irods_max_sessions': 2 }, connect=False)
+        ihelper.make_session = lambda: object()
+        ihelper._root = pl.PurePath('/iplant/home/test')
+        ihelper.cd_root()
+
+        seen = dict()
+        def work (subdir):
+            with ihelper.pooled_session() as session:
+                assert ihelper.session() is session
+                ihelper.cd_down(subdir)
+                with ihelper.pooled_session() as inner:  # nested use keeps the same session
+                    assert inner is session
+                seen[subdir] = (session, ihelper.cwd())
+        threads = [ threading.Thread(target=work, args=[subdir]) for subdir in ['a', 'b'] ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert seen['a'][1] == '/iplant/home/test/a'
+        assert seen['b'][1] == '/iplant/home/test/b'
+        assert ihelper.cwd() == '/iplant/home/test'    # main state is unchanged
+        assert ihelper.session() is None
+        assert ihelper.get_pool().stats().get('in_use') == 0
+        assert ihelper.get_pool().max_sessions == 2
+
+
+    def test_list_data_objects (self):
+        ihelper = IRodsHelper({}, connect=False)
+        ihelper._session = FakeCatalogSession([
+            ('/zone/home/test/vos/m13.fits', 5760, 2),
+            ('/zone/home/test/vos/deep/er/HorseHead.fits.gz', 2880, 1),
+            ('/zone/home/test/vos/notes.txt', 10, 1),
+            ('/zone/home/test/vos_other/m13.fits', 5760, 1),  # matched by '_', but not in tree
+            ('/zone/home/test/other/m31.fits', 5760, 1)
+        ])
+
+        dobjs = ihelper.list_data_objects('/zone/home/test/vos/', page_size=50)
+        assert [ dobj.path for dobj in dobjs ] == [
+            '/zone/home/test/vos/deep/er/HorseHead.fits.gz',
+            '/zone/home/test/vos/m13.fits',
+            '/zone/home/test/vos/notes.txt' ]
+        assert ihelper.session().queries == 2
+        assert ihelper.session().page_sizes == [50, 50]
+        assert dobjs[1].size == 5760
+        assert dobjs[1].checksum == 'sha2:0'
+        assert len(dobjs[1].replicas) == 2
+        assert dobjs[1].collection.path == '/zone/home/test/vos'
+
+        dobjs = ihelper.list_data_objects('/zone/home/test', suffixes=['.fits', '.fits.gz'])
+        assert [ dobj.name for dobj in dobjs ] == [ 'm31.fits', 'HorseHead.fits.gz', 'm13.fits', 'm13.fits' ]
+        assert ihelper.session().queries == 6
+
+        assert ihelper.list_data_objects('/zone/home/nobody') == []
+
+
+    def test_list_metadata (self):
+        ihelper = IRodsHelper({}, connect=False)
+        ihelper._session = FakeCatalogSession(
+            [ ('/zone/home/test/vos/m13.fits', 5760, 2), ('/zone/home/test/vos/HorseHead.fits', 2880, 1),
+              ('/zone/home/test/vos/a/m31.fits.gz', 5760, 1) ],
+            avus={ '/zone/home/test/vos/m13.fits': [('target', 'M13'), ('filter', 'R'), ('a', 'x')],
+                   '/zone/home/test/vos/a/m31.fits.gz': [('target', 'M31')] })
+
+        mds = ihelper.list_metadata('/zone/home/test/vos', suffixes=['.fits'])
+        assert mds == { '/zone/home/test/vos/m13.fits':   # replicas do not repeat metadata
+                        (Metadatum('target', 'M13'), Metadatum('filter', 'R'), Metadatum('a', 'x')) }
+        assert ihelper.session().queries == 2
+
+        mds = ihelper.list_metadata('/zone/home/test/vos/a')
+        assert mds == { '/zone/home/test/vos/a/m31.fits.gz': (Metadatum('target', 'M31'),) }
+
+
+    def test_metadata_changes (self):
+        current = [ iRODSMeta('a', '1'), iRODSMeta('b', '2'), iRODSMeta('b', '3'),
+                    iRODSMeta('c', '4', 'deg'), iRODSMeta('keep', 'me') ]
+        (removes, adds) = IRodsHelper.metadata_changes(current, { 'a': 1, 'b': '3', 'c': 4, 'd': 5.5 })
+        assert [ (avu.name, avu.value) for avu in removes ] == [ ('b', '2'), ('c', '4') ]
+        assert [ (avu.name, avu.value) for avu in adds ] == [ ('c', '4'), ('d', '5.5') ]
+
+        (removes, adds) = IRodsHelper.metadata_changes(current, { 'a': 'x', 'b': 'y' }, remove_only=True)
+        assert [ (avu.name, avu.value) for avu in removes ] == [ ('a', '1'), ('b', '2'), ('b', '3') ]
+        assert adds == []
+
+        assert IRodsHelper.metadata_changes(current, { 'a': '1', 'keep': 'me' }) == ([], [])
+
+
+    def test_update_metaf (self):
+        path = '/zone/home/test/m13.fits'
+        ihelper = IRodsHelper({}, connect=False)
+        ihelper._session = FakeCatalogSession([], avus={ path: [('a', '1'), ('b', '2')] })
+        metadata = ihelper.session().metadata
+
+        assert ihelper.put_metaf(path, { 'a': 1, 'b': 3, 'c': 'new' }, absolute=True) == 3
+        assert len(metadata.applied) == 1   # all changes in one atomic operation
+        assert metadata.gets == 1
+        assert sorted((avu.name, avu.value) for avu in metadata.avus[path]) == [
+            ('a', '1'), ('b', '3'), ('c', 'new') ]
+
+        assert ihelper.put_metaf(path, { 'a': 1, 'b': 3 }, absolute=True) == 0
+        assert len(metadata.applied) == 1   # nothing changed: nothing applied
+
+        assert ihelper.remove_metaf(path, { 'a': None, 'z': None }, absolute=True) == 1
+        assert sorted(avu.name for avu in metadata.avus[path]) == [ 'b', 'c' ]
+
+
     def test_get_authentication_file (self):
         args = {}
         ihelper = IRodsHelper(args, connect=False)
@@ -0,0 +1,141 @@
+# Tests for the iRods session pool module.
+#   Written by: Tom Hicks. 1/27/21.
+#   Last Modified: Initial creation.
+#
+import threading
+import time
+import pytest
+
+from imdtk.core.irods_session_pool import IRodsSessionPool, PoolExhausted
+
+
+class FakeSession (object):
+    """ Stand-in for an iRods session, which records its cleanup. """
+    def __init__ (self, number):
+        self.number = number
+        self.cleaned = False
+
+    def cleanup (self):
+        self.cleaned = True
+
+
+class TestIRodsSessionPool(object):
+
+    def make_pool (self, **kwargs):
+        """ Return a pool of fake sessions, and the list of the sessions it has created. """
+        created = []
+        def factory ():
+            created.append(FakeSession(len(created)))
+            return created[-1]
+        return (IRodsSessionPool(factory, **kwargs), created)
+
+
+    def test_ctor_bad_max (self):
+        with pytest.raises(ValueError):
+            IRodsSessionPool(lambda: None, max_sessions=0)
+
+
+    def test_checkout_reuse (self):
+        (pool, created) = self.make_pool(max_sessions=2)
+        sess0 = pool.checkout()
+        pool.checkin(sess0)
+        assert pool.checkout() is sess0
+        sess1 = pool.checkout()
+        assert sess1 is not sess0
+        assert len(created) == 2
+        assert pool.stats() == { 'idle': 0, 'in_use': 2, 'max_sessions': 2 }
+
+
+    def test_checkout_timeout (self):
+        (pool, created) = self.make_pool(max_sessions=1)
+        pool.checkout()
+        with pytest.raises(PoolExhausted):
+            pool.checkout(timeout=0.05)
+        assert len(created) == 1
+
+
+    def test_checkout_waits (self):
+        (pool, created) = self.make_pool(max_sessions=1)
+        sess0 = pool.checkout()
+        timer = threading.Timer(0.05, pool.checkin, [sess0])
+        timer.start()
+        assert pool.checkout(timeout=5) is sess0
+        timer.join()
+
+
+    def test_checkin_unhealthy (self):
+        (pool, created) = self.make_pool(max_sessions=1)
+        sess0 = pool.checkout()
+        pool.checkin(sess0, healthy=False)
+        assert sess0.cleaned
+        assert pool.checkout() is not sess0
+
+
+    def test_health_check (self):
+        (pool, created) = self.make_pool(check_after=0, health_check=lambda sess: sess.number > 0)
+        sess0 = pool.checkout()
+        pool.checkin(sess0)
+        sess1 = pool.checkout()             # idle session 0 fails its check and is replaced
+        assert sess0.cleaned
+        assert sess1.number == 1
+        pool.checkin(sess1)
+        assert pool.checkout() is sess1
+
+
+    def test_health_check_error (self):
+        def bad_check (sess):
+            raise OSError('connection reset')
+        (pool, created) = self.make_pool(check_after=0, health_check=bad_check)
+        pool.checkin(pool.checkout())
+        assert pool.checkout() is created[1]
+        assert created[0].cleaned
+
+
+    def test_session_context (self):
+        (pool, created) = self.make_pool()
+        with pool.session() as sess:
+            assert pool.stats().get('in_use') == 1
+        assert pool.stats() == { 'idle': 1, 'in_use': 0, 'max_sessions': 4 }
+
+        with pytest.raises(ValueError):
+            with pool.session() as sess:
+                raise ValueError('not a session problem')
+        assert not sess.cleaned
+
+        with pytest.raises(OSError):
+            with pool.session() as sess:
+                raise OSError('connection reset')
+        assert sess.cleaned
+        assert pool.stats().get('idle') == 0
+
+
+    def test_threads_bounded (self):
+        (pool, created) = self.make_pool(max_sessions=3)
+        peak = []
+        lock = threading.Lock()
+        def work ():
+            with pool.session():
+                with lock:
+                    peak.append(pool.stats().get('in_use'))
+                time.sleep(0.01)
+        threads = [ threading.Thread(target=work) for idx in range(12) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(created) == 3
+        assert max(peak) <= 3
+        assert pool.stats() == { 'idle': 3, 'in_use': 0, 'max_sessions': 3 }
+
+
+    def test_close (self):
+        (pool, created) = self.make_pool()
+        sess0 = pool.checkout()
+        pool.checkin(pool.checkout())
+        pool.close()
+        assert created[1].cleaned
+        assert not sess0.cleaned
+        pool.checkin(sess0)                 # returned after close: cleaned up
+        assert sess0.cleaned
+        with pytest.raises(PoolExhausted):
+            pool.checkout()
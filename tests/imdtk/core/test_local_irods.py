@@ -0,0 +1,159 @@
+# Tests for the local directory tree stand-in for iRods.
+#   Written by: Tom Hicks. 1/29/21.
+#   Last Modified: Test that the writes of the metadata store are batched.
+#
+import os
+import pathlib as pl
+import shutil
+import tempfile
+import time
+import pytest
+
+from astropy.io import fits
+from irods.exception import CollectionDoesNotExist, DataObjectDoesNotExist, NoResultFound
+from irods.models import Collection, DataObject
+
+import imdtk.core.local_irods as local_irods
+from imdtk.core import Metadatum
+from imdtk.core.fits_irods_helper import FitsIRodsHelper
+from imdtk.core.irods_helper import IRodsHelper
+from imdtk.core.local_irods import LocalIRodsSession, LocalStore, METADATA_STORE_FILENAME
+from tests import TEST_DIR, TEST_RESOURCES_DIR
+
+
+class TestLocalIRods(object):
+
+    vos = '/myZone/home/tester/vos'
+
+    @pytest.fixture
+    def tmp_path (self):
+        """ A temporary directory, kept out of the system temporary directory, which other tests scan. """
+        with tempfile.TemporaryDirectory(dir=TEST_DIR) as tmp_dir:
+            yield pl.Path(tmp_dir)
+
+
+    def make_tree (self, tmp_path):
+        """ Make a local tree of a zone with a user's home, holding some FITS files. """
+        vos_dir = tmp_path.joinpath('myZone', 'home', 'tester', 'vos')
+        os.makedirs(vos_dir.joinpath('deep'))
+        shutil.copy(f"{TEST_RESOURCES_DIR}/m13.fits", vos_dir)
+        shutil.copy(f"{TEST_RESOURCES_DIR}/HorseHead.fits", vos_dir.joinpath('deep'))
+        vos_dir.joinpath('notes.txt').write_text('not a FITS file')
+        return str(tmp_path)
+
+
+    def test_ctor (self, tmp_path):
+        sess = LocalIRodsSession(self.make_tree(tmp_path))
+        assert (sess.zone, sess.username) == ('myZone', 'tester')
+        assert sess.collections.get('/myZone/home/tester').path == '/myZone/home/tester'
+
+        empty = tmp_path.joinpath('empty')
+        empty.mkdir()
+        sess = LocalIRodsSession(str(empty))
+        assert (sess.zone, sess.username) == (local_irods.DEFAULT_ZONE, local_irods.DEFAULT_USERNAME)
+        assert sess.collections.exists('/tempZone/home/rods')   # home created
+
+        with pytest.raises(FileNotFoundError):
+            LocalIRodsSession(str(tmp_path.joinpath('nosuchdir')))
+
+
+    def test_collections (self, tmp_path):
+        sess = LocalIRodsSession(self.make_tree(tmp_path))
+        assert sess.collections.exists(self.vos)
+        assert not sess.collections.exists(f"{self.vos}/m13.fits")
+        assert not sess.collections.exists(f"{self.vos}/../../..")
+        with pytest.raises(CollectionDoesNotExist):
+            sess.collections.get(f"{self.vos}/nosuchdir")
+
+        coll = sess.collections.create(f"{self.vos}/new/sub")
+        assert coll.name == 'sub'
+        assert [ sub.name for sub in sess.collections.get(self.vos).subcollections ] == [ 'deep', 'new' ]
+        sess.collections.remove(f"{self.vos}/new")
+        assert not sess.collections.exists(f"{self.vos}/new")
+
+
+    def test_data_objects (self, tmp_path):
+        sess = LocalIRodsSession(self.make_tree(tmp_path))
+        dobj = sess.data_objects.get(f"{self.vos}/m13.fits")
+        assert dobj.size == os.path.getsize(f"{TEST_RESOURCES_DIR}/m13.fits")
+        assert dobj.collection.path == self.vos
+        assert dobj.checksum is None        # not computed until asked for
+        assert sess.data_objects.chksum(dobj.path).startswith('sha2:')
+        assert sess.data_objects.get(dobj.path).checksum == sess.data_objects.chksum(dobj.path)
+
+        with dobj.open('r') as irff_fd:
+            irff_fd.seek(2880)
+            assert len(irff_fd.read(100)) == 100
+            assert irff_fd.tell() == 2980
+
+        sess.data_objects.put(f"{TEST_RESOURCES_DIR}/small_table.fits", self.vos)
+        assert sess.data_objects.exists(f"{self.vos}/small_table.fits")
+        sess.data_objects.unlink(f"{self.vos}/small_table.fits")
+        assert not sess.data_objects.exists(f"{self.vos}/small_table.fits")
+        with pytest.raises(DataObjectDoesNotExist):
+            sess.data_objects.get(f"{self.vos}/deep")
+
+
+    def test_query (self, tmp_path):
+        sess = LocalIRodsSession(self.make_tree(tmp_path))
+        rows = sess.query(DataObject.name, DataObject.size).filter(DataObject.size > 10000).all()
+        assert sorted(row[DataObject.name] for row in rows) == [ 'HorseHead.fits', 'm13.fits' ]
+        assert set(rows[0].keys()) == { DataObject.name, DataObject.size }
+
+        query = sess.query(Collection.name).filter(Collection.parent_name == self.vos)
+        assert query.one()[Collection.name] == f"{self.vos}/deep"
+        with pytest.raises(NoResultFound):
+            sess.query(DataObject.name).filter(DataObject.name == 'nosuch.fits').one()
+        assert sess.query(Collection).filter(Collection.name == '/nosuch').first() is None
+
+        calls = sess.stats()['calls']
+        assert len(sess.query(DataObject.id).filter(Collection.name == self.vos).limit(1).all()) == 2
+        assert sess.stats()['calls'] == calls + 2   # one request per page
+
+
+    def test_helper (self, tmp_path):
+        root = self.make_tree(tmp_path)
+        ihelper = IRodsHelper({ 'irods_local_root': root })
+        assert ihelper.root() == '/myZone/home/tester'
+        walked = sorted(ihelper.gen_file_paths(ihelper.getc('vos')))
+        assert walked == [ f"{self.vos}/deep/HorseHead.fits", f"{self.vos}/m13.fits", f"{self.vos}/notes.txt" ]
+        assert [ dobj.path for dobj in ihelper.list_data_objects('/myZone') ] == walked
+        assert METADATA_STORE_FILENAME not in [ dobj.name for dobj in ihelper.list_data_objects('/') ]
+
+
+    def test_metadata (self, tmp_path):
+        root = self.make_tree(tmp_path)
+        ihelper = IRodsHelper({ 'irods_local_root': root })
+        path = f"{self.vos}/m13.fits"
+        assert ihelper.put_metaf(path, { 'target': 'M13', 'filter': 'R' }, absolute=True) == 2
+        assert ihelper.put_metaf(path, { 'filter': 'V' }, absolute=True) == 2
+        assert ihelper.get_metaf(path, absolute=True) == [ Metadatum('target', 'M13'), Metadatum('filter', 'V') ]
+        assert ihelper.list_metadata(self.vos) == { path: (Metadatum('target', 'M13'), Metadatum('filter', 'V')) }
+        with pytest.raises(DataObjectDoesNotExist):
+            ihelper.put_metaf(f"{self.vos}/nosuch.fits", { 'a': 1 }, absolute=True)
+
+        assert path not in LocalStore(root).data['avus']['DataObject']  # writes are batched
+        ihelper.cleanup()
+        store = LocalStore(root)            # the metadata is persistent, once cleaned up
+        assert [ avu[1:] for avu in store.data['avus']['DataObject'][path] ] == [
+            [ 'target', 'M13', None ], [ 'filter', 'V', None ] ]
+
+
+    def test_fits_helper (self, tmp_path):
+        firh = FitsIRodsHelper({ 'irods_local_root': self.make_tree(tmp_path) })
+        paths = firh.list_fits_file_paths(self.vos)
+        assert paths == [ f"{self.vos}/deep/HorseHead.fits", f"{self.vos}/m13.fits" ]
+        header = firh.get_header(firh.get_fits_file(paths[1]))
+        assert header == fits.getheader(f"{TEST_RESOURCES_DIR}/m13.fits")
+
+
+    def test_latency (self, tmp_path):
+        sess = LocalIRodsSession(self.make_tree(tmp_path), latency=0.01, bandwidth=1_000_000)
+        calls = sess.stats()['calls']
+        start = time.monotonic()
+        with sess.data_objects.open(f"{self.vos}/m13.fits", 'r') as irff_fd:
+            data = irff_fd.read(50000)
+        elapsed = time.monotonic() - start
+        stats = sess.stats()
+        assert stats['bytes'] >= len(data)
+        assert elapsed >= ((stats['calls'] - calls) * 0.01) + (len(data) / 1_000_000)
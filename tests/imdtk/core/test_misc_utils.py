@@ -1,7 +1,8 @@
 # Tests for the misc utilities module.
 #   Written by: Tom Hicks. 5/22/2020.
-#   Last Modified: Add tests of product.
+#   Last Modified: Add tests of batching generator.
 #
+import pytest
 import string
 
 import imdtk.core.misc_utils as mutils
@@ -18,6 +19,39 @@ class TestMiscUtils(object):
     testvec = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k']
 
 
+    def test_gen_batches(self):
+        assert list(mutils.gen_batches([], 3)) == []
+        assert list(mutils.gen_batches(self.testvec, 4)) == [
+            ['a', 'b', 'c', 'd'], ['e', 'f', 'g', 'h'], ['i', 'j', 'k'] ]
+        assert list(mutils.gen_batches(iter(range(4)), 2)) == [ [0, 1], [2, 3] ]
+        assert list(mutils.gen_batches(range(3), 0)) == [ [0], [1], [2] ]
+
+
+    def test_gen_read_ahead(self):
+        assert list(mutils.gen_read_ahead(iter([]))) == []
+        assert list(mutils.gen_read_ahead(range(10))) == list(range(10))
+        assert list(mutils.gen_read_ahead(range(10), depth=1)) == list(range(10))
+        assert list(mutils.gen_read_ahead(range(3), depth=0)) == list(range(3))
+
+
+    def test_gen_read_ahead_early_stop(self):
+        gen = mutils.gen_read_ahead(range(1000), depth=2)
+        assert next(gen) == 0
+        assert next(gen) == 1
+        gen.close()                         # must not hang the producer thread
+
+
+    def test_gen_read_ahead_error(self):
+        def failing ():
+            yield 1
+            raise OSError('read failed')
+
+        gen = mutils.gen_read_ahead(failing())
+        assert next(gen) == 1
+        with pytest.raises(OSError, match='read failed'):
+            next(gen)
+
+
     def test_get_in(self):
         nester = { 'a': 'a',
                    'L1': { 'a': 'a',
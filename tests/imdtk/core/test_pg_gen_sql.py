@@ -1,6 +1,6 @@
 # Tests for the FITS-specific PostgreSQL interface module.
 #   Written by: Tom Hicks. 8/10/2020.
-#   Last Modified: Add tests for clean_id.
+#   Last Modified: Add tests of generating SQL to delete the rows of a file.
 #
 import pytest
 
@@ -85,6 +85,34 @@ class TestFitsPgSql(object):
 
 
 
+    def test_copy_value_text(self):
+        assert pg_gen.copy_value_text(None) == '\\N'
+        assert pg_gen.copy_value_text(42) == '42'
+        assert pg_gen.copy_value_text(2.5) == '2.5'
+        assert pg_gen.copy_value_text(float('nan')) == 'NaN'
+        assert pg_gen.copy_value_text(float('-inf')) == '-Infinity'
+        assert pg_gen.copy_value_text(True) == 't'
+        assert pg_gen.copy_value_text(False) == 'f'
+        assert pg_gen.copy_value_text('a\tb\nc\\d') == 'a\\tb\\nc\\\\d'
+        assert pg_gen.copy_value_text(b'0101') == '0101'
+
+
+    def test_copy_value_text_arrays(self):
+        assert pg_gen.copy_value_text([]) == '{}'
+        assert pg_gen.copy_value_text([1, 2, 3]) == '{1,2,3}'
+        assert pg_gen.copy_value_text([1.5, None]) == '{1.5,NULL}'
+        assert pg_gen.copy_value_text([[1, 2], [3, 4]]) == '{{1,2},{3,4}}'
+        assert pg_gen.copy_value_text(['a,b', 'c']) == '{"a,b","c"}'
+        assert pg_gen.copy_value_text(['x"y']) == '{"x\\\\"y"}'
+
+
+    def test_copy_rows_text(self):
+        assert pg_gen.copy_rows_text([]) == ''
+        text = pg_gen.copy_rows_text([[1, 'one', None], [2, 'two', [1.0, 2.0]]])
+        print(text)
+        assert text == '1\tone\t\\N\n2\ttwo\t{1.0,2.0}\n'
+
+
     def test_clean_id_empty(self):
         with pytest.raises(errors.ProcessingError, match='cannot be empty or None'):
             pg_gen.clean_id(None)
@@ -123,7 +151,7 @@ class TestFitsPgSql(object):
 
 
     def test_fits_format_to_sql_unsup(self):
-        for fcode in ['B', 'C', 'M', 'P', 'Q', 'BAD', 'CRAZY']:
+        for fcode in ['', 'P', 'Q', 'BAD', 'CRAZY', '3', 'EJ(5)', 'Y']:
             with pytest.raises(errors.ProcessingError, match='is not supported'):
                 pg_gen.fits_format_to_sql(fcode)
 
@@ -143,6 +171,61 @@ class TestFitsPgSql(object):
 
 
 
+    def test_fits_format_to_sql_repeat(self):
+        fcodes = ['20A', '1D', '3E', '2J', '5X', '1X', '4L', '8B']
+        dtypes = [ pg_gen.fits_format_to_sql(fcode) for fcode in fcodes ]
+        print(dtypes)
+        assert dtypes == ['text', 'double precision', 'real[]', 'integer[]',
+                          'bit(5)', 'bit', 'boolean[]', 'smallint[]']
+
+
+    def test_fits_format_to_sql_complex(self):
+        assert pg_gen.fits_format_to_sql('C') == 'real[]'
+        assert pg_gen.fits_format_to_sql('M') == 'double precision[]'
+        assert pg_gen.fits_format_to_sql('2C') == 'real[][]'
+        assert pg_gen.fits_format_to_sql('3M') == 'double precision[][]'
+
+
+    def test_fits_format_to_sql_array_desc(self):
+        assert pg_gen.fits_format_to_sql('PJ()') == 'integer[]'
+        assert pg_gen.fits_format_to_sql('1PE(100)') == 'real[]'
+        assert pg_gen.fits_format_to_sql('QD(8)') == 'double precision[]'
+        assert pg_gen.fits_format_to_sql('PA(30)') == 'text'
+        assert pg_gen.fits_format_to_sql('PI()', 32768) == 'integer[]'
+
+
+    def test_fits_format_to_sql_unsigned(self):
+        assert pg_gen.fits_format_to_sql('B', -128) == 'smallint'
+        assert pg_gen.fits_format_to_sql('I', 32768) == 'integer'
+        assert pg_gen.fits_format_to_sql('J', 2147483648) == 'bigint'
+        assert pg_gen.fits_format_to_sql('K', '9223372036854775808') == 'numeric(20)'
+        assert pg_gen.fits_format_to_sql('3I', 32768.0) == 'integer[]'
+        assert pg_gen.fits_format_to_sql('I', '') == 'smallint'
+        assert pg_gen.fits_format_to_sql('I', 0, 1) == 'smallint'
+
+
+    def test_fits_format_to_sql_scaled(self):
+        assert pg_gen.fits_format_to_sql('I', 10) == 'double precision'
+        assert pg_gen.fits_format_to_sql('J', 0, 0.5) == 'double precision'
+        assert pg_gen.fits_format_to_sql('E', 0, 0.5) == 'real'
+
+
+    def test_parse_fits_format(self):
+        assert pg_gen.parse_fits_format(None) is None
+        assert pg_gen.parse_fits_format('') is None
+        assert pg_gen.parse_fits_format('BAD') is None
+        assert pg_gen.parse_fits_format('K') == (1, 'K', None)
+        assert pg_gen.parse_fits_format('24A') == (24, 'A', None)
+        assert pg_gen.parse_fits_format('D25.17') == (1, 'D', None)
+        assert pg_gen.parse_fits_format('E15.7E3') == (1, 'E', None)
+        assert pg_gen.parse_fits_format('ES12.4E2') == (1, 'E', None)
+        assert pg_gen.parse_fits_format('EN10.3') == (1, 'E', None)
+        assert pg_gen.parse_fits_format('E15.7E') is None
+        assert pg_gen.parse_fits_format('2PJ(12)') == (2, 'P', 'J')
+        assert pg_gen.parse_fits_format('QE()') == (1, 'Q', 'E')
+
+
+
     def test_gen_column_decls_sql_empty(self):
         sql = pg_gen.gen_column_decls_sql([], [])
         print(sql)
@@ -178,11 +261,57 @@ class TestFitsPgSql(object):
         assert sql[9] == 'kron_flag bytea'
 
 
+    def test_gen_column_decls_sql_zeros(self):
+        sql = pg_gen.gen_column_decls_sql(['a', 'b', 'c'], ['I', 'J', '2B'],
+                                          [32768, '', ''], ['', 2.0, ''])
+        print(sql)
+        assert sql == ['a integer', 'b double precision', 'c smallint[]']
+
+
+    def test_gen_column_decls_sql_zeros_unequal(self):
+        with pytest.raises(errors.ProcessingError, match='must be the same length'):
+            pg_gen.gen_column_decls_sql(['a', 'b'], ['I', 'J'], [32768])
+
+
+    def test_gen_stats_table_sql(self):
+        argmix = self.args.copy()
+        argmix.update(self.dbconfig)
+        argmix['stats_table'] = 'my_stats'
+        sql = pg_gen.gen_stats_table_sql(argmix)
+        print(sql)
+        assert len(sql) == 2
+        assert 'CREATE TABLE IF NOT EXISTS' in sql[0]
+        assert '.my_stats (' in sql[0]
+        assert 'null_count bigint' in sql[0]
+        assert 'OWNER TO' in sql[1]
+
+
     def test_gen_search_path_sql_bad(self):
         with pytest.raises(errors.ProcessingError):
             pg_gen.gen_search_path_sql(dict())
 
 
+    def test_gen_copy_rows(self):
+        sql = pg_gen.gen_copy_rows(self.dbconfig, 'my_table')
+        print(sql)
+        assert sql.startswith('COPY ')
+        assert '.my_table FROM STDIN' in sql
+
+
+    def test_gen_delete_file_rows(self):
+        (sql, values) = pg_gen.gen_delete_file_rows(self.dbconfig, '/vos/m13.fits', 'my_table')
+        print(sql)
+        assert sql.startswith('delete from ')
+        assert sql.endswith('.my_table where file_path = %s;')
+        assert values == [ '/vos/m13.fits' ]
+
+        (sql, values) = pg_gen.gen_delete_file_rows(self.dbconfig, '/vos/m13.fits', 'hyb', hybrid=True)
+        assert sql.endswith(".hyb where metadata->>'file_path' = %s;")
+
+        with pytest.raises(errors.ProcessingError, match='file path is required'):
+            pg_gen.gen_delete_file_rows(self.dbconfig, None, 'my_table')
+
+
     def test_gen_search_path_sql(self):
         schema = self.dbconfig.get('DB_SCHEMA_NAME') or 'sia'
         sql = pg_gen.gen_search_path_sql(self.dbconfig)
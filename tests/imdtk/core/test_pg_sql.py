@@ -1,16 +1,56 @@
 # Tests for the PostgreSQL interface module.
 #   Written by: Tom Hicks. 7/25/2020.
-#   Last Modified: Update for adding hybrid to TAP tables.
+#   Last Modified: Add tests of replacing the rows of a re-ingested file.
 #
 import pytest
+import sqlite3
 
 from config.settings import SQL_FIELDS_HYBRID
 import imdtk.exceptions as errors
 import imdtk.core.pg_sql as pgsql
 import imdtk.tasks.i_sql_sink as isql
+from imdtk.tasks.jwst_pgsql_sink import JWST_ObsCorePostgreSQLSink
 from tests import TEST_DBCONFIG_FILEPATH
 
 
+class SqliteConnection ():
+    """ Stand-in for a Psycopg2 connection, executing SQL in an in-memory SQLite database. """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if (exc_type is None):
+            self.db.commit()
+        else:
+            self.db.rollback()
+
+    def close (self):
+        pass
+
+    def cursor (self):
+        return SqliteCursor(self.db)
+
+
+class SqliteCursor ():
+    """ Stand-in for a Psycopg2 cursor, translating its parameter place holders for SQLite. """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def execute (self, sql_query_string, sql_values):
+        self.db.execute(sql_query_string.replace('%s', '?'), sql_values)
+
+
 class TestPgSql(object):
 
     args = { 'debug': True, 'verbose': True, 'TOOL_NAME': 'TestPgSql', 'catalog_table': 'myCatalog' }
@@ -215,6 +255,50 @@ class TestPgSql(object):
 
 
 
+    def sqlite_db (self, monkeypatch, table_ddl):
+        """ Return an in-memory SQLite database, with the given table, for pg_sql to connect to. """
+        db = sqlite3.connect(':memory:')
+        db.execute(f"attach database ':memory:' as {self.dbconfig.get('db_schema_name')};")
+        db.execute(table_ddl.format(self.dbconfig.get('db_schema_name')))
+        monkeypatch.setattr(pgsql.psycopg2, 'connect', lambda db_uri: SqliteConnection(db))
+        return db
+
+
+    def test_replace_row (self, monkeypatch):
+        db = self.sqlite_db(monkeypatch, "create table {}.obscore (file_path text, s_ra real);")
+        pgsql.insert_row(self.dbconfig, { 'file_path': '/vos/m13.fits', 's_ra': 1.0 }, 'obscore')
+        pgsql.insert_row(self.dbconfig, { 'file_path': '/vos/m31.fits', 's_ra': 2.0 }, 'obscore')
+        pgsql.replace_row(self.dbconfig, { 'file_path': '/vos/m13.fits', 's_ra': 3.0 }, 'obscore')
+        rows = db.execute("select file_path, s_ra from obscore order by file_path;").fetchall()
+        assert rows == [ ('/vos/m13.fits', 3.0), ('/vos/m31.fits', 2.0) ]
+
+        with pytest.raises(errors.ProcessingError, match='file path is required'):
+            pgsql.replace_row(self.dbconfig, { 's_ra': 4.0 }, 'obscore')
+
+
+    def test_replace_row_sink (self, monkeypatch):
+        db = self.sqlite_db(monkeypatch, "create table {}.obscore (file_path text, s_ra real);")
+        args = { 'TOOL_NAME': 'TestPgSql', 'dbconfig_file': TEST_DBCONFIG_FILEPATH,
+                 'table_name': 'obscore' }
+        sink = JWST_ObsCorePostgreSQLSink(args)
+        sink.output_results({ 'calculated': { 'file_path': '/vos/m13.fits', 's_ra': 1.0 } })
+        args['replace_existing'] = True     # re-ingest the changed file
+        sink.output_results({ 'calculated': { 'file_path': '/vos/m13.fits', 's_ra': 2.0 } })
+        rows = db.execute("select file_path, s_ra from obscore;").fetchall()
+        assert rows == [ ('/vos/m13.fits', 2.0) ]
+
+
+    def test_replace_hybrid_row (self, monkeypatch):
+        db = self.sqlite_db(monkeypatch, "create table {}.hybrid (s_dec real, s_ra real, "
+                            "obs_collection text, is_public integer, metadata text);")
+        datad = { 'file_path': '/vos/m13.fits', 'obs_collection': 'JWST',
+                  's_dec': -27.8, 's_ra': 53.1, 'is_public': 0 }
+        pgsql.insert_hybrid_row(self.dbconfig, datad, 'hybrid')
+        pgsql.replace_hybrid_row(self.dbconfig, dict(datad, s_ra=53.2), 'hybrid')
+        rows = db.execute("select s_ra, metadata->>'file_path' from hybrid;").fetchall()
+        assert rows == [ (53.2, '/vos/m13.fits') ]
+
+
     def test_insert_hybrid_row_str_empty (self):
         with pytest.raises(errors.ProcessingError, match='cannot be inserted'):
             pgsql.insert_hybrid_row_str(self.dbconfig, dict(), 'TESTTBL')
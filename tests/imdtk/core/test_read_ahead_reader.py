@@ -0,0 +1,84 @@
+# Tests for the read-ahead file reader class.
+#   Written by: Tom Hicks. 1/21/21.
+#   Last Modified: Initial creation.
+#
+import io
+import pytest
+
+from imdtk.core.read_ahead_reader import ReadAheadReader
+
+
+class TestReadAheadReader(object):
+
+    data = bytes(range(256)) * 400          # 102400 bytes
+
+
+    def test_read_window(self):
+        rar = ReadAheadReader(io.BytesIO(self.data), window_size=10000)
+        assert rar.read(80) == self.data[:80]
+        assert rar.read(2880) == self.data[80:2960]
+        assert rar.requests == 1            # both reads served from the first window
+        assert rar.tell() == 2960
+
+
+    def test_read_across_windows(self):
+        rar = ReadAheadReader(io.BytesIO(self.data), window_size=1000)
+        assert rar.read(600) == self.data[:600]
+        assert rar.read(600) == self.data[600:1200]
+        assert rar.requests == 2
+        assert rar.tell() == 1200
+
+
+    def test_window_growth(self):
+        rar = ReadAheadReader(io.BytesIO(self.data), window_size=1000, max_window_size=4000)
+        for idx in range(0, 20000, 500):    # long sequential read, in small pieces
+            assert rar.read(500) == self.data[idx:idx + 500]
+        assert rar.requests == 7            # windows of 1000, 2000, then 4000 bytes
+        rar.seek(50000)                     # jump away: window is reset
+        assert rar.read(10) == self.data[50000:50010]
+        assert rar.requests == 8
+        assert len(rar._window) == 1000
+
+
+    def test_seek_within_window(self):
+        rar = ReadAheadReader(io.BytesIO(self.data), window_size=10000)
+        rar.read(10)
+        assert rar.seek(5000) == 5000
+        assert rar.read(10) == self.data[5000:5010]
+        assert rar.seek(-20, 1) == 4990
+        assert rar.read(20) == self.data[4990:5010]
+        assert rar.requests == 1
+
+
+    def test_seek_end(self):
+        rar = ReadAheadReader(io.BytesIO(self.data))
+        assert rar.seek(-100, 2) == len(self.data) - 100
+        assert rar.read() == self.data[-100:]
+        assert rar.read(10) == b''
+        with pytest.raises(ValueError):
+            rar.seek(-1, 0)
+
+
+    def test_large_read_bypass(self):
+        rar = ReadAheadReader(io.BytesIO(self.data), window_size=1000)
+        rar.read(100)
+        assert rar.read(50000) == self.data[100:50100]
+        assert rar.requests == 2
+        assert rar._window_end() == 1000    # window not replaced by the large read
+
+
+    def test_read_past_end(self):
+        rar = ReadAheadReader(io.BytesIO(self.data), window_size=1000)
+        rar.seek(len(self.data) - 30)
+        assert rar.read(100) == self.data[-30:]
+        assert rar.read(100) == b''
+        assert rar.tell() == len(self.data)
+
+
+    def test_readinto(self):
+        rar = ReadAheadReader(io.BytesIO(self.data), window_size=1000)
+        buffer = bytearray(2880)
+        assert rar.readinto(buffer) == 2880
+        assert bytes(buffer) == self.data[:2880]
+        assert rar.readinto(memoryview(buffer)[:80]) == 80
+        assert bytes(buffer[:80]) == self.data[2880:2960]
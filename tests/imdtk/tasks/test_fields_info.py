@@ -1,12 +1,13 @@
 # Tests for the FieldsInfoTask.
 #   Written by: Tom Hicks. 8/8/2020.
-#   Last Modified: Initial creation: test non-interface methods only.
+#   Last Modified: Test holding fields info and defaults in the shared run context.
 #
 import pytest
 from pytest import approx
 
 import imdtk.exceptions as errors
 import imdtk.tasks.fields_info as fit
+from imdtk.tasks.run_context import RUN_CONTEXT_KEY, share_run_context
 from tests import TEST_DIR
 
 
@@ -70,3 +71,42 @@ class TestFieldsInfoTask(object):
 
         assert 'filter' not in defaults
         assert 'target_name' not in defaults
+
+
+    def test_process_shared(self):
+        args = dict(self.args, fields_file=self.fields_tstfyl)
+        task = fit.FieldsInfoTask(args)
+        md1 = task.process(dict())
+        assert 'fields_info' not in md1
+        assert 'defaults' not in md1
+        context = share_run_context(args)    # the context shared by the tasks of the pipeline
+        assert context is task.run_context
+        assert context.fields_info is not None
+        assert context.defaults.get('dataproduct_type') == 'image'
+        (fields_info, defaults) = (context.fields_info, context.defaults)
+        task.process(dict())
+        assert context.fields_info is fields_info
+        assert context.defaults is defaults
+        assert task.get_fields_context(self.fields_tstfyl) == (fields_info, defaults)
+
+
+    def test_run_context_stream(self, tmp_path, capsys):
+        args = dict(self.args, fields_file=self.fields_tstfyl)
+        task = fit.FieldsInfoTask(args)
+        task.output_results(task.process({ 'file_info': { 'file_name': 'f1.fits' } }))
+        task.output_results(task.process({ 'file_info': { 'file_name': 'f2.fits' } }))
+        out = capsys.readouterr().out
+        assert out.count(RUN_CONTEXT_KEY) == 1         # emitted once, at the head of the stream
+        assert out.index(RUN_CONTEXT_KEY) < out.index('f1.fits')
+
+        outfile = tmp_path / 'fields_info.json'
+        task.output_results(task.process(dict()))     # to standard output: not emitted again
+        task.args['output_file'] = str(outfile)
+        task.output_results(task.process({ 'file_info': { 'file_name': 'f3.fits' } }))
+        assert RUN_CONTEXT_KEY not in capsys.readouterr().out
+
+        next_args = dict(self.args, input_file=str(outfile))  # a downstream CLI stage
+        metadata = fit.FieldsInfoTask(next_args).input_data()
+        assert RUN_CONTEXT_KEY not in metadata
+        assert metadata.get('file_info').get('file_name') == 'f3.fits'
+        assert share_run_context(next_args).defaults == task.run_context.defaults
@@ -0,0 +1,48 @@
+# Tests for the FitsCatalogDataTask.
+#   Written by: Tom Hicks. 10/19/2026.
+#   Last Modified: Initial creation: test streaming the table rows in chunks.
+#
+import pytest
+
+from astropy.io import fits
+
+import imdtk.exceptions as errors
+import imdtk.tasks.fits_catalog_data as fcdt
+from tests import TEST_DIR
+
+
+class TestFitsCatalogDataTask(object):
+
+    image_tstfyl = "{}/resources/m13.fits".format(TEST_DIR)
+    nosuch_tstfyl = "{}/resources/NOSUCHFILE.fits".format(TEST_DIR)
+    table_tstfyl = "{}/resources/small_table.fits".format(TEST_DIR)
+
+    args = { 'debug': True, 'verbose': True, 'TOOL_NAME': 'TestFitsCatalogDataTask' }
+
+
+    def test_gen_row_chunks(self):
+        with fits.open(self.table_tstfyl) as hdus_list:
+            nrows = len(hdus_list[1].data)
+        task = fcdt.FitsCatalogDataTask(dict(self.args, chunk_size=2))
+        chunks = list(task.gen_row_chunks(self.table_tstfyl))
+        assert len(chunks) == (nrows + 1) // 2
+        assert all(len(chunk) <= 2 for chunk in chunks)
+        assert sum(len(chunk) for chunk in chunks) == nrows
+
+
+    def test_gen_row_chunks_default_size(self):
+        task = fcdt.FitsCatalogDataTask(self.args)
+        chunks = list(task.gen_row_chunks(self.table_tstfyl))
+        assert len(chunks) == 1
+
+
+    def test_gen_row_chunks_no_catalog(self):
+        task = fcdt.FitsCatalogDataTask(self.args)
+        with pytest.raises(errors.UnsupportedType, match='no catalog in HDU 1'):
+            list(task.gen_row_chunks(self.image_tstfyl))
+
+
+    def test_gen_row_chunks_nosuch(self):
+        task = fcdt.FitsCatalogDataTask(self.args)
+        with pytest.raises(errors.ProcessingError, match='Unable to read catalog data'):
+            list(task.gen_row_chunks(self.nosuch_tstfyl))
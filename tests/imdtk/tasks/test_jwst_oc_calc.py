@@ -0,0 +1,77 @@
+# Tests for the JWST ObsCore calculation task.
+#   Written by: Tom Hicks. 1/26/21.
+#   Last Modified: Read the fields info and defaults from the shared run context.
+#
+import pytest
+
+from astropy.io import fits
+
+from imdtk.core.fast_wcs import make_fast_wcs
+from imdtk.tasks.jwst_oc_calc import JWST_ObsCoreCalcTask
+from imdtk.tasks.run_context import RunContext
+from tests import TEST_RESOURCES_DIR
+
+
+class TestJWST_ObsCoreCalcTask(object):
+
+    m13_tstfyl = f"{TEST_RESOURCES_DIR}/m13.fits"
+
+    fields_info = {
+        's_ra': { 'required': True },
+        'obs_id': { 'required': True },
+        'target_name': { 'default': 'DEFAULT_TARGET' },
+        'im_naxis1': { 'required': True },
+        'dataproduct_type': { 'default': 'image' }
+    }
+
+    defaults = { 'target_name': 'DEFAULT_TARGET', 'dataproduct_type': 'image' }
+
+
+    def test_compile_field_plan(self):
+        task = JWST_ObsCoreCalcTask({ 'TOOL_NAME': 'test' })
+        plan = task.compile_field_plan(self.fields_info, self.defaults)
+        assert [ step.field_name for step in plan ] == ['s_ra', 'target_name', 'im_naxis1', 'dataproduct_type']
+        assert plan[0].calculator is not None
+        assert plan[1].default_setter is not None
+        assert plan[1].default == 'DEFAULT_TARGET'
+        assert plan[3].calculator is None
+        assert plan[3].default == 'image'
+
+
+    def context_args (self, **kwargs):
+        """ Return task arguments holding a run context with the test fields info and defaults. """
+        return dict({ 'TOOL_NAME': 'test',
+                      'run_context': RunContext(self.fields_info, self.defaults) }, **kwargs)
+
+
+    def test_get_field_plan(self):
+        task = JWST_ObsCoreCalcTask(self.context_args())
+        plan = task.get_field_plan()
+        assert task.get_field_plan() is plan
+        task.run_context.update({ 'fields_info': dict(self.fields_info),
+                                  'defaults': dict(self.defaults) })
+        assert task.get_field_plan() is plan
+        task.run_context.update(dict())
+        assert task.get_field_plan() == []
+
+
+    def test_calc_field_values(self):
+        task = JWST_ObsCoreCalcTask(self.context_args())
+        metadata = { 'file_info': { 'file_name': 'goods_s_F150W.fits' } }
+        calcs = { 's_xel1': 300, 'dataproduct_type': 'cube' }
+        wcs_info = make_fast_wcs(fits.getheader(self.m13_tstfyl))
+        task.calc_field_values(wcs_info, metadata, calcs)
+        assert calcs.get('target_name') == 'goods_south'  # set by fallback, not default
+        assert calcs.get('im_naxis1') == 300
+        assert calcs.get('dataproduct_type') == 'cube'    # existing value not defaulted
+        assert 's_ra' not in calcs                        # no headers
+
+
+    def test_process(self):
+        task = JWST_ObsCoreCalcTask(self.context_args(fits_file=self.m13_tstfyl))
+        metadata = { 'headers': { 'CRVAL1': 250.4226, 'CRVAL2': 36.4602 } }
+        calcs = task.process(metadata).get('calculated')
+        assert calcs.get('s_ra') == 250.4226
+        assert calcs.get('target_name') == 'DEFAULT_TARGET'  # no file info for fallback
+        assert calcs.get('im_scale') == pytest.approx(0.0002777)
+        assert len([ key for key in calcs if key.startswith('im_ra') ]) == 4
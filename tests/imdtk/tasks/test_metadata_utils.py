@@ -1,6 +1,6 @@
 # Tests for the metata utilities module.
 #   Written by: Tom Hicks. 7/16/2020.
-#   Last Modified: Add test for get_data.
+#   Last Modified: Add test for data chunks getter.
 #
 import imdtk.tasks.metadata_utils as utils
 
@@ -213,6 +213,28 @@ class TestMetadataUtils(object):
         assert 'Q' not in data
 
 
+    def test_get_column_scales_zeros_missing (self):
+        assert utils.get_column_scales(self.cat_md) is None
+        assert utils.get_column_zeros(self.cat_md) is None
+
+
+    def test_get_column_scales_zeros (self):
+        cat_md = { 'column_info': { 'bscale': ['', 0.5], 'bzero': [32768, ''] } }
+        assert utils.get_column_scales(cat_md) == ['', 0.5]
+        assert utils.get_column_zeros(cat_md) == [32768, '']
+
+
+    def test_get_column_stats (self):
+        assert utils.get_column_stats(self.cat_md) is None
+        assert utils.get_column_stats({ 'column_stats': { 'row_count': 2 } }) == { 'row_count': 2 }
+
+
+    def test_get_data_chunks (self):
+        assert utils.get_data_chunks(self.cat_md) is None
+        chunks = iter([[[1, 2]], [[3, 4]]])
+        assert utils.get_data_chunks({ 'data_chunks': chunks }) is chunks
+
+
     def test_get_data (self):
         data = utils.get_data(self.cat_md)
         print(data)
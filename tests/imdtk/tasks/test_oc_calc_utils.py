@@ -1,6 +1,6 @@
 # Tests for the ObsCore Calculation utilities module.
 #   Written by: Tom Hicks. 7/16/2020.
-#   Last Modified: Update tests of calc_wcs_coordinates. Fix: rename some missed tests.
+#   Last Modified: Add tests of batch geometry and image size calculations.
 #
 import pytest
 from pytest import approx
@@ -9,6 +9,7 @@ from astropy import wcs
 from astropy.io import fits
 
 import imdtk.exceptions as errors
+import imdtk.core.fast_wcs as fast_wcs
 import imdtk.tasks.oc_calc_utils as utils
 from tests import TEST_DIR
 
@@ -69,6 +70,39 @@ class TestOcCalcUtils(object):
 
 
 
+    def test_calc_geometry_batch(self):
+        header = fits.getheader(self.m13_tstfyl)
+        rotated = header.copy()
+        rotated.update(CRVAL1=10.0, CRVAL2=-45.0, CDELT1=-0.001, CDELT2=0.001,
+                       PC1_1=0.6, PC1_2=-0.8, PC2_1=0.8, PC2_2=0.6)
+        full_wcss = [ wcs.WCS(header), wcs.WCS(rotated) ]
+        wcs_infos = [ fast_wcs.make_fast_wcs(header), full_wcss[0], fast_wcs.make_fast_wcs(rotated) ]
+        calcs_list = [ dict(), dict(), dict() ]
+        utils.calc_geometry_batch(wcs_infos, calcs_list)
+        for calcs, full_wcs in zip(calcs_list, full_wcss[:1] + full_wcss):
+            expected = dict()
+            utils.calc_scale(full_wcs, expected)
+            utils.calc_corners(full_wcs, expected)
+            assert list(calcs.keys()) == list(expected.keys())
+            assert calcs == approx(expected, abs=1e-9)
+
+
+    def test_calc_geometry_batch_empty(self):
+        calcs_list = []
+        utils.calc_geometry_batch([], calcs_list)
+        assert calcs_list == []
+
+
+    def test_calc_image_size(self):
+        calcs = dict()
+        utils.calc_image_size(calcs)
+        assert calcs == dict()
+        calcs = { 's_xel1': 300, 's_xel2': 200 }
+        utils.calc_image_size(calcs)
+        assert calcs.get('im_naxis1') == 300
+        assert calcs.get('im_naxis2') == 200
+
+
     def test_calc_scale(self):
         calcs = dict()
         scale = None
@@ -1,6 +1,6 @@
 # Tests for the CLI utilities module.
 #   Written by: Tom Hicks. 7/15/2020.
-#   Last Modified: Replace SQL only argument with more general output only argument.
+#   Last Modified: Test that the exit codes are unique.
 #
 import argparse
 import pytest
@@ -21,6 +21,19 @@ class TestCliUtils(object):
     resources_tstdir = "{}/resources".format(TEST_DIR)
 
 
+    def test_add_adaptive_argument(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_adaptive_argument(parser, TOOL_NAME)
+        utils.add_aliases_argument(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        assert args.get('adaptive') is False
+
+        args = vars(parser.parse_args(['-ac', '-a', 'aliases.ini']))
+        assert args.get('adaptive') is True
+        assert args.get('alias_file') == 'aliases.ini'
+
+
     def test_add_aliases_argument(self):
         parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
         utils.add_aliases_argument(parser, TOOL_NAME)
@@ -72,6 +85,20 @@ class TestCliUtils(object):
         assert args.get('catalog_table') == 'a_cat_table'
 
 
+    def test_add_chunk_size_argument(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_chunk_size_argument(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        assert 'chunk_size' not in args
+
+        args = vars(parser.parse_args(['-cs', '500']))
+        assert args.get('chunk_size') == 500
+
+        args = vars(parser.parse_args(['--chunk-size', '20000']))
+        assert args.get('chunk_size') == 20000
+
+
     def test_add_collection_argument(self):
         parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
         utils.add_collection_argument(parser, TOOL_NAME)
@@ -292,6 +319,82 @@ class TestCliUtils(object):
         assert 'verbose' in args            # it has a default
 
 
+    def test_add_stats_arguments(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_stats_arguments(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        print(args)
+        assert 'stats_file' not in args     # no default
+        assert 'stats_table' not in args    # no default
+
+        args = vars(parser.parse_args(['-sf', 'stats.json', '-st', 'cat_stats']))
+        print(args)
+        assert args.get('stats_file') == 'stats.json'
+        assert args.get('stats_table') == 'cat_stats'
+
+        args = vars(parser.parse_args(['--stats-file', '/tmp/s.json', '--stats-table', 'stbl']))
+        print(args)
+        assert args.get('stats_file') == '/tmp/s.json'
+        assert args.get('stats_table') == 'stbl'
+
+
+    def test_add_header_cache_argument(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_header_cache_argument(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        print(args)
+        assert 'header_cache' not in args   # no default: caching disabled
+
+        args = vars(parser.parse_args(['-hc']))
+        assert args.get('header_cache') == utils.DEFAULT_HEADER_CACHE_FILEPATH
+
+        args = vars(parser.parse_args(['--header-cache', '/tmp/cache.sqlite']))
+        assert args.get('header_cache') == '/tmp/cache.sqlite'
+
+
+    def test_add_keyfile_argument(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_keyfile_argument(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        print(args)
+        assert 'keyfile' not in args        # no default
+
+        args = vars(parser.parse_args(['-k', 'keys.txt']))
+        assert args.get('keyfile') == 'keys.txt'
+
+        args = vars(parser.parse_args(['--keyfile', '/tmp/keys.txt']))
+        assert args.get('keyfile') == '/tmp/keys.txt'
+
+
+    def test_add_read_ahead_argument(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_read_ahead_argument(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        print(args)
+        assert 'read_ahead_kb' not in args  # no default
+
+        args = vars(parser.parse_args(['-ra', '256']))
+        assert args.get('read_ahead_kb') == 256
+
+        args = vars(parser.parse_args(['--read-ahead', '0']))
+        assert args.get('read_ahead_kb') == 0
+
+
+    def test_add_skip_names_argument(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_skip_names_argument(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        assert args.get('skip_names') is None
+
+        args = vars(parser.parse_args(['-sn', '*_x1d.fits', '--skip-name', '*cat*']))
+        assert args.get('skip_names') == [ '*_x1d.fits', '*cat*' ]
+
+
     def test_add_table_name_argument(self):
         parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
         utils.add_table_name_argument(parser, TOOL_NAME)
@@ -311,6 +414,85 @@ class TestCliUtils(object):
         assert args.get('table_name') == 'a_table_name'
 
 
+    def test_add_incremental_arguments(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_incremental_arguments(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        assert args == { 'incremental': False }   # no manifest by default
+
+        args = vars(parser.parse_args(['-inc', '-mf']))
+        assert args == { 'incremental': True, 'manifest': utils.DEFAULT_INGEST_MANIFEST_FILEPATH }
+
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_incremental_arguments(parser, TOOL_NAME, manifest_required=True)
+
+        args = vars(parser.parse_args(['--incremental']))
+        assert args.get('manifest') == utils.DEFAULT_INGEST_MANIFEST_FILEPATH
+
+        args = vars(parser.parse_args(['--manifest', '/some/manifest.sqlite']))
+        assert args == { 'incremental': False, 'manifest': '/some/manifest.sqlite' }
+
+
+    def test_add_listing_mode_argument(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_listing_mode_argument(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        assert 'listing_mode' not in args   # no default: helper uses the default mode
+
+        args = vars(parser.parse_args(['-lm', 'walk']))
+        assert args.get('listing_mode') == 'walk'
+
+        with pytest.raises(SystemExit):
+            parser.parse_args(['--listing-mode', 'guess'])
+
+
+    def test_add_local_irods_arguments(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_local_irods_arguments(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        assert args == {}                   # no defaults: connect to iRods
+
+        args = vars(parser.parse_args(['--irods-local-root', TEST_DIR, '--irods-latency', '2.5',
+                                       '--irods-bandwidth', '100']))
+        assert args == { 'irods_local_root': TEST_DIR, 'irods_latency_ms': 2.5, 'irods_bandwidth_mbs': 100.0 }
+
+
+    def test_add_wcs_mode_argument(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_wcs_mode_argument(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        print(args)
+        assert 'wcs_mode' not in args       # no default: task uses the default mode
+
+        args = vars(parser.parse_args(['-wm', 'validate']))
+        assert args.get('wcs_mode') == 'validate'
+
+        with pytest.raises(SystemExit):
+            parser.parse_args(['--wcs-mode', 'guess'])
+
+
+    def test_add_workers_argument(self):
+        parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+        utils.add_workers_argument(parser, TOOL_NAME)
+
+        args = vars(parser.parse_args([]))
+        print(args)
+        assert 'workers' in args            # it has a default
+        assert args.get('workers') == utils.DEFAULT_WORKERS
+
+        args = vars(parser.parse_args(['-w', '8']))
+        print(args)
+        assert args.get('workers') == 8
+
+        args = vars(parser.parse_args(['--workers', '2']))
+        print(args)
+        assert args.get('workers') == 2
+
+
     def test_check_alias_file(self):
         with pytest.raises(SystemExit) as se:
             utils.check_alias_file(self.nosuch_tstfyl, TOOL_NAME)
@@ -325,6 +507,21 @@ class TestCliUtils(object):
         assert se.value.code == utils.CATALOG_TABLE_EXIT_CODE
 
 
+    def test_exit_codes_unique(self):
+        codes = { name: value for (name, value) in vars(utils).items() if name.endswith('_EXIT_CODE') }
+        assert len(set(codes.values())) == len(codes)
+
+
+    def test_check_chunk_size(self):
+        for chunk_size in [0, -1]:
+            with pytest.raises(SystemExit) as se:
+                utils.check_chunk_size(chunk_size, TOOL_NAME)
+            assert se.type == SystemExit
+            assert se.value.code == utils.CHUNK_SIZE_EXIT_CODE
+        utils.check_chunk_size(None, TOOL_NAME)
+        utils.check_chunk_size(1, TOOL_NAME)
+
+
     def test_check_dbconfig_file(self):
         with pytest.raises(SystemExit) as se:
             utils.check_dbconfig_file(self.nosuch_tstfyl, TOOL_NAME)
@@ -372,3 +569,98 @@ class TestCliUtils(object):
             utils.check_input_file(self.nosuch_tstfyl, TOOL_NAME)
         assert se.type == SystemExit
         assert se.value.code == utils.INPUT_FILE_EXIT_CODE
+
+
+    def test_check_key_file_bad(self):
+        with pytest.raises(SystemExit) as se:
+            utils.check_key_file(self.nosuch_tstfyl, TOOL_NAME)
+        assert se.type == SystemExit
+        assert se.value.code == utils.KEY_FILE_EXIT_CODE
+
+
+    def test_check_key_file(self):
+        try:
+            utils.check_key_file(None, TOOL_NAME)
+            utils.check_key_file(self.m13_tstfyl, TOOL_NAME)
+        except SystemExit as se:
+            pytest.fail("test_cli_utils.test_check_key_file: unexpected SystemExit: {}".format(repr(se)))
+
+
+    def test_check_header_cache_bad(self):
+        with pytest.raises(SystemExit) as se:
+            utils.check_header_cache('/no/such/dir/cache.sqlite', TOOL_NAME)
+        assert se.type == SystemExit
+        assert se.value.code == utils.HEADER_CACHE_EXIT_CODE
+
+
+    def test_check_header_cache(self):
+        try:
+            utils.check_header_cache(None, TOOL_NAME)
+            utils.check_header_cache("{}/cache.sqlite".format(self.resources_tstdir), TOOL_NAME)
+        except SystemExit as se:
+            pytest.fail("test_cli_utils.test_check_header_cache: unexpected SystemExit: {}".format(repr(se)))
+
+
+    def test_check_local_irods_bad(self):
+        for args in [ { 'irods_local_root': '/nosuchdir' }, { 'irods_latency_ms': -1 },
+                      { 'irods_bandwidth_mbs': 0 } ]:
+            with pytest.raises(SystemExit) as se:
+                utils.check_local_irods(args, TOOL_NAME)
+            assert se.value.code == utils.LOCAL_IRODS_EXIT_CODE
+
+
+    def test_check_local_irods(self):
+        try:
+            utils.check_local_irods({}, TOOL_NAME)
+            utils.check_local_irods({ 'irods_local_root': TEST_DIR, 'irods_latency_ms': 0,
+                                      'irods_bandwidth_mbs': 10 }, TOOL_NAME)
+        except SystemExit as se:
+            pytest.fail("test_cli_utils.test_check_local_irods: unexpected SystemExit: {}".format(repr(se)))
+
+
+    def test_check_manifest_bad(self):
+        with pytest.raises(SystemExit) as se:
+            utils.check_manifest({ 'incremental': True, 'manifest': '/no/such/dir/manifest.sqlite' }, TOOL_NAME)
+        assert se.value.code == utils.MANIFEST_EXIT_CODE
+
+
+    def test_check_manifest(self):
+        try:
+            utils.check_manifest({ 'incremental': True }, TOOL_NAME)
+            utils.check_manifest({ 'manifest': '/no/such/dir/manifest.sqlite' }, TOOL_NAME)  # not incremental
+            utils.check_manifest({ 'incremental': True,
+                                   'manifest': "{}/manifest.sqlite".format(self.resources_tstdir) }, TOOL_NAME)
+        except SystemExit as se:
+            pytest.fail("test_cli_utils.test_check_manifest: unexpected SystemExit: {}".format(repr(se)))
+
+
+    def test_check_read_ahead_bad(self):
+        with pytest.raises(SystemExit) as se:
+            utils.check_read_ahead(-1, TOOL_NAME)
+        assert se.type == SystemExit
+        assert se.value.code == utils.READ_AHEAD_EXIT_CODE
+
+
+    def test_check_read_ahead(self):
+        try:
+            utils.check_read_ahead(None, TOOL_NAME)
+            utils.check_read_ahead(0, TOOL_NAME)
+            utils.check_read_ahead(64, TOOL_NAME)
+        except SystemExit as se:
+            pytest.fail("test_cli_utils.test_check_read_ahead: unexpected SystemExit: {}".format(repr(se)))
+
+
+    def test_check_workers_bad(self):
+        for workers in [None, 0, -1]:
+            with pytest.raises(SystemExit) as se:
+                utils.check_workers(workers, TOOL_NAME)
+            assert se.type == SystemExit
+            assert se.value.code == utils.WORKERS_EXIT_CODE
+
+
+    def test_check_workers(self):
+        try:
+            utils.check_workers(1, TOOL_NAME)
+            utils.check_workers(16, TOOL_NAME)
+        except SystemExit as se:
+            pytest.fail("test_cli_utils.test_check_workers: unexpected SystemExit: {}".format(repr(se)))